@@ -22,6 +22,9 @@ import pandas as pd
 from binance.client import Client
 from dotenv import load_dotenv
 
+from runtime.journal import read_journal
+from runtime.scheduler import ManualClock
+
 # Columns returned by Binance kline endpoints
 KLINE_COLUMNS: List[str] = [
     "timestamp",
@@ -144,6 +147,9 @@ class BacktestConfig:
     system_prompt_file: Optional[str]
     start_capital: Optional[float]
     disable_telegram: bool
+    llm_cache_mode: str = "readwrite"
+    kline_cache_mode: str = "readwrite"
+    prefetch_only: bool = False
 
     @property
     def start_ms(self) -> int:
@@ -236,6 +242,18 @@ class BacktestConfig:
 
         disable_telegram = os.getenv("BACKTEST_DISABLE_TELEGRAM", "true").strip().lower() in {"1", "true", "yes", "on"}
 
+        llm_cache_mode = os.getenv("BACKTEST_LLM_CACHE", "readwrite").strip().lower() or "readwrite"
+        if llm_cache_mode not in {"readwrite", "readonly", "bypass"}:
+            logging.warning("Invalid BACKTEST_LLM_CACHE '%s'; using readwrite.", llm_cache_mode)
+            llm_cache_mode = "readwrite"
+
+        # 并行扫参时各进程只读共享 K 线缓存，下载统一由预取步骤完成
+        kline_cache_mode = os.getenv("BACKTEST_KLINE_CACHE", "readwrite").strip().lower() or "readwrite"
+        if kline_cache_mode not in {"readwrite", "readonly"}:
+            logging.warning("Invalid BACKTEST_KLINE_CACHE '%s'; using readwrite.", kline_cache_mode)
+            kline_cache_mode = "readwrite"
+        prefetch_only = os.getenv("BACKTEST_PREFETCH_ONLY", "false").strip().lower() in {"1", "true", "yes", "on"}
+
         base_dir.mkdir(parents=True, exist_ok=True)
         run_dir.mkdir(parents=True, exist_ok=True)
         cache_dir.mkdir(parents=True, exist_ok=True)
@@ -256,11 +274,14 @@ class BacktestConfig:
             system_prompt_file=system_prompt_file,
             start_capital=start_capital,
             disable_telegram=disable_telegram,
+            llm_cache_mode=llm_cache_mode,
+            kline_cache_mode=kline_cache_mode,
+            prefetch_only=prefetch_only,
         )
 
 
 def ensure_cached_klines(
-    client: Client,
+    client: Optional[Client],
     cfg: BacktestConfig,
     symbol: str,
     interval: str,
@@ -289,6 +310,11 @@ def ensure_cached_klines(
     if not have_coverage:
         start_str = start_with_buffer.strftime("%Y-%m-%d %H:%M:%S")
         end_str = end_with_buffer.strftime("%Y-%m-%d %H:%M:%S")
+        if cfg.kline_cache_mode == "readonly":
+            raise RuntimeError(
+                f"Kline cache {cache_path} does not cover {start_str} → {end_str}; "
+                "prefetch it with BACKTEST_KLINE_CACHE=readwrite first."
+            )
         logging.info("Downloading %s %s klines from Binance (%s → %s)...", symbol, interval, start_str, end_str)
         # Pass millisecond timestamps to avoid ambiguous string date parsing in python-binance.
         klines = client.get_historical_klines(symbol, interval, start_ms_required, end_ms_required)
@@ -300,7 +326,10 @@ def ensure_cached_klines(
             cached.drop_duplicates(subset="timestamp", keep="last", inplace=True)
             cached.sort_values("timestamp", inplace=True)
             cached.reset_index(drop=True, inplace=True)
-        cached.to_csv(cache_path, index=False)
+        # 先写临时文件再原子替换，避免其他进程读到写了一半的缓存
+        tmp_path = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.tmp")
+        cached.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
 
     trimmed = cached[cached["timestamp"] <= end_ms_required].copy()
     trimmed.reset_index(drop=True, inplace=True)
@@ -329,21 +358,45 @@ class HistoricalBinanceClient:
                 else:
                     self._indices[symbol][interval] = None
 
-    def get_klines(self, symbol: str, interval: str, limit: int = 500) -> List[List[float]]:
+    def get_klines(
+        self,
+        symbol: str,
+        interval: str,
+        limit: int = 500,
+        startTime: Optional[int] = None,
+    ) -> List[List[float]]:
         if symbol not in self._frames or interval not in self._frames[symbol]:
             return []
         idx = self._indices[symbol][interval]
         if idx is None:
             return []
         df = self._frames[symbol][interval]
-        start_idx = max(0, idx - max(0, limit - 1))
-        subset = df.iloc[start_idx : idx + 1]
+        if startTime is not None:
+            # Mirror Binance: oldest bars first, starting at startTime, capped by limit.
+            timestamps = df["timestamp"].to_numpy(dtype=np.int64)
+            start_idx = int(np.searchsorted(timestamps, startTime, side="left"))
+            end_idx = min(idx + 1, start_idx + max(0, limit))
+            subset = df.iloc[start_idx:end_idx]
+        else:
+            start_idx = max(0, idx - max(0, limit - 1))
+            subset = df.iloc[start_idx : idx + 1]
         return subset[KLINE_COLUMNS].values.tolist()
 
-    def futures_open_interest_hist(self, symbol: str, period: str, limit: int = 30) -> List[Dict[str, float]]:
+    def futures_open_interest_hist(
+        self,
+        symbol: str,
+        period: str,
+        limit: int = 30,
+        startTime: Optional[int] = None,
+    ) -> List[Dict[str, float]]:
         return []
 
-    def futures_funding_rate(self, symbol: str, limit: int = 30) -> List[Dict[str, float]]:
+    def futures_funding_rate(
+        self,
+        symbol: str,
+        limit: int = 30,
+        startTime: Optional[int] = None,
+    ) -> List[Dict[str, float]]:
         return []
 
     @property
@@ -376,12 +429,9 @@ def summarize_trades(trades_path: Path) -> Dict[str, Optional[float]]:
         "net_realized_pnl": 0.0,
     }
 
-    if not trades_path.exists():
-        return dict(empty_stats)
-
     try:
-        df = pd.read_csv(trades_path)
-    except Exception as exc:  # pragma: no cover - defensive against bad CSVs
+        df = read_journal(trades_path.parent, trades_path.stem, columns=["action", "pnl"])
+    except Exception as exc:  # pragma: no cover - defensive against bad journals
         logging.warning("Unable to load trade history from %s: %s", trades_path, exc)
         return dict(empty_stats)
 
@@ -439,6 +489,11 @@ def configure_environment(cfg: BacktestConfig) -> None:
     elif cfg.system_prompt is not None:
         os.environ["TRADEBOT_SYSTEM_PROMPT"] = cfg.system_prompt
         os.environ.pop("TRADEBOT_SYSTEM_PROMPT_FILE", None)
+    # 回测默认读写共享的 LLM 响应缓存（位于各运行目录之外）
+    os.environ["TRADEBOT_LLM_CACHE"] = cfg.llm_cache_mode
+    os.environ.setdefault("TRADEBOT_LLM_CACHE_DIR", str(cfg.base_dir / "llm_cache"))
+    # 回测状态可随时重跑，逐条 fsync 状态日志只会拖慢回放
+    os.environ.setdefault("TRADEBOT_STATE_FSYNC", "false")
     if cfg.disable_telegram:
         os.environ["TELEGRAM_BOT_TOKEN"] = ""
         os.environ["TELEGRAM_CHAT_ID"] = ""
@@ -473,7 +528,8 @@ def main() -> None:
 
     api_key = os.getenv("BN_API_KEY") or None
     api_secret = os.getenv("BN_SECRET") or None
-    binance_client = Client(api_key, api_secret, testnet=False)
+    # 只读缓存模式下不会下载，无需创建（会联网 ping 的）Binance 客户端
+    binance_client = Client(api_key, api_secret, testnet=False) if cfg.kline_cache_mode == "readwrite" else None
 
     intervals_needed = {cfg.interval, LONG_CONTEXT_INTERVAL}
     symbol_frames: Dict[str, Dict[str, pd.DataFrame]] = {}
@@ -482,6 +538,9 @@ def main() -> None:
         for interval in intervals_needed:
             frame = ensure_cached_klines(binance_client, cfg, symbol, interval)
             symbol_frames[symbol][interval] = frame
+    if cfg.prefetch_only:
+        logging.info("Kline cache ready in %s; prefetch only, skipping the replay.", cfg.cache_dir)
+        return
 
     historical_client = HistoricalBinanceClient(symbol_frames)
     bot.client = historical_client  # type: ignore[assignment]
@@ -496,11 +555,7 @@ def main() -> None:
         logging.error("No data available for %s between %s and %s", cfg.interval, cfg.start, cfg.end)
         return
 
-    time_holder = {"value": int(timeline[0])}
-
-    def simulated_time() -> datetime:
-        return datetime.fromtimestamp(time_holder["value"] / 1000, tz=timezone.utc)
-
+    simulated_time = ManualClock(datetime.fromtimestamp(int(timeline[0]) / 1000, tz=timezone.utc))
     bot.set_time_provider(simulated_time)
     bot.reset_state(cfg.start_capital)
     bot.init_csv_files()
@@ -512,19 +567,19 @@ def main() -> None:
     print(f"LLM model used for this backtest: {bot.LLM_MODEL_NAME}")
 
     for idx, timestamp_ms in enumerate(timeline, start=1):
-        time_holder["value"] = int(timestamp_ms)
+        simulated_time.set(datetime.fromtimestamp(int(timestamp_ms) / 1000, tz=timezone.utc))
         historical_client.set_current_timestamp(int(timestamp_ms))
         bot.iteration_counter += 1
         bot.current_iteration_messages = []
+        bot.begin_market_snapshot()
+        bot.prefetch_market_data()
 
         bot.check_stop_loss_take_profit()
         prompt = bot.format_prompt_for_deepseek()
-        decisions = bot.call_deepseek_api(prompt)
+        decisions = bot.request_trading_decisions(prompt)
 
         if not decisions:
             logging.warning("Iteration %d: no decisions returned by LLM.", idx)
-        else:
-            bot.process_ai_decisions(decisions)
 
         total_equity = bot.calculate_total_equity()
         bot.register_equity_snapshot(total_equity)
@@ -541,16 +596,38 @@ def main() -> None:
             len(bot.positions),
         )
 
+    bot.log_llm_cache_stats()
+    bot.log_prefix_cache_stats()
+    bot.journal.flush()
+    bot.log_journal_stats()
     final_equity = bot.calculate_total_equity()
     total_return_pct = ((final_equity - bot.START_CAPITAL) / bot.START_CAPITAL) * 100 if bot.START_CAPITAL else 0.0
     sortino = bot.calculate_sortino_ratio(bot.equity_history, interval_seconds, bot.RISK_FREE_RATE)
     max_drawdown = compute_max_drawdown(bot.equity_history)
     trade_stats = summarize_trades(bot.TRADES_CSV)
+    llm_summary = bot.llm_telemetry.summary()
 
     results = {
         "run_id": cfg.run_id,
         "run_directory": str(cfg.run_dir),
         "cache_directory": str(cfg.cache_dir),
+        "llm_cache": {
+            "mode": bot.llm_response_cache.mode,
+            "directory": str(bot.llm_response_cache.root),
+            "hits": bot.llm_response_cache.stats.hits,
+            "misses": bot.llm_response_cache.stats.misses,
+            "writes": bot.llm_response_cache.stats.writes,
+        },
+        "llm_telemetry": llm_summary.as_dict() if llm_summary is not None else None,
+        "llm_hedging": bot.llm_hedge_stats.as_dict() if bot.LLM_HEDGE else None,
+        "journal": bot.journal.stats().as_dict(),
+        "message_blobs": bot.message_blobs.stats.as_dict(),
+        "prompt_prefix_cache": {
+            "layout": bot.static_prompt.layout,
+            "fingerprint": bot.static_prompt.fingerprint,
+            "prompt_tokens": bot.prefix_cache_stats.prompt_tokens,
+            "cached_tokens": bot.prefix_cache_stats.cached_tokens,
+        },
         "timeframe": {
             "start": cfg.start.isoformat(),
             "end": cfg.end.isoformat(),
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Parallel parameter sweep over `backtest.py`.
+
+Every combination of the grid runs as its own `backtest.py` process with an
+isolated run directory under one sweep folder.  Missing klines are downloaded
+once up front; the workers then open the shared kline cache read-only.  When
+all runs have finished, their `backtest_results.json` files are collected into
+`sweep_results.csv` / `sweep_results.json` and printed as a comparison table.
+
+    python -m backtest.sweep --grid sweep.yaml --workers 4
+    python -m backtest.sweep --set model=deepseek/deepseek-chat,openai/gpt-4o-mini \\
+        --set interval=3m,15m --base start=2024-01-01T00:00:00Z --base end=2024-01-03T00:00:00Z
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import pandas as pd
+import yaml
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+BACKTEST_SCRIPT = PROJECT_ROOT / "backtest.py"
+DEFAULT_BACKTEST_DIR = PROJECT_ROOT / "data-backtest"
+RESULTS_FILENAME = "backtest_results.json"
+
+# 网格中的简写参数名 → backtest.py 读取的环境变量；其他键按原样作为环境变量名
+PARAM_ALIASES = {
+    "start": "BACKTEST_START",
+    "end": "BACKTEST_END",
+    "interval": "BACKTEST_INTERVAL",
+    "model": "BACKTEST_LLM_MODEL",
+    "temperature": "BACKTEST_TEMPERATURE",
+    "max_tokens": "BACKTEST_MAX_TOKENS",
+    "thinking": "BACKTEST_LLM_THINKING",
+    "system_prompt": "BACKTEST_SYSTEM_PROMPT",
+    "system_prompt_file": "BACKTEST_SYSTEM_PROMPT_FILE",
+    "capital": "BACKTEST_START_CAPITAL",
+    "start_capital": "BACKTEST_START_CAPITAL",
+    "llm_cache": "BACKTEST_LLM_CACHE",
+    "prompt_mode": "TRADEBOT_PROMPT_MODE",
+}
+
+# 预取 K 线只取决于时间窗口与周期
+_WINDOW_KEYS = ("BACKTEST_START", "BACKTEST_END", "BACKTEST_INTERVAL")
+
+SUMMARY_COLUMNS = [
+    "bars",
+    "final_equity",
+    "return_pct",
+    "max_drawdown_pct",
+    "sortino",
+    "trades",
+    "closed_trades",
+    "win_rate_pct",
+    "net_realized_pnl",
+    "llm_calls",
+    "llm_latency_p95",
+    "llm_cost_usd",
+]
+
+
+def env_name(key: str) -> str:
+    """Map a grid key to the environment variable `backtest.py` reads."""
+    key = key.strip()
+    return PARAM_ALIASES.get(key.lower(), key)
+
+
+@dataclass
+class SweepSpec:
+    grid: Dict[str, List[str]]
+    base: Dict[str, str] = field(default_factory=dict)
+    name: Optional[str] = None
+    workers: Optional[int] = None
+
+    def combinations(self) -> List["SweepRun"]:
+        """Cartesian product of the grid, in the order the keys were given."""
+        keys = list(self.grid)
+        runs = []
+        for index, values in enumerate(itertools.product(*(self.grid[key] for key in keys)), start=1):
+            params = dict(zip(keys, values))
+            runs.append(SweepRun(index=index, params=params, env={**self.base, **params}))
+        return runs
+
+
+@dataclass
+class SweepRun:
+    index: int
+    params: Dict[str, str]
+    env: Dict[str, str]
+
+    @property
+    def name(self) -> str:
+        slug = "_".join(_slug(value) for value in self.params.values())
+        return f"{self.index:02d}-{slug[:60]}".rstrip("-_") if slug else f"{self.index:02d}"
+
+
+def _slug(value: str) -> str:
+    tail = value.rstrip("/").rsplit("/", 1)[-1]
+    return re.sub(r"[^A-Za-z0-9.]+", "-", tail).strip("-")
+
+
+def _stringify(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (datetime, date)):
+        # YAML 会把未加引号的时间戳解析为 datetime
+        return value.isoformat()
+    return str(value)
+
+
+def _normalize_mapping(raw: Optional[Mapping[str, Any]]) -> Dict[str, str]:
+    return {env_name(str(key)): _stringify(value) for key, value in (raw or {}).items()}
+
+
+def _normalize_grid(raw: Optional[Mapping[str, Any]]) -> Dict[str, List[str]]:
+    grid: Dict[str, List[str]] = {}
+    for key, values in (raw or {}).items():
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        if not values:
+            raise ValueError(f"Grid parameter '{key}' has no values")
+        grid[env_name(str(key))] = [_stringify(value) for value in values]
+    return grid
+
+
+def load_spec(path: Path) -> SweepSpec:
+    """Read a YAML sweep file with `grid`, optional `base`, `name` and `workers`."""
+    with open(path) as fh:
+        raw = yaml.safe_load(fh) or {}
+    if not isinstance(raw, Mapping):
+        raise ValueError(f"Sweep file {path} must contain a mapping")
+    unknown = set(raw) - {"grid", "base", "name", "workers"}
+    if unknown:
+        raise ValueError(f"Unknown keys in sweep file {path}: {', '.join(sorted(unknown))}")
+    workers = raw.get("workers")
+    return SweepSpec(
+        grid=_normalize_grid(raw.get("grid")),
+        base=_normalize_mapping(raw.get("base")),
+        name=raw.get("name"),
+        workers=int(workers) if workers is not None else None,
+    )
+
+
+def parse_assignment(text: str) -> Tuple[str, str]:
+    """Split `KEY=VALUE` from the command line."""
+    key, sep, value = text.partition("=")
+    if not sep or not key.strip():
+        raise ValueError(f"Expected KEY=VALUE, got '{text}'")
+    return env_name(key), value
+
+
+def merge_cli(spec: SweepSpec, sets: Sequence[str], bases: Sequence[str]) -> SweepSpec:
+    """Overlay `--set KEY=v1,v2` grid axes and `--base KEY=VALUE` settings onto `spec`."""
+    grid = dict(spec.grid)
+    base = dict(spec.base)
+    for item in sets:
+        key, value = parse_assignment(item)
+        grid[key] = [part.strip() for part in value.split(",") if part.strip()]
+        if not grid[key]:
+            raise ValueError(f"Grid parameter '{key}' has no values")
+    for item in bases:
+        key, value = parse_assignment(item)
+        base[key] = value
+    return SweepSpec(grid=grid, base=base, name=spec.name, workers=spec.workers)
+
+
+def summarize_results(results: Mapping[str, Any]) -> Dict[str, Any]:
+    """Flatten one `backtest_results.json` into comparison-table columns."""
+    capital = results.get("capital") or {}
+    trading = results.get("trading") or {}
+    telemetry = results.get("llm_telemetry") or {}
+    latency = telemetry.get("latency_seconds") or {}
+    return {
+        "bars": (results.get("timeframe") or {}).get("bars"),
+        "final_equity": capital.get("final_equity"),
+        "return_pct": capital.get("total_return_pct"),
+        "max_drawdown_pct": capital.get("max_drawdown_pct"),
+        "sortino": capital.get("sortino_ratio"),
+        "trades": trading.get("total_trades"),
+        "closed_trades": trading.get("closed_trades"),
+        "win_rate_pct": trading.get("win_rate_pct"),
+        "net_realized_pnl": trading.get("net_realized_pnl"),
+        "llm_calls": telemetry.get("calls"),
+        "llm_latency_p95": latency.get("p95"),
+        "llm_cost_usd": telemetry.get("cost_usd"),
+    }
+
+
+class SweepRunner:
+    """
+    回测参数扫描执行器：每个参数组合在独立的 `backtest.py` 子进程中运行，
+    运行目录为 `<data_dir>/<sweep_id>/<组合名>`，互不干扰。
+
+    - 开始前按不同的（起止时间、周期）窗口串行预取 K 线，之后各进程以只读方式共享缓存；
+    - LLM 响应缓存（原子写入）同样在所有组合间共享；
+    - 每个组合的输出写入 `<组合名>.log`，失败的组合记录退出码，不影响其他组合。
+    """
+
+    def __init__(
+        self,
+        spec: SweepSpec,
+        *,
+        data_dir: Path = DEFAULT_BACKTEST_DIR,
+        workers: Optional[int] = None,
+        sweep_id: Optional[str] = None,
+        command: Optional[Sequence[str]] = None,
+        prefetch: bool = True,
+        env: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        if not spec.grid:
+            raise ValueError("Sweep grid is empty")
+        self.spec = spec
+        self.data_dir = Path(data_dir)
+        self.workers = max(1, workers or spec.workers or os.cpu_count() or 1)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        self.sweep_id = sweep_id or f"sweep-{spec.name or stamp}"
+        self.sweep_dir = self.data_dir / self.sweep_id
+        self.command = list(command or [sys.executable, str(BACKTEST_SCRIPT)])
+        self.prefetch = prefetch
+        self.env = dict(os.environ if env is None else env)
+
+    def _run_env(self, run_env: Mapping[str, str], run_id: str, **extra: str) -> Dict[str, str]:
+        return {
+            **self.env,
+            **run_env,
+            "BACKTEST_DATA_DIR": str(self.data_dir),
+            "BACKTEST_RUN_ID": run_id,
+            **extra,
+        }
+
+    def _execute(self, env: Mapping[str, str], log_path: Path) -> Tuple[int, float]:
+        started = time.monotonic()
+        with open(log_path, "w") as log:
+            completed = subprocess.run(
+                self.command,
+                cwd=PROJECT_ROOT,
+                env=dict(env),
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                check=False,
+            )
+        return completed.returncode, time.monotonic() - started
+
+    def prefetch_klines(self, runs: Iterable[SweepRun]) -> None:
+        """Download every distinct window once, serially, so workers never write the cache."""
+        windows: Dict[Tuple[Optional[str], ...], SweepRun] = {}
+        for run in runs:
+            windows.setdefault(tuple(run.env.get(key) for key in _WINDOW_KEYS), run)
+        for number, run in enumerate(windows.values(), start=1):
+            run_id = f"{self.sweep_id}/prefetch-{number:02d}"
+            (self.data_dir / run_id).mkdir(parents=True, exist_ok=True)
+            env = self._run_env(run.env, run_id, BACKTEST_PREFETCH_ONLY="true", BACKTEST_KLINE_CACHE="readwrite")
+            code, _ = self._execute(env, self.sweep_dir / f"prefetch-{number:02d}.log")
+            if code != 0:
+                raise RuntimeError(
+                    f"Kline prefetch failed (exit {code}); see {self.sweep_dir / f'prefetch-{number:02d}.log'}"
+                )
+
+    def run_one(self, run: SweepRun) -> Dict[str, Any]:
+        run_id = f"{self.sweep_id}/{run.name}"
+        env = self._run_env(
+            run.env,
+            run_id,
+            BACKTEST_PREFETCH_ONLY="false",
+            BACKTEST_KLINE_CACHE="readonly",
+        )
+        code, elapsed = self._execute(env, self.sweep_dir / f"{run.name}.log")
+        row: Dict[str, Any] = {"run": run.name, **run.params, "status": "ok" if code == 0 else f"exit {code}"}
+        results_path = self.data_dir / run_id / RESULTS_FILENAME
+        summary = dict.fromkeys(SUMMARY_COLUMNS)
+        if code == 0:
+            try:
+                with open(results_path) as fh:
+                    summary = summarize_results(json.load(fh))
+            except (OSError, ValueError) as exc:
+                row["status"] = f"no results ({exc.__class__.__name__})"
+        row.update(summary)
+        row["wall_seconds"] = round(elapsed, 2)
+        row["results_path"] = str(results_path)
+        return row
+
+    def run(self) -> pd.DataFrame:
+        runs = self.spec.combinations()
+        self.sweep_dir.mkdir(parents=True, exist_ok=True)
+        logging.info(
+            "Sweep %s: %d combinations on %d workers in %s",
+            self.sweep_id,
+            len(runs),
+            self.workers,
+            self.sweep_dir,
+        )
+        if self.prefetch:
+            self.prefetch_klines(runs)
+
+        started = time.monotonic()
+        rows: List[Dict[str, Any]] = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sweep") as pool:
+            futures = {pool.submit(self.run_one, run): run for run in runs}
+            for future in as_completed(futures):
+                row = future.result()
+                rows.append(row)
+                logging.info(
+                    "[%d/%d] %s: %s in %.1fs (return %s)",
+                    len(rows),
+                    len(runs),
+                    row["run"],
+                    row["status"],
+                    row["wall_seconds"],
+                    "n/a" if row.get("return_pct") is None else f"{row['return_pct']:.2f}%",
+                )
+        table = pd.DataFrame(rows).sort_values("run").reset_index(drop=True)
+        table.to_csv(self.sweep_dir / "sweep_results.csv", index=False)
+        with open(self.sweep_dir / "sweep_results.json", "w") as fh:
+            json.dump(
+                {
+                    "sweep_id": self.sweep_id,
+                    "grid": self.spec.grid,
+                    "base": self.spec.base,
+                    "workers": self.workers,
+                    "elapsed_seconds": round(time.monotonic() - started, 2),
+                    "runs": table.astype(object).where(table.notna(), None).to_dict(orient="records"),
+                },
+                fh,
+                indent=2,
+            )
+        return table
+
+
+def format_table(table: pd.DataFrame, params: Sequence[str]) -> str:
+    """Comparison table for the terminal, best return first."""
+    columns = ["run", *params, "status", "return_pct", "max_drawdown_pct", "sortino",
+               "trades", "win_rate_pct", "llm_cost_usd", "wall_seconds"]
+    view = table[[column for column in columns if column in table.columns]]
+    if "return_pct" in view.columns:
+        view = view.sort_values("return_pct", ascending=False, na_position="last")
+    return view.to_string(index=False, float_format=lambda value: f"{value:.2f}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run backtest.py over a parameter grid in parallel.")
+    parser.add_argument("--grid", type=Path, help="YAML file with `grid`, optional `base`, `name`, `workers`")
+    parser.add_argument("--set", dest="sets", action="append", default=[], metavar="KEY=V1,V2",
+                        help="Grid axis (repeatable); KEY is a short name such as model/interval or an env var")
+    parser.add_argument("--base", dest="bases", action="append", default=[], metavar="KEY=VALUE",
+                        help="Setting applied to every run (repeatable)")
+    parser.add_argument("--workers", type=int, help="Parallel backtest processes (default: CPU count)")
+    parser.add_argument("--data-dir", type=Path, help="Backtest root (default: BACKTEST_DATA_DIR or data-backtest/)")
+    parser.add_argument("--name", help="Sweep name; results go to <data-dir>/sweep-<name>/")
+    parser.add_argument("--no-prefetch", action="store_true",
+                        help="Skip the kline prefetch (the cache must already cover every window)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    spec = load_spec(args.grid) if args.grid else SweepSpec(grid={})
+    spec = merge_cli(spec, args.sets, args.bases)
+    if args.name:
+        spec.name = args.name
+
+    data_dir = args.data_dir or Path(os.getenv("BACKTEST_DATA_DIR") or DEFAULT_BACKTEST_DIR)
+    data_dir = data_dir.expanduser()
+    if not data_dir.is_absolute():
+        data_dir = (PROJECT_ROOT / data_dir).resolve()
+
+    runner = SweepRunner(spec, data_dir=data_dir, workers=args.workers, prefetch=not args.no_prefetch)
+    table = runner.run()
+    print(format_table(table, list(spec.grid)))
+    print(f"\nSweep results written to {runner.sweep_dir / 'sweep_results.csv'}")
+
+
+if __name__ == "__main__":
+    main()
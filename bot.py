@@ -12,17 +12,46 @@ import json
 import logging
 import csv
 from datetime import datetime, timezone
-from typing import Any, Callable, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple, Union
 from decimal import Decimal
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
-import requests
 from requests.exceptions import RequestException, Timeout
 from binance.client import Client
 from dotenv import load_dotenv
 from adapters.execution_bridge import send_market_order
+from market.concurrent_fetch import FetchOutcome, fetch_concurrently
+from market.derivatives_cache import DerivativesHistoryCache
+from market.kline_arrays import KlineArrays, decode_klines
+from market.kline_buffer import KlineBufferStore
+from market.kline_stream import BinanceKlineStream, KlineStreamState, ReplayKlineStream
+from market.snapshot_cache import MarketSnapshotCache
+from runtime.http import EndpointPolicy, get_transport
+from runtime.blob_store import BLOB_REF_PREFIX, MESSAGE_BLOB_DIRNAME, BlobStore, content_digest
+from runtime.journal import (
+    JOURNAL_BACKENDS,
+    PARQUET_JOURNAL_DIRNAME,
+    SQLITE_JOURNAL_FILENAME,
+    JournalBackend,
+    JournalWriter,
+    read_journal,
+    record_journal_backend,
+)
+from runtime.sqlite_journal import SqliteJournal
+from runtime.state_store import StateStore
+from llm.ensemble import ENSEMBLE_POLICIES, ModelSpec, parse_model_specs, run_ensemble
+from llm.hedging import HedgeAttempt, HedgeCancelled, HedgeStats, hedge_delay, run_hedged
+from llm.prompt_budget import PromptSection, TokenCounter, assemble_prompt, encode_series, format_value
+from llm.prompt_layout import PROMPT_LAYOUTS, PrefixCacheStats, StaticPrompt
+from llm.response_cache import CACHE_MODES, CachedResponse, LLMResponseCache, chat_request_key
+from llm.decisions import DecisionRecord, ParsedDecisions, normalize_decision, parse_decisions
+from llm.streaming import DecisionStreamParser, read_chat_stream
+from llm.telemetry import LLMCallRecord, LLMTelemetry, parse_price_table
+from runtime.scheduler import BarCloseScheduler, CycleReport, ScheduleTick
+from indicators.streaming import IndicatorEngineStore, IndicatorSpec
+from indicators.vectorized import compute_indicator_matrix, stack_right_aligned
 from colorama import Fore, Style, init as colorama_init
 
 from hyperliquid_client import HyperliquidTradingClient
@@ -266,12 +295,151 @@ def _load_trade_interval(default: str = DEFAULT_INTERVAL) -> str:
 
 INTERVAL = _load_trade_interval()
 CHECK_INTERVAL = _INTERVAL_TO_SECONDS[INTERVAL]
+
+# Main-loop scheduling: "aligned" wakes shortly after every INTERVAL candle close,
+# "sleep" keeps the legacy fixed CHECK_INTERVAL pause after each iteration
+SCHEDULE_MODE = os.getenv("TRADEBOT_SCHEDULE", "aligned").strip().lower() or "aligned"
+if SCHEDULE_MODE not in {"aligned", "sleep"}:
+    EARLY_ENV_WARNINGS.append(f"Unsupported TRADEBOT_SCHEDULE '{SCHEDULE_MODE}'; using aligned.")
+    SCHEDULE_MODE = "aligned"
+SCHEDULE_OFFSET_SECONDS = _parse_float_env(
+    os.getenv("TRADEBOT_SCHEDULE_OFFSET_MS"),
+    default=300.0,
+) / 1000.0
+SCHEDULE_MAX_LATENESS = _parse_float_env(
+    os.getenv("TRADEBOT_SCHEDULE_MAX_LATENESS"),
+    default=CHECK_INTERVAL / 2,
+)
+HTTP_MAX_RETRIES = max(0, _parse_int_env(
+    os.getenv("TRADEBOT_HTTP_RETRIES"),
+    default=2,
+))
+HTTP_POOL_SIZE = max(1, _parse_int_env(
+    os.getenv("TRADEBOT_HTTP_POOL_SIZE"),
+    default=4,
+))
+LLM_TIMEOUT_SECONDS = _parse_float_env(
+    os.getenv("TRADEBOT_LLM_TIMEOUT"),
+    default=30.0,
+)
+NOTIFY_TIMEOUT_SECONDS = _parse_float_env(
+    os.getenv("TRADEBOT_NOTIFY_TIMEOUT"),
+    default=10.0,
+)
+LLM_STREAMING = _parse_bool_env(
+    os.getenv("TRADEBOT_LLM_STREAM"),
+    default=True,
+)
+# 流式响应的整体截止时间 = 请求超时 × 该系数（从发出请求算起）
+LLM_STREAM_DEADLINE_FACTOR = 1.5
+LLM_CACHE_MODE = os.getenv("TRADEBOT_LLM_CACHE", "bypass").strip().lower() or "bypass"
+if LLM_CACHE_MODE not in CACHE_MODES:
+    EARLY_ENV_WARNINGS.append(f"Unsupported TRADEBOT_LLM_CACHE '{LLM_CACHE_MODE}'; bypassing the response cache.")
+    LLM_CACHE_MODE = "bypass"
+LLM_CACHE_DIR = os.getenv("TRADEBOT_LLM_CACHE_DIR", "").strip()
+try:
+    LLM_ENSEMBLE_MODELS = parse_model_specs(
+        os.getenv("TRADEBOT_LLM_ENSEMBLE_MODELS", ""),
+        default_timeout=LLM_TIMEOUT_SECONDS,
+    )
+except ValueError as exc:
+    EARLY_ENV_WARNINGS.append(f"{exc}; ensemble disabled.")
+    LLM_ENSEMBLE_MODELS = []
+LLM_ENSEMBLE_POLICY = os.getenv("TRADEBOT_LLM_ENSEMBLE_POLICY", "majority").strip().lower() or "majority"
+if LLM_ENSEMBLE_POLICY not in ENSEMBLE_POLICIES:
+    EARLY_ENV_WARNINGS.append(
+        f"Unsupported TRADEBOT_LLM_ENSEMBLE_POLICY '{LLM_ENSEMBLE_POLICY}'; using majority."
+    )
+    LLM_ENSEMBLE_POLICY = "majority"
+LLM_ENSEMBLE_DEADLINE = _parse_float_env(
+    os.getenv("TRADEBOT_LLM_ENSEMBLE_DEADLINE"),
+    default=0.0,
+)
+LLM_HEDGE = _parse_bool_env(
+    os.getenv("TRADEBOT_LLM_HEDGE"),
+    default=False,
+)
+LLM_HEDGE_PERCENTILE = min(max(_parse_float_env(
+    os.getenv("TRADEBOT_LLM_HEDGE_PERCENTILE"),
+    default=95.0,
+), 0.0), 100.0)
+LLM_HEDGE_DELAY = max(0.0, _parse_float_env(
+    os.getenv("TRADEBOT_LLM_HEDGE_DELAY"),
+    default=10.0,
+))
+LLM_HEDGE_MODEL = os.getenv("TRADEBOT_LLM_HEDGE_MODEL", "").strip()
+PROMPT_MODE = os.getenv("TRADEBOT_PROMPT_MODE", "verbose").strip().lower() or "verbose"
+if PROMPT_MODE not in {"verbose", "compact"}:
+    EARLY_ENV_WARNINGS.append(f"Unsupported TRADEBOT_PROMPT_MODE '{PROMPT_MODE}'; using verbose.")
+    PROMPT_MODE = "verbose"
+PROMPT_TOKEN_BUDGET = max(0, _parse_int_env(
+    os.getenv("TRADEBOT_PROMPT_TOKEN_BUDGET"),
+    default=0,
+))
+PROMPT_DELTA_SERIES = _parse_bool_env(
+    os.getenv("TRADEBOT_PROMPT_DELTA"),
+    default=False,
+)
+PROMPT_SIGNIFICANT_DIGITS = max(2, _parse_int_env(
+    os.getenv("TRADEBOT_PROMPT_DIGITS"),
+    default=5,
+))
+PROMPT_LAYOUT = os.getenv("TRADEBOT_PROMPT_LAYOUT", "prefix").strip().lower() or "prefix"
+if PROMPT_LAYOUT not in PROMPT_LAYOUTS:
+    EARLY_ENV_WARNINGS.append(f"Unsupported TRADEBOT_PROMPT_LAYOUT '{PROMPT_LAYOUT}'; using prefix.")
+    PROMPT_LAYOUT = "prefix"
+PROMPT_CACHE_CONTROL = _parse_bool_env(
+    os.getenv("TRADEBOT_PROMPT_CACHE_CONTROL"),
+    default=False,
+)
+JOURNAL_ASYNC = _parse_bool_env(
+    os.getenv("TRADEBOT_JOURNAL_ASYNC"),
+    default=True,
+)
+JOURNAL_BATCH_SIZE = max(1, _parse_int_env(
+    os.getenv("TRADEBOT_JOURNAL_BATCH"),
+    default=256,
+))
+JOURNAL_FLUSH_INTERVAL = max(0.0, _parse_float_env(
+    os.getenv("TRADEBOT_JOURNAL_FLUSH_INTERVAL"),
+    default=1.0,
+))
+JOURNAL_BACKEND = os.getenv("TRADEBOT_JOURNAL_BACKEND", "csv").strip().lower() or "csv"
+if JOURNAL_BACKEND not in JOURNAL_BACKENDS:
+    EARLY_ENV_WARNINGS.append(f"Unsupported TRADEBOT_JOURNAL_BACKEND '{JOURNAL_BACKEND}'; using csv.")
+    JOURNAL_BACKEND = "csv"
+MESSAGE_BLOBS = _parse_bool_env(
+    os.getenv("TRADEBOT_MESSAGE_BLOBS"),
+    default=True,
+)
+MESSAGE_BLOB_MIN_BYTES = max(0, _parse_int_env(
+    os.getenv("TRADEBOT_MESSAGE_BLOB_MIN_BYTES"),
+    default=256,
+))
+STATE_COMPACT_EVERY = max(1, _parse_int_env(
+    os.getenv("TRADEBOT_STATE_COMPACT_EVERY"),
+    default=100,
+))
+STATE_FSYNC = _parse_bool_env(
+    os.getenv("TRADEBOT_STATE_FSYNC"),
+    default=True,
+)
+LLM_TELEMETRY_WINDOW = max(1, _parse_int_env(
+    os.getenv("TRADEBOT_LLM_TELEMETRY_WINDOW"),
+    default=200,
+))
+try:
+    LLM_PRICES = parse_price_table(os.getenv("TRADEBOT_LLM_PRICES", ""))
+except ValueError as exc:
+    EARLY_ENV_WARNINGS.append(f"{exc}; cost estimates limited to provider-reported costs.")
+    LLM_PRICES = {}
 DEFAULT_RISK_FREE_RATE = 0.0  # Annualized baseline for Sortino ratio calculations
 DEFAULT_LLM_MODEL = "deepseek/deepseek-chat-v3.1"
 
 
 def _load_llm_model_name() -> str:
-    raw = os.getenv("TRADEBOT_LLM_MODEL", DEFAULT_LLM_MODEL)
+    # TRADEBOT_LLM_MODEL 优先；未设置时沿用 .env.example 中的 OPENROUTER_MODEL_NAME
+    raw = os.getenv("TRADEBOT_LLM_MODEL") or os.getenv("OPENROUTER_MODEL_NAME", DEFAULT_LLM_MODEL)
     if not raw:
         return DEFAULT_LLM_MODEL
     value = raw.strip()
@@ -294,18 +462,26 @@ def _load_llm_max_tokens() -> int:
 
 def refresh_llm_configuration_from_env() -> None:
     """Reload LLM-related runtime settings from environment variables."""
-    global LLM_MODEL_NAME, LLM_TEMPERATURE, LLM_MAX_TOKENS, LLM_THINKING_PARAM, TRADING_RULES_PROMPT
+    global LLM_MODEL_NAME, LLM_TEMPERATURE, LLM_MAX_TOKENS, LLM_THINKING_PARAM, TRADING_RULES_PROMPT, static_prompt
     LLM_MODEL_NAME = _load_llm_model_name()
     LLM_TEMPERATURE = _load_llm_temperature()
     LLM_MAX_TOKENS = _load_llm_max_tokens()
     LLM_THINKING_PARAM = _parse_thinking_env(os.getenv("TRADEBOT_LLM_THINKING"))
     TRADING_RULES_PROMPT = _load_system_prompt()
+    static_prompt = _compile_static_prompt()
 
 
 def log_system_prompt_info(prefix: str = "System prompt in use") -> None:
     """Log the current system prompt configuration."""
     description = describe_system_prompt_source()
     logging.info("%s: %s", prefix, description)
+    logging.info(
+        "Static prompt prefix (%s layout): %d chars, ~%d tokens, fingerprint %s",
+        static_prompt.layout,
+        len(static_prompt.system_text),
+        prompt_token_counter.count(static_prompt.system_text),
+        static_prompt.fingerprint,
+    )
 
 
 LLM_MODEL_NAME = _load_llm_model_name()
@@ -320,6 +496,68 @@ MACD_FAST = 12
 MACD_SLOW = 26
 MACD_SIGNAL = 9
 
+# Kline windows requested from Binance
+MARKET_DATA_KLINE_LIMIT = 50
+PROMPT_KLINE_LIMIT = 200
+LONG_CONTEXT_INTERVAL = "4h"
+DERIVATIVES_HISTORY_LIMIT = 30
+
+# Per-iteration market snapshot cache (0 = valid for the whole iteration)
+MARKET_SNAPSHOT_MAX_AGE = _parse_float_env(
+    os.getenv("TRADEBOT_SNAPSHOT_MAX_AGE"),
+    default=0.0,
+)
+
+# Incremental kline ring buffers (seed once, then fetch only new bars via startTime)
+KLINE_BUFFER_ENABLED = _parse_bool_env(
+    os.getenv("TRADEBOT_KLINE_BUFFER"),
+    default=True,
+)
+KLINE_BUFFER_INCREMENT_LIMIT = _parse_int_env(
+    os.getenv("TRADEBOT_KLINE_BUFFER_INCREMENT"),
+    default=100,
+)
+
+# Streaming klines: "binance" for the live websocket, "replay:<path>" for a recorded JSONL file
+MARKET_STREAM_MODE = os.getenv("TRADEBOT_MARKET_STREAM", "").strip()
+MARKET_STREAM_MAX_STALENESS = _parse_float_env(
+    os.getenv("TRADEBOT_STREAM_MAX_STALENESS"),
+    default=30.0,
+)
+MARKET_STREAM_RECORD_PATH = os.getenv("TRADEBOT_STREAM_RECORD", "").strip()
+MARKET_STREAM_REPLAY_DELAY = _parse_float_env(
+    os.getenv("TRADEBOT_STREAM_REPLAY_DELAY"),
+    default=0.0,
+)
+
+# Funding / open-interest history cache shared across iterations (TTL per endpoint, seconds)
+FUNDING_CACHE_TTL = _parse_float_env(
+    os.getenv("TRADEBOT_FUNDING_CACHE_TTL"),
+    default=900.0,
+)
+OPEN_INTEREST_CACHE_TTL = _parse_float_env(
+    os.getenv("TRADEBOT_OI_CACHE_TTL"),
+    default=150.0,
+)
+DERIVATIVES_CACHE_PATH = os.getenv("TRADEBOT_DERIVATIVES_CACHE", "").strip()
+
+# Concurrent prompt data collection (workers <= 1 keeps the serial path)
+PROMPT_FETCH_WORKERS = _parse_int_env(
+    os.getenv("TRADEBOT_FETCH_WORKERS"),
+    default=8,
+)
+PROMPT_FETCH_TIMEOUT = _parse_float_env(
+    os.getenv("TRADEBOT_FETCH_TIMEOUT"),
+    default=10.0,
+)
+
+# Indicator backend: "pandas" recomputes every window, "streaming" updates O(1) per closed bar,
+# "vectorized" computes all symbols in one NumPy pass over a (symbols × bars) matrix
+INDICATOR_BACKEND = os.getenv("TRADEBOT_INDICATOR_BACKEND", "pandas").strip().lower() or "pandas"
+if INDICATOR_BACKEND not in {"pandas", "streaming", "vectorized"}:
+    EARLY_ENV_WARNINGS.append(f"Unsupported TRADEBOT_INDICATOR_BACKEND '{INDICATOR_BACKEND}'; using pandas.")
+    INDICATOR_BACKEND = "pandas"
+
 # Binance fee structure (as decimals)
 MAKER_FEE_RATE = 0.0         # 0.0000%
 TAKER_FEE_RATE = 0.000275    # 0.0275%
@@ -420,6 +658,309 @@ def get_binance_client() -> Optional[Client]:
 
     return client
 
+# ───────────────────── MARKET SNAPSHOT CACHE ────────────────
+
+market_snapshot = MarketSnapshotCache(max_age_seconds=MARKET_SNAPSHOT_MAX_AGE)
+kline_buffers = KlineBufferStore(
+    capacity=PROMPT_KLINE_LIMIT,
+    incremental_limit=KLINE_BUFFER_INCREMENT_LIMIT,
+)
+
+
+def begin_market_snapshot() -> None:
+    """Start a fresh market snapshot; call once at the top of every iteration."""
+    market_snapshot.reset()
+
+
+market_stream_state: Optional[KlineStreamState] = None
+market_stream_feed: Optional[Any] = None
+
+
+def _resolve_data_path(raw: str) -> Path:
+    path = Path(raw).expanduser()
+    if not path.is_absolute():
+        path = (BASE_DIR / path).resolve()
+    return path
+
+
+def _derivatives_cache_path() -> Optional[Path]:
+    if DERIVATIVES_CACHE_PATH.lower() in {"off", "none", "false", "0"}:
+        return None
+    if DERIVATIVES_CACHE_PATH:
+        return _resolve_data_path(DERIVATIVES_CACHE_PATH)
+    return DATA_DIR / "derivatives_cache.json"
+
+
+derivatives_cache = DerivativesHistoryCache(
+    ttl_seconds={"funding": FUNDING_CACHE_TTL, "open_interest": OPEN_INTEREST_CACHE_TTL},
+    capacity=DERIVATIVES_HISTORY_LIMIT,
+    path=_derivatives_cache_path(),
+    clock=lambda: get_current_time().timestamp(),
+)
+if derivatives_cache.load():
+    logging.info("Restored funding/open-interest history from %s", derivatives_cache.path)
+
+# 外部 HTTP 调用共享的连接池；LLM 请求的总预算包含重试与退避
+http_transport = get_transport()
+http_transport.pool_maxsize = HTTP_POOL_SIZE
+http_transport.set_policy(
+    "openrouter",
+    EndpointPolicy(
+        read_timeout=LLM_TIMEOUT_SECONDS,
+        total_budget=LLM_TIMEOUT_SECONDS * 1.5,
+        max_retries=HTTP_MAX_RETRIES,
+        backoff_base=1.0,
+    ),
+)
+llm_response_cache = LLMResponseCache(
+    _resolve_data_path(LLM_CACHE_DIR) if LLM_CACHE_DIR else DATA_DIR / "llm_cache",
+    mode=LLM_CACHE_MODE,
+)
+for _notify_endpoint in ("telegram", "dingtalk"):
+    http_transport.set_policy(
+        _notify_endpoint,
+        EndpointPolicy(
+            read_timeout=NOTIFY_TIMEOUT_SECONDS,
+            total_budget=NOTIFY_TIMEOUT_SECONDS * 2,
+            max_retries=HTTP_MAX_RETRIES,
+        ),
+    )
+
+
+def start_market_stream() -> None:
+    """Start the configured kline stream so buffers stay current without REST polling."""
+    global market_stream_state, market_stream_feed
+    if not MARKET_STREAM_MODE or market_stream_feed is not None:
+        return
+    if not KLINE_BUFFER_ENABLED:
+        logging.warning("TRADEBOT_MARKET_STREAM requires TRADEBOT_KLINE_BUFFER; streaming disabled.")
+        return
+
+    record_path = _resolve_data_path(MARKET_STREAM_RECORD_PATH) if MARKET_STREAM_RECORD_PATH else None
+    state = KlineStreamState(buffers=kline_buffers, capacity=PROMPT_KLINE_LIMIT, record_path=record_path)
+    pairs = [(symbol, interval) for symbol in SYMBOLS for interval in (INTERVAL, LONG_CONTEXT_INTERVAL)]
+
+    mode = MARKET_STREAM_MODE.lower()
+    try:
+        if mode == "binance":
+            feed: Any = BinanceKlineStream(state, api_key=API_KEY, api_secret=API_SECRET)
+        elif mode.startswith("replay:"):
+            replay_path = _resolve_data_path(MARKET_STREAM_MODE.split(":", 1)[1])
+            if not replay_path.exists():
+                logging.error("Kline replay file %s not found; streaming disabled.", replay_path)
+                return
+            feed = ReplayKlineStream(state, replay_path, delay_seconds=MARKET_STREAM_REPLAY_DELAY)
+        else:
+            logging.warning("Unsupported TRADEBOT_MARKET_STREAM '%s'; streaming disabled.", MARKET_STREAM_MODE)
+            return
+        feed.start(pairs)
+    except Exception as exc:
+        logging.error("Failed to start kline stream (%s): %s; falling back to REST polling.", MARKET_STREAM_MODE, exc)
+        return
+
+    market_stream_state = state
+    market_stream_feed = feed
+    logging.info("Kline stream started (%s) for %d symbol/interval pairs.", MARKET_STREAM_MODE, len(pairs))
+
+
+def stop_market_stream() -> None:
+    """Stop the kline stream if one is running."""
+    global market_stream_state, market_stream_feed
+    if market_stream_feed is not None:
+        market_stream_feed.stop()
+    market_stream_feed = None
+    market_stream_state = None
+
+
+def log_market_snapshot_stats() -> None:
+    """Log how many exchange requests the snapshot cache saved this iteration."""
+    stats = market_snapshot.stats
+    logging.info(
+        "Market snapshot cache: %d hits / %d misses %s",
+        stats.hits,
+        stats.misses,
+        json.dumps(stats.by_kind, sort_keys=True),
+    )
+    if market_stream_state is not None:
+        logging.info("Kline stream: %d events applied so far.", market_stream_state.events_applied)
+    derivatives_stats = derivatives_cache.stats
+    logging.info(
+        "Derivatives cache: %d TTL hits, %d seeds, %d incremental updates, %d reseeds, %d records downloaded in total",
+        derivatives_stats.hits,
+        derivatives_stats.seeds,
+        derivatives_stats.increments,
+        derivatives_stats.reseeds,
+        derivatives_stats.rows_downloaded,
+    )
+    if KLINE_BUFFER_ENABLED:
+        buffer_stats = kline_buffers.stats
+        logging.info(
+            "Kline buffers: %d seeds, %d incremental updates, %d reseeds, %d bars downloaded in total",
+            buffer_stats.seeds,
+            buffer_stats.increments,
+            buffer_stats.reseeds,
+            buffer_stats.rows_downloaded,
+        )
+
+
+def log_http_transport_stats() -> None:
+    """Log connection reuse and retry counters of the shared HTTP pool."""
+    stats = http_transport.stats()
+    if not stats.requests:
+        return
+    logging.info(
+        "HTTP pool: %d requests, %d retries, %d failures, %d connections opened / %d reused",
+        stats.requests,
+        stats.retries,
+        stats.failures,
+        stats.connections_opened,
+        stats.connections_reused,
+    )
+
+
+def log_llm_cache_stats() -> None:
+    """Log hit/miss counters of the on-disk LLM response cache."""
+    if not llm_response_cache.enabled:
+        return
+    stats = llm_response_cache.stats
+    logging.info(
+        "LLM response cache (%s): %d hits / %d misses, %d entries written (%d bytes)",
+        llm_response_cache.mode,
+        stats.hits,
+        stats.misses,
+        stats.writes,
+        stats.bytes_written,
+    )
+
+
+def log_llm_telemetry_summary() -> None:
+    """Print rolling LLM latency/token/cost percentiles as the iteration footer."""
+    summary = llm_telemetry.summary()
+    if summary is None:
+        return
+    print(f"{Fore.CYAN}{summary.describe()}{Style.RESET_ALL}")
+    if llm_hedge_stats.calls:
+        print(f"{Fore.CYAN}{llm_hedge_stats.describe()}{Style.RESET_ALL}")
+
+
+def log_journal_stats() -> None:
+    """Log the background CSV journal's queue depth, flush latency and message blob savings."""
+    stats = journal.stats()
+    if stats.flushes:
+        logging.info(stats.describe())
+    if message_blobs.stats.puts:
+        logging.info(message_blobs.stats.describe())
+
+
+def log_prefix_cache_stats() -> None:
+    """Log how much of the prompt the provider served from its prefix cache."""
+    stats = prefix_cache_stats
+    if not stats.calls:
+        return
+    hit_rate = stats.hit_rate
+    logging.info(
+        "Prompt prefix cache: %d/%d prompt tokens cached over %d calls (%s); prefix %s",
+        stats.cached_tokens,
+        stats.prompt_tokens,
+        stats.calls,
+        f"{hit_rate:.0%} hit rate" if hit_rate is not None else "provider does not report cached tokens",
+        static_prompt.fingerprint,
+    )
+
+
+def _download_klines(
+    binance_client: Client,
+    symbol: str,
+    interval: str,
+    limit: int,
+    start_time: Optional[int] = None,
+) -> List[List[Any]]:
+    """Request klines from Binance, optionally starting at `start_time` (ms)."""
+    params: Dict[str, Any] = {"symbol": symbol, "interval": interval, "limit": limit}
+    if start_time is not None:
+        params["startTime"] = start_time
+    return binance_client.get_klines(**params)
+
+
+def get_cached_klines(binance_client: Client, symbol: str, interval: str, limit: int) -> List[List[Any]]:
+    """Return klines for (symbol, interval), downloading the widest window once per iteration."""
+    def fetch(n: int) -> List[List[Any]]:
+        if not KLINE_BUFFER_ENABLED:
+            return _download_klines(binance_client, symbol, interval, n)
+        if market_stream_state is not None and market_stream_state.is_fresh(
+            symbol, interval, MARKET_STREAM_MAX_STALENESS
+        ):
+            streamed = kline_buffers.peek(symbol, interval, n)
+            if streamed is not None:
+                return streamed
+        return kline_buffers.get_klines(
+            symbol,
+            interval,
+            n,
+            lambda count, start_time: _download_klines(binance_client, symbol, interval, count, start_time),
+        )
+
+    return market_snapshot.get_series(
+        ("klines", symbol, interval),
+        limit,
+        fetch,
+        min_limit=PROMPT_KLINE_LIMIT,
+    )
+
+
+def _download_funding_rates(
+    binance_client: Client,
+    symbol: str,
+    limit: int,
+    start_time: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    params: Dict[str, Any] = {"symbol": symbol, "limit": limit}
+    if start_time is not None:
+        params["startTime"] = start_time
+    return binance_client.futures_funding_rate(**params)
+
+
+def _download_open_interest(
+    binance_client: Client,
+    symbol: str,
+    limit: int,
+    start_time: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    params: Dict[str, Any] = {"symbol": symbol, "period": "5m", "limit": limit}
+    if start_time is not None:
+        params["startTime"] = start_time
+    return binance_client.futures_open_interest_hist(**params)
+
+
+def get_cached_funding_rates(binance_client: Client, symbol: str, limit: int) -> List[Dict[str, Any]]:
+    """Return funding-rate history for symbol via the iteration snapshot and TTL cache."""
+    return market_snapshot.get_series(
+        ("funding", symbol),
+        limit,
+        lambda n: derivatives_cache.get(
+            "funding",
+            symbol,
+            n,
+            lambda count, start_time: _download_funding_rates(binance_client, symbol, count, start_time),
+        ),
+        min_limit=DERIVATIVES_HISTORY_LIMIT,
+    )
+
+
+def get_cached_open_interest(binance_client: Client, symbol: str, limit: int) -> List[Dict[str, Any]]:
+    """Return 5m open-interest history for symbol via the iteration snapshot and TTL cache."""
+    return market_snapshot.get_series(
+        ("open_interest", symbol),
+        limit,
+        lambda n: derivatives_cache.get(
+            "open_interest",
+            symbol,
+            n,
+            lambda count, start_time: _download_open_interest(binance_client, symbol, count, start_time),
+        ),
+        min_limit=DERIVATIVES_HISTORY_LIMIT,
+    )
+
 # ──────────────────────── GLOBAL STATE ─────────────────────
 balance: float = START_CAPITAL
 positions: Dict[str, Dict[str, Any]] = {}  # coin -> position info
@@ -444,6 +985,69 @@ def set_time_provider(provider: Optional[Callable[[], datetime]]) -> None:
 
 
 BOT_START_TIME = get_current_time()
+
+
+def sleep_for(seconds: float) -> None:
+    """Sleep on the active clock: wall time normally, simulated time under a manual clock."""
+    sleeper = getattr(_current_time_provider, "sleep", None)
+    if callable(sleeper):
+        sleeper(seconds)
+    else:
+        time.sleep(seconds)
+
+
+def create_bar_scheduler() -> BarCloseScheduler:
+    """Return a scheduler aligned to INTERVAL candle closes on the bot's clock."""
+    return BarCloseScheduler(
+        CHECK_INTERVAL,
+        offset_seconds=SCHEDULE_OFFSET_SECONDS,
+        max_lateness_seconds=SCHEDULE_MAX_LATENESS,
+        clock=get_current_time,
+        sleep=sleep_for,
+    )
+
+
+def log_schedule_tick(tick: ScheduleTick) -> None:
+    """Report how far the iteration start drifted from its candle close."""
+    since_close = (tick.started_at - tick.bar_close).total_seconds()
+    message = "Acting on %s close: started %.2fs after close (drift %+.3fs)."
+    if tick.skipped_bars:
+        logging.warning(
+            message + " Skipped %d bar(s) because the previous cycle overran.",
+            tick.bar_close.strftime("%H:%M:%S"),
+            since_close,
+            tick.drift,
+            tick.skipped_bars,
+        )
+    elif tick.late:
+        logging.warning(
+            message + " Running a shortened cycle.",
+            tick.bar_close.strftime("%H:%M:%S"),
+            since_close,
+            tick.drift,
+        )
+    else:
+        logging.info(message, tick.bar_close.strftime("%H:%M:%S"), since_close, tick.drift)
+
+
+def log_cycle_report(report: CycleReport, scheduler: BarCloseScheduler) -> None:
+    """Report cycle duration against the bar budget and cumulative drift statistics."""
+    stats = scheduler.stats
+    budget = (report.tick.deadline - report.tick.started_at).total_seconds()
+    log = logging.warning if report.overran else logging.info
+    log(
+        "Cycle finished in %.2fs of %.2fs budget%s | drift mean %+.3fs max %+.3fs | "
+        "%d late starts, %d skipped bars, %d overruns in %d cycles",
+        report.duration,
+        budget,
+        " (overran into the next bar)" if report.overran else "",
+        stats.mean_drift,
+        stats.max_drift,
+        stats.late_starts,
+        stats.skipped_bars,
+        stats.overruns,
+        stats.ticks,
+    )
 invocation_count: int = 0
 iteration_counter: int = 0
 ANSI_ESCAPE_RE = re.compile(r"\x1B\[[0-?]*[ -/]*[@-~]")
@@ -456,6 +1060,8 @@ STATE_JSON = DATA_DIR / "portfolio_state.json"
 TRADES_CSV = DATA_DIR / "trade_history.csv"
 DECISIONS_CSV = DATA_DIR / "ai_decisions.csv"
 MESSAGES_CSV = DATA_DIR / "ai_messages.csv"
+MESSAGE_BLOB_DIR = DATA_DIR / MESSAGE_BLOB_DIRNAME
+LLM_CALLS_CSV = DATA_DIR / "llm_calls.csv"
 STATE_COLUMNS = [
     'timestamp',
     'total_balance',
@@ -469,8 +1075,49 @@ STATE_COLUMNS = [
 
 # ───────────────────────── CSV LOGGING ──────────────────────
 
+
+
+def _make_journal_backend() -> Optional[JournalBackend]:
+    """Return the configured journal backend (None keeps the CSV default)."""
+    if JOURNAL_BACKEND == "sqlite":
+        return SqliteJournal(DATA_DIR / SQLITE_JOURNAL_FILENAME)
+    if JOURNAL_BACKEND != "parquet":
+        return None
+    # pyarrow 仅在启用 Parquet 后端时导入
+    from runtime.parquet_journal import ParquetJournal
+
+    return ParquetJournal(DATA_DIR / PARQUET_JOURNAL_DIRNAME)
+
+
+journal = JournalWriter(
+    batch_size=JOURNAL_BATCH_SIZE,
+    flush_interval=JOURNAL_FLUSH_INTERVAL,
+    enabled=JOURNAL_ASYNC,
+    backend=_make_journal_backend(),
+)
+message_blobs = BlobStore(MESSAGE_BLOB_DIR)
+# 遥测行与其他日志一样由后台线程写入，不占用请求线程
+llm_telemetry = LLMTelemetry(
+    LLM_CALLS_CSV,
+    window=LLM_TELEMETRY_WINDOW,
+    prices=LLM_PRICES,
+    now=lambda: get_current_time(),
+    append=journal.append,
+)
+llm_hedge_stats = HedgeStats()
+state_store = StateStore(STATE_JSON, compact_every=STATE_COMPACT_EVERY, fsync=STATE_FSYNC)
+
 def init_csv_files() -> None:
-    """Initialize CSV files with headers."""
+    """Initialize CSV files with headers (or migrate them into the Parquet/SQLite journal)."""
+    # 记录当前后端，仪表盘与脚本只读取它，切换后端后不会继续读到旧存储
+    try:
+        record_journal_backend(DATA_DIR, JOURNAL_BACKEND)
+    except OSError as exc:
+        logging.warning("Unable to record the journal backend in %s: %s", DATA_DIR, exc)
+    if JOURNAL_BACKEND != "csv":
+        _migrate_csv_journals()
+        return
+
     if not STATE_CSV.exists():
         with open(STATE_CSV, 'w', newline='') as f:
             writer = csv.writer(f)
@@ -499,6 +1146,22 @@ def init_csv_files() -> None:
                 'timestamp', 'direction', 'role', 'content', 'metadata'
             ])
 
+def _migrate_csv_journals() -> None:
+    """Copy existing CSV journals into empty Parquet/SQLite tables once; the CSVs are left untouched."""
+    backend = journal.backend
+    for path in (STATE_CSV, TRADES_CSV, DECISIONS_CSV, MESSAGES_CSV):
+        if not path.exists():
+            continue
+        try:
+            if backend.has_data(path.stem):
+                continue
+            imported = backend.import_csv(path)
+        except (OSError, ValueError) as exc:
+            logging.warning("Unable to import %s into the %s journal: %s", path, JOURNAL_BACKEND, exc)
+            continue
+        if imported:
+            logging.info("Imported %d rows from %s into the %s journal.", imported, path.name, JOURNAL_BACKEND)
+
 def log_portfolio_state() -> None:
     """Log current portfolio state."""
     total_equity = calculate_total_equity()
@@ -511,63 +1174,65 @@ def log_portfolio_state() -> None:
         for coin, pos in positions.items()
     ]) if positions else "No positions"
     
-    with open(STATE_CSV, 'a', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            get_current_time().isoformat(),
-            f"{balance:.2f}",
-            f"{total_equity:.2f}",
-            f"{total_return:.2f}",
-            len(positions),
-            position_details,
-            f"{total_margin:.2f}",
-            f"{net_unrealized:.2f}"
-        ])
+    journal.append(STATE_CSV, [
+        get_current_time().isoformat(),
+        f"{balance:.2f}",
+        f"{total_equity:.2f}",
+        f"{total_return:.2f}",
+        len(positions),
+        position_details,
+        f"{total_margin:.2f}",
+        f"{net_unrealized:.2f}"
+    ])
 
 def log_trade(coin: str, action: str, details: Dict[str, Any]) -> None:
     """Log trade execution."""
-    with open(TRADES_CSV, 'a', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            get_current_time().isoformat(),
-            coin,
-            action,
-            details.get('side', ''),
-            details.get('quantity', 0),
-            details.get('price', 0),
-            details.get('profit_target', 0),
-            details.get('stop_loss', 0),
-            details.get('leverage', 1),
-            details.get('confidence', 0),
-            details.get('pnl', 0),
-            balance,
-            details.get('reason', '')
-        ])
+    journal.append(TRADES_CSV, [
+        get_current_time().isoformat(),
+        coin,
+        action,
+        details.get('side', ''),
+        details.get('quantity', 0),
+        details.get('price', 0),
+        details.get('profit_target', 0),
+        details.get('stop_loss', 0),
+        details.get('leverage', 1),
+        details.get('confidence', 0),
+        details.get('pnl', 0),
+        balance,
+        details.get('reason', '')
+    ])
 
 def log_ai_decision(coin: str, signal: str, reasoning: str, confidence: float) -> None:
     """Log AI decision."""
-    with open(DECISIONS_CSV, 'a', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            get_current_time().isoformat(),
-            coin,
-            signal,
-            reasoning,
-            confidence
-        ])
+    journal.append(DECISIONS_CSV, [
+        get_current_time().isoformat(),
+        coin,
+        signal,
+        reasoning,
+        confidence
+    ])
 
 
 def log_ai_message(direction: str, role: str, content: str, metadata: Optional[Dict[str, Any]] = None) -> None:
     """Log raw messages exchanged with the AI provider."""
-    with open(MESSAGES_CSV, 'a', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            get_current_time().isoformat(),
-            direction,
-            role,
-            content,
-            json.dumps(metadata) if metadata else ""
-        ])
+    # 较长的正文（系统提示词、行情快照、模型回复）存入内容寻址的 blob 目录，
+    # 日志里只保留 `blob:<sha256>` 引用与原始字节数；相同内容只落盘一次，
+    # 同方向同角色的消息以上一条为字典做差量压缩。调用线程（可能是 LLM 工作线程）只计算摘要，
+    # 压缩与落盘交给日志线程，且在引用它的行写入之前完成
+    if MESSAGE_BLOBS and content and len(content) >= MESSAGE_BLOB_MIN_BYTES:
+        text, family = content, f"{direction}:{role}"
+        journal.defer(lambda: message_blobs.put(text, family=family))
+        content = f"{BLOB_REF_PREFIX}{content_digest(text)}"
+        metadata = {**(metadata or {}), "content_bytes": len(text.encode("utf-8"))}
+    # 多模型并发请求时由多个线程写入；JournalWriter 的队列与写入均线程安全
+    journal.append(MESSAGES_CSV, [
+        get_current_time().isoformat(),
+        direction,
+        role,
+        content,
+        json.dumps(metadata) if metadata else ""
+    ])
 
 def strip_ansi_codes(text: str) -> str:
     """Remove ANSI color codes so Telegram receives plain text."""
@@ -584,13 +1249,13 @@ def _send_telegram_message(text: str) -> None:
         return
 
     try:
-        response = requests.post(
+        response = http_transport.post(
             f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage",
             json={
                 "chat_id": TELEGRAM_CHAT_ID,
                 "text": text,
             },
-            timeout=10,
+            endpoint="telegram",
         )
         if response.status_code != 200:
             logging.warning(
@@ -607,26 +1272,13 @@ def send_notification(text: str) -> None:
     if robot_preference == 'dingtalk':
         try:
             from utils.dingtalk_bot import DingTalkBot
-            ding_bot = DingTalkBot()
-            ding_bot.send_message(text)
+            ding_bot = DingTalkBot.from_config(BASE_DIR / "utils" / "dingconfig.ini")
+            ding_bot.send_text(text, timeout=NOTIFY_TIMEOUT_SECONDS)
         except Exception as e:
             logging.error(f"Error sending DingTalk message: {e}")
     elif robot_preference == 'telegram':
         _send_telegram_message(text)
 
-def send_notification(text: str) -> None:
-    """Send a notification using the configured robot."""
-    robot_preference = os.getenv("ROBOT", "telegram").lower()
-    if robot_preference == 'dingtalk':
-        try:
-            from utils.dingtalk_bot import DingTalkBot
-            ding_bot = DingTalkBot()
-            ding_bot.send_message(text)
-        except Exception as e:
-            logging.error(f"Error sending DingTalk message: {e}")
-    elif robot_preference == 'telegram':
-        send_telegram_message(text)
-        
 def notify_error(
     message: str,
     metadata: Optional[Dict[str, Any]] = None,
@@ -646,17 +1298,57 @@ def notify_error(
 
 # ───────────────────────── STATE MGMT ───────────────────────
 
+def _state_snapshot() -> Dict[str, Any]:
+    return {
+        "balance": balance,
+        "positions": positions,
+        "iteration": iteration_counter,
+        "updated_at": get_current_time().isoformat(),
+    }
+
+
+def _record_state(op: str, **fields: Any) -> None:
+    """Append one balance/position change to the state write-ahead journal."""
+    try:
+        state_store.record(op, **fields)
+    except (OSError, ValueError) as e:
+        logging.error("Failed to journal %s state change to %s: %s", op, state_store.wal_path, e, exc_info=True)
+
+
+def _compact_state() -> None:
+    """Fold the state journal into a fresh, atomically replaced snapshot of the in-memory state."""
+    try:
+        state_store.compact(_state_snapshot())
+    except (OSError, ValueError) as e:
+        logging.error("Failed to write state snapshot %s: %s", STATE_JSON, e, exc_info=True)
+
+
+def _journal_state_drift() -> None:
+    """Journal position edits made outside execute_entry/execute_close as field-level updates."""
+    recorded = state_store.state.get("positions", {})
+    current = json.loads(json.dumps(positions, default=str))
+    for coin in recorded.keys() - current.keys():
+        _record_state("close", coin=coin)
+    for coin, pos in current.items():
+        before = recorded.get(coin)
+        if before is None or before.keys() - pos.keys():
+            _record_state("open", coin=coin, position=pos)
+            continue
+        changed = {key: value for key, value in pos.items() if before.get(key) != value}
+        if changed:
+            _record_state("update", coin=coin, fields=changed)
+
+
 def load_state() -> None:
-    """Load persisted balance and positions if available."""
+    """Recover balance and positions from the state snapshot plus its write-ahead journal."""
     global balance, positions, iteration_counter
 
-    if not STATE_JSON.exists():
-        logging.info("No existing state file found; starting fresh.")
-        return
-
     try:
-        with open(STATE_JSON, "r") as f:
-            data = json.load(f)
+        data = state_store.load()
+        if data is None:
+            logging.info("No existing state file found; starting fresh.")
+            _compact_state()
+            return
 
         balance = float(data.get("balance", START_CAPITAL))
         try:
@@ -711,21 +1403,39 @@ def load_state() -> None:
         logging.error("Failed to load state from %s: %s", STATE_JSON, e, exc_info=True)
         balance = START_CAPITAL
         positions = {}
+        # 无法恢复时绝不覆盖原文件：快照与 WAL 整体移到一旁留待人工恢复，再从空状态开始；
+        # 连移动都失败时直接退出，避免之后的压缩把它们覆盖掉
+        try:
+            moved = state_store.quarantine()
+        except OSError as move_error:
+            logging.critical(
+                "Unable to move unreadable state files %s / %s aside (%s); refusing to start.",
+                STATE_JSON,
+                state_store.wal_path,
+                move_error,
+            )
+            raise
+        logging.critical(
+            "STATE NOT RECOVERED: moved %s aside and started fresh with balance %.2f and no positions. "
+            "Inspect those files before trading further.",
+            ", ".join(str(path) for path in moved) or "nothing",
+            balance,
+        )
+        return
+    # 重放过的 WAL 并入新快照（含加载时的字段规范化），之后的 WAL 从空文件开始
+    _compact_state()
 
 def save_state() -> None:
-    """Persist current balance, open positions, and iteration counter."""
+    """Journal this iteration's state changes; compact into a snapshot every STATE_COMPACT_EVERY records.
+
+    Does not wait for queued journal rows: trade paths call this mid-stream, and
+    the main loop flushes the journal itself at the end of each iteration.
+    """
     try:
-        with open(STATE_JSON, "w") as f:
-            json.dump(
-                {
-                    "balance": balance,
-                    "positions": positions,
-                    "iteration": iteration_counter,
-                    "updated_at": get_current_time().isoformat(),
-                },
-                f,
-                indent=2,
-            )
+        _journal_state_drift()
+        _record_state("iteration", iteration=iteration_counter, balance=balance, at=get_current_time().isoformat())
+        if state_store.should_compact:
+            _compact_state()
     except Exception as e:
         logging.error("Failed to save state to %s: %s", STATE_JSON, e, exc_info=True)
 
@@ -741,24 +1451,28 @@ def reset_state(initial_balance: Optional[float] = None) -> None:
     equity_history.clear()
     current_iteration_messages = []
     BOT_START_TIME = get_current_time()
+    kline_buffers.clear()
+    market_snapshot.reset()
+    derivatives_cache.clear()
+    indicator_engines.clear()
+    _compact_state()
 
 
 def load_equity_history() -> None:
     """Populate the in-memory equity history for performance calculations."""
     equity_history.clear()
-    if not STATE_CSV.exists():
-        return
     try:
-        df = pd.read_csv(STATE_CSV, usecols=["total_equity"])
-    except ValueError:
-        logging.warning(
-            "%s missing 'total_equity' column; Sortino ratio unavailable until new data is logged.",
-            STATE_CSV,
-        )
-        return
+        df = read_journal(DATA_DIR, STATE_CSV.stem, columns=["total_equity"], backend=JOURNAL_BACKEND)
     except Exception as exc:
         logging.warning("Unable to load historical equity data: %s", exc)
         return
+    if "total_equity" not in df.columns:
+        if STATE_CSV.exists():
+            logging.warning(
+                "%s missing 'total_equity' column; Sortino ratio unavailable until new data is logged.",
+                STATE_CSV,
+            )
+        return
 
     values = pd.to_numeric(df["total_equity"], errors="coerce").dropna()
     if not values.empty:
@@ -773,6 +1487,27 @@ def register_equity_snapshot(total_equity: float) -> None:
 
 # ───────────────────────── INDICATORS ───────────────────────
 
+MARKET_DATA_INDICATORS = IndicatorSpec(
+    ema_lengths=(EMA_LEN,),
+    rsi_periods=(RSI_LEN,),
+    macd_params=(MACD_FAST, MACD_SLOW, MACD_SIGNAL),
+)
+INTRADAY_INDICATORS = IndicatorSpec(
+    ema_lengths=(EMA_LEN,),
+    rsi_periods=(7, RSI_LEN),
+    macd_params=(MACD_FAST, MACD_SLOW, MACD_SIGNAL),
+)
+LONG_TERM_INDICATORS = IndicatorSpec(
+    ema_lengths=(20, 50),
+    rsi_periods=(14,),
+    macd_params=(MACD_FAST, MACD_SLOW, MACD_SIGNAL),
+    atr_periods=(3, 14),
+)
+PROMPT_SERIES_LENGTH = 10
+
+indicator_engines = IndicatorEngineStore(history=PROMPT_SERIES_LENGTH)
+
+
 def calculate_rsi_series(close: pd.Series, period: int) -> pd.Series:
     """Return RSI series for specified period using Wilder's smoothing."""
     delta = close.astype(float).diff()
@@ -834,19 +1569,92 @@ def calculate_atr_series(df: pd.DataFrame, period: int) -> pd.Series:
     return true_range.ewm(alpha=alpha, adjust=False).mean()
 
 
-def calculate_indicators(df: pd.DataFrame) -> pd.Series:
-    """Calculate technical indicators and return the latest row."""
+IndicatorColumns = Dict[str, np.ndarray]
+
+
+def apply_indicators(
+    bars: KlineArrays,
+    spec: IndicatorSpec,
+    key: Optional[Any] = None,
+    tail: int = 1,
+) -> IndicatorColumns:
+    """Return one array per indicator column of `spec`, aligned with `bars`.
+
+    With the streaming backend (and a `key` identifying the kline stream) only the
+    newest `tail` values are filled, from engines updated once per closed bar; older
+    values are NaN. The pandas and vectorized backends fill every bar.
+    """
+    if INDICATOR_BACKEND == "vectorized":
+        return _apply_indicator_matrix({key: bars}, spec)[key]
+
+    if INDICATOR_BACKEND == "streaming" and key is not None and len(bars):
+        values = indicator_engines.sync(key, spec, bars.open_time, bars.high, bars.low, bars.close, tail=tail)
+        columns: IndicatorColumns = {}
+        for column, series in values.items():
+            filled = np.full(len(bars), np.nan)
+            filled[len(bars) - len(series):] = series
+            columns[column] = filled
+        return columns
+
+    frame = pd.DataFrame({"high": bars.high, "low": bars.low, "close": bars.close})
     enriched = add_indicator_columns(
-        df,
-        ema_lengths=(EMA_LEN,),
-        rsi_periods=(RSI_LEN,),
-        macd_params=(MACD_FAST, MACD_SLOW, MACD_SIGNAL),
+        frame,
+        ema_lengths=spec.ema_lengths,
+        rsi_periods=spec.rsi_periods,
+        macd_params=spec.macd_params,
     )
-    enriched["rsi"] = enriched[f"rsi{RSI_LEN}"]
-    return enriched.iloc[-1]
+    for period in spec.atr_periods:
+        enriched[f"atr{period}"] = calculate_atr_series(enriched, period)
+    return {column: enriched[column].to_numpy() for column in spec.columns()}
+
+
+def _apply_indicator_matrix(bars_by_key: Dict[Any, KlineArrays], spec: IndicatorSpec) -> Dict[Any, IndicatorColumns]:
+    """Compute `spec` for every kline window with a single (symbols × bars) NumPy pass."""
+    keys = list(bars_by_key)
+    if not keys:
+        return {}
+
+    highs, lengths = stack_right_aligned([bars_by_key[key].high for key in keys])
+    lows, _ = stack_right_aligned([bars_by_key[key].low for key in keys])
+    closes, _ = stack_right_aligned([bars_by_key[key].close for key in keys])
+    matrices = compute_indicator_matrix(spec, highs, lows, closes, lengths)
+
+    width = closes.shape[1]
+    result: Dict[Any, IndicatorColumns] = {}
+    for row, key in enumerate(keys):
+        start = width - int(lengths[row])
+        result[key] = {column: values[row, start:] for column, values in matrices.items()}
+    return result
+
+
+def compute_indicator_batch(
+    bars_by_symbol: Dict[str, KlineArrays],
+    spec: IndicatorSpec,
+    interval: str,
+    tail: int = 1,
+) -> Dict[str, IndicatorColumns]:
+    """Return indicator columns for `spec` per symbol.
+
+    The vectorized backend handles every symbol in one pass; the other backends
+    fall back to `apply_indicators` per symbol.
+    """
+    if INDICATOR_BACKEND == "vectorized":
+        return _apply_indicator_matrix(bars_by_symbol, spec)
+    return {
+        symbol: apply_indicators(bars, spec, key=(symbol, interval), tail=tail)
+        for symbol, bars in bars_by_symbol.items()
+    }
 
 def fetch_market_data(symbol: str) -> Optional[Dict[str, Any]]:
-    """Fetch current market data for a symbol."""
+    """Fetch current market data for a symbol (memoised for the current iteration)."""
+    return market_snapshot.get_or_compute(
+        ("market_data", symbol),
+        lambda: _fetch_market_data_uncached(symbol),
+    )
+
+
+def _fetch_market_data_uncached(symbol: str) -> Optional[Dict[str, Any]]:
+    """Build the latest price/indicator snapshot for a symbol."""
     binance_client = get_binance_client()
     if not binance_client:
         logging.warning("Skipping market data fetch for %s: Binance client unavailable.", symbol)
@@ -854,58 +1662,99 @@ def fetch_market_data(symbol: str) -> Optional[Dict[str, Any]]:
 
     try:
         # Get recent klines
-        klines = binance_client.get_klines(symbol=symbol, interval=INTERVAL, limit=50)
-
-        df = pd.DataFrame(
-            klines,
-            columns=[
-                "timestamp",
-                "open",
-                "high",
-                "low",
-                "close",
-                "volume",
-                "close_time",
-                "quote_volume",
-                "trades",
-                "taker_base",
-                "taker_quote",
-                "ignore",
-            ],
-        )
+        bars = decode_klines(get_cached_klines(binance_client, symbol, INTERVAL, MARKET_DATA_KLINE_LIMIT))
+        indicators = apply_indicators(bars, MARKET_DATA_INDICATORS, key=(symbol, INTERVAL))
+        return _market_data_from_bars(binance_client, symbol, bars, indicators)
+    except Exception as e:
+        logging.error(f"Error fetching data for {symbol}: {e}")
+        return None
+
+
+def _market_data_from_bars(
+    binance_client: Client,
+    symbol: str,
+    bars: KlineArrays,
+    indicators: IndicatorColumns,
+) -> Dict[str, Any]:
+    """Return the fetch_market_data() payload from decoded klines and their indicators."""
+    last_high = float(bars.high[-1])
+    last_low = float(bars.low[-1])
+    last_close = float(bars.close[-1])
+
+    # Get funding rate for perpetual futures
+    try:
+        funding_info = get_cached_funding_rates(binance_client, symbol, 1)
+        funding_rate = float(funding_info[0]["fundingRate"]) if funding_info else 0
+    except:
+        funding_rate = 0
+
+    return {
+        "symbol": symbol,
+        "price": last_close,
+        "high": last_high,
+        "low": last_low,
+        "ema20": indicators["ema20"][-1],
+        "rsi": indicators[f"rsi{RSI_LEN}"][-1],
+        "macd": indicators["macd"][-1],
+        "macd_signal": indicators["macd_signal"][-1],
+        "funding_rate": funding_rate,
+    }
+
+
+def prefetch_market_data(symbols: Iterable[str] = SYMBOLS) -> None:
+    """Build fetch_market_data() snapshots for all symbols with one indicator batch.
 
-        df["close"] = df["close"].astype(float)
-        df["high"] = df["high"].astype(float)
-        df["low"] = df["low"].astype(float)
-        df["open"] = df["open"].astype(float)
+    Only active with the vectorized backend; the other backends compute lazily
+    per symbol when fetch_market_data() is first called.
+    """
+    if INDICATOR_BACKEND != "vectorized":
+        return
+    binance_client = get_binance_client()
+    if not binance_client:
+        return
 
-        last = calculate_indicators(df)
-        latest_bar = df.iloc[-1]
-        last_high = float(latest_bar["high"])
-        last_low = float(latest_bar["low"])
-        last_close = float(latest_bar["close"])
+    tasks: Dict[Any, Callable[[], Any]] = {}
+    for symbol in symbols:
+        tasks[(symbol, "klines")] = (
+            lambda symbol=symbol: get_cached_klines(binance_client, symbol, INTERVAL, MARKET_DATA_KLINE_LIMIT)
+        )
+        tasks[(symbol, "funding")] = (
+            lambda symbol=symbol: get_cached_funding_rates(binance_client, symbol, 1)
+        )
+    outcomes = fetch_concurrently(
+        tasks,
+        max_workers=PROMPT_FETCH_WORKERS,
+        timeout=PROMPT_FETCH_TIMEOUT,
+    )
 
-        # Get funding rate for perpetual futures
+    bars_by_symbol: Dict[str, KlineArrays] = {}
+    for (symbol, name), outcome in outcomes.items():
+        if name != "klines":
+            continue
+        if not outcome.ok:
+            logging.error("Error fetching data for %s: %s", symbol, outcome.describe_failure())
+            continue
         try:
-            funding_info = binance_client.futures_funding_rate(symbol=symbol, limit=1)
-            funding_rate = float(funding_info[0]["fundingRate"]) if funding_info else 0
-        except:
-            funding_rate = 0
+            bars_by_symbol[symbol] = decode_klines(outcome.value)
+        except Exception as exc:
+            logging.error("Error fetching data for %s: %s", symbol, exc)
 
-        return {
-            "symbol": symbol,
-            "price": last_close,
-            "high": last_high,
-            "low": last_low,
-            "ema20": last["ema20"],
-            "rsi": last["rsi"],
-            "macd": last["macd"],
-            "macd_signal": last["macd_signal"],
-            "funding_rate": funding_rate,
-        }
-    except Exception as e:
-        logging.error(f"Error fetching data for {symbol}: {e}")
-        return None
+    try:
+        indicators = compute_indicator_batch(bars_by_symbol, MARKET_DATA_INDICATORS, INTERVAL)
+    except Exception as exc:
+        logging.error("Batched indicator computation failed: %s", exc)
+        return
+
+    for symbol, columns in indicators.items():
+        try:
+            market_snapshot.get_or_compute(
+                ("market_data", symbol),
+                lambda symbol=symbol, columns=columns: _market_data_from_bars(
+                    binance_client, symbol, bars_by_symbol[symbol], columns
+                ),
+            )
+        except Exception as exc:
+            logging.error("Error fetching data for %s: %s", symbol, exc)
 
 
 def round_series(values: Iterable[Any], precision: int) -> List[float]:
@@ -925,92 +1774,86 @@ def round_series(values: Iterable[Any], precision: int) -> List[float]:
     return rounded
 
 
-def collect_prompt_market_data(symbol: str) -> Optional[Dict[str, Any]]:
-    """Return rich market snapshot for prompt composition."""
+def _prompt_data_requests(binance_client: Client, symbol: str) -> Dict[str, Callable[[], Any]]:
+    """Return the exchange requests needed to build one symbol's prompt snapshot."""
+    return {
+        "intraday": lambda: get_cached_klines(binance_client, symbol, INTERVAL, PROMPT_KLINE_LIMIT),
+        "long_term": lambda: get_cached_klines(binance_client, symbol, LONG_CONTEXT_INTERVAL, PROMPT_KLINE_LIMIT),
+        "open_interest": lambda: get_cached_open_interest(binance_client, symbol, DERIVATIVES_HISTORY_LIMIT),
+        "funding": lambda: get_cached_funding_rates(binance_client, symbol, DERIVATIVES_HISTORY_LIMIT),
+    }
+
+
+def collect_prompt_market_data(
+    symbol: str,
+    prefetched: Optional[Dict[str, FetchOutcome]] = None,
+    batched: Optional[Dict[str, Tuple[KlineArrays, IndicatorColumns]]] = None,
+) -> Optional[Dict[str, Any]]:
+    """Return rich market snapshot for prompt composition.
+
+    When `prefetched` is given, payloads come from a concurrent fetch instead of
+    blocking requests; failed kline requests skip the symbol, failed derivative
+    requests degrade to empty series. `batched` supplies the decoded
+    "intraday"/"long_term" klines with indicators from a batched computation.
+    """
     binance_client = get_binance_client()
     if not binance_client:
         return None
 
-    try:
-        intraday_klines = binance_client.get_klines(symbol=symbol, interval=INTERVAL, limit=200)
-        df_intraday = pd.DataFrame(
-            intraday_klines,
-            columns=[
-                "timestamp",
-                "open",
-                "high",
-                "low",
-                "close",
-                "volume",
-                "close_time",
-                "quote_volume",
-                "trades",
-                "taker_base",
-                "taker_quote",
-                "ignore",
-            ],
-        )
+    data_requests = _prompt_data_requests(binance_client, symbol)
 
-        numeric_cols = ["open", "high", "low", "close", "volume"]
-        df_intraday[numeric_cols] = df_intraday[numeric_cols].astype(float)
-        df_intraday["mid_price"] = (df_intraday["high"] + df_intraday["low"]) / 2
-        df_intraday = add_indicator_columns(
-            df_intraday,
-            ema_lengths=(EMA_LEN,),
-            rsi_periods=(7, RSI_LEN),
-            macd_params=(MACD_FAST, MACD_SLOW, MACD_SIGNAL),
-        )
+    def payload(name: str) -> Any:
+        if prefetched is None:
+            return data_requests[name]()
+        outcome = prefetched.get(name)
+        if outcome is None:
+            raise RuntimeError(f"{name} data was not prefetched")
+        if not outcome.ok:
+            raise RuntimeError(f"{name} request failed ({outcome.describe_failure()})")
+        return outcome.value
 
-        df_long = pd.DataFrame(
-            binance_client.get_klines(symbol=symbol, interval="4h", limit=200),
-            columns=[
-                "timestamp",
-                "open",
-                "high",
-                "low",
-                "close",
-                "volume",
-                "close_time",
-                "quote_volume",
-                "trades",
-                "taker_base",
-                "taker_quote",
-                "ignore",
-            ],
-        )
-        df_long[numeric_cols] = df_long[numeric_cols].astype(float)
-        df_long = add_indicator_columns(
-            df_long,
-            ema_lengths=(20, 50),
-            rsi_periods=(14,),
-            macd_params=(MACD_FAST, MACD_SLOW, MACD_SIGNAL),
-        )
-        df_long["atr3"] = calculate_atr_series(df_long, 3)
-        df_long["atr14"] = calculate_atr_series(df_long, 14)
+    try:
+        if batched is not None:
+            intraday_bars, intraday = batched["intraday"]
+            long_bars, long_term = batched["long_term"]
+        else:
+            intraday_bars = decode_klines(payload("intraday"))
+            intraday = apply_indicators(
+                intraday_bars,
+                INTRADAY_INDICATORS,
+                key=(symbol, INTERVAL),
+                tail=PROMPT_SERIES_LENGTH,
+            )
+            long_bars = decode_klines(payload("long_term"))
+            long_term = apply_indicators(
+                long_bars,
+                LONG_TERM_INDICATORS,
+                key=(symbol, LONG_CONTEXT_INTERVAL),
+                tail=PROMPT_SERIES_LENGTH,
+            )
 
         try:
-            oi_hist = binance_client.futures_open_interest_hist(symbol=symbol, period="5m", limit=30)
+            oi_hist = payload("open_interest")
             open_interest_values = [float(entry["sumOpenInterest"]) for entry in oi_hist]
         except Exception as exc:
             logging.debug("Open interest history unavailable for %s: %s", symbol, exc)
             open_interest_values = []
 
         try:
-            funding_hist = binance_client.futures_funding_rate(symbol=symbol, limit=30)
+            funding_hist = payload("funding")
             funding_rates = [float(entry["fundingRate"]) for entry in funding_hist]
         except Exception as exc:
             logging.debug("Funding rate history unavailable for %s: %s", symbol, exc)
             funding_rates = []
 
-        price = float(df_intraday["close"].iloc[-1])
-        ema20 = float(df_intraday["ema20"].iloc[-1])
-        rsi7 = float(df_intraday["rsi7"].iloc[-1])
-        rsi14 = float(df_intraday["rsi14"].iloc[-1])
-        macd_value = float(df_intraday["macd"].iloc[-1])
+        price = float(intraday_bars.close[-1])
+        ema20 = float(intraday["ema20"][-1])
+        rsi7 = float(intraday["rsi7"][-1])
+        rsi14 = float(intraday["rsi14"][-1])
+        macd_value = float(intraday["macd"][-1])
         funding_latest = funding_rates[-1] if funding_rates else 0.0
 
-        intraday_tail = df_intraday.tail(10)
-        long_tail = df_long.tail(10)
+        series_tail = slice(-PROMPT_SERIES_LENGTH, None)
 
         open_interest_latest = open_interest_values[-1] if open_interest_values else None
         open_interest_average = (
@@ -1026,7 +1869,7 @@ def collect_prompt_market_data(symbol: str) -> Optional[Dict[str, Any]]:
             "rsi": rsi14,
             "rsi7": rsi7,
             "macd": macd_value,
-            "macd_signal": float(df_intraday["macd_signal"].iloc[-1]),
+            "macd_signal": float(intraday["macd_signal"][-1]),
             "funding_rate": funding_latest,
             "funding_rates": funding_rates,
             "open_interest": {
@@ -1034,29 +1877,215 @@ def collect_prompt_market_data(symbol: str) -> Optional[Dict[str, Any]]:
                 "average": open_interest_average,
             },
             "intraday_series": {
-                "mid_prices": round_series(intraday_tail["mid_price"], 3),
-                "ema20": round_series(intraday_tail["ema20"], 3),
-                "macd": round_series(intraday_tail["macd"], 3),
-                "rsi7": round_series(intraday_tail["rsi7"], 3),
-                "rsi14": round_series(intraday_tail["rsi14"], 3),
+                "mid_prices": round_series(intraday_bars.mid_price[series_tail], 3),
+                "ema20": round_series(intraday["ema20"][series_tail], 3),
+                "macd": round_series(intraday["macd"][series_tail], 3),
+                "rsi7": round_series(intraday["rsi7"][series_tail], 3),
+                "rsi14": round_series(intraday["rsi14"][series_tail], 3),
             },
             "long_term": {
-                "ema20": float(df_long["ema20"].iloc[-1]),
-                "ema50": float(df_long["ema50"].iloc[-1]),
-                "atr3": float(df_long["atr3"].iloc[-1]),
-                "atr14": float(df_long["atr14"].iloc[-1]),
-                "current_volume": float(df_long["volume"].iloc[-1]),
-                "average_volume": float(df_long["volume"].mean()),
-                "macd": round_series(long_tail["macd"], 3),
-                "rsi14": round_series(long_tail["rsi14"], 3),
+                "ema20": float(long_term["ema20"][-1]),
+                "ema50": float(long_term["ema50"][-1]),
+                "atr3": float(long_term["atr3"][-1]),
+                "atr14": float(long_term["atr14"][-1]),
+                "current_volume": float(long_bars.volume[-1]),
+                "average_volume": float(np.mean(long_bars.volume)),
+                "macd": round_series(long_term["macd"][series_tail], 3),
+                "rsi14": round_series(long_term["rsi14"][series_tail], 3),
             },
         }
     except Exception as exc:
         logging.error("Failed to build market snapshot for %s: %s", symbol, exc, exc_info=True)
         return None
 
+
+def collect_all_prompt_market_data(symbols: Iterable[str] = SYMBOLS) -> Dict[str, Dict[str, Any]]:
+    """Return prompt snapshots keyed by coin, in `symbols` order.
+
+    With TRADEBOT_FETCH_WORKERS > 1 every symbol/endpoint request is issued at
+    once, so collection time follows the slowest request instead of their sum.
+    """
+    symbols = list(symbols)
+    market_snapshots: Dict[str, Dict[str, Any]] = {}
+
+    binance_client = get_binance_client()
+    if PROMPT_FETCH_WORKERS <= 1 or not binance_client:
+        for symbol in symbols:
+            snapshot = collect_prompt_market_data(symbol)
+            if snapshot:
+                market_snapshots[snapshot["coin"]] = snapshot
+        return market_snapshots
+
+    tasks: Dict[Any, Callable[[], Any]] = {}
+    for symbol in symbols:
+        for name, request in _prompt_data_requests(binance_client, symbol).items():
+            tasks[(symbol, name)] = request
+
+    started = time.perf_counter()
+    outcomes = fetch_concurrently(
+        tasks,
+        max_workers=PROMPT_FETCH_WORKERS,
+        timeout=PROMPT_FETCH_TIMEOUT,
+    )
+    elapsed = time.perf_counter() - started
+
+    failures = [
+        f"{symbol}/{name}: {outcome.describe_failure()}"
+        for (symbol, name), outcome in outcomes.items()
+        if not outcome.ok
+    ]
+    if failures:
+        logging.warning(
+            "Prompt data: %d/%d requests failed: %s",
+            len(failures),
+            len(tasks),
+            "; ".join(failures),
+        )
+    slowest = max((outcome.elapsed for outcome in outcomes.values()), default=0.0)
+    logging.info(
+        "Fetched %d prompt data requests concurrently in %.2fs (slowest %.2fs).",
+        len(tasks),
+        elapsed,
+        slowest,
+    )
+
+    batched: Dict[str, Dict[str, Tuple[KlineArrays, IndicatorColumns]]] = {}
+    if INDICATOR_BACKEND == "vectorized":
+        batched = _batch_prompt_indicators(symbols, outcomes)
+
+    for symbol in symbols:
+        prefetched = {
+            name: outcome
+            for (outcome_symbol, name), outcome in outcomes.items()
+            if outcome_symbol == symbol
+        }
+        snapshot = collect_prompt_market_data(
+            symbol,
+            prefetched=prefetched,
+            batched=batched.get(symbol),
+        )
+        if snapshot:
+            market_snapshots[snapshot["coin"]] = snapshot
+    return market_snapshots
+
+
+def _batch_prompt_indicators(
+    symbols: List[str],
+    outcomes: Dict[Any, FetchOutcome],
+) -> Dict[str, Dict[str, Tuple[KlineArrays, IndicatorColumns]]]:
+    """Compute prompt indicators for every symbol in one pass per interval."""
+    intraday_bars: Dict[str, KlineArrays] = {}
+    long_bars: Dict[str, KlineArrays] = {}
+    for symbol in symbols:
+        intraday = outcomes.get((symbol, "intraday"))
+        long_term = outcomes.get((symbol, "long_term"))
+        if not (intraday and intraday.ok and long_term and long_term.ok):
+            continue
+        try:
+            intraday_bars[symbol] = decode_klines(intraday.value)
+            long_bars[symbol] = decode_klines(long_term.value)
+        except Exception as exc:
+            logging.debug("Skipping batched indicators for %s: %s", symbol, exc)
+            intraday_bars.pop(symbol, None)
+
+    try:
+        intraday = compute_indicator_batch(intraday_bars, INTRADAY_INDICATORS, INTERVAL)
+        long_term = compute_indicator_batch(long_bars, LONG_TERM_INDICATORS, LONG_CONTEXT_INTERVAL)
+    except Exception as exc:
+        logging.error("Batched indicator computation failed; computing per symbol: %s", exc)
+        return {}
+    return {
+        symbol: {
+            "intraday": (intraday_bars[symbol], intraday[symbol]),
+            "long_term": (long_bars[symbol], long_term[symbol]),
+        }
+        for symbol in intraday
+        if symbol in long_term
+    }
+
 # ───────────────────── AI DECISION MAKING ───────────────────
 
+PROMPT_INSTRUCTIONS = """
+INSTRUCTIONS:
+For each coin, provide a trading decision in JSON format. You can either:
+1. "hold" - Keep current position (if you have one)
+2. "entry" - Open a new position (if you don't have one)
+3. "close" - Close current position
+
+Return ONLY a valid JSON object with this structure:
+{
+  "ETH": {
+    "signal": "hold|entry|close",
+    "side": "long|short",  // only for entry
+    "quantity": 0.0,
+    "profit_target": 0.0,
+    "stop_loss": 0.0,
+    "leverage": 10,
+    "confidence": 0.75,
+    "risk_usd": 500.0,
+    "invalidation_condition": "If price closes below X on a 3-minute candle",
+    "justification": "Reason for entry/close/hold"
+  }
+}
+
+IMPORTANT:
+- Only suggest entries if you see strong opportunities
+- Use proper risk management
+- Provide clear invalidation conditions
+- Return ONLY valid JSON, no other text
+""".strip()
+
+
+def _compile_static_prompt() -> StaticPrompt:
+    """Build the invariant request prefix (system prompt + output instructions) once."""
+    return StaticPrompt(
+        system_prompt=TRADING_RULES_PROMPT,
+        instructions=PROMPT_INSTRUCTIONS,
+        layout=PROMPT_LAYOUT,
+        cache_control=PROMPT_CACHE_CONTROL,
+    )
+
+
+# 静态前缀在启动时编译一次；TRADING_RULES_PROMPT 重新加载时随之重建
+static_prompt = _compile_static_prompt()
+prompt_token_counter = TokenCounter()
+prefix_cache_stats = PrefixCacheStats()
+
+
+def _position_prompt_payload(coin: str, pos: Dict[str, Any], current_price: float) -> Dict[str, Any]:
+    """Position details exposed to the model."""
+    quantity = pos["quantity"]
+    gross_unrealized = calculate_unrealized_pnl(coin, current_price)
+    leverage = pos.get("leverage", 1) or 1
+    if pos["side"] == "long":
+        liquidation_price = pos["entry_price"] * max(0.0, 1 - 1 / leverage)
+    else:
+        liquidation_price = pos["entry_price"] * (1 + 1 / leverage)
+    notional_value = quantity * current_price
+    return {
+        "symbol": coin,
+        "side": pos["side"],
+        "quantity": quantity,
+        "entry_price": pos["entry_price"],
+        "current_price": current_price,
+        "liquidation_price": liquidation_price,
+        "unrealized_pnl": gross_unrealized,
+        "leverage": pos.get("leverage", 1),
+        "exit_plan": {
+            "profit_target": pos.get("profit_target"),
+            "stop_loss": pos.get("stop_loss"),
+            "invalidation_condition": pos.get("invalidation_condition"),
+        },
+        "confidence": pos.get("confidence", 0.0),
+        "risk_usd": pos.get("risk_usd"),
+        "sl_oid": pos.get("sl_oid", -1),
+        "tp_oid": pos.get("tp_oid", -1),
+        "wait_for_fill": pos.get("wait_for_fill", False),
+        "entry_oid": pos.get("entry_oid", -1),
+        "notional_usd": notional_value,
+    }
+
+
 def format_prompt_for_deepseek() -> str:
     """Compose a rich prompt resembling the original DeepSeek in-context format."""
     global invocation_count
@@ -1065,11 +2094,7 @@ def format_prompt_for_deepseek() -> str:
     now = get_current_time()
     minutes_running = int((now - BOT_START_TIME).total_seconds() // 60)
 
-    market_snapshots: Dict[str, Dict[str, Any]] = {}
-    for symbol in SYMBOLS:
-        snapshot = collect_prompt_market_data(symbol)
-        if snapshot:
-            market_snapshots[snapshot["coin"]] = snapshot
+    market_snapshots = collect_all_prompt_market_data(SYMBOLS)
 
     total_margin = calculate_total_margin()
     total_equity = balance + total_margin
@@ -1080,6 +2105,20 @@ def format_prompt_for_deepseek() -> str:
     total_return = ((total_equity - START_CAPITAL) / START_CAPITAL) * 100 if START_CAPITAL else 0.0
     net_unrealized_total = total_equity - balance - total_margin
 
+    if PROMPT_MODE == "compact":
+        return _format_compact_prompt(
+            now,
+            minutes_running,
+            market_snapshots,
+            {
+                "return_pct": total_return,
+                "cash": balance,
+                "margin": total_margin,
+                "unrealized_pnl": net_unrealized_total,
+                "equity": total_equity,
+            },
+        )
+
     def fmt(value: Optional[float], digits: int = 3) -> str:
         if value is None:
             return "N/A"
@@ -1156,154 +2195,502 @@ def format_prompt_for_deepseek() -> str:
 
     for coin, pos in positions.items():
         current_price = market_snapshots.get(coin, {}).get("price", pos["entry_price"])
-        quantity = pos["quantity"]
-        gross_unrealized = calculate_unrealized_pnl(coin, current_price)
-        leverage = pos.get("leverage", 1) or 1
-        if pos["side"] == "long":
-            liquidation_price = pos["entry_price"] * max(0.0, 1 - 1 / leverage)
-        else:
-            liquidation_price = pos["entry_price"] * (1 + 1 / leverage)
-        notional_value = quantity * current_price
-        position_payload = {
-            "symbol": coin,
-            "side": pos["side"],
-            "quantity": quantity,
-            "entry_price": pos["entry_price"],
-            "current_price": current_price,
-            "liquidation_price": liquidation_price,
-            "unrealized_pnl": gross_unrealized,
-            "leverage": pos.get("leverage", 1),
-            "exit_plan": {
-                "profit_target": pos.get("profit_target"),
-                "stop_loss": pos.get("stop_loss"),
-                "invalidation_condition": pos.get("invalidation_condition"),
-            },
-            "confidence": pos.get("confidence", 0.0),
-            "risk_usd": pos.get("risk_usd"),
-            "sl_oid": pos.get("sl_oid", -1),
-            "tp_oid": pos.get("tp_oid", -1),
-            "wait_for_fill": pos.get("wait_for_fill", False),
-            "entry_oid": pos.get("entry_oid", -1),
-            "notional_usd": notional_value,
-        }
+        position_payload = _position_prompt_payload(coin, pos, current_price)
         prompt_lines.append(f"{coin} position data: {json.dumps(position_payload)}")
 
     sharpe_ratio = 0.0
     prompt_lines.append(f"Sharpe Ratio: {fmt(sharpe_ratio, 3)}")
 
-    prompt_lines.append(
-        """
-INSTRUCTIONS:
-For each coin, provide a trading decision in JSON format. You can either:
-1. "hold" - Keep current position (if you have one)
-2. "entry" - Open a new position (if you don't have one)
-3. "close" - Close current position
+    if static_prompt.inline_instructions:
+        prompt_lines.append(static_prompt.inline_instructions)
 
-Return ONLY a valid JSON object with this structure:
-{
-  "ETH": {
-    "signal": "hold|entry|close",
-    "side": "long|short",  // only for entry
-    "quantity": 0.0,
-    "profit_target": 0.0,
-    "stop_loss": 0.0,
-    "leverage": 10,
-    "confidence": 0.75,
-    "risk_usd": 500.0,
-    "invalidation_condition": "If price closes below X on a 3-minute candle",
-    "justification": "Reason for entry/close/hold"
-  }
-}
+    return "\n".join(prompt_lines)
 
-IMPORTANT:
-- Only suggest entries if you see strong opportunities
-- Use proper risk management
-- Provide clear invalidation conditions
-- Return ONLY valid JSON, no other text
-""".strip()
+
+def _compact_json(value: Any) -> str:
+    """JSON without whitespace, floats trimmed to the configured significant digits."""
+    def trim(item: Any) -> Any:
+        if isinstance(item, float):
+            text = format_value(item, PROMPT_SIGNIFICANT_DIGITS)
+            return float(text) if text != "NA" else None
+        if isinstance(item, dict):
+            return {key: trim(val) for key, val in item.items()}
+        if isinstance(item, list):
+            return [trim(val) for val in item]
+        return item
+    return json.dumps(trim(value), separators=(",", ":"))
+
+
+def _format_compact_prompt(
+    now: datetime,
+    minutes_running: int,
+    market_snapshots: Dict[str, Dict[str, Any]],
+    account: Dict[str, float],
+) -> str:
+    """Token-lean prompt: shared headers, precision-aware numbers, budgeted sections."""
+    digits = PROMPT_SIGNIFICANT_DIGITS
+
+    def num(value: Optional[float]) -> str:
+        return format_value(value, digits)
+
+    def series(values: List[float]) -> str:
+        return encode_series(values, digits, delta=PROMPT_DELTA_SERIES)
+
+    coins = [SYMBOL_TO_COIN[symbol] for symbol in SYMBOLS if market_snapshots.get(SYMBOL_TO_COIN[symbol])]
+    header = (
+        f"t={now.isoformat()} running={minutes_running}m call={invocation_count}. "
+        f"Series are oldest->newest on {INTERVAL} bars unless marked 4h."
+    )
+    if PROMPT_DELTA_SERIES:
+        header += " A series starting with d: lists the first value, then the change from the previous value."
+    sections: List[PromptSection] = [PromptSection("header", header, priority=100, required=True)]
+
+    market_rows = ["MARKET coin price ema20 macd rsi7 rsi14 | oi_last oi_avg | funding_last funding_avg"]
+    context_rows = ["4H coin ema20 ema50 atr3 atr14 volume volume_avg"]
+    for coin in coins:
+        data = market_snapshots[coin]
+        open_interest = data["open_interest"]
+        funding_rates = data.get("funding_rates", [])
+        funding_avg = float(np.mean(funding_rates)) if funding_rates else None
+        market_rows.append(
+            f"{coin} {num(data['price'])} {num(data['ema20'])} {num(data['macd'])} {num(data['rsi7'])} {num(data['rsi'])}"
+            f" | {num(open_interest.get('latest'))} {num(open_interest.get('average'))}"
+            f" | {format_value(data['funding_rate'], 3)} {format_value(funding_avg, 3)}"
+        )
+        long_term = data["long_term"]
+        context_rows.append(
+            f"{coin} {num(long_term['ema20'])} {num(long_term['ema50'])} {num(long_term['atr3'])}"
+            f" {num(long_term['atr14'])} {num(long_term['current_volume'])} {num(long_term['average_volume'])}"
+        )
+    sections.append(PromptSection("market", "\n".join(market_rows), priority=90, required=True))
+    sections.append(PromptSection("context_4h", "\n".join(context_rows), priority=70))
+
+    sections.append(
+        PromptSection(
+            "series_header",
+            f"SERIES ({INTERVAL}, last {PROMPT_SERIES_LENGTH}) keys: mid ema20 macd rsi7 rsi14; 4h keys: macd4h rsi14_4h",
+            group="series",
+            group_header=True,
+        )
     )
+    for coin in coins:
+        data = market_snapshots[coin]
+        intraday = data["intraday_series"]
+        long_term = data["long_term"]
+        held = 10 if coin in positions else 0
+        sections.append(
+            PromptSection(
+                f"series:{coin}",
+                f"{coin} mid {series(intraday['mid_prices'])} ema20 {series(intraday['ema20'])}"
+                f" macd {series(intraday['macd'])} rsi7 {series(intraday['rsi7'])} rsi14 {series(intraday['rsi14'])}",
+                priority=40 + held,
+                group="series",
+            )
+        )
+        sections.append(
+            PromptSection(
+                f"series_4h:{coin}",
+                f"{coin} macd4h {series(long_term['macd'])} rsi14_4h {series(long_term['rsi14'])}",
+                priority=30 + held,
+                group="series",
+            )
+        )
 
-    return "\n".join(prompt_lines)
+    sections.append(
+        PromptSection(
+            "account",
+            "ACCOUNT return_pct cash margin upnl equity: "
+            + " ".join(
+                format_value(account[key], digits)
+                for key in ("return_pct", "cash", "margin", "unrealized_pnl", "equity")
+            ),
+            priority=95,
+            required=True,
+        )
+    )
+    position_lines = [
+        f"POSITION {_compact_json(_position_prompt_payload(coin, pos, market_snapshots.get(coin, {}).get('price', pos['entry_price'])))}"
+        for coin, pos in positions.items()
+    ]
+    sections.append(PromptSection("positions", "\n".join(position_lines) or "POSITIONS none", priority=95, required=True))
+    if static_prompt.inline_instructions:
+        sections.append(PromptSection("instructions", static_prompt.inline_instructions, priority=100, required=True))
 
-def call_deepseek_api(prompt: str) -> Optional[Dict[str, Any]]:
-    """Call OpenRouter API with a configurable model."""
-    model_name = os.getenv("OPENROUTER_MODEL_NAME", "deepseek/deepseek-chat")
+    text, report = assemble_prompt(sections, PROMPT_TOKEN_BUDGET or None, prompt_token_counter)
+    log = logging.warning if report.over_budget else logging.info
+    log("Compact prompt: %s", report.describe())
+    return text
 
-    try:
-        request_metadata: Dict[str, Any] = {
-            "model": LLM_MODEL_NAME,
-            "temperature": LLM_TEMPERATURE,
-            "max_tokens": LLM_MAX_TOKENS,
-        }
-        if LLM_THINKING_PARAM is not None:
-            request_metadata["thinking"] = LLM_THINKING_PARAM
 
+DEFAULT_OPENROUTER_CHAT_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_CHAT_URL = os.getenv("TRADEBOT_LLM_CHAT_URL", "").strip() or DEFAULT_OPENROUTER_CHAT_URL
+DecisionMap = Dict[str, DecisionRecord]
+DecisionCallback = Callable[[str, DecisionRecord], None]
+
+
+def _llm_request_params() -> Dict[str, Any]:
+    """Sampling parameters sent with every chat request (TRADEBOT_LLM_* settings)."""
+    params: Dict[str, Any] = {
+        "temperature": LLM_TEMPERATURE,
+        "max_tokens": LLM_MAX_TOKENS,
+    }
+    if LLM_THINKING_PARAM is not None:
+        params["thinking"] = LLM_THINKING_PARAM
+    return params
+
+
+def _chat_request_body(prompt: str, model: str) -> Dict[str, Any]:
+    """Chat-completions body for one model; also the input of the response cache key."""
+    return {
+        "model": model,
+        "messages": static_prompt.messages(prompt),
+        **_llm_request_params(),
+    }
+
+
+def call_deepseek_api(
+    prompt: str,
+    on_decision: Optional[DecisionCallback] = None,
+) -> Optional[DecisionMap]:
+    """Call OpenRouter API with a configurable model.
+
+    With streaming enabled, `on_decision(coin, decision)` is invoked for each
+    coin as soon as its decision object is complete in the token stream.
+    """
+    model_name = LLM_MODEL_NAME
+
+    try:
+        logged_model: Any = [spec.name for spec in LLM_ENSEMBLE_MODELS] if LLM_ENSEMBLE_MODELS else model_name
+        request_metadata: Dict[str, Any] = {"model": logged_model, **_llm_request_params()}
         log_ai_message(
             direction="sent",
             role="system",
-            content=TRADING_RULES_PROMPT,
-            metadata={
-                "model": model_name,
-                "temperature": 0.7,
-                "max_tokens": 4000
-            }
+            content=static_prompt.system_text,
+            metadata=request_metadata,
         )
         log_ai_message(
             direction="sent",
             role="user",
             content=prompt,
+            metadata=request_metadata,
+        )
+
+        if LLM_ENSEMBLE_MODELS:
+            return _call_model_ensemble(prompt)
+        if LLM_HEDGE:
+            return _call_model_hedged(prompt, model_name, on_decision)
+        return _request_model_decisions(prompt, model_name, on_decision=on_decision)
+    except Exception as e:
+        logging.exception("Error calling DeepSeek API")
+        notify_error(
+            f"Error calling DeepSeek API: {e}",
+            metadata={"context": "call_deepseek_api"},
+            log_error=False,
+        )
+        return None
+
+
+def _request_model_decisions(
+    prompt: str,
+    model: str,
+    *,
+    timeout: Optional[float] = None,
+    on_decision: Optional[DecisionCallback] = None,
+    attempt: Optional[HedgeAttempt] = None,
+) -> Optional[DecisionMap]:
+    """Request decisions from one model and record the call in `llm_calls.csv`."""
+    with llm_telemetry.track(model, streamed=LLM_STREAMING) as call:
+        try:
+            return _perform_model_request(
+                prompt, model, call, timeout=timeout, on_decision=on_decision, attempt=attempt
+            )
+        except HedgeCancelled:
+            call.outcome = "cancelled"
+            return None
+
+
+def _call_model_hedged(
+    prompt: str,
+    model: str,
+    on_decision: Optional[DecisionCallback] = None,
+) -> Optional[DecisionMap]:
+    """Request decisions, issuing a second request if the first is slower than recent latency."""
+    latencies = [
+        record.latency
+        for record in llm_telemetry.recent()
+        if record.model == model and record.outcome == "ok"
+    ]
+    delay = hedge_delay(latencies, LLM_HEDGE_PERCENTILE, fallback=LLM_HEDGE_DELAY)
+
+    def request(attempt: HedgeAttempt) -> Optional[DecisionMap]:
+        def dispatch(coin: str, decision: DecisionRecord) -> None:
+            # 只有认领胜出的请求才能执行交易；另一方此时已被取消
+            if not attempt.claim():
+                raise HedgeCancelled(f"{attempt.label} request lost the hedge race")
+            on_decision(coin, decision)
+
+        return _request_model_decisions(
+            prompt,
+            attempt.model,
+            on_decision=dispatch if on_decision is not None else None,
+            attempt=attempt,
+        )
+
+    outcome = run_hedged(request, model, delay=delay, hedge_model=LLM_HEDGE_MODEL or None)
+    llm_hedge_stats.record(outcome)
+    log = logging.warning if outcome.winner is None else logging.info
+    log(
+        "Hedged LLM call (p%g threshold %.2fs): %s; %s",
+        LLM_HEDGE_PERCENTILE,
+        delay,
+        outcome.describe(),
+        llm_hedge_stats.describe(),
+    )
+    for label, error in outcome.errors.items():
+        logging.warning("Hedged LLM %s request failed: %s", label, error)
+    return outcome.value
+
+
+def _perform_model_request(
+    prompt: str,
+    model: str,
+    call: LLMCallRecord,
+    *,
+    timeout: Optional[float] = None,
+    on_decision: Optional[DecisionCallback] = None,
+    attempt: Optional[HedgeAttempt] = None,
+) -> Optional[DecisionMap]:
+    """Request decisions from one model (cache, then streaming or buffered HTTP)."""
+    request_headers = {
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": "https://github.com/crypto-trading-bot",
+        "X-Title": "DeepSeek Trading Bot",
+    }
+    request_body = _chat_request_body(prompt, model)
+    # 自定义端点（如本地 stub）的响应与真实模型的缓存条目分开存放
+    namespace = OPENROUTER_CHAT_URL if OPENROUTER_CHAT_URL != DEFAULT_OPENROUTER_CHAT_URL else ""
+    cache_key = chat_request_key(request_body, namespace) if llm_response_cache.enabled else None
+    if cache_key is not None:
+        cached = llm_response_cache.get(cache_key)
+        if cached is not None:
+            call.outcome = "cached"
+            call.streamed = False
+            call.usage = cached.usage
+            call.response_id = cached.response_id
+            log_ai_message(
+                direction="received",
+                role="assistant",
+                content=cached.content,
+                metadata={
+                    "model": model,
+                    "status_code": 200,
+                    "response_id": cached.response_id,
+                    "usage": cached.usage,
+                    "cached": True,
+                    "cache_key": cache_key,
+                }
+            )
+            return _decode_decisions(cached.content, cached.response_id, 200).records or None
+
+    if LLM_STREAMING:
+        return _stream_deepseek_decisions(
+            request_headers, request_body, on_decision, call, cache_key, timeout, attempt
+        )
+
+    response = http_transport.post(
+        OPENROUTER_CHAT_URL,
+        endpoint="openrouter",
+        headers=request_headers,
+        json=request_body,
+        timeout=timeout,
+    )
+    call.status_code = response.status_code
+
+    if response.status_code != 200:
+        if attempt is not None:
+            attempt.check()
+        call.outcome = "http-error"
+        notify_error(
+            f"OpenRouter API error: {response.status_code}",
             metadata={
-                "model": model_name,
-                "temperature": 0.7,
-                "max_tokens": 4000
-            }
+                "status_code": response.status_code,
+                "response_text": response.text,
+            },
         )
+        return None
 
-        request_payload: Dict[str, Any] = {
-            "model": LLM_MODEL_NAME,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": TRADING_RULES_PROMPT
-                },
+    result = response.json()
+    content = result['choices'][0]['message']['content']
+    call.usage = result.get("usage")
+    call.response_id = result.get("id")
+    if attempt is not None:
+        attempt.check()
+
+    log_ai_message(
+        direction="received",
+        role="assistant",
+        content=content,
+        metadata={
+            "model": model,
+            "status_code": response.status_code,
+            "response_id": result.get("id"),
+            "usage": result.get("usage"),
+            "cached_tokens": prefix_cache_stats.record(result.get("usage")),
+            "prefix_fingerprint": static_prompt.fingerprint,
+        }
+    )
+
+    parsed = _decode_decisions(content, result.get("id"), response.status_code)
+    # 与流式路径同一规则：只要有币种被丢弃或修复失败（即使部分决策可用）都记为 decode-fail
+    if not parsed.ok:
+        call.outcome = "decode-fail"
+    if parsed.ok and cache_key is not None:
+        llm_response_cache.put(
+            cache_key,
+            CachedResponse(
+                content=content,
+                response_id=result.get("id"),
+                model=result.get("model"),
+                usage=result.get("usage"),
+            ),
+        )
+    return parsed.records or None
+
+
+def _call_model_ensemble(prompt: str) -> Optional[DecisionMap]:
+    """Query all ensemble models concurrently and combine their decisions."""
+    deadline = LLM_ENSEMBLE_DEADLINE if LLM_ENSEMBLE_DEADLINE > 0 else None
+
+    def query(spec: ModelSpec) -> Optional[Dict[str, Any]]:
+        records = _request_model_decisions(prompt, spec.name, timeout=spec.timeout)
+        if records is None:
+            return None
+        return {coin: record.as_dict() for coin, record in records.items()}
+
+    outcome = run_ensemble(
+        LLM_ENSEMBLE_MODELS,
+        query,
+        policy=LLM_ENSEMBLE_POLICY,
+        deadline=deadline,
+    )
+    for result in outcome.results:
+        log = logging.warning if result.failed else logging.info
+        log("Ensemble model %s: %s", result.model, result.describe())
+    logging.info(
+        "Ensemble (%s) combined %d/%d models in %.2fs.",
+        outcome.policy,
+        len(outcome.responders),
+        len(outcome.results),
+        outcome.elapsed,
+    )
+    log_ai_message(
+        direction="ensemble",
+        role="system",
+        content=json.dumps(outcome.decisions),
+        metadata={
+            "policy": outcome.policy,
+            "elapsed_seconds": round(outcome.elapsed, 3),
+            "models": [
                 {
-                    "role": "user",
-                    "content": prompt
+                    "model": result.model,
+                    "latency_seconds": round(result.latency, 3),
+                    "ok": result.ok,
+                    "timed_out": result.timed_out,
+                    "superseded": result.superseded,
+                    "error": result.error,
                 }
+                for result in outcome.results
             ],
-            "temperature": LLM_TEMPERATURE,
-            "max_tokens": LLM_MAX_TOKENS
+            "votes": outcome.votes,
         }
-        if LLM_THINKING_PARAM is not None:
-            request_payload["thinking"] = LLM_THINKING_PARAM
-
-        response = requests.post(
-            url="https://openrouter.ai/api/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "https://github.com/crypto-trading-bot",
-                "X-Title": "DeepSeek Trading Bot",
+    )
+    if not outcome.responders:
+        notify_error(
+            "No ensemble model returned decisions in time",
+            metadata={"models": [result.model for result in outcome.results]},
+        )
+        return None
+    return {coin: normalize_decision(coin, decision) for coin, decision in outcome.decisions.items()}
+
+
+def _decode_decisions(
+    content: str,
+    response_id: Optional[str],
+    status_code: int,
+) -> ParsedDecisions:
+    """Parse a complete response text into validated per-coin decisions."""
+    parsed = parse_decisions(content, coins=COIN_TO_SYMBOL)
+    if not parsed.found:
+        notify_error(
+            "No JSON found in DeepSeek response",
+            metadata={
+                "response_id": response_id,
+                "status_code": status_code,
             },
-            json={
-                "model": model_name,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": TRADING_RULES_PROMPT
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "temperature": 0.7,
-                "max_tokens": 4000
+        )
+        return parsed
+    if parsed.errors:
+        summary = "; ".join(f"{coin}: {error}" if coin else error for coin, error in parsed.errors)
+        notify_error(
+            f"DeepSeek JSON decode failed: {summary}",
+            metadata={
+                "response_id": response_id,
+                "status_code": status_code,
+                "recovered": sorted(parsed.records),
+                "raw_json_excerpt": parsed.excerpt,
             },
-            timeout=30
         )
-
+    elif parsed.repaired:
+        logging.info("Repaired malformed JSON in LLM response %s.", response_id or "")
+    for record in parsed.records.values():
+        for issue in record.issues:
+            logging.warning("LLM decision for %s: %s", record.coin, issue)
+    return parsed
+
+
+def _stream_deepseek_decisions(
+    headers: Dict[str, str],
+    body: Dict[str, Any],
+    on_decision: Optional[DecisionCallback],
+    call: LLMCallRecord,
+    cache_key: Optional[str] = None,
+    timeout: Optional[float] = None,
+    attempt: Optional[HedgeAttempt] = None,
+) -> Optional[DecisionMap]:
+    """Stream the completion over SSE and hand out coin decisions as they complete."""
+    # 与 parse_decisions 相同的取值规则：优先代码围栏内的对象，前言中不含币种的 `{...}` 被跳过
+    parser = DecisionStreamParser(follow_fences=True, coins=COIN_TO_SYMBOL)
+    dispatched: Dict[str, DecisionRecord] = {}
+
+    def on_text(text: str) -> None:
+        if attempt is not None:
+            # 对冲落败时中止读取，关闭连接即取消服务端生成
+            attempt.check()
+        for coin, decision in parser.feed(text):
+            if on_decision is None or coin not in COIN_TO_SYMBOL or coin in dispatched:
+                continue
+            record = normalize_decision(coin, decision)
+            dispatched[coin] = record
+            on_decision(coin, record)
+
+    sent_at = time.monotonic()
+    # 套接字超时只限制单次读取，整体截止时间防止生成卡住时无限期阻塞主循环
+    deadline = sent_at + (timeout if timeout is not None else LLM_TIMEOUT_SECONDS) * LLM_STREAM_DEADLINE_FACTOR
+    response = http_transport.post(
+        OPENROUTER_CHAT_URL,
+        endpoint="openrouter",
+        headers=headers,
+        json={**body, "stream": True},
+        stream=True,
+        timeout=timeout,
+    )
+    call.status_code = response.status_code
+    with response:
         if response.status_code != 200:
+            if attempt is not None:
+                attempt.check()
+            call.outcome = "http-error"
             notify_error(
                 f"OpenRouter API error: {response.status_code}",
                 metadata={
@@ -1312,58 +2699,89 @@ def call_deepseek_api(prompt: str) -> Optional[Dict[str, Any]]:
                 },
             )
             return None
-
-        result = response.json()
-        content = result['choices'][0]['message']['content']
-
-        log_ai_message(
-            direction="received",
-            role="assistant",
-            content=content,
-            metadata={
-                "status_code": response.status_code,
-                "response_id": result.get("id"),
-                "usage": result.get("usage")
-            }
+        completion = read_chat_stream(
+            response.iter_content(chunk_size=None),
+            on_text=on_text,
+            started=sent_at,
+            deadline=deadline,
         )
+    call.usage = completion.usage
+    call.response_id = completion.response_id
+    call.first_token = completion.first_token_seconds
+    if attempt is not None:
+        attempt.check()
 
-        # Extract JSON from response (in case there's extra text)
-        start = content.find('{')
-        end = content.rfind('}') + 1
-        if start != -1 and end > start:
-            json_str = content[start:end]
-            try:
-                decisions = json.loads(json_str)
-                return decisions
-            except json.JSONDecodeError as decode_err:
-                snippet = json_str[:2000]
-                notify_error(
-                    f"DeepSeek JSON decode failed: {decode_err}",
-                    metadata={
-                        "response_id": result.get("id"),
-                        "status_code": response.status_code,
-                        "raw_json_excerpt": snippet,
-                    },
-                )
-                return None
-        else:
-            notify_error(
-                "No JSON found in DeepSeek response",
-                metadata={
-                    "response_id": result.get("id"),
-                    "status_code": response.status_code,
-                },
-            )
-            return None
-            
-    except Exception as e:
-        logging.exception("Error calling DeepSeek API")
+    log_ai_message(
+        direction="received",
+        role="assistant",
+        content=completion.content,
+        metadata={
+            "model": body.get("model"),
+            "status_code": response.status_code,
+            "response_id": completion.response_id,
+            "usage": completion.usage,
+            "cached_tokens": prefix_cache_stats.record(completion.usage),
+            "prefix_fingerprint": static_prompt.fingerprint,
+            "streamed": True,
+            "first_token_seconds": completion.first_token_seconds,
+            "elapsed_seconds": round(completion.elapsed_seconds, 3),
+        }
+    )
+    logging.info(
+        "Streamed LLM response: first token after %s, complete after %.2fs; %d decision(s) dispatched early.",
+        f"{completion.first_token_seconds:.2f}s" if completion.first_token_seconds is not None else "n/a",
+        completion.elapsed_seconds,
+        len(dispatched),
+    )
+
+    # 流式解析器只用于提前分发；完整文本由同一解析/修复/校验流程最终裁定
+    parsed = _decode_decisions(completion.content, completion.response_id, response.status_code)
+    if not parsed.ok:
+        call.outcome = "decode-fail"
+    diverged = sorted(
+        coin for coin, record in dispatched.items()
+        if coin not in parsed.records or parsed.records[coin].as_dict() != record.as_dict()
+    )
+    if diverged or parser.superseded:
         notify_error(
-            f"Error calling DeepSeek API: {e}",
-            metadata={"context": "call_deepseek_api"},
-            log_error=False,
+            "Streamed decisions differ from the final response parse",
+            metadata={
+                "response_id": completion.response_id,
+                "executed_early": sorted(dispatched),
+                "diverged": diverged,
+                "superseded": parser.superseded,
+            },
         )
+    if not parsed.records:
         return None
+    if cache_key is not None and parsed.ok:
+        llm_response_cache.put(
+            cache_key,
+            CachedResponse(
+                content=completion.content,
+                response_id=completion.response_id,
+                model=completion.model,
+                usage=completion.usage,
+            ),
+        )
+    return parsed.records
+
+
+def request_trading_decisions(prompt: str) -> Optional[DecisionMap]:
+    """Ask the LLM for decisions and execute them, streamed coins first."""
+    dispatched: Set[str] = set()
+
+    def dispatch(coin: str, decision: DecisionRecord) -> None:
+        dispatched.add(coin)
+        process_ai_decisions({coin: decision})
+
+    decisions = call_deepseek_api(prompt, on_decision=dispatch)
+    if decisions:
+        remaining = {coin: value for coin, value in decisions.items() if coin not in dispatched}
+        if remaining:
+            process_ai_decisions(remaining)
+    return decisions
+
 
 # ───────────────────── POSITION MANAGEMENT ──────────────────
 
@@ -1496,7 +2914,7 @@ def calculate_sortino_ratio(
         return None
     return float(sortino)
 
-def execute_entry(coin: str, decision: Dict[str, Any], current_price: float) -> None:
+def execute_entry(coin: str, decision: DecisionRecord, current_price: float) -> None:
     """Execute entry trade."""
     global balance
     
@@ -1504,8 +2922,8 @@ def execute_entry(coin: str, decision: Dict[str, Any], current_price: float) ->
         logging.warning(f"{coin}: Already have position, skipping entry")
         return
     
-    side = str(decision.get('side', 'long')).lower()
-    raw_reason = str(decision.get('justification', '')).strip()
+    side = decision.side or 'long'
+    raw_reason = decision.justification
     reason_text_compact = " ".join(raw_reason.split()) if raw_reason else ""
     if reason_text_compact:
         contradictory_phrases = (
@@ -1525,27 +2943,14 @@ def execute_entry(coin: str, decision: Dict[str, Any], current_price: float) ->
             )
             return
 
-    leverage_raw = decision.get('leverage', 10)
-    try:
-        leverage = float(leverage_raw)
-        if leverage <= 0:
-            leverage = 1.0
-    except (TypeError, ValueError):
-        logging.warning(f"{coin}: Invalid leverage '%s'; defaulting to 1x", leverage_raw)
-        leverage = 1.0
+    leverage = decision.leverage
     leverage_display = format_leverage_display(leverage)
 
-    risk_usd_raw = decision.get('risk_usd', balance * 0.01)
-    try:
-        risk_usd = float(risk_usd_raw)
-    except (TypeError, ValueError):
-        logging.warning(f"{coin}: Invalid risk_usd '%s'; defaulting to 1%% of balance.", risk_usd_raw)
-        risk_usd = balance * 0.01
+    risk_usd = decision.risk_usd if decision.risk_usd is not None else balance * 0.01
 
-    try:
-        stop_loss_price = float(decision['stop_loss'])
-        profit_target_price = float(decision['profit_target'])
-    except (KeyError, TypeError, ValueError):
+    stop_loss_price = decision.stop_loss
+    profit_target_price = decision.profit_target
+    if stop_loss_price is None or profit_target_price is None:
         logging.warning(f"{coin}: Invalid stop loss or profit target in decision; skipping entry.")
         return
     if stop_loss_price <= 0 or profit_target_price <= 0:
@@ -1602,14 +3007,8 @@ def execute_entry(coin: str, decision: Dict[str, Any], current_price: float) ->
     position_value = quantity * current_price
     margin_required = position_value / leverage if leverage else position_value
     
-    liquidity = str(decision.get('liquidity', 'taker')).lower()
-    fee_rate = decision.get('fee_rate')
-    if fee_rate is not None:
-        try:
-            fee_rate = float(fee_rate)
-        except (TypeError, ValueError):
-            logging.warning(f"{coin}: Invalid fee_rate provided ({fee_rate}); defaulting to Binance schedule.")
-            fee_rate = None
+    liquidity = decision.liquidity
+    fee_rate = decision.fee_rate
     if fee_rate is None:
         fee_rate = MAKER_FEE_RATE if liquidity == 'maker' else TAKER_FEE_RATE
     entry_fee = position_value * fee_rate
@@ -1659,17 +3058,17 @@ def execute_entry(coin: str, decision: Dict[str, Any], current_price: float) ->
         'profit_target': profit_target_price,
         'stop_loss': stop_loss_price,
         'leverage': leverage,
-        'confidence': decision.get('confidence', 0),
-        'invalidation_condition': decision.get('invalidation_condition', ''),
+        'confidence': decision.confidence,
+        'invalidation_condition': decision.invalidation_condition,
         'margin': margin_required,
         'fees_paid': entry_fee,
         'fee_rate': fee_rate,
         'liquidity': liquidity,
         'risk_usd': risk_usd,
-        'wait_for_fill': decision.get('wait_for_fill', False),
-        'entry_oid': decision.get('entry_oid', -1),
-        'tp_oid': decision.get('tp_oid', -1),
-        'sl_oid': decision.get('sl_oid', -1),
+        'wait_for_fill': decision.wait_for_fill,
+        'entry_oid': decision.entry_oid,
+        'tp_oid': decision.tp_oid,
+        'sl_oid': decision.sl_oid,
         'entry_justification': raw_reason,
         'last_justification': raw_reason,
     }
@@ -1680,6 +3079,7 @@ def execute_entry(coin: str, decision: Dict[str, Any], current_price: float) ->
         positions[coin]['live_trading'] = True
     
     balance -= total_cost
+    _record_state("open", coin=coin, position=positions[coin], balance=balance)
     
     entry_price = current_price
     target_price = profit_target_price
@@ -1752,7 +3152,7 @@ def execute_entry(coin: str, decision: Dict[str, Any], current_price: float) ->
             line = f"  ├─ Hyperliquid TP OID: {tp_oid}"
             print(line)
             record_iteration_message(line)
-    line = f"  ├─ Confidence: {decision.get('confidence', 0)*100:.0f}%"
+    line = f"  ├─ Confidence: {decision.confidence*100:.0f}%"
     print(line)
     record_iteration_message(line)
     line = f"  ├─ Reward/Risk: {rr_display}"
@@ -1766,16 +3166,16 @@ def execute_entry(coin: str, decision: Dict[str, Any], current_price: float) ->
         'side': side,
         'quantity': quantity,
         'price': current_price,
-        'profit_target': decision['profit_target'],
-        'stop_loss': decision['stop_loss'],
+        'profit_target': profit_target_price,
+        'stop_loss': stop_loss_price,
         'leverage': leverage,
-        'confidence': decision.get('confidence', 0),
+        'confidence': decision.confidence,
         'pnl': 0,
         'reason': f"{reason_text or 'AI entry signal'} | Fees: ${entry_fee:.2f}"
     })
     save_state()
 
-def execute_close(coin: str, decision: Dict[str, Any], current_price: float) -> None:
+def execute_close(coin: str, decision: DecisionRecord, current_price: float) -> None:
     """Execute close trade."""
     global balance
     
@@ -1784,7 +3184,7 @@ def execute_close(coin: str, decision: Dict[str, Any], current_price: float) ->
         return
     
     pos = positions[coin]
-    raw_reason = str(decision.get('justification', '')).strip()
+    raw_reason = decision.justification
     reason_text = raw_reason or pos.get('last_justification') or "AI close signal"
     reason_text = " ".join(reason_text.split())
     
@@ -1866,23 +3266,24 @@ def execute_close(coin: str, decision: Dict[str, Any], current_price: float) ->
     })
     
     del positions[coin]
+    _record_state("close", coin=coin, balance=balance)
     save_state()
 
 
-def process_ai_decisions(decisions: Dict[str, Any]) -> None:
+def process_ai_decisions(decisions: Mapping[str, Union[DecisionRecord, Mapping[str, Any]]]) -> None:
     """Handle AI decisions for each tracked coin."""
     for coin in SYMBOL_TO_COIN.values():
         if coin not in decisions:
             continue
 
-        decision = decisions[coin]
-        signal = decision.get("signal", "hold")
+        decision = normalize_decision(coin, decisions[coin])
+        signal = decision.signal
 
         log_ai_decision(
             coin,
             signal,
-            decision.get("justification", ""),
-            decision.get("confidence", 0),
+            decision.justification,
+            decision.confidence,
         )
 
         symbol = COIN_TO_SYMBOL.get(coin)
@@ -1904,7 +3305,7 @@ def process_ai_decisions(decisions: Dict[str, Any]) -> None:
             if coin not in positions:
                 continue
             pos = positions[coin]
-            raw_reason = str(decision.get("justification", "")).strip()
+            raw_reason = decision.justification
             if raw_reason:
                 reason_text = " ".join(raw_reason.split())
                 pos["last_justification"] = reason_text
@@ -2047,7 +3448,7 @@ def check_stop_loss_take_profit() -> None:
                 exit_price = pos["profit_target"]
 
         if exit_reason:
-            execute_close(coin, {"justification": exit_reason}, exit_price)
+            execute_close(coin, DecisionRecord(coin=coin, signal="close", justification=exit_reason), exit_price)
 
 # ─────────────────────────── MAIN ──────────────────────────
 
@@ -2088,11 +3489,24 @@ def main() -> None:
         logging.info("Telegram notifications disabled; missing TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID.")
     log_system_prompt_info("System prompt selected")
     logging.info("LLM model configured: %s", LLM_MODEL_NAME)
+    start_market_stream()
+    scheduler = create_bar_scheduler() if SCHEDULE_MODE == "aligned" else None
+    if scheduler is not None:
+        logging.info(
+            "Scheduling iterations %.0fms after each %s candle close.",
+            SCHEDULE_OFFSET_SECONDS * 1000,
+            INTERVAL,
+        )
     
     while True:
         try:
+            tick = scheduler.wait_for_next() if scheduler is not None else None
+            if tick is not None:
+                log_schedule_tick(tick)
             iteration_counter += 1
             current_iteration_messages = []
+            begin_market_snapshot()
+            prefetch_market_data()
 
             if not get_binance_client():
                 retry_delay = min(CHECK_INTERVAL, 60)
@@ -2120,12 +3534,10 @@ def main() -> None:
             # Get AI decisions
             logging.info("Requesting trading decisions from DeepSeek...")
             prompt = format_prompt_for_deepseek()
-            decisions = call_deepseek_api(prompt)
+            decisions = request_trading_decisions(prompt)
             
             if not decisions:
                 logging.warning("No decisions received from AI")
-            else:
-                process_ai_decisions(decisions)
             
             # Display portfolio summary
             total_equity = calculate_total_equity()
@@ -2173,6 +3585,7 @@ def main() -> None:
             line = f"Open Positions: {len(positions)}"
             print(line)
             record_iteration_message(line)
+            log_llm_telemetry_summary()
             line = f"{Fore.YELLOW}{'─'*20}\n"
             print(line)
             record_iteration_message(line)
@@ -2182,20 +3595,39 @@ def main() -> None:
             
             # Log state
             log_portfolio_state()
+            # 每轮结束时先把排队中的日志行写完，再记录本轮状态，保证 CSV 与状态一致
+            journal.flush()
             save_state()
+            derivatives_cache.save()
+            log_market_snapshot_stats()
+            log_http_transport_stats()
+            log_llm_cache_stats()
+            log_prefix_cache_stats()
+            log_journal_stats()
             
             # Wait for next check
-            logging.info(f"Waiting {CHECK_INTERVAL} seconds until next check...")
-            time.sleep(CHECK_INTERVAL)
+            if scheduler is not None and tick is not None:
+                log_cycle_report(scheduler.complete(tick), scheduler)
+            else:
+                logging.info(f"Waiting {CHECK_INTERVAL} seconds until next check...")
+                time.sleep(CHECK_INTERVAL)
             
         except KeyboardInterrupt:
             print("\n\nShutting down bot...")
+            journal.flush()
             save_state()
+            _compact_state()
+            state_store.close()
+            derivatives_cache.save()
+            stop_market_stream()
+            journal.close()
             break
         except Exception as e:
             logging.error(f"Error in main loop: {e}", exc_info=True)
+            journal.flush()
             save_state()
-            time.sleep(60)
+            if scheduler is None:
+                time.sleep(60)
 
 if __name__ == "__main__":
     main()
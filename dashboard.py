@@ -5,6 +5,8 @@ from __future__ import annotations
 import logging
 import os
 import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List
 
@@ -15,6 +17,8 @@ import streamlit as st
 from binance.client import Client
 from dotenv import load_dotenv
 from adapters.app_context import build_context
+from runtime.blob_store import MESSAGE_BLOB_DIRNAME, BlobStore, blob_digest
+from runtime.journal import read_journal
 from ui.dashboard_sections import section_market, section_positions, section_trades, section_stats_from_state, section_trade_stats
 
 logging.basicConfig(level=logging.INFO)
@@ -28,6 +32,18 @@ STATE_CSV = DATA_DIR / "portfolio_state.csv"
 TRADES_CSV = DATA_DIR / "trade_history.csv"
 DECISIONS_CSV = DATA_DIR / "ai_decisions.csv"
 MESSAGES_CSV = DATA_DIR / "ai_messages.csv"
+LLM_CALLS_CSV = DATA_DIR / "llm_calls.csv"
+MESSAGE_BLOBS = BlobStore(DATA_DIR / MESSAGE_BLOB_DIRNAME)
+# 侧边栏可选的历史窗口；日志只按所选窗口读取（Parquet 后端只读对应日期分区）
+HISTORY_WINDOWS: Dict[str, timedelta | None] = {
+    "Last 24 hours": timedelta(days=1),
+    "Last 7 days": timedelta(days=7),
+    "Last 30 days": timedelta(days=30),
+    "All history": None,
+}
+# 默认读取全部历史，头部指标与引入窗口前一致；较短窗口需在侧边栏中主动选择
+DEFAULT_HISTORY_WINDOW = "All history"
+LLM_TELEMETRY_WINDOW = 200
 ENV_PATH = BASE_DIR / ".env"
 DEFAULT_RISK_FREE_RATE = 0.0
 DEFAULT_SNAPSHOT_SECONDS = 180.0
@@ -88,9 +104,24 @@ def load_csv(path: Path, parse_dates: List[str] | None = None) -> pd.DataFrame:
         return pd.read_csv(path, parse_dates=parse_dates, encoding='gbk')
 
 
+def window_start(window: str) -> datetime | None:
+    """Start of the selected history window (None for all history)."""
+    span = HISTORY_WINDOWS.get(window)
+    return None if span is None else datetime.now(timezone.utc) - span
+
+
+def load_journal(path: Path, window: str, columns: List[str] | None = None) -> pd.DataFrame:
+    """Load a bot journal (CSV or Parquet backend) restricted to the history window."""
+    try:
+        return read_journal(path.parent, path.stem, start=window_start(window), columns=columns)
+    except Exception as exc:
+        logging.warning("Unable to load %s: %s", path.stem, exc)
+        return pd.DataFrame()
+
+
 @st.cache_data(ttl=15)
-def get_portfolio_state() -> pd.DataFrame:
-    df = load_csv(STATE_CSV, parse_dates=["timestamp"])
+def get_portfolio_state(window: str = DEFAULT_HISTORY_WINDOW) -> pd.DataFrame:
+    df = load_journal(STATE_CSV, window)
     if df.empty:
         return df
 
@@ -111,8 +142,8 @@ def get_portfolio_state() -> pd.DataFrame:
 
 
 @st.cache_data(ttl=15)
-def get_trades() -> pd.DataFrame:
-    df = load_csv(TRADES_CSV, parse_dates=["timestamp"])
+def get_trades(window: str = DEFAULT_HISTORY_WINDOW) -> pd.DataFrame:
+    df = load_journal(TRADES_CSV, window)
     if df.empty:
         return df
     df.sort_values("timestamp", inplace=True, ascending=False)
@@ -133,8 +164,8 @@ def get_trades() -> pd.DataFrame:
 
 
 @st.cache_data(ttl=15)
-def get_ai_decisions() -> pd.DataFrame:
-    df = load_csv(DECISIONS_CSV, parse_dates=["timestamp"])
+def get_ai_decisions(window: str = DEFAULT_HISTORY_WINDOW) -> pd.DataFrame:
+    df = load_journal(DECISIONS_CSV, window)
     if df.empty:
         return df
     df.sort_values("timestamp", inplace=True, ascending=False)
@@ -142,34 +173,92 @@ def get_ai_decisions() -> pd.DataFrame:
 
 
 @st.cache_data(ttl=15)
-def get_ai_messages() -> pd.DataFrame:
-    df = load_csv(MESSAGES_CSV, parse_dates=["timestamp"])
+def get_ai_messages(window: str = DEFAULT_HISTORY_WINDOW) -> pd.DataFrame:
+    df = load_journal(MESSAGES_CSV, window)
     if df.empty:
         return df
     df.sort_values("timestamp", inplace=True, ascending=False)
     return df
 
 
+@st.cache_data(ttl=15)
+def get_llm_calls() -> pd.DataFrame:
+    df = load_csv(LLM_CALLS_CSV, parse_dates=["timestamp"])
+    if df.empty:
+        return df
+    numeric_cols = [
+        "latency_seconds",
+        "first_token_seconds",
+        "prompt_tokens",
+        "completion_tokens",
+        "cached_tokens",
+        "cost_usd",
+    ]
+    for col in numeric_cols:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    df.sort_values("timestamp", inplace=True)
+    return df
+
+
+def summarize_llm_calls(calls_df: pd.DataFrame, window: int = LLM_TELEMETRY_WINDOW) -> pd.DataFrame:
+    """Rolling p50/p95/p99 of latency and time-to-first-token per model."""
+    recent = calls_df.tail(window)
+    live = recent[~recent["outcome"].isin(["cached", "cancelled"])]
+    rows = []
+    for model, group in live.groupby("model"):
+        row: Dict[str, float | str | int] = {"model": model, "calls": len(group)}
+        for column, label in (("latency_seconds", "latency"), ("first_token_seconds", "ttft")):
+            values = group[column].dropna()
+            for q in (50, 95, 99):
+                row[f"{label}_p{q}"] = float(values.quantile(q / 100)) if not values.empty else np.nan
+        row["error_pct"] = float((group["outcome"] != "ok").mean() * 100)
+        row["cost_usd"] = float(group["cost_usd"].sum())
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+BTC_SNAPSHOT_PRICE_RE = re.compile(r"BTC MARKET SNAPSHOT.*?- Price:\s*([0-9.,]+)", re.DOTALL)
+
+
+def _extract_btc_price(text: str) -> float | None:
+    matches = BTC_SNAPSHOT_PRICE_RE.findall(str(text))
+    if not matches:
+        return None
+    raw_value = matches[-1].replace(",", "")
+    try:
+        return float(raw_value)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=8192)
+def _btc_price_for_blob(digest: str) -> float | None:
+    # blob 内容不可变，每个摘要只需解压解析一次
+    text = MESSAGE_BLOBS.get(digest)
+    return None if text is None else _extract_btc_price(text)
+
+
+def _message_btc_price(content: object) -> float | None:
+    digest = blob_digest(content)
+    if digest is not None:
+        return _btc_price_for_blob(digest)
+    return _extract_btc_price(str(content))
+
+
+def resolve_message_content(content: object) -> str:
+    """Full text of a logged AI message, loading `blob:` references on demand."""
+    return str(MESSAGE_BLOBS.resolve(content))
+
+
 @st.cache_data(ttl=60)
-def get_local_btc_price_series() -> pd.DataFrame:
+def get_local_btc_price_series(window: str = DEFAULT_HISTORY_WINDOW) -> pd.DataFrame:
     """Extract BTC prices from logged AI messages (no external calls)."""
-    messages_df = load_csv(MESSAGES_CSV, parse_dates=["timestamp"])
+    messages_df = load_journal(MESSAGES_CSV, window, columns=["timestamp", "content"])
     if messages_df.empty or "content" not in messages_df.columns:
         return pd.DataFrame()
 
-    pattern = re.compile(r"BTC MARKET SNAPSHOT.*?- Price:\s*([0-9.,]+)", re.DOTALL)
-
-    def _extract_price(text: str) -> float | None:
-        matches = pattern.findall(str(text))
-        if not matches:
-            return None
-        raw_value = matches[-1].replace(",", "")
-        try:
-            return float(raw_value)
-        except ValueError:
-            return None
-
-    messages_df["btc_price"] = messages_df["content"].apply(_extract_price)
+    messages_df["btc_price"] = messages_df["content"].apply(_message_btc_price)
     price_df = (
         messages_df.dropna(subset=["btc_price"])[["timestamp", "btc_price"]]
         .drop_duplicates(subset=["timestamp"])
@@ -309,7 +398,7 @@ def compute_sortino_ratio(state_df: pd.DataFrame, risk_free_rate: float) -> floa
     return float(sortino) if np.isfinite(sortino) else None
 
 
-def render_portfolio_tab(state_df: pd.DataFrame, trades_df: pd.DataFrame) -> None:
+def render_portfolio_tab(state_df: pd.DataFrame, trades_df: pd.DataFrame, window: str = DEFAULT_HISTORY_WINDOW) -> None:
     if state_df.empty:
         st.info("No portfolio data logged yet.")
         return
@@ -352,6 +441,8 @@ def render_portfolio_tab(state_df: pd.DataFrame, trades_df: pd.DataFrame) -> Non
 
     sharpe_ratio = compute_sharpe_ratio(trades_df)
     sortino_ratio = compute_sortino_ratio(state_df, RISK_FREE_RATE)
+    # 选择较短窗口时，按窗口内数据计算的指标在标签中注明窗口
+    scope = "" if HISTORY_WINDOWS.get(window) is None else f" ({window.lower()})"
 
     col_a, col_b, col_c, col_d, col_e, col_f, col_g, col_h = st.columns(8)
     col_a.metric("Available Balance", f"${latest['total_balance']:.2f}")
@@ -363,17 +454,23 @@ def render_portfolio_tab(state_df: pd.DataFrame, trades_df: pd.DataFrame) -> Non
         f"${unrealized_pnl:.2f}",
         delta=f"${unrealized_pnl - prev_unrealized:.2f}",
     )
-    col_f.metric("Realized PnL", f"${realized_pnl:.2f}")
+    col_f.metric(f"Realized PnL{scope}", f"${realized_pnl:.2f}")
     col_g.metric(
-        "Sharpe Ratio",
+        f"Sharpe Ratio{scope}",
         f"{sharpe_ratio:.2f}" if sharpe_ratio is not None else "N/A",
     )
     col_h.metric(
-        "Sortino Ratio",
+        f"Sortino Ratio{scope}",
         f"{sortino_ratio:.2f}" if sortino_ratio is not None else "N/A",
     )
 
-    st.subheader("Equity Over Time (with BTC benchmark)")
+    if scope:
+        st.caption(
+            f"Realized PnL, Sharpe and Sortino cover {window.lower()} only; "
+            "select All history for all-time figures."
+        )
+
+    st.subheader(f"Equity Over Time (with BTC benchmark){scope}")
     base_investment = 10_000.0
 
     chart_frames = [
@@ -386,7 +483,7 @@ def render_portfolio_tab(state_df: pd.DataFrame, trades_df: pd.DataFrame) -> Non
         )
     ]
 
-    btc_series = get_local_btc_price_series()
+    btc_series = get_local_btc_price_series(window)
     btc_caption = None
     if not btc_series.empty and len(state_df.index) > 0:
         timeline = (
@@ -542,7 +639,47 @@ def render_trades_tab(trades_df: pd.DataFrame) -> None:
     )
 
 
-def render_ai_tab(decisions_df: pd.DataFrame, messages_df: pd.DataFrame) -> None:
+def render_llm_telemetry(calls_df: pd.DataFrame) -> None:
+    st.subheader("LLM Call Latency")
+    if calls_df.empty:
+        st.write("No LLM calls recorded yet.")
+        return
+
+    summary_df = summarize_llm_calls(calls_df)
+    if not summary_df.empty:
+        st.caption(f"Rolling percentiles over the last {LLM_TELEMETRY_WINDOW} calls (local cache hits excluded).")
+        st.dataframe(
+            summary_df,
+            column_config={
+                **{
+                    f"{label}_p{q}": st.column_config.NumberColumn(format="%.2fs")
+                    for label in ("latency", "ttft")
+                    for q in (50, 95, 99)
+                },
+                "error_pct": st.column_config.NumberColumn(format="%.1f%%"),
+                "cost_usd": st.column_config.NumberColumn(format="$%.4f"),
+            },
+            use_container_width=True,
+        )
+
+    chart = (
+        alt.Chart(calls_df.tail(LLM_TELEMETRY_WINDOW))
+        .mark_circle(size=40)
+        .encode(
+            x=alt.X("timestamp:T", title="Time"),
+            y=alt.Y("latency_seconds:Q", title="Latency (s)"),
+            color=alt.Color("outcome:N", title="Outcome"),
+            tooltip=["timestamp:T", "model:N", "outcome:N", "latency_seconds:Q", "first_token_seconds:Q",
+                     "prompt_tokens:Q", "cached_tokens:Q", "completion_tokens:Q"],
+        )
+        .properties(height=260)
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+
+def render_ai_tab(decisions_df: pd.DataFrame, messages_df: pd.DataFrame, calls_df: pd.DataFrame) -> None:
+    render_llm_telemetry(calls_df)
+
     col1, col2 = st.columns(2)
 
     with col1:
@@ -564,13 +701,23 @@ def render_ai_tab(decisions_df: pd.DataFrame, messages_df: pd.DataFrame) -> None
         if messages_df.empty:
             st.write("No messages logged yet.")
         else:
+            recent = messages_df.head(50)
             st.dataframe(
-                messages_df.head(50),
+                recent,
                 column_config={
                     "timestamp": st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm:ss"),
                 },
                 use_container_width=True,
             )
+            selected = st.selectbox(
+                "Show full message",
+                options=list(recent.index),
+                format_func=lambda idx: (
+                    f"{recent.at[idx, 'timestamp']} · {recent.at[idx, 'direction']} · {recent.at[idx, 'role']}"
+                ),
+            )
+            if selected is not None:
+                st.code(resolve_message_content(recent.at[selected, "content"]), language=None)
 
 
 def main() -> None:
@@ -585,10 +732,17 @@ def main() -> None:
         st.cache_data.clear()
         st.rerun()
 
-    state_df = get_portfolio_state()
-    trades_df = get_trades()
-    decisions_df = get_ai_decisions()
-    messages_df = get_ai_messages()
+    window = st.sidebar.selectbox(
+        "History window",
+        options=list(HISTORY_WINDOWS),
+        index=list(HISTORY_WINDOWS).index(DEFAULT_HISTORY_WINDOW),
+    )
+
+    state_df = get_portfolio_state(window)
+    trades_df = get_trades(window)
+    decisions_df = get_ai_decisions(window)
+    messages_df = get_ai_messages(window)
+    llm_calls_df = get_llm_calls()
 
     # 新分区：基于统一上下文的行情/持仓/成交展示（A股/加密可切换）
     market_tab, portfolio_tab, trades_tab, stats_tab, ai_tab = st.tabs(["Market", "Portfolio", "Trades", "Stats", "AI Activity"])
@@ -610,7 +764,7 @@ def main() -> None:
         section_trades(ctx.portfolio)
 
     with portfolio_tab:
-        render_portfolio_tab(state_df, trades_df)
+        render_portfolio_tab(state_df, trades_df, window)
 
     with trades_tab:
         render_trades_tab(trades_df)
@@ -621,7 +775,7 @@ def main() -> None:
         section_trade_stats(trades_df)
 
     with ai_tab:
-        render_ai_tab(decisions_df, messages_df)
+        render_ai_tab(decisions_df, messages_df, llm_calls_df)
 
 
 if __name__ == "__main__":
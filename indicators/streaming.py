@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+NAN = float("nan")
+
+
+@dataclass(frozen=True)
+class IndicatorSpec:
+    """一组指标参数；列名与 bot.add_indicator_columns / calculate_atr_series 保持一致。"""
+
+    ema_lengths: Tuple[int, ...] = (20,)
+    rsi_periods: Tuple[int, ...] = (14,)
+    macd_params: Tuple[int, int, int] = (12, 26, 9)
+    atr_periods: Tuple[int, ...] = ()
+
+    def columns(self) -> Tuple[str, ...]:
+        names = [f"ema{span}" for span in self.ema_lengths]
+        names += [f"rsi{period}" for period in self.rsi_periods]
+        names += ["macd", "macd_signal"]
+        names += [f"atr{period}" for period in self.atr_periods]
+        return tuple(names)
+
+
+class EmaState:
+    """递推 EMA，等价于 pandas ewm(adjust=False)：首值取第一根输入。"""
+
+    __slots__ = ("alpha", "value")
+
+    def __init__(self, span: Optional[int] = None, alpha: Optional[float] = None) -> None:
+        if alpha is None:
+            if span is None or span <= 0:
+                raise ValueError("EMA needs a positive span or an alpha")
+            alpha = 2.0 / (span + 1.0)
+        self.alpha = float(alpha)
+        self.value: Optional[float] = None
+
+    def peek(self, x: float) -> float:
+        if self.value is None:
+            return float(x)
+        return self.alpha * float(x) + (1.0 - self.alpha) * self.value
+
+    def update(self, x: float) -> float:
+        self.value = self.peek(x)
+        return self.value
+
+
+class RsiState:
+    """Wilder RSI（alpha = 1/period），首根 K 线的涨跌记为 0，与 calculate_rsi_series 一致。"""
+
+    __slots__ = ("avg_gain", "avg_loss", "prev_close")
+
+    def __init__(self, period: int) -> None:
+        if period <= 0:
+            raise ValueError("RSI period must be positive")
+        self.avg_gain = EmaState(alpha=1.0 / period)
+        self.avg_loss = EmaState(alpha=1.0 / period)
+        self.prev_close: Optional[float] = None
+
+    def _components(self, close: float) -> Tuple[float, float]:
+        if self.prev_close is None:
+            return 0.0, 0.0
+        delta = float(close) - self.prev_close
+        return max(delta, 0.0), max(-delta, 0.0)
+
+    @staticmethod
+    def _rsi(avg_gain: float, avg_loss: float) -> float:
+        if avg_loss == 0:
+            return NAN
+        return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+    def peek(self, close: float) -> float:
+        gain, loss = self._components(close)
+        return self._rsi(self.avg_gain.peek(gain), self.avg_loss.peek(loss))
+
+    def update(self, close: float) -> float:
+        gain, loss = self._components(close)
+        value = self._rsi(self.avg_gain.update(gain), self.avg_loss.update(loss))
+        self.prev_close = float(close)
+        return value
+
+
+class MacdState:
+    """MACD 线与信号线。"""
+
+    __slots__ = ("fast", "slow", "signal")
+
+    def __init__(self, fast: int, slow: int, signal: int) -> None:
+        self.fast = EmaState(span=fast)
+        self.slow = EmaState(span=slow)
+        self.signal = EmaState(span=signal)
+
+    def peek(self, close: float) -> Tuple[float, float]:
+        macd = self.fast.peek(close) - self.slow.peek(close)
+        return macd, self.signal.peek(macd)
+
+    def update(self, close: float) -> Tuple[float, float]:
+        macd = self.fast.update(close) - self.slow.update(close)
+        return macd, self.signal.update(macd)
+
+
+class AtrState:
+    """ATR（真实波幅的 Wilder 平滑），首根 K 线真实波幅为 high - low。"""
+
+    __slots__ = ("average", "prev_close")
+
+    def __init__(self, period: int) -> None:
+        if period <= 0:
+            raise ValueError("ATR period must be positive")
+        self.average = EmaState(alpha=1.0 / period)
+        self.prev_close: Optional[float] = None
+
+    def _true_range(self, high: float, low: float) -> float:
+        high = float(high)
+        low = float(low)
+        if self.prev_close is None:
+            return high - low
+        return max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+
+    def peek(self, high: float, low: float) -> float:
+        return self.average.peek(self._true_range(high, low))
+
+    def update(self, high: float, low: float, close: float) -> float:
+        value = self.average.update(self._true_range(high, low))
+        self.prev_close = float(close)
+        return value
+
+
+class IndicatorEngine:
+    """
+    增量指标引擎：每根已收盘 K 线 O(1) 更新递推状态，未收盘 K 线仅 peek 不落状态。
+
+    history 保存最近若干根已收盘 K 线的指标值，用于输出 prompt 所需的尾部序列。
+    """
+
+    def __init__(self, spec: IndicatorSpec, history: int = 10) -> None:
+        self.spec = spec
+        self.history_size = max(1, history)
+        self._reset()
+
+    def _reset(self) -> None:
+        spec = self.spec
+        self._emas = {span: EmaState(span=span) for span in spec.ema_lengths}
+        self._rsis = {period: RsiState(period) for period in spec.rsi_periods}
+        self._macd = MacdState(*spec.macd_params)
+        self._atrs = {period: AtrState(period) for period in spec.atr_periods}
+        self._history: Deque[Dict[str, float]] = deque(maxlen=self.history_size)
+        self.last_open_time: Optional[int] = None
+        self.bars_processed = 0
+
+    def update(self, high: float, low: float, close: float, open_time: Optional[int] = None) -> Dict[str, float]:
+        """Commit one closed bar and return its indicator values."""
+        values: Dict[str, float] = {}
+        for span, ema in self._emas.items():
+            values[f"ema{span}"] = ema.update(close)
+        for period, rsi in self._rsis.items():
+            values[f"rsi{period}"] = rsi.update(close)
+        values["macd"], values["macd_signal"] = self._macd.update(close)
+        for period, atr in self._atrs.items():
+            values[f"atr{period}"] = atr.update(high, low, close)
+        self._history.append(values)
+        if open_time is not None:
+            self.last_open_time = int(open_time)
+        self.bars_processed += 1
+        return values
+
+    def peek(self, high: float, low: float, close: float) -> Dict[str, float]:
+        """Indicator values for a still-forming bar, without changing state."""
+        values: Dict[str, float] = {}
+        for span, ema in self._emas.items():
+            values[f"ema{span}"] = ema.peek(close)
+        for period, rsi in self._rsis.items():
+            values[f"rsi{period}"] = rsi.peek(close)
+        values["macd"], values["macd_signal"] = self._macd.peek(close)
+        for period, atr in self._atrs.items():
+            values[f"atr{period}"] = atr.peek(high, low)
+        return values
+
+    def _start_index(self, open_times: Sequence[int]) -> int:
+        if self.last_open_time is None:
+            return 0
+        idx = int(np.searchsorted(open_times, self.last_open_time, side="left"))
+        if idx < len(open_times) and int(open_times[idx]) == self.last_open_time and idx < len(open_times) - 1:
+            return idx + 1
+        # 窗口内找不到已处理的最后一根（缺口过大或时间回退），从窗口起点重放
+        self._reset()
+        return 0
+
+    def sync(
+        self,
+        open_times: Sequence[int],
+        highs: Sequence[float],
+        lows: Sequence[float],
+        closes: Sequence[float],
+        tail: int = 1,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Bring the engine up to date with a kline window (oldest → newest).
+
+        All bars except the last are treated as closed and committed once; the last
+        bar is previewed. Returns the newest `tail` values per indicator column.
+        """
+        n = len(open_times)
+        if n == 0:
+            return {name: np.array([], dtype=float) for name in self.spec.columns()}
+
+        open_times = np.asarray(open_times, dtype=np.int64)
+        start = self._start_index(open_times)
+        for i in range(start, n - 1):
+            self.update(highs[i], lows[i], closes[i], open_time=int(open_times[i]))
+
+        rows = list(self._history)[-(tail - 1):] if tail > 1 else []
+        rows.append(self.peek(highs[-1], lows[-1], closes[-1]))
+        return {name: np.array([row[name] for row in rows], dtype=float) for name in self.spec.columns()}
+
+
+class IndicatorEngineStore:
+    """按 (symbol, interval, spec) 复用的引擎集合（线程安全）。"""
+
+    def __init__(self, history: int = 10) -> None:
+        self.history = history
+        self._engines: Dict[Hashable, Tuple[IndicatorEngine, threading.Lock]] = {}
+        self._guard = threading.Lock()
+
+    def sync(
+        self,
+        key: Hashable,
+        spec: IndicatorSpec,
+        open_times: Sequence[int],
+        highs: Sequence[float],
+        lows: Sequence[float],
+        closes: Sequence[float],
+        tail: int = 1,
+    ) -> Dict[str, np.ndarray]:
+        with self._guard:
+            entry = self._engines.get((key, spec))
+            if entry is None:
+                entry = (IndicatorEngine(spec, history=max(self.history, tail)), threading.Lock())
+                self._engines[(key, spec)] = entry
+        engine, lock = entry
+        with lock:
+            return engine.sync(open_times, highs, lows, closes, tail=tail)
+
+    def clear(self) -> None:
+        with self._guard:
+            self._engines.clear()
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .streaming import IndicatorSpec
+
+
+# 窗口不超过该长度时用权重矩阵一次矩阵乘完成 EMA；更长的窗口按 K 线递推（对所有品种向量化）
+MATMUL_MAX_BARS = 512
+
+
+@lru_cache(maxsize=32)
+def _ema_weights(alpha: float, n: int) -> np.ndarray:
+    """
+    下三角权重矩阵 W，使 y = x @ W.T 等价于 pandas ewm(alpha, adjust=False)：
+    y[t] = (1-α)^t · x[0] + Σ_{k=1..t} α(1-α)^(t-k) · x[k]。
+    """
+    decay = 1.0 - alpha
+    lags = np.arange(n)[:, None] - np.arange(n)[None, :]
+    weights = np.where(lags >= 0, alpha * decay ** np.maximum(lags, 0), 0.0)
+    weights[:, 0] = decay ** np.arange(n)
+    weights.setflags(write=False)
+    return weights
+
+
+def ema_matrix(values: np.ndarray, alpha: float) -> np.ndarray:
+    """EMA along the bar axis (axis 1) of a (symbols × bars) matrix."""
+    values = np.asarray(values, dtype=float)
+    n = values.shape[1]
+    if n == 0:
+        return values.copy()
+    if n <= MATMUL_MAX_BARS:
+        return values @ _ema_weights(float(alpha), n).T
+
+    out = np.empty_like(values)
+    out[:, 0] = values[:, 0]
+    decay = 1.0 - alpha
+    for t in range(1, n):
+        out[:, t] = alpha * values[:, t] + decay * out[:, t - 1]
+    return out
+
+
+def rsi_matrix(closes: np.ndarray, period: int) -> np.ndarray:
+    """Wilder RSI per row; the first bar has zero gain/loss, zero average loss gives NaN."""
+    delta = np.zeros_like(closes)
+    delta[:, 1:] = np.diff(closes, axis=1)
+    alpha = 1.0 / period
+    avg_gain = ema_matrix(np.maximum(delta, 0.0), alpha)
+    avg_loss = ema_matrix(np.maximum(-delta, 0.0), alpha)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    rsi[avg_loss == 0] = np.nan
+    return rsi
+
+
+def true_range_matrix(highs: np.ndarray, lows: np.ndarray, closes: np.ndarray) -> np.ndarray:
+    """True range per row; the first bar uses high - low."""
+    true_range = highs - lows
+    prev_close = closes[:, :-1]
+    true_range[:, 1:] = np.maximum.reduce(
+        [
+            true_range[:, 1:],
+            np.abs(highs[:, 1:] - prev_close),
+            np.abs(lows[:, 1:] - prev_close),
+        ]
+    )
+    return true_range
+
+
+def stack_right_aligned(series: Sequence[Sequence[float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    将长度不一的序列右对齐堆叠为矩阵，返回 (matrix, lengths)。
+
+    左侧用各自第一根的值填充：常数前缀不改变 EMA/RSI/MACD/ATR 的递推结果
+    （EMA 保持首值、涨跌为 0、真实波幅等于首根 high - low），因此有效区间的结果
+    与单独计算完全一致。
+    """
+    lengths = np.array([len(values) for values in series], dtype=np.int64)
+    width = int(lengths.max()) if len(lengths) else 0
+    matrix = np.empty((len(series), width), dtype=float)
+    for row, values in enumerate(series):
+        values = np.asarray(values, dtype=float)
+        pad = width - len(values)
+        if len(values):
+            matrix[row, pad:] = values
+            matrix[row, :pad] = values[0]
+        else:
+            matrix[row, :] = np.nan
+    return matrix, lengths
+
+
+def compute_indicator_matrix(
+    spec: IndicatorSpec,
+    highs: np.ndarray,
+    lows: np.ndarray,
+    closes: np.ndarray,
+    lengths: Optional[np.ndarray] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Compute every indicator in `spec` for all symbols at once.
+
+    Inputs are (symbols × bars) float matrices, oldest bar first; rows shorter than
+    the matrix must be left-padded as done by `stack_right_aligned` and described by
+    `lengths`. Returns one (symbols × bars) matrix per column of `spec.columns()`,
+    NaN over the padded prefix.
+    """
+    highs = np.atleast_2d(np.asarray(highs, dtype=float))
+    lows = np.atleast_2d(np.asarray(lows, dtype=float))
+    closes = np.atleast_2d(np.asarray(closes, dtype=float))
+
+    result: Dict[str, np.ndarray] = {}
+    for span in spec.ema_lengths:
+        result[f"ema{span}"] = ema_matrix(closes, 2.0 / (span + 1.0))
+    for period in spec.rsi_periods:
+        result[f"rsi{period}"] = rsi_matrix(closes, period)
+
+    fast, slow, signal = spec.macd_params
+    macd = ema_matrix(closes, 2.0 / (fast + 1.0)) - ema_matrix(closes, 2.0 / (slow + 1.0))
+    result["macd"] = macd
+    result["macd_signal"] = ema_matrix(macd, 2.0 / (signal + 1.0))
+
+    if spec.atr_periods:
+        true_range = true_range_matrix(highs, lows, closes)
+        for period in spec.atr_periods:
+            result[f"atr{period}"] = ema_matrix(true_range, 1.0 / period)
+
+    if lengths is not None:
+        width = closes.shape[1]
+        padded = np.arange(width)[None, :] < (width - np.asarray(lengths))[:, None]
+        if padded.any():
+            for values in result.values():
+                values[padded] = np.nan
+    return result
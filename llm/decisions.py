@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import json
+import math
+import re
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple, Union
+
+from llm.streaming import DecisionStreamParser
+
+
+SIGNALS = ("hold", "entry", "close")
+SIDES = ("long", "short")
+LIQUIDITY = ("taker", "maker")
+
+_SIGNAL_ALIASES = {"open": "entry", "enter": "entry", "exit": "close", "wait": "hold", "none": "hold"}
+_FENCE = re.compile(r"```[A-Za-z0-9_-]*[ \t]*\n?(.*?)```", re.DOTALL)
+_LITERALS = {"True": "true", "False": "false", "None": "null", "NaN": "null", "Infinity": "null"}
+_MEMBER_KEY = re.compile(r'\s*"([^"]+)"\s*:')
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class DecisionRecord:
+    coin: str
+    signal: str = "hold"
+    side: Optional[str] = None
+    quantity: Optional[float] = None
+    profit_target: Optional[float] = None
+    stop_loss: Optional[float] = None
+    leverage: float = 10.0
+    confidence: float = 0.0
+    risk_usd: Optional[float] = None
+    invalidation_condition: str = ""
+    justification: str = ""
+    liquidity: str = "taker"
+    fee_rate: Optional[float] = None
+    wait_for_fill: bool = False
+    entry_oid: int = -1
+    tp_oid: int = -1
+    sl_oid: int = -1
+    # 校验时发现但已按默认值处理的问题，供日志输出
+    issues: Tuple[str, ...] = ()
+
+    def as_dict(self) -> Dict[str, Any]:
+        """The decision in the model's JSON shape (unset optional fields omitted)."""
+        data = asdict(self)
+        data.pop("coin")
+        data.pop("issues")
+        return {key: value for key, value in data.items() if value is not None}
+
+
+def _number(value: Any) -> float:
+    if isinstance(value, bool):
+        raise ValueError(f"expected a number, got {value!r}")
+    if isinstance(value, (int, float)):
+        number = float(value)
+    elif isinstance(value, str):
+        # 容忍 "$1,250.5"、"10x"、"75%" 之类的写法
+        cleaned = value.strip().replace(",", "").replace("$", "").rstrip("xX%").strip()
+        try:
+            number = float(cleaned)
+        except ValueError:
+            raise ValueError(f"expected a number, got {value!r}") from None
+    else:
+        raise ValueError(f"expected a number, got {type(value).__name__}")
+    if not math.isfinite(number):
+        raise ValueError(f"expected a finite number, got {value!r}")
+    return number
+
+
+def _integer(value: Any) -> int:
+    return int(_number(value))
+
+
+def _text(value: Any) -> str:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value).strip()
+
+
+def _flag(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    normalized = str(value).strip().lower()
+    if normalized in {"1", "true", "yes", "on"}:
+        return True
+    if normalized in {"0", "false", "no", "off", ""}:
+        return False
+    raise ValueError(f"expected a boolean, got {value!r}")
+
+
+def _choice(options: Sequence[str], aliases: Optional[Mapping[str, str]] = None) -> Callable[[Any], str]:
+    def convert(value: Any) -> str:
+        normalized = str(value).strip().lower()
+        normalized = (aliases or {}).get(normalized, normalized)
+        if normalized not in options:
+            raise ValueError(f"expected one of {'/'.join(options)}, got {value!r}")
+        return normalized
+    return convert
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    name: str
+    convert: Callable[[Any], Any]
+    aliases: Tuple[str, ...] = ()
+    # 转换失败时使用的值；_MISSING 表示保留记录默认值
+    on_invalid: Any = _MISSING
+
+
+class DecisionSchema:
+    """
+    决策字段的编译后校验器：字段名与别名在构造时展开为一张查找表，
+    每个成员只遍历一次，逐字段转换为类型化的 DecisionRecord。
+
+    - 未知字段忽略；单个字段无效时按默认值处理并记入 `issues`，不会丢弃整条决策；
+    - 信号同义词（open/exit/wait 等）归一化，无法识别的信号按 hold 处理；
+    - 置信度写成百分数（如 75）时换算为 0..1，杠杆非正时按 1 倍处理。
+    """
+
+    def __init__(self, specs: Sequence[FieldSpec]) -> None:
+        known = {f.name for f in fields(DecisionRecord)}
+        self._lookup: Dict[str, FieldSpec] = {}
+        for spec in specs:
+            if spec.name not in known:
+                raise ValueError(f"Unknown decision field: {spec.name}")
+            for key in (spec.name, *spec.aliases):
+                self._lookup[key.lower()] = spec
+
+    def validate(self, coin: str, raw: Any) -> DecisionRecord:
+        """Convert one coin's raw decision into a DecisionRecord."""
+        if isinstance(raw, str):
+            raw = {"signal": raw}
+        if not isinstance(raw, Mapping):
+            return DecisionRecord(coin=coin, issues=(f"decision is a {type(raw).__name__}, treated as hold",))
+
+        values: Dict[str, Any] = {}
+        issues: List[str] = []
+        for key, value in raw.items():
+            spec = self._lookup.get(str(key).strip().lower())
+            if spec is None or value is None:
+                continue
+            try:
+                values[spec.name] = spec.convert(value)
+            except ValueError as exc:
+                issues.append(f"{spec.name}: {exc}")
+                if spec.on_invalid is not _MISSING:
+                    values[spec.name] = spec.on_invalid
+
+        signal = values.get("signal", "hold")
+        if signal == "entry":
+            if "side" not in values:
+                issues.append("side missing for entry; assuming long")
+                values["side"] = "long"
+            for name in ("stop_loss", "profit_target"):
+                if name not in values:
+                    issues.append(f"{name} missing for entry")
+        leverage = values.get("leverage")
+        if leverage is not None and leverage <= 0:
+            values["leverage"] = 1.0
+        confidence = values.get("confidence")
+        if confidence is not None:
+            if 1.0 < confidence <= 100.0:
+                confidence /= 100.0
+            values["confidence"] = min(max(confidence, 0.0), 1.0)
+        return DecisionRecord(coin=coin, issues=tuple(issues), **values)
+
+
+DECISION_SCHEMA = DecisionSchema([
+    FieldSpec("signal", _choice(SIGNALS, _SIGNAL_ALIASES), aliases=("action",), on_invalid="hold"),
+    FieldSpec("side", _choice(SIDES, {"buy": "long", "sell": "short"}), aliases=("direction",)),
+    FieldSpec("quantity", _number, aliases=("size", "qty")),
+    FieldSpec("profit_target", _number, aliases=("take_profit", "tp", "target")),
+    FieldSpec("stop_loss", _number, aliases=("stop", "sl")),
+    FieldSpec("leverage", _number, on_invalid=1.0),
+    FieldSpec("confidence", _number, on_invalid=0.0),
+    FieldSpec("risk_usd", _number, aliases=("risk",)),
+    FieldSpec("invalidation_condition", _text, aliases=("invalidation",)),
+    FieldSpec("justification", _text, aliases=("reason", "reasoning", "rationale")),
+    FieldSpec("liquidity", _choice(LIQUIDITY), on_invalid="taker"),
+    FieldSpec("fee_rate", _number),
+    FieldSpec("wait_for_fill", _flag),
+    FieldSpec("entry_oid", _integer),
+    FieldSpec("tp_oid", _integer),
+    FieldSpec("sl_oid", _integer),
+])
+
+
+def normalize_decision(coin: str, decision: Union[DecisionRecord, Mapping[str, Any], Any]) -> DecisionRecord:
+    """Pass records through; validate anything else against the schema."""
+    if isinstance(decision, DecisionRecord):
+        return decision
+    return DECISION_SCHEMA.validate(coin, decision)
+
+
+def repair_json(text: str) -> str:
+    """
+    Fix common model JSON defects in one pass, leaving string contents intact:
+    `//` and `/* */` comments, trailing commas, and Python literals
+    (True/False/None, NaN/Infinity become null).
+    """
+    out: List[str] = []
+    i = 0
+    length = len(text)
+    in_string = False
+    escaped = False
+    while i < length:
+        char = text[i]
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            i += 1
+            continue
+        if char == '"':
+            in_string = True
+        elif char == "/" and text.startswith("//", i):
+            end = text.find("\n", i)
+            i = length if end == -1 else end
+            continue
+        elif char == "/" and text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = length if end == -1 else end + 2
+            continue
+        elif char in "}]":
+            k = len(out) - 1
+            while k >= 0 and out[k].isspace():
+                k -= 1
+            if k >= 0 and out[k] == ",":
+                del out[k]
+        elif char.isalpha():
+            end = i
+            while end < length and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+            word = text[i:end]
+            out.append(_LITERALS.get(word, word))
+            i = end
+            continue
+        out.append(char)
+        i += 1
+    return "".join(out)
+
+
+def _balanced_object(text: str) -> Tuple[str, bool]:
+    """The first top-level object in `text` (which starts with `{`), and whether it closed."""
+    depth = 0
+    in_string = False
+    escaped = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[:index + 1], True
+    return text, False
+
+
+def _first_coin_object(text: str, start: int, coins: Set[str]) -> int:
+    """Skip closed objects without any coin member (e.g. `{EMA}` in a preamble), as the stream parser does."""
+    position = start
+    while position != -1:
+        raw, closed = _balanced_object(text[position:])
+        if not closed:
+            return position
+        probe = DecisionStreamParser()
+        probe.feed(raw)
+        if {str(key).upper() for key in probe.members} & coins:
+            return position
+        position = text.find("{", position + len(raw))
+    return start
+
+
+@dataclass
+class ParsedDecisions:
+    records: Dict[str, DecisionRecord] = field(default_factory=dict)
+    errors: List[Tuple[Optional[str], str]] = field(default_factory=list)
+    found: bool = False
+    repaired: bool = False
+    excerpt: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.found and not self.errors
+
+
+def parse_decisions(content: str, coins: Optional[Iterable[str]] = None) -> ParsedDecisions:
+    """
+    Extract, repair and validate the decision object from a model response.
+
+    Prefers a fenced code block, ignores commentary around the object, repairs
+    minor JSON defects and, if the object still does not parse (or is
+    truncated), salvages every well-formed coin member.  Each coin is validated
+    independently, so one malformed coin never discards the others.
+    """
+    result = ParsedDecisions()
+    text = content or ""
+    fenced = False
+    for block in _FENCE.findall(text):
+        if "{" in block:
+            text = block
+            fenced = True
+            break
+    start = text.find("{")
+    if start == -1:
+        return result
+    if not fenced and coins is not None:
+        start = _first_coin_object(text, start, {coin.upper() for coin in coins})
+    result.found = True
+    raw_tail = text[start:]
+    repaired_tail = repair_json(raw_tail)
+    candidate, closed = _balanced_object(repaired_tail)
+    result.repaired = _balanced_object(raw_tail)[0] != candidate
+    result.excerpt = candidate[:2000]
+
+    members: Dict[str, Any]
+    try:
+        parsed = json.loads(candidate) if closed else None
+    except json.JSONDecodeError:
+        parsed = None
+    if isinstance(parsed, dict):
+        members = parsed
+    else:
+        salvage = DecisionStreamParser()
+        salvage.feed(candidate)
+        members = dict(salvage.members)
+        for member, error in salvage.errors:
+            key = _MEMBER_KEY.match(member)
+            result.errors.append((key.group(1).upper() if key else None, f"{error}: {member[:120]}"))
+        if not closed:
+            result.errors.append((None, "response truncated before the decision object closed"))
+        elif parsed is not None:
+            result.errors.append((None, f"expected an object of coin decisions, got {type(parsed).__name__}"))
+
+    allowed = {coin.upper() for coin in coins} if coins is not None else None
+    for key, value in members.items():
+        coin = str(key).strip().upper()
+        if allowed is not None and coin not in allowed:
+            continue
+        result.records[coin] = DECISION_SCHEMA.validate(coin, value)
+    return result
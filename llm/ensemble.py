@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+ENSEMBLE_POLICIES = ("majority", "confidence", "first")
+
+Decisions = Dict[str, Any]
+
+_POLL_SECONDS = 0.05
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    name: str
+    timeout: Optional[float] = None
+
+
+def parse_model_specs(raw: str, default_timeout: Optional[float] = None) -> List[ModelSpec]:
+    """Parse `model[@seconds],...` (e.g. `deepseek/deepseek-chat@25,openai/gpt-4o-mini@15`)."""
+    specs: List[ModelSpec] = []
+    for item in (raw or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, timeout_raw = item.partition("@")
+        timeout = default_timeout
+        if timeout_raw.strip():
+            try:
+                timeout = float(timeout_raw)
+            except ValueError as exc:
+                raise ValueError(f"Invalid timeout for model '{name}': {timeout_raw}") from exc
+        specs.append(ModelSpec(name=name.strip(), timeout=timeout))
+    return specs
+
+
+@dataclass
+class ModelResult:
+    model: str
+    decisions: Optional[Decisions] = None
+    latency: float = 0.0
+    error: Optional[str] = None
+    timed_out: bool = False
+    superseded: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.decisions) and self.error is None and not self.timed_out and not self.superseded
+
+    @property
+    def failed(self) -> bool:
+        return self.timed_out or self.error is not None
+
+    def describe(self) -> str:
+        if self.superseded:
+            return f"superseded by the first valid answer after {self.latency:.2f}s"
+        if self.timed_out:
+            return f"timeout after {self.latency:.2f}s"
+        if self.error is not None:
+            return f"error after {self.latency:.2f}s ({self.error})"
+        if not self.decisions:
+            return f"no decisions after {self.latency:.2f}s"
+        return f"{len(self.decisions)} decisions in {self.latency:.2f}s"
+
+
+@dataclass
+class EnsembleOutcome:
+    policy: str
+    decisions: Decisions
+    results: List[ModelResult]
+    votes: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def responders(self) -> List[str]:
+        return [result.model for result in self.results if result.ok]
+
+
+def _vote_key(decision: Dict[str, Any]) -> str:
+    signal = str(decision.get("signal", "hold")).strip().lower() or "hold"
+    if signal == "entry":
+        # 多空方向不同的开仓是不同的提案
+        side = str(decision.get("side", "")).strip().lower()
+        return f"entry:{side}" if side else "entry"
+    return signal
+
+
+def _confidence(decision: Dict[str, Any]) -> float:
+    try:
+        value = float(decision.get("confidence", 0.0))
+    except (TypeError, ValueError):
+        return 0.0
+    return min(max(value, 0.0), 1.0)
+
+
+def combine_decisions(
+    results: List[ModelResult],
+    policy: str,
+) -> Tuple[Decisions, Dict[str, Dict[str, float]]]:
+    """
+    Merge per-coin decisions from several models.
+
+    `majority` counts one vote per model, `confidence` weights each vote by the
+    model's stated confidence.  The winning proposal's most confident decision
+    is used; ties (and coins nobody voted on with weight) fall back to hold.
+    """
+    if policy not in {"majority", "confidence"}:
+        raise ValueError(f"Unsupported ensemble policy: {policy}")
+    ballots: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+    passthrough: Decisions = {}
+    for result in results:
+        if not result.ok:
+            continue
+        for coin, decision in result.decisions.items():
+            if isinstance(decision, dict):
+                ballots.setdefault(coin, []).append((result.model, decision))
+            else:
+                passthrough.setdefault(coin, decision)
+
+    combined: Decisions = dict(passthrough)
+    votes: Dict[str, Dict[str, float]] = {}
+    for coin, entries in ballots.items():
+        tally: Dict[str, float] = {}
+        for _, decision in entries:
+            weight = 1.0 if policy == "majority" else _confidence(decision)
+            key = _vote_key(decision)
+            tally[key] = tally.get(key, 0.0) + weight
+        votes[coin] = tally
+        best = max(tally.values())
+        leaders = [key for key, weight in tally.items() if weight == best]
+        if len(leaders) == 1 and best > 0:
+            winner = leaders[0]
+            candidates = [decision for _, decision in entries if _vote_key(decision) == winner]
+            combined[coin] = dict(max(candidates, key=_confidence))
+            continue
+        holds = [decision for _, decision in entries if _vote_key(decision) == "hold"]
+        if holds:
+            combined[coin] = dict(max(holds, key=_confidence))
+        else:
+            combined[coin] = {
+                "signal": "hold",
+                "justification": "Ensemble tie: " + ", ".join(f"{key}={weight:g}" for key, weight in sorted(tally.items())),
+                "confidence": 0.0,
+            }
+    return combined, votes
+
+
+def run_ensemble(
+    specs: List[ModelSpec],
+    query: Callable[[ModelSpec], Optional[Decisions]],
+    *,
+    policy: str = "majority",
+    deadline: Optional[float] = None,
+    clock: Callable[[], float] = time.monotonic,
+) -> EnsembleOutcome:
+    """
+    Query every model concurrently and combine what arrives in time.
+
+    Each model is abandoned after its own `timeout`; `deadline` bounds the
+    whole fan-out.  With the `first` policy the first valid answer is returned
+    immediately and the remaining calls are left to finish in the background.
+    """
+    if policy not in ENSEMBLE_POLICIES:
+        raise ValueError(f"Unsupported ensemble policy: {policy}")
+    started = clock()
+    if not specs:
+        return EnsembleOutcome(policy=policy, decisions={}, results=[])
+
+    finished_at: Dict[int, float] = {}
+
+    def run(index: int, spec: ModelSpec) -> Optional[Decisions]:
+        try:
+            return query(spec)
+        finally:
+            finished_at[index] = clock()
+
+    executor = ThreadPoolExecutor(max_workers=len(specs), thread_name_prefix="llm-ensemble")
+    futures: Dict[Future, int] = {
+        executor.submit(run, index, spec): index for index, spec in enumerate(specs)
+    }
+    pending = set(futures)
+    results: Dict[int, ModelResult] = {}
+    winner: Optional[ModelResult] = None
+    try:
+        while pending and winner is None:
+            done, pending = wait(pending, timeout=_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures[future]
+                spec = specs[index]
+                latency = finished_at.get(index, clock()) - started
+                error = future.exception()
+                value = None if error is not None else future.result()
+                result = ModelResult(
+                    model=spec.name,
+                    decisions=value if isinstance(value, dict) else None,
+                    latency=max(latency, 0.0),
+                    error=f"{type(error).__name__}: {error}" if error is not None else None,
+                )
+                results[index] = result
+                if policy == "first" and result.ok and winner is None:
+                    winner = result
+
+            now = clock()
+            elapsed = now - started
+            for future in list(pending):
+                index = futures[future]
+                spec = specs[index]
+                expired = spec.timeout is not None and spec.timeout > 0 and elapsed > spec.timeout
+                if expired or (deadline is not None and elapsed >= deadline):
+                    # 线程无法强制终止；放弃等待，HTTP 超时会让后台请求自行结束
+                    pending.discard(future)
+                    results[index] = ModelResult(model=spec.name, latency=elapsed, timed_out=True)
+        for future in pending:
+            index = futures[future]
+            results[index] = ModelResult(
+                model=specs[index].name,
+                latency=clock() - started,
+                superseded=True,
+            )
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    ordered = [results[index] for index in range(len(specs)) if index in results]
+    votes: Dict[str, Dict[str, float]] = {}
+    if policy == "first":
+        decisions = dict(winner.decisions) if winner is not None else {}
+    else:
+        decisions, votes = combine_decisions(ordered, policy)
+    return EnsembleOutcome(
+        policy=policy,
+        decisions=decisions,
+        results=ordered,
+        votes=votes,
+        elapsed=clock() - started,
+    )
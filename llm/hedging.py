@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Generic, Iterable, List, Optional, TypeVar
+
+from llm.telemetry import percentile
+
+
+T = TypeVar("T")
+
+HEDGE_MIN_SAMPLES = 5
+_POLL_SECONDS = 0.05
+
+
+class HedgeCancelled(Exception):
+    """Raised inside a request whose hedge race has already been won by the other attempt."""
+
+
+class _Race:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.winner: Optional[HedgeAttempt] = None
+        self.attempts: List[HedgeAttempt] = []
+
+    def add(self, attempt: "HedgeAttempt") -> "HedgeAttempt":
+        with self._lock:
+            self.attempts.append(attempt)
+            if self.winner is not None:
+                attempt.cancel_event.set()
+        return attempt
+
+    def claim(self, attempt: "HedgeAttempt") -> bool:
+        with self._lock:
+            if self.winner is None:
+                self.winner = attempt
+                for other in self.attempts:
+                    if other is not attempt:
+                        other.cancel_event.set()
+            return self.winner is attempt
+
+
+@dataclass
+class HedgeAttempt:
+    label: str
+    model: str
+    race: _Race = field(repr=False)
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def claim(self) -> bool:
+        """Become the winner unless the other attempt already is; the loser is cancelled."""
+        return self.race.claim(self)
+
+    def check(self) -> None:
+        """Abort this attempt (raise HedgeCancelled) once the other one has won."""
+        if self.cancelled:
+            raise HedgeCancelled(f"{self.label} request for {self.model} lost the hedge race")
+
+
+@dataclass
+class HedgeOutcome(Generic[T]):
+    value: Optional[T]
+    winner: Optional[str]
+    hedged: bool
+    delay: float
+    elapsed: float
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    def describe(self) -> str:
+        hedge = f"hedge after {self.delay:.2f}s" if self.hedged else f"no hedge (threshold {self.delay:.2f}s)"
+        winner = f"{self.winner} won" if self.winner else "no valid response"
+        return f"{winner} in {self.elapsed:.2f}s, {hedge}"
+
+
+def hedge_delay(
+    latencies: Iterable[float],
+    q: float,
+    *,
+    fallback: float,
+    min_samples: int = HEDGE_MIN_SAMPLES,
+) -> float:
+    """Seconds to wait before hedging: the `q`th percentile of recent latency, or `fallback` until enough samples."""
+    values = [value for value in latencies if value is not None and value >= 0]
+    if len(values) < max(1, min_samples):
+        return max(fallback, 0.0)
+    return percentile(values, q) or 0.0
+
+
+class HedgeStats:
+    """
+    对冲请求计数：总调用数、发出对冲的次数、主请求/对冲请求各自胜出的次数与均无结果的次数，
+    用于观察额外请求成本（对冲率）与尾延迟收益之间的权衡。多线程更新时加锁。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.primary_wins = 0
+        self.hedge_wins = 0
+        self.failures = 0
+
+    def record(self, outcome: HedgeOutcome) -> None:
+        with self._lock:
+            self.calls += 1
+            self.hedged += int(outcome.hedged)
+            if outcome.winner == "primary":
+                self.primary_wins += 1
+            elif outcome.winner == "hedge":
+                self.hedge_wins += 1
+            else:
+                self.failures += 1
+
+    @property
+    def hedge_rate(self) -> Optional[float]:
+        return self.hedged / self.calls if self.calls else None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_rate": self.hedge_rate,
+            "primary_wins": self.primary_wins,
+            "hedge_wins": self.hedge_wins,
+            "failures": self.failures,
+        }
+
+    def describe(self) -> str:
+        rate = self.hedge_rate
+        if rate is None:
+            return "LLM hedging: no calls"
+        return (
+            f"LLM hedging: {self.hedged}/{self.calls} calls hedged ({rate:.0%})"
+            f" | wins primary {self.primary_wins} / hedge {self.hedge_wins} | failed {self.failures}"
+        )
+
+
+def run_hedged(
+    request: Callable[[HedgeAttempt], Optional[T]],
+    model: str,
+    *,
+    delay: float,
+    hedge_model: Optional[str] = None,
+    clock: Callable[[], float] = time.monotonic,
+) -> HedgeOutcome[T]:
+    """
+    Issue `request` for `model`; if it has not returned after `delay` seconds,
+    issue an identical request (to `hedge_model` if given) and take the first
+    valid (non-empty) response.
+
+    An attempt that calls `claim()` itself (e.g. before acting on a streamed
+    partial result) wins immediately.  The losing attempt's `cancel_event` is
+    set so it can abort; it is never waited for.
+    """
+    started = clock()
+    race = _Race()
+    primary = race.add(HedgeAttempt("primary", model, race))
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="llm-hedge")
+    futures: Dict[Future, HedgeAttempt] = {executor.submit(request, primary): primary}
+    pending = set(futures)
+    hedged = False
+    errors: Dict[str, str] = {}
+    value: Optional[T] = None
+    try:
+        while pending and race.winner is None:
+            elapsed = clock() - started
+            timeout = _POLL_SECONDS if hedged else min(_POLL_SECONDS, max(delay - elapsed, 0.0))
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                attempt = futures[future]
+                error = future.exception()
+                if error is not None:
+                    if not isinstance(error, HedgeCancelled):
+                        errors[attempt.label] = f"{type(error).__name__}: {error}"
+                    continue
+                result = future.result()
+                if race.winner is attempt or (result and attempt.claim()):
+                    value = result
+                    break
+            if race.winner is not None or hedged or not pending:
+                continue
+            if clock() - started >= delay:
+                hedge = race.add(HedgeAttempt("hedge", hedge_model or model, race))
+                future = executor.submit(request, hedge)
+                futures[future] = hedge
+                pending.add(future)
+                hedged = True
+        winner = race.winner
+        if winner is not None and value is None:
+            # 流式分发时由请求内部认领：等待胜出者返回其完整结果
+            for future, attempt in futures.items():
+                if attempt is winner:
+                    try:
+                        value = future.result()
+                    except Exception as exc:
+                        errors[attempt.label] = f"{type(exc).__name__}: {exc}"
+        for attempt in race.attempts:
+            if attempt is not winner:
+                attempt.cancel_event.set()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return HedgeOutcome(
+        value=value,
+        winner=race.winner.label if race.winner is not None else None,
+        hedged=hedged,
+        delay=delay,
+        elapsed=clock() - started,
+        errors=errors,
+    )
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+try:  # 可选依赖：安装 tiktoken 时使用真实 BPE 计数
+    import tiktoken
+except ImportError:  # pragma: no cover - depends on the environment
+    tiktoken = None
+
+
+_MAX_DECIMALS = 8
+_TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d{1,3}|\n|[^\sA-Za-z\d]")
+
+
+def significant_decimals(values: Iterable[Optional[float]], significant: int = 5) -> int:
+    """Decimals needed so the largest magnitude keeps `significant` digits."""
+    magnitudes = [abs(float(v)) for v in values if v is not None and math.isfinite(float(v)) and v != 0]
+    if not magnitudes:
+        return 0
+    exponent = math.floor(math.log10(max(magnitudes)))
+    return int(min(max(significant - 1 - exponent, 0), _MAX_DECIMALS))
+
+
+def format_number(value: Optional[float], decimals: int) -> str:
+    """Fixed-point formatting without trailing zeros (`None`/NaN become `NA`)."""
+    if value is None:
+        return "NA"
+    number = float(value)
+    if not math.isfinite(number):
+        return "NA"
+    text = f"{number:.{decimals}f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return "0" if text in {"-0", ""} else text
+
+
+def format_value(value: Optional[float], significant: int = 5) -> str:
+    """Format a single number with `significant` digits of precision."""
+    return format_number(value, significant_decimals([value], significant))
+
+
+def encode_series(values: Sequence[float], significant: int = 5, delta: bool = False) -> str:
+    """
+    Comma-separated series at a shared precision.
+
+    With `delta`, the output is `d:first,+step,-step,...`; steps are computed on
+    the quantised values so decoding reproduces the rounded series exactly.
+    """
+    if not values:
+        return ""
+    decimals = significant_decimals(values, significant)
+    if not delta or len(values) < 2:
+        return ",".join(format_number(v, decimals) for v in values)
+    scale = 10 ** decimals
+    quantised = [round(float(v) * scale) for v in values]
+    parts = [format_number(quantised[0] / scale, decimals)]
+    for previous, current in zip(quantised, quantised[1:]):
+        step = format_number((current - previous) / scale, decimals)
+        parts.append(step if step.startswith("-") else f"+{step}")
+    return "d:" + ",".join(parts)
+
+
+def decode_series(text: str) -> List[float]:
+    """Inverse of encode_series (used by tests and prompt tooling)."""
+    if not text:
+        return []
+    if not text.startswith("d:"):
+        return [float(part) for part in text.split(",")]
+    parts = text[2:].split(",")
+    values = [float(parts[0])]
+    for step in parts[1:]:
+        values.append(values[-1] + float(step))
+    return values
+
+
+class TokenCounter:
+    """
+    Token 计数器：安装 tiktoken 时使用指定 BPE 编码，否则使用近似估算
+    （字母串按约 5 字符一个 token、数字按 3 位一组、标点与换行各一个）。
+    估算值用于比较各段大小与预算控制，与服务端计费可能略有出入。
+    """
+
+    def __init__(self, encoding: str = "cl100k_base") -> None:
+        self.encoding_name = encoding
+        self._encoding: Any = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception:  # pragma: no cover - e.g. encoding files unavailable offline
+                self._encoding = None
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        total = 0
+        for piece in _TOKEN_PATTERN.findall(text):
+            if piece[0].isalpha():
+                total += max(1, math.ceil(len(piece) / 5))
+            else:
+                total += 1
+        return total
+
+
+@dataclass
+class PromptSection:
+    name: str
+    text: str
+    priority: int = 50
+    required: bool = False
+    # 同组内的 header 段只在组内还有其他段保留时输出
+    group: Optional[str] = None
+    group_header: bool = False
+
+
+@dataclass
+class SectionReport:
+    name: str
+    tokens: int
+    priority: int
+    dropped: bool = False
+
+
+@dataclass
+class PromptBudgetReport:
+    total_tokens: int
+    budget: Optional[int]
+    sections: List[SectionReport] = field(default_factory=list)
+
+    @property
+    def dropped(self) -> List[str]:
+        return [section.name for section in self.sections if section.dropped]
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.total_tokens > self.budget
+
+    def describe(self) -> str:
+        kept = ", ".join(f"{s.name}={s.tokens}" for s in self.sections if not s.dropped)
+        summary = f"{self.total_tokens} tokens"
+        if self.budget is not None:
+            summary += f" (budget {self.budget})"
+        summary += f" | {kept}"
+        if self.dropped:
+            summary += f" | dropped: {', '.join(self.dropped)}"
+        return summary
+
+
+def assemble_prompt(
+    sections: Sequence[PromptSection],
+    budget: Optional[int] = None,
+    counter: Optional[TokenCounter] = None,
+) -> Tuple[str, PromptBudgetReport]:
+    """
+    Join sections in order, dropping the lowest-priority optional ones until the
+    token budget is met (later sections go first among equal priorities).
+    Required sections are always kept, even if that leaves the prompt over budget.
+    """
+    counter = counter or TokenCounter()
+    costs = [counter.count(section.text) + 1 for section in sections]  # +1：段间换行
+    kept = [bool(section.text) for section in sections]
+
+    def total() -> int:
+        return _visible_total(sections, costs, kept)
+
+    if budget is not None and budget > 0:
+        candidates = sorted(
+            (index for index, section in enumerate(sections) if not section.required and not section.group_header),
+            key=lambda index: (sections[index].priority, -index),
+        )
+        for index in candidates:
+            if total() <= budget:
+                break
+            kept[index] = False
+
+    visible = _visible(sections, kept)
+    text = "\n".join(sections[index].text for index in range(len(sections)) if visible[index])
+    reports = [
+        SectionReport(
+            name=section.name,
+            tokens=costs[index] - 1,
+            priority=section.priority,
+            dropped=bool(section.text) and not visible[index],
+        )
+        for index, section in enumerate(sections)
+    ]
+    return text, PromptBudgetReport(
+        total_tokens=counter.count(text),
+        budget=budget if budget and budget > 0 else None,
+        sections=reports,
+    )
+
+
+def _visible(sections: Sequence[PromptSection], kept: List[bool]) -> List[bool]:
+    groups_alive = {
+        section.group
+        for index, section in enumerate(sections)
+        if kept[index] and section.group and not section.group_header
+    }
+    return [
+        kept[index] and (not section.group_header or section.group in groups_alive)
+        for index, section in enumerate(sections)
+    ]
+
+
+def _visible_total(sections: Sequence[PromptSection], costs: List[int], kept: List[bool]) -> int:
+    visible = _visible(sections, kept)
+    return sum(cost for cost, show in zip(costs, visible) if show)
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional
+
+
+PROMPT_LAYOUTS = ("prefix", "legacy")
+
+
+def cached_prompt_tokens(usage: Optional[Mapping[str, Any]]) -> Optional[int]:
+    """
+    Prompt tokens served from the provider's prefix cache, if reported.
+
+    Understands the OpenAI/OpenRouter `prompt_tokens_details.cached_tokens`
+    field as well as DeepSeek's `prompt_cache_hit_tokens` and Anthropic's
+    `cache_read_input_tokens`.  Returns None when the usage block says nothing.
+    """
+    if not isinstance(usage, Mapping):
+        return None
+    details = usage.get("prompt_tokens_details")
+    candidates = [
+        details.get("cached_tokens") if isinstance(details, Mapping) else None,
+        usage.get("prompt_cache_hit_tokens"),
+        usage.get("cache_read_input_tokens"),
+    ]
+    for value in candidates:
+        if value is None:
+            continue
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+@dataclass
+class PrefixCacheStats:
+    calls: int = 0
+    reported: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+
+    def record(self, usage: Optional[Mapping[str, Any]]) -> Optional[int]:
+        """Account one completion's usage; returns its cached-token count."""
+        self.calls += 1
+        if not isinstance(usage, Mapping):
+            return None
+        try:
+            self.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+        except (TypeError, ValueError):
+            pass
+        cached = cached_prompt_tokens(usage)
+        if cached is not None:
+            self.reported += 1
+            self.cached_tokens += cached
+        return cached
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        if not self.reported or not self.prompt_tokens:
+            return None
+        return self.cached_tokens / self.prompt_tokens
+
+
+@dataclass(frozen=True)
+class StaticPrompt:
+    """
+    预编译的静态提示词前缀：系统提示词与决策输出说明合并为一条固定的 system 消息，
+    启动时构建一次，之后每次请求都复用同一对象，保证发送的前缀逐字节一致，
+    以便服务端前缀缓存命中。动态的行情与账户数据只出现在随后的 user 消息中。
+
+    - layout="prefix": 静态内容全部位于 system 消息，user 消息不再附带说明；
+    - layout="legacy": 保持原有布局（说明附在 user 消息末尾）。
+    - cache_control=True 时 system 内容以带 `cache_control` 断点的分段形式发送，
+      供需要显式断点的服务商（如经 OpenRouter 调用的 Anthropic 模型）使用。
+    """
+
+    system_prompt: str
+    instructions: str = ""
+    layout: str = "prefix"
+    cache_control: bool = False
+    system_message: Dict[str, Any] = field(init=False, repr=False, compare=False)
+    fingerprint: str = field(init=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if self.layout not in PROMPT_LAYOUTS:
+            raise ValueError(f"Unsupported prompt layout: {self.layout}")
+        content: Any = self.system_text
+        if self.cache_control:
+            content = [{"type": "text", "text": self.system_text, "cache_control": {"type": "ephemeral"}}]
+        object.__setattr__(self, "system_message", {"role": "system", "content": content})
+        digest = hashlib.sha256(self.system_text.encode("utf-8")).hexdigest()[:12]
+        object.__setattr__(self, "fingerprint", digest)
+
+    @property
+    def system_text(self) -> str:
+        if self.layout == "prefix" and self.instructions:
+            return f"{self.system_prompt.rstrip()}\n\n{self.instructions}"
+        return self.system_prompt
+
+    @property
+    def inline_instructions(self) -> Optional[str]:
+        """Instructions the user prompt must still carry (legacy layout only)."""
+        return self.instructions if self.layout == "legacy" and self.instructions else None
+
+    def messages(self, user_prompt: str) -> List[Dict[str, Any]]:
+        """Chat messages with the shared static prefix first."""
+        return [self.system_message, {"role": "user", "content": user_prompt}]
+
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Mapping, Optional
+
+
+CACHE_MODES = ("readwrite", "readonly", "bypass")
+
+_CACHE_VERSION = 1
+
+
+def cache_key(
+    model: str,
+    params: Mapping[str, Any],
+    system_prompt: str,
+    user_prompt: str,
+) -> str:
+    """SHA-256 over the canonical JSON of everything that determines the completion."""
+    canonical = json.dumps(
+        {
+            "v": _CACHE_VERSION,
+            "model": model,
+            "params": dict(params),
+            "system": system_prompt,
+            "user": user_prompt,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def chat_request_key(body: Mapping[str, Any], namespace: str = "") -> str:
+    """
+    Cache key for an OpenAI-style chat request body (transport-only fields ignored).
+
+    A non-empty `namespace` (e.g. a non-default endpoint) keeps its entries apart.
+    """
+    system_parts = []
+    user_parts = []
+    for message in body.get("messages") or []:
+        target = system_parts if message.get("role") == "system" else user_parts
+        target.append(str(message.get("content", "")))
+    params = {
+        name: value
+        for name, value in body.items()
+        if name not in {"model", "messages", "stream", "stream_options"}
+    }
+    if namespace:
+        params["namespace"] = namespace
+    return cache_key(
+        str(body.get("model", "")),
+        params,
+        "\n".join(system_parts),
+        "\n".join(user_parts),
+    )
+
+
+@dataclass
+class CachedResponse:
+    content: str
+    response_id: Optional[str] = None
+    model: Optional[str] = None
+    usage: Optional[Dict[str, Any]] = None
+    stored_at: float = 0.0
+
+
+@dataclass
+class ResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    bytes_written: int = 0
+    errors: int = 0
+
+
+class LLMResponseCache:
+    """
+    内容寻址的 LLM 响应磁盘缓存，主要用于回测重放。
+
+    - 键为 (模型, 参数, 系统提示词, 用户提示词) 的 SHA-256，相同请求在任何运行目录下命中同一条目；
+    - 每个条目一个 gzip 压缩的 JSON 文件，按键前两位分目录，写入为临时文件 + 原子替换，
+      多个并行回测进程可安全共享同一目录；
+    - mode: readwrite（读取并写入）、readonly（只读，不写新条目）、bypass（完全跳过）。
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        mode: str = "readwrite",
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unsupported LLM cache mode: {mode}")
+        self.root = Path(root)
+        self.mode = mode
+        self.clock = clock
+        self.stats = ResponseCacheStats()
+
+    @property
+    def can_read(self) -> bool:
+        return self.mode in {"readwrite", "readonly"}
+
+    @property
+    def can_write(self) -> bool:
+        return self.mode == "readwrite"
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "bypass"
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json.gz"
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Return the stored response for `key`, or None on a miss."""
+        if not self.can_read:
+            return None
+        path = self.path_for(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as fh:
+                payload = json.load(fh)
+        except FileNotFoundError:
+            self.stats.misses += 1
+            return None
+        except (OSError, ValueError, EOFError) as exc:
+            logging.warning("Ignoring unreadable LLM cache entry %s: %s", path, exc)
+            self.stats.errors += 1
+            self.stats.misses += 1
+            return None
+        if not isinstance(payload, dict) or payload.get("version") != _CACHE_VERSION:
+            self.stats.misses += 1
+            return None
+        try:
+            response = CachedResponse(**payload["response"])
+        except (KeyError, TypeError):
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return response
+
+    def put(self, key: str, response: CachedResponse) -> bool:
+        """Store `response` under `key`; return True when a new entry was written."""
+        if not self.can_write:
+            return False
+        if not response.stored_at:
+            response.stored_at = self.clock()
+        path = self.path_for(key)
+        data = json.dumps(
+            {"version": _CACHE_VERSION, "key": key, "response": asdict(response)},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+        compressed = gzip.compress(data, compresslevel=6, mtime=0)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{key[:8]}-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as fh:
+                    fh.write(compressed)
+                os.replace(tmp_name, path)
+            except BaseException:
+                if os.path.exists(tmp_name):
+                    os.unlink(tmp_name)
+                raise
+        except OSError as exc:
+            logging.warning("Unable to write LLM cache entry %s: %s", path, exc)
+            self.stats.errors += 1
+            return False
+        self.stats.writes += 1
+        self.stats.bytes_written += len(compressed)
+        return True
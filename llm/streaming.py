@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class StreamError(RuntimeError):
+    """Raised when the completion stream reports an error or is malformed."""
+
+
+class DecisionStreamParser:
+    """
+    增量解析决策 JSON：逐块喂入模型输出，最外层对象的每个成员一旦语法完整即返回。
+
+    - 第一个 `{` 之前的文本（思考过程、代码围栏等）被忽略；
+    - 对象 / 数组成员在其右括号到达时即完成，标量成员在其后的 `,` 或 `}` 到达时完成；
+    - 单个成员无法解析时记录在 `errors` 中并跳过，不影响其余成员；
+    - 最外层对象闭合后 `complete` 为 True，其后的文本被忽略。
+
+    `follow_fences=True` 时与 `parse_decisions` 的取值规则一致（优先代码围栏内的对象）：
+    - 围栏内的第一个对象是最终对象；
+    - 围栏外的对象只是暂定的：不含 `coins` 中任何键（如前言里的 `{EMA}`）时丢弃并继续寻找，
+      之后若出现含 `{` 的围栏，则改为解析围栏内的对象并把 `superseded` 置为 True。
+
+    扫描位置跨 feed() 调用保留，总开销与输出长度成线性关系。
+    """
+
+    def __init__(self, *, follow_fences: bool = False, coins: Optional[Iterable[str]] = None) -> None:
+        self.follow_fences = follow_fences
+        self.coins = {coin.upper() for coin in coins} if coins is not None else None
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._started = False
+        self._member_start: Optional[int] = None
+        self._in_fence = False
+        self._fenced = False
+        self._ticks = 0
+        self.complete = False
+        self.superseded = False
+        self.members: Dict[str, Any] = {}
+        self.errors: List[Tuple[str, str]] = []
+
+    @property
+    def _provisional(self) -> bool:
+        return self.follow_fences and not self._fenced
+
+    def _fence_mark(self, char: str) -> bool:
+        # 跨分片累计反引号，第三个连续的 ` 表示围栏开始或结束
+        if char != "`":
+            self._ticks = 0
+            return False
+        self._ticks += 1
+        if self._ticks < 3:
+            return False
+        self._ticks = 0
+        return True
+
+    def _restart(self, *, in_fence: bool) -> None:
+        self._started = False
+        self._depth = 0
+        self._member_start = None
+        self._in_fence = in_fence
+        self.complete = False
+        self.members = {}
+        self.errors = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume the next piece of text; return members completed by it."""
+        if (self.complete and not self._provisional) or not chunk:
+            return []
+        self._text += chunk
+        completed: List[Tuple[str, Any]] = []
+        text = self._text
+        pos = self._pos
+        length = len(text)
+        while pos < length:
+            char = text[pos]
+            if self.complete:
+                # 暂定对象已闭合：继续留意其后的围栏，围栏内出现 `{` 时改以该对象为准
+                if self._fence_mark(char):
+                    self._in_fence = not self._in_fence
+                elif char == "{" and self._in_fence:
+                    self.superseded = True
+                    self._restart(in_fence=True)
+                    continue
+                pos += 1
+                continue
+            if not self._started:
+                if self.follow_fences and self._fence_mark(char):
+                    self._in_fence = not self._in_fence
+                elif char == "{":
+                    self._started = True
+                    self._fenced = self._in_fence
+                    self._depth = 1
+                    self._member_start = pos + 1
+                pos += 1
+                continue
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                pos += 1
+                continue
+            if self._provisional and self._fence_mark(char):
+                # 暂定对象尚未闭合时围栏打开：前面的 `{` 只是前言
+                self.superseded = self.superseded or bool(self.members)
+                self._restart(in_fence=True)
+                pos += 1
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    # 嵌套值闭合：成员已完整，不必等后续的逗号
+                    self._emit(text[self._member_start:pos + 1], completed)
+                    self._member_start = None
+                elif self._depth == 0:
+                    self._emit(text[self._member_start:pos] if self._member_start is not None else "", completed)
+                    pos += 1
+                    if self._provisional and self.coins is not None and not (
+                        {str(key).upper() for key in self.members} & self.coins
+                    ):
+                        self._restart(in_fence=False)
+                        continue
+                    self.complete = True
+                    if self._provisional:
+                        continue
+                    break
+            elif char == "," and self._depth == 1:
+                if self._member_start is not None:
+                    self._emit(text[self._member_start:pos], completed)
+                self._member_start = pos + 1
+            pos += 1
+        self._pos = pos
+        return completed
+
+    def _emit(self, member: str, completed: List[Tuple[str, Any]]) -> None:
+        if not member.strip():
+            return
+        try:
+            parsed = json.loads("{" + member + "}")
+        except json.JSONDecodeError as exc:
+            self.errors.append((member.strip()[:200], str(exc)))
+            return
+        for key, value in parsed.items():
+            self.members[key] = value
+            completed.append((key, value))
+
+
+def iter_sse_data(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Yield the `data` payload of each server-sent event from raw byte chunks."""
+    pending = b""
+    data_lines: List[str] = []
+    for chunk in chunks:
+        if not chunk:
+            continue
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for raw in lines:
+            line = raw.rstrip(b"\r").decode("utf-8")
+            if not line:
+                if data_lines:
+                    yield "\n".join(data_lines)
+                    data_lines = []
+                continue
+            if line.startswith(":"):
+                continue  # 注释 / keep-alive（如 OpenRouter 的 ": OPENROUTER PROCESSING"）
+            name, _, value = line.partition(":")
+            if name == "data":
+                data_lines.append(value[1:] if value.startswith(" ") else value)
+    if pending.strip():
+        line = pending.rstrip(b"\r").decode("utf-8")
+        if line.startswith("data:"):
+            value = line[5:]
+            data_lines.append(value[1:] if value.startswith(" ") else value)
+    if data_lines:
+        yield "\n".join(data_lines)
+
+
+def _until_deadline(chunks: Iterable[bytes], deadline: float, clock: Callable[[], float]) -> Iterator[bytes]:
+    # 逐个原始分片检查：keep-alive 注释也会重置套接字读超时，只有总截止时间能限制卡住的生成
+    for chunk in chunks:
+        if clock() > deadline:
+            raise StreamError("Stream exceeded its deadline")
+        yield chunk
+
+
+@dataclass
+class StreamedCompletion:
+    content: str
+    response_id: Optional[str] = None
+    model: Optional[str] = None
+    finish_reason: Optional[str] = None
+    usage: Optional[Dict[str, Any]] = None
+    first_token_seconds: Optional[float] = None
+    elapsed_seconds: float = 0.0
+    chunks: int = 0
+
+
+def read_chat_stream(
+    chunks: Iterable[bytes],
+    on_text: Optional[Callable[[str], None]] = None,
+    clock: Callable[[], float] = time.monotonic,
+    started: Optional[float] = None,
+    deadline: Optional[float] = None,
+) -> StreamedCompletion:
+    """
+    Assemble an OpenAI-style `chat.completion.chunk` SSE stream.
+
+    `on_text` receives every content delta as it arrives; the returned record
+    carries the full text, usage (sent with the final chunk) and timing
+    measured from `started` (the moment the request was sent, if given).
+    `deadline` (a `clock()` value) raises StreamError once passed, checked
+    after every received chunk including keep-alive comments.
+    """
+    started = clock() if started is None else started
+    parts: List[str] = []
+    result = StreamedCompletion(content="")
+    if deadline is not None:
+        chunks = _until_deadline(chunks, deadline, clock)
+    for data in iter_sse_data(chunks):
+        if data.strip() == "[DONE]":
+            break
+        try:
+            event = json.loads(data)
+        except json.JSONDecodeError as exc:
+            raise StreamError(f"Malformed stream event: {data[:200]}") from exc
+        if not isinstance(event, dict):
+            continue
+        if event.get("error"):
+            error = event["error"]
+            message = error.get("message") if isinstance(error, dict) else error
+            raise StreamError(f"Stream error: {message}")
+        result.chunks += 1
+        result.response_id = result.response_id or event.get("id")
+        result.model = result.model or event.get("model")
+        if event.get("usage"):
+            result.usage = event["usage"]
+        for choice in event.get("choices") or []:
+            delta = choice.get("delta") or {}
+            text = delta.get("content")
+            if text:
+                if result.first_token_seconds is None:
+                    result.first_token_seconds = clock() - started
+                parts.append(text)
+                if on_text is not None:
+                    on_text(text)
+            if choice.get("finish_reason"):
+                result.finish_reason = choice["finish_reason"]
+    result.content = "".join(parts)
+    result.elapsed_seconds = clock() - started
+    return result
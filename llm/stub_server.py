@@ -0,0 +1,410 @@
+"""
+Local OpenAI-compatible chat-completions server for offline benchmarking.
+
+Point the bot at it with `TRADEBOT_LLM_CHAT_URL=http://127.0.0.1:8765/v1/chat/completions`
+(any non-empty `OPENROUTER_API_KEY` is accepted) and run `python -m llm.stub_server`.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import itertools
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from llm.prompt_budget import TokenCounter
+from runtime.blob_store import MESSAGE_BLOB_DIRNAME, BlobStore, blob_digest
+
+
+Decisions = Dict[str, Any]
+# 策略返回决策字典，或原样返回的响应文本（回放）
+DecisionPolicy = Callable[[str, str], Union[Decisions, str]]
+
+_VERBOSE_MARKET = re.compile(
+    r"^(?P<coin>[A-Z0-9]+) MARKET SNAPSHOT\s*\n- Price: (?P<price>[-\d.eE+]+), EMA20: (?P<ema20>[-\d.eE+]+), "
+    r"MACD: (?P<macd>[-\d.eE+]+), RSI\(7\): (?P<rsi7>[-\d.eE+]+)",
+    re.MULTILINE,
+)
+_VERBOSE_POSITION = re.compile(r"^(?P<coin>[A-Z0-9]+) position data: (?P<payload>\{.*\})\s*$", re.MULTILINE)
+_COMPACT_POSITION = re.compile(r"^POSITION (?P<payload>\{.*\})\s*$", re.MULTILINE)
+
+
+def parse_prompt_market(prompt: str) -> Tuple[Dict[str, Dict[str, float]], Dict[str, str]]:
+    """
+    Extract per-coin price/EMA20/MACD/RSI7 and open position sides from a bot prompt.
+
+    Understands both the verbose and the compact prompt formats.
+    """
+    market: Dict[str, Dict[str, float]] = {}
+    for match in _VERBOSE_MARKET.finditer(prompt):
+        market[match.group("coin")] = {
+            key: float(match.group(key)) for key in ("price", "ema20", "macd", "rsi7")
+        }
+
+    lines = prompt.splitlines()
+    for index, line in enumerate(lines):
+        if not line.startswith("MARKET coin "):
+            continue
+        columns = line.split("|")[0].split()[1:]
+        for row in lines[index + 1:]:
+            fields = row.split("|")[0].split()
+            if len(fields) != len(columns) or not fields[0].isupper():
+                break
+            values = dict(zip(columns, fields))
+            try:
+                market[values["coin"]] = {
+                    key: float(values[key]) for key in ("price", "ema20", "macd", "rsi7")
+                }
+            except (KeyError, ValueError):
+                continue
+        break
+
+    positions: Dict[str, str] = {}
+    for pattern in (_VERBOSE_POSITION, _COMPACT_POSITION):
+        for match in pattern.finditer(prompt):
+            try:
+                payload = json.loads(match.group("payload"))
+            except json.JSONDecodeError:
+                continue
+            coin = payload.get("symbol") or match.groupdict().get("coin")
+            if coin:
+                positions[str(coin)] = str(payload.get("side", "")).lower()
+    return market, positions
+
+
+class HoldPolicy:
+    """Answer hold for every coin found in the prompt."""
+
+    def __call__(self, system: str, user: str) -> Decisions:
+        market, _ = parse_prompt_market(user)
+        return {
+            coin: {"signal": "hold", "justification": "stub: hold", "confidence": 0.5}
+            for coin in market
+        }
+
+
+class RuleBasedPolicy:
+    """
+    Deterministic trend rule on the indicators in the prompt: enter in the
+    direction of price vs EMA20 when MACD agrees and RSI(7) is not stretched,
+    close a position once both turn against it, hold otherwise.
+    """
+
+    def __init__(
+        self,
+        *,
+        risk_usd: float = 50.0,
+        stop_pct: float = 0.02,
+        reward_ratio: float = 2.0,
+        leverage: float = 5.0,
+    ) -> None:
+        self.risk_usd = risk_usd
+        self.stop_pct = stop_pct
+        self.reward_ratio = reward_ratio
+        self.leverage = leverage
+
+    def __call__(self, system: str, user: str) -> Decisions:
+        market, positions = parse_prompt_market(user)
+        return {coin: self.decide(coin, data, positions.get(coin)) for coin, data in market.items()}
+
+    def decide(self, coin: str, data: Dict[str, float], held_side: Optional[str]) -> Dict[str, Any]:
+        price, ema20, macd, rsi7 = data["price"], data["ema20"], data["macd"], data["rsi7"]
+        uptrend = price > ema20 and macd > 0
+        downtrend = price < ema20 and macd < 0
+        if held_side:
+            against = downtrend if held_side == "long" else uptrend
+            if against:
+                return {"signal": "close", "justification": "stub: trend reversed against position", "confidence": 0.6}
+            return {"signal": "hold", "justification": "stub: trend intact", "confidence": 0.6}
+
+        side = None
+        if uptrend and rsi7 < 70:
+            side = "long"
+        elif downtrend and rsi7 > 30:
+            side = "short"
+        if side is None or price <= 0:
+            return {"signal": "hold", "justification": "stub: no setup", "confidence": 0.4}
+
+        stop_distance = price * self.stop_pct
+        direction = 1 if side == "long" else -1
+        return {
+            "signal": "entry",
+            "side": side,
+            "quantity": round(self.risk_usd / stop_distance, 6),
+            "profit_target": round(price + direction * stop_distance * self.reward_ratio, 6),
+            "stop_loss": round(price - direction * stop_distance, 6),
+            "leverage": self.leverage,
+            "confidence": 0.65,
+            "risk_usd": self.risk_usd,
+            "invalidation_condition": f"Price closes {'below' if side == 'long' else 'above'} EMA20",
+            "justification": f"stub: price {'above' if side == 'long' else 'below'} EMA20 with MACD confirmation",
+        }
+
+
+class ReplayPolicy:
+    """
+    Replay assistant responses recorded in an `ai_messages.csv`, in order.
+
+    Responses are returned verbatim (including any text around the JSON), so the
+    bot's parsing path is exercised exactly as in the recorded run. `blob:` references
+    are resolved from `blob_dir` (default: the `message_blobs` directory next to the file).
+    """
+
+    def __init__(self, path: Path, *, loop: bool = True, blob_dir: Optional[Path] = None) -> None:
+        self.path = Path(path)
+        self.blobs = BlobStore(blob_dir if blob_dir is not None else self.path.parent / MESSAGE_BLOB_DIRNAME)
+        self.responses = self._load(self.path, self.blobs)
+        if not self.responses:
+            raise ValueError(f"No recorded assistant responses in {self.path}")
+        self._iterator: Iterator[str] = itertools.cycle(self.responses) if loop else iter(self.responses)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load(path: Path, blobs: BlobStore) -> List[str]:
+        csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+        responses: List[str] = []
+        with open(path, newline="", encoding="utf-8") as fh:
+            for row in csv.DictReader(fh):
+                content = row.get("content")
+                if row.get("direction") != "received" or row.get("role") != "assistant" or not content:
+                    continue
+                digest = blob_digest(content)
+                if digest is not None:
+                    content = blobs.get(digest)
+                    if content is None:
+                        logging.warning("Skipping recorded response with missing blob %s", digest)
+                        continue
+                responses.append(content)
+        return responses
+
+    def next_content(self) -> str:
+        with self._lock:
+            try:
+                return next(self._iterator)
+            except StopIteration:
+                raise LookupError("Replay exhausted") from None
+
+    def __call__(self, system: str, user: str) -> str:
+        return self.next_content()
+
+
+class StubLLMServer:
+    """
+    OpenAI/OpenRouter 兼容的本地 chat-completions 服务，用于离线基准测试。
+
+    - 决策来自可插拔的确定性策略（规则、回放、全部 hold），不访问网络、不消耗 token；
+    - `latency` 为每个请求的人工延迟（秒），`jitter` 为按 `seed` 生成的均匀随机抖动；
+      流式请求在 `first_token` 秒后发送首个分片，其余延迟平摊到后续分片；
+    - 返回的 `usage` 使用本地 token 估算，便于遥测与费用统计链路正常工作。
+    """
+
+    def __init__(
+        self,
+        policy: DecisionPolicy,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        first_token: Optional[float] = None,
+        chunk_chars: int = 24,
+        seed: int = 0,
+    ) -> None:
+        self.policy = policy
+        self.latency = max(latency, 0.0)
+        self.jitter = max(jitter, 0.0)
+        self.first_token = first_token
+        self.chunk_chars = max(1, chunk_chars)
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counter = TokenCounter()
+        self._thread: Optional[threading.Thread] = None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, kwargs={"poll_interval": 0.1}, name="stub-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "StubLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def complete(self, body: Dict[str, Any]) -> Tuple[str, Dict[str, Any], float, str]:
+        """Run the policy for one request: (content, usage, delay, response id)."""
+        messages = body.get("messages") or []
+        system = "\n".join(_message_text(m) for m in messages if m.get("role") == "system")
+        user = "\n".join(_message_text(m) for m in messages if m.get("role") != "system")
+        answer = self.policy(system, user)
+        content = answer if isinstance(answer, str) else json.dumps(answer, indent=2)
+        with self._lock:
+            self.requests += 1
+            response_id = f"stub-{self.requests}"
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        usage = {
+            "prompt_tokens": self._counter.count(system) + self._counter.count(user),
+            "completion_tokens": self._counter.count(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        return content, usage, delay, response_id
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self) -> None:  # noqa: N802 - http.server API
+                if not self.path.rstrip("/").endswith("chat/completions"):
+                    self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    content, usage, delay, response_id = server.complete(body)
+                except LookupError as exc:
+                    self._send_json(503, {"error": {"message": str(exc)}})
+                    return
+                except Exception as exc:  # 策略异常以 500 返回，便于测试 bot 的错误路径
+                    logging.exception("Stub LLM policy failed")
+                    self._send_json(500, {"error": {"message": f"{type(exc).__name__}: {exc}"}})
+                    return
+                model = body.get("model", "stub")
+                try:
+                    if body.get("stream"):
+                        self._stream(content, usage, delay, response_id, model)
+                    else:
+                        time.sleep(delay)
+                        self._send_json(200, {
+                            "id": response_id,
+                            "object": "chat.completion",
+                            "model": model,
+                            "choices": [{
+                                "index": 0,
+                                "message": {"role": "assistant", "content": content},
+                                "finish_reason": "stop",
+                            }],
+                            "usage": usage,
+                        })
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, content: str, usage: Dict[str, Any], delay: float, response_id: str, model: str) -> None:
+                pieces = [content[i:i + server.chunk_chars] for i in range(0, len(content), server.chunk_chars)] or [""]
+                first = min(delay, server.first_token) if server.first_token is not None else 0.0
+                step = (delay - first) / len(pieces) if pieces else 0.0
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                time.sleep(first)
+                for piece in pieces:
+                    self._event({"id": response_id, "model": model, "choices": [{"index": 0, "delta": {"content": piece}}]})
+                    time.sleep(step)
+                self._event({
+                    "id": response_id,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+                self._chunk(b"data: [DONE]\n\n")
+                self._chunk(b"")
+
+            def _event(self, payload: Dict[str, Any]) -> None:
+                self._chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+            def _chunk(self, data: bytes) -> None:
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+                logging.debug("stub-llm: " + format, *args)
+
+        return Handler
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content", "")
+    if isinstance(content, list):
+        return "".join(str(part.get("text", "")) for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def build_policy(name: str, replay_file: Optional[str] = None) -> DecisionPolicy:
+    if name == "rule":
+        return RuleBasedPolicy()
+    if name == "hold":
+        return HoldPolicy()
+    if name == "replay":
+        if not replay_file:
+            raise ValueError("--replay-file is required for the replay policy")
+        return ReplayPolicy(Path(replay_file))
+    raise ValueError(f"Unknown stub policy: {name}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible LLM stub for offline benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--policy", choices=("rule", "hold", "replay"), default="rule")
+    parser.add_argument("--replay-file", help="ai_messages.csv to replay assistant responses from")
+    parser.add_argument("--latency", type=float, default=0.0, help="Artificial seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra uniform random latency (seconds)")
+    parser.add_argument("--first-token", type=float, default=None, help="Seconds before the first streamed chunk")
+    parser.add_argument("--chunk-chars", type=int, default=24, help="Characters per streamed chunk")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    server = StubLLMServer(
+        build_policy(args.policy, args.replay_file),
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        first_token=args.first_token,
+        chunk_chars=args.chunk_chars,
+        seed=args.seed,
+    )
+    logging.info("Stub LLM (%s policy) listening on %s", args.policy, server.url)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
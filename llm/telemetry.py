@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import csv
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Mapping, Optional, Sequence
+
+from llm.prompt_layout import cached_prompt_tokens
+
+
+OUTCOMES = ("ok", "decode-fail", "http-error", "error", "cached", "cancelled")
+
+TELEMETRY_COLUMNS = [
+    "timestamp",
+    "model",
+    "outcome",
+    "latency_seconds",
+    "first_token_seconds",
+    "prompt_tokens",
+    "completion_tokens",
+    "cached_tokens",
+    "cost_usd",
+    "status_code",
+    "streamed",
+    "response_id",
+]
+
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """USD per million tokens."""
+
+    prompt: float
+    completion: float
+    cached: Optional[float] = None
+
+
+def parse_price_table(raw: str) -> Dict[str, ModelPrice]:
+    """Parse `model=prompt/completion[/cached],...`; `*` sets the default price."""
+    prices: Dict[str, ModelPrice] = {}
+    for item in (raw or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        model, sep, spec = item.rpartition("=")
+        parts = spec.split("/")
+        if not sep or not model.strip() or len(parts) not in (2, 3):
+            raise ValueError(f"Invalid LLM price entry: '{item}'")
+        try:
+            values = [float(part) for part in parts]
+        except ValueError as exc:
+            raise ValueError(f"Invalid LLM price entry: '{item}'") from exc
+        prices[model.strip()] = ModelPrice(*values)
+    return prices
+
+
+def estimate_cost(
+    usage: Optional[Mapping[str, Any]],
+    price: Optional[ModelPrice],
+) -> Optional[float]:
+    """Cost in USD: the provider-reported `usage.cost` if present, else priced tokens."""
+    if not isinstance(usage, Mapping):
+        return None
+    reported = usage.get("cost")
+    if reported is not None:
+        try:
+            return float(reported)
+        except (TypeError, ValueError):
+            pass
+    if price is None:
+        return None
+    prompt_tokens = _as_int(usage.get("prompt_tokens")) or 0
+    completion_tokens = _as_int(usage.get("completion_tokens")) or 0
+    cached_tokens = min(cached_prompt_tokens(usage) or 0, prompt_tokens)
+    cached_rate = price.cached if price.cached is not None else price.prompt
+    total = (
+        (prompt_tokens - cached_tokens) * price.prompt
+        + cached_tokens * cached_rate
+        + completion_tokens * price.completion
+    )
+    return total / 1_000_000
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """Linear-interpolated percentile (`q` in 0..100); None for no data."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return ordered[low]
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class LLMCallRecord:
+    model: str
+    timestamp: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    outcome: str = "ok"
+    latency: float = 0.0
+    first_token: Optional[float] = None
+    usage: Optional[Dict[str, Any]] = None
+    status_code: Optional[int] = None
+    response_id: Optional[str] = None
+    streamed: bool = False
+    cost: Optional[float] = None
+
+    @property
+    def prompt_tokens(self) -> Optional[int]:
+        return _as_int((self.usage or {}).get("prompt_tokens"))
+
+    @property
+    def completion_tokens(self) -> Optional[int]:
+        return _as_int((self.usage or {}).get("completion_tokens"))
+
+    @property
+    def cached_tokens(self) -> Optional[int]:
+        return cached_prompt_tokens(self.usage)
+
+    def as_row(self) -> List[Any]:
+        def number(value: Optional[float], digits: int) -> str:
+            return "" if value is None else f"{value:.{digits}f}"
+
+        def integer(value: Optional[int]) -> str:
+            return "" if value is None else str(value)
+
+        return [
+            self.timestamp.isoformat(),
+            self.model,
+            self.outcome,
+            number(self.latency, 3),
+            number(self.first_token, 3),
+            integer(self.prompt_tokens),
+            integer(self.completion_tokens),
+            integer(self.cached_tokens),
+            number(self.cost, 6),
+            integer(self.status_code),
+            "true" if self.streamed else "false",
+            self.response_id or "",
+        ]
+
+
+@dataclass
+class TelemetrySummary:
+    calls: int
+    outcomes: Dict[str, int]
+    latency: Dict[int, Optional[float]]
+    first_token: Dict[int, Optional[float]]
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    cost: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "outcomes": dict(self.outcomes),
+            "latency_seconds": {f"p{q}": value for q, value in self.latency.items()},
+            "first_token_seconds": {f"p{q}": value for q, value in self.first_token.items()},
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cost_usd": round(self.cost, 6),
+        }
+
+    def describe(self) -> str:
+        def triple(values: Dict[int, Optional[float]]) -> str:
+            return "/".join("-" if values[q] is None else f"{values[q]:.2f}" for q in PERCENTILES)
+
+        outcomes = ", ".join(f"{name} {count}" for name, count in self.outcomes.items() if count)
+        text = f"LLM last {self.calls}: latency p50/p95/p99 {triple(self.latency)}s"
+        if any(value is not None for value in self.first_token.values()):
+            text += f" | TTFT {triple(self.first_token)}s"
+        text += (
+            f" | tokens {self.prompt_tokens} in ({self.cached_tokens} cached) / {self.completion_tokens} out"
+            f" | ${self.cost:.4f} | {outcomes}"
+        )
+        return text
+
+
+class LLMTelemetry:
+    """
+    LLM 调用遥测：每次请求一行写入 `llm_calls.csv`（耗时、首 token 时间、token 数、
+    费用估算、模型与结果），并在内存中保留最近 `window` 次调用用于滚动分位数统计。
+
+    - 结果分类：ok / decode-fail / http-error / error（超时、连接错误等异常）/ cached（本地响应缓存命中）
+      / cancelled（对冲请求中落败被取消的一方）；
+    - 分位数只统计真正发出并完成的请求，本地缓存命中与被取消的请求不计入延迟；
+    - 多模型并发时由多个线程写入，写文件与内存窗口均加锁；
+    - 传入 `append(path, row)`（如 JournalWriter.append）时行只入队，由日志线程落盘，
+      表头在首次记录时同步写入一次。
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        window: int = 200,
+        prices: Optional[Mapping[str, ModelPrice]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        now: Callable[[], datetime] = lambda: datetime.now(timezone.utc),
+        append: Optional[Callable[[Path, Sequence[Any]], None]] = None,
+    ) -> None:
+        self.path = Path(path)
+        self.append = append
+        self._header_checked = False
+        self.prices = dict(prices or {})
+        self.clock = clock
+        self.now = now
+        self._recent: Deque[LLMCallRecord] = deque(maxlen=max(1, window))
+        self._lock = threading.Lock()
+
+    def price_for(self, model: str) -> Optional[ModelPrice]:
+        return self.prices.get(model) or self.prices.get("*")
+
+    @contextmanager
+    def track(self, model: str, *, streamed: bool = False) -> Iterator[LLMCallRecord]:
+        """Time one call; the caller fills in outcome/usage, exceptions count as `error`."""
+        record = LLMCallRecord(model=model, timestamp=self.now(), streamed=streamed)
+        started = self.clock()
+        try:
+            yield record
+        except BaseException:
+            record.outcome = "error"
+            raise
+        finally:
+            record.latency = max(self.clock() - started, 0.0)
+            self.record(record)
+
+    def record(self, record: LLMCallRecord) -> None:
+        if record.outcome not in OUTCOMES:
+            raise ValueError(f"Unknown LLM call outcome: {record.outcome}")
+        if record.cost is None and record.outcome != "cached":
+            record.cost = estimate_cost(record.usage, self.price_for(record.model))
+        with self._lock:
+            self._recent.append(record)
+            try:
+                if self.append is None:
+                    self._write_rows([record.as_row()])
+                else:
+                    if not self._header_checked:
+                        self._write_rows([])
+                        self._header_checked = True
+                    self.append(self.path, record.as_row())
+            except OSError as exc:
+                # 遥测写入失败不应影响交易决策
+                logging.warning("Failed to write LLM telemetry to %s: %s", self.path, exc)
+
+    def _write_rows(self, rows: Sequence[Sequence[Any]]) -> None:
+        new_file = not self.path.exists()
+        if not rows and not new_file:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", newline="") as fh:
+            writer = csv.writer(fh)
+            if new_file:
+                writer.writerow(TELEMETRY_COLUMNS)
+            writer.writerows(rows)
+
+    def recent(self) -> List[LLMCallRecord]:
+        with self._lock:
+            return list(self._recent)
+
+    def summary(self) -> Optional[TelemetrySummary]:
+        """Rolling statistics over the recent window, or None before the first call."""
+        records = self.recent()
+        if not records:
+            return None
+        live = [record for record in records if record.outcome != "cached"]
+        completed = [record for record in live if record.outcome != "cancelled"]
+        latencies = [record.latency for record in completed]
+        first_tokens = [record.first_token for record in completed if record.first_token is not None]
+        outcomes = {name: 0 for name in OUTCOMES}
+        for record in records:
+            outcomes[record.outcome] += 1
+        return TelemetrySummary(
+            calls=len(records),
+            outcomes=outcomes,
+            latency={q: percentile(latencies, q) for q in PERCENTILES},
+            first_token={q: percentile(first_tokens, q) for q in PERCENTILES},
+            prompt_tokens=sum(record.prompt_tokens or 0 for record in live),
+            completion_tokens=sum(record.completion_tokens or 0 for record in live),
+            cached_tokens=sum(record.cached_tokens or 0 for record in live),
+            cost=sum(record.cost or 0.0 for record in live),
+        )
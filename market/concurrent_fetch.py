@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Mapping, Optional, TypeVar
+
+
+K = TypeVar("K", bound=Hashable)
+
+_POLL_SECONDS = 0.05
+
+
+@dataclass
+class FetchOutcome:
+    """单个请求的结果：成功值、异常或超时。"""
+
+    key: Hashable
+    value: Any = None
+    error: Optional[BaseException] = None
+    timed_out: bool = False
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.timed_out
+
+    def describe_failure(self) -> str:
+        if self.timed_out:
+            return f"timeout after {self.elapsed:.2f}s"
+        if self.error is not None:
+            return f"{type(self.error).__name__}: {self.error}"
+        return "ok"
+
+
+def fetch_concurrently(
+    tasks: Mapping[K, Callable[[], Any]],
+    *,
+    max_workers: int,
+    timeout: Optional[float],
+) -> Dict[K, FetchOutcome]:
+    """
+    并发执行一组阻塞请求，返回与 tasks 相同键的结果字典。
+
+    - max_workers 限制线程池大小；
+    - timeout 为每个请求自开始执行起的时限，超时请求标记为 timed_out，不阻塞其他结果；
+    - 任一请求抛出的异常被捕获到 FetchOutcome.error 中（部分失败不影响整体）。
+    """
+    if not tasks:
+        return {}
+
+    started_at: Dict[K, float] = {}
+    finished_at: Dict[K, float] = {}
+
+    def run(key: K, fn: Callable[[], Any]) -> Any:
+        started_at[key] = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            finished_at[key] = time.perf_counter()
+
+    workers = max(1, min(int(max_workers), len(tasks)))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="market-fetch")
+    futures: Dict[Future, K] = {executor.submit(run, key, fn): key for key, fn in tasks.items()}
+    outcomes: Dict[K, FetchOutcome] = {}
+    pending = set(futures)
+
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = futures[future]
+                elapsed = finished_at.get(key, time.perf_counter()) - started_at.get(key, time.perf_counter())
+                error = future.exception()
+                outcomes[key] = FetchOutcome(
+                    key=key,
+                    value=None if error is not None else future.result(),
+                    error=error,
+                    elapsed=max(elapsed, 0.0),
+                )
+
+            if timeout is None or timeout <= 0:
+                continue
+            now = time.perf_counter()
+            for future in list(pending):
+                key = futures[future]
+                start = started_at.get(key)
+                if start is not None and now - start > timeout:
+                    # 线程无法强制终止；放弃等待，结果由后台线程自行结束
+                    pending.discard(future)
+                    outcomes[key] = FetchOutcome(key=key, timed_out=True, elapsed=now - start)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return {key: outcomes[key] for key in tasks}
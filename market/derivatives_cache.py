@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+
+DerivativeRow = Dict[str, Any]
+# fetch(limit, start_time_ms) -> 交易所原始历史（旧 → 新）
+DerivativeFetchFn = Callable[[int, Optional[int]], Sequence[DerivativeRow]]
+
+# 各端点历史记录中的时间字段
+TIME_FIELDS: Dict[str, str] = {
+    "funding": "fundingTime",
+    "open_interest": "timestamp",
+}
+
+_CACHE_VERSION = 1
+
+
+@dataclass
+class _HistoryEntry:
+    rows: List[DerivativeRow]
+    fetched_at: float
+    exhausted: bool = False
+
+    def last_time(self, time_field: str) -> Optional[int]:
+        if not self.rows:
+            return None
+        return int(self.rows[-1][time_field])
+
+
+@dataclass
+class DerivativesCacheStats:
+    hits: int = 0
+    seeds: int = 0
+    increments: int = 0
+    reseeds: int = 0
+    rows_downloaded: int = 0
+    by_kind: Dict[str, int] = field(default_factory=dict)
+
+
+class DerivativesHistoryCache:
+    """
+    资金费率 / 持仓量历史的跨迭代缓存。
+
+    - 每个端点（kind）有独立 TTL：TTL 内直接返回内存中的序列；
+    - TTL 过期后以 startTime = 最后一条记录时间做增量请求，按时间字段去重合并，
+      结果与缓存不衔接（缺口）或返回满窗口时重新整窗拉取；
+    - 可选持久化到 JSON 文件（原子替换），重启后直接命中。
+
+    时间由 `clock` 提供（秒），机器人传入可被回测替换的时间源。
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: Mapping[str, float],
+        capacity: int,
+        path: Optional[Path] = None,
+        incremental_limit: int = 10,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.ttl_seconds = dict(ttl_seconds)
+        self.capacity = capacity
+        self.path = Path(path) if path else None
+        self.incremental_limit = max(2, incremental_limit)
+        self.clock = clock
+        self._entries: Dict[Tuple[str, str], _HistoryEntry] = {}
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._guard = threading.Lock()
+        self._dirty = False
+        self.stats = DerivativesCacheStats()
+
+    def _entry_lock(self, key: Tuple[str, str]) -> threading.Lock:
+        with self._guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = threading.Lock()
+                self._locks[key] = lock
+            return lock
+
+    def get(self, kind: str, symbol: str, limit: int, fetch: DerivativeFetchFn) -> List[DerivativeRow]:
+        """Return the newest `limit` records, refreshing incrementally once the TTL expires."""
+        if kind not in TIME_FIELDS:
+            raise ValueError(f"Unsupported derivatives endpoint: {kind}")
+        if limit > self.capacity:
+            rows = list(fetch(limit, None) or [])
+            self.stats.rows_downloaded += len(rows)
+            return rows
+
+        key = (kind, symbol)
+        with self._entry_lock(key):
+            entry = self._entries.get(key)
+            now = self.clock()
+            if entry is None or (len(entry.rows) < limit and not entry.exhausted):
+                entry = self._seed(key, fetch, now)
+            elif now - entry.fetched_at >= self.ttl_seconds.get(kind, 0.0):
+                entry = self._extend(key, entry, fetch, now)
+            else:
+                self.stats.hits += 1
+                self.stats.by_kind[kind] = self.stats.by_kind.get(kind, 0) + 1
+            return [dict(row) for row in entry.rows[-limit:]] if limit > 0 else []
+
+    def _seed(self, key: Tuple[str, str], fetch: DerivativeFetchFn, now: float) -> _HistoryEntry:
+        rows = list(fetch(self.capacity, None) or [])
+        self.stats.seeds += 1
+        self.stats.rows_downloaded += len(rows)
+        entry = _HistoryEntry(
+            rows=self._sorted(key[0], rows)[-self.capacity:],
+            fetched_at=now,
+            exhausted=len(rows) < self.capacity,
+        )
+        self._store(key, entry)
+        return entry
+
+    def _extend(
+        self,
+        key: Tuple[str, str],
+        entry: _HistoryEntry,
+        fetch: DerivativeFetchFn,
+        now: float,
+    ) -> _HistoryEntry:
+        time_field = TIME_FIELDS[key[0]]
+        last_time = entry.last_time(time_field)
+        if last_time is None:
+            return self._seed(key, fetch, now)
+
+        rows = self._sorted(key[0], list(fetch(self.incremental_limit, last_time) or []))
+        self.stats.rows_downloaded += len(rows)
+        if len(rows) >= self.incremental_limit or (rows and int(rows[0][time_field]) > last_time):
+            # 增量窗口被截断或与缓存不衔接，重新整窗拉取
+            self.stats.reseeds += 1
+            return self._seed(key, fetch, now)
+
+        merged = {int(row[time_field]): row for row in entry.rows}
+        for row in rows:
+            merged[int(row[time_field])] = row
+        updated = _HistoryEntry(
+            rows=[merged[ts] for ts in sorted(merged)][-self.capacity:],
+            fetched_at=now,
+            exhausted=entry.exhausted,
+        )
+        self.stats.increments += 1
+        self._store(key, updated)
+        return updated
+
+    @staticmethod
+    def _sorted(kind: str, rows: List[DerivativeRow]) -> List[DerivativeRow]:
+        time_field = TIME_FIELDS[kind]
+        return sorted((dict(row) for row in rows), key=lambda row: int(row[time_field]))
+
+    def _store(self, key: Tuple[str, str], entry: _HistoryEntry) -> None:
+        with self._guard:
+            self._entries[key] = entry
+            self._dirty = True
+
+    def clear(self) -> None:
+        with self._guard:
+            self._entries.clear()
+            self._locks.clear()
+            self._dirty = False
+            self.stats = DerivativesCacheStats()
+
+    def load(self) -> int:
+        """Load persisted histories; return how many series were restored."""
+        if self.path is None or not self.path.exists():
+            return 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                payload = json.load(fh)
+        except (OSError, ValueError) as exc:
+            logging.warning("Ignoring unreadable derivatives cache %s: %s", self.path, exc)
+            return 0
+        if not isinstance(payload, dict) or payload.get("version") != _CACHE_VERSION:
+            return 0
+
+        restored = 0
+        with self._guard:
+            for item in payload.get("entries", []):
+                try:
+                    kind, symbol = str(item["kind"]), str(item["symbol"])
+                    if kind not in TIME_FIELDS:
+                        continue
+                    self._entries[(kind, symbol)] = _HistoryEntry(
+                        rows=list(item["rows"])[-self.capacity:],
+                        fetched_at=float(item["fetched_at"]),
+                        exhausted=bool(item.get("exhausted", False)),
+                    )
+                    restored += 1
+                except (KeyError, TypeError, ValueError):
+                    continue
+        return restored
+
+    def save(self) -> bool:
+        """Persist histories when anything changed since the last save."""
+        if self.path is None:
+            return False
+        with self._guard:
+            if not self._dirty:
+                return False
+            payload = {
+                "version": _CACHE_VERSION,
+                "entries": [
+                    {
+                        "kind": kind,
+                        "symbol": symbol,
+                        "fetched_at": entry.fetched_at,
+                        "exhausted": entry.exhausted,
+                        "rows": entry.rows,
+                    }
+                    for (kind, symbol), entry in self._entries.items()
+                ],
+            }
+            self._dirty = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump(payload, fh)
+            os.replace(tmp_path, self.path)
+        except OSError as exc:
+            logging.warning("Unable to persist derivatives cache to %s: %s", self.path, exc)
+            with self._guard:
+                self._dirty = True
+            return False
+        return True
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from itertools import chain
+from typing import Any, Sequence
+
+import numpy as np
+
+
+# Binance K 线行中机器人用到的字段：开盘时间 + OHLCV（其余 6 列直接丢弃）
+_OHLCV_SLICE = slice(1, 6)
+_OHLCV_FIELDS = 5
+
+
+@dataclass(frozen=True)
+class KlineArrays:
+    """按列存放的 K 线窗口（旧 → 新）：开盘时间为 int64，OHLCV 为连续的 float64 数组。"""
+
+    open_time: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.open_time)
+
+    @property
+    def mid_price(self) -> np.ndarray:
+        return (self.high + self.low) / 2
+
+    def tail(self, limit: int) -> "KlineArrays":
+        start = max(0, len(self) - max(0, limit))
+        return KlineArrays(
+            open_time=self.open_time[start:],
+            open=self.open[start:],
+            high=self.high[start:],
+            low=self.low[start:],
+            close=self.close[start:],
+            volume=self.volume[start:],
+        )
+
+
+def decode_klines(rows: Sequence[Sequence[Any]]) -> KlineArrays:
+    """
+    将 get_klines 返回的原始列表（字符串或数值）直接解码为 KlineArrays。
+
+    不构造 DataFrame：OHLCV 经一次 np.fromiter 解析为 (5, n) 的 float64 块，
+    每列都是该块的连续行视图。
+    """
+    n = len(rows)
+    open_time = np.fromiter((int(row[0]) for row in rows), dtype=np.int64, count=n)
+    flat = np.fromiter(
+        chain.from_iterable(row[_OHLCV_SLICE] for row in rows),
+        dtype=np.float64,
+        count=n * _OHLCV_FIELDS,
+    )
+    block = flat.reshape(n, _OHLCV_FIELDS).T.copy()
+    return KlineArrays(
+        open_time=open_time,
+        open=block[0],
+        high=block[1],
+        low=block[2],
+        close=block[3],
+        volume=block[4],
+    )
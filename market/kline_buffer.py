@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+
+KlineRow = List[Any]
+# fetch(limit, start_time_ms) -> Binance 原始 K 线（旧 → 新）
+KlineFetchFn = Callable[[int, Optional[int]], Sequence[KlineRow]]
+
+
+def _open_time(row: Sequence[Any]) -> int:
+    return int(row[0])
+
+
+class KlineRingBuffer:
+    """
+    固定容量的 K 线环形缓冲区（按开盘时间升序）。
+
+    merge() 只接收比缓冲区最后一根更新（或相同开盘时间）的 K 线：
+    相同开盘时间的未收盘 K 线原位替换，新 K 线追加，超出容量的最旧 K 线自动淘汰。
+    """
+
+    def __init__(self, capacity: int) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._rows: Deque[KlineRow] = deque(maxlen=capacity)
+        self.exhausted = False  # 种子请求返回的数据少于请求量（交易所历史不足）
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def last_open_time(self) -> Optional[int]:
+        if not self._rows:
+            return None
+        return _open_time(self._rows[-1])
+
+    def seed(self, rows: Sequence[KlineRow], requested: int) -> None:
+        self._rows.clear()
+        self.merge(rows)
+        self.exhausted = len(rows) < requested
+
+    def merge(self, rows: Sequence[KlineRow]) -> int:
+        """Merge ascending rows; return how many bars were appended."""
+        appended = 0
+        for row in rows:
+            open_time = _open_time(row)
+            last = self.last_open_time
+            if last is None or open_time > last:
+                self._rows.append(list(row))
+                appended += 1
+            elif open_time == last:
+                self._rows[-1] = list(row)
+        return appended
+
+    def tail(self, limit: int) -> List[KlineRow]:
+        if limit <= 0:
+            return []
+        rows = list(self._rows)
+        return rows[-limit:]
+
+    def clear(self) -> None:
+        self._rows.clear()
+        self.exhausted = False
+
+
+@dataclass
+class KlineBufferStats:
+    seeds: int = 0
+    increments: int = 0
+    reseeds: int = 0
+    rows_downloaded: int = 0
+
+
+class KlineBufferStore:
+    """
+    按 (symbol, interval) 维护环形缓冲区：首次整窗拉取，此后仅以 startTime
+    增量拉取最后一根（可能未收盘）K 线之后的数据。
+    """
+
+    def __init__(self, capacity: int, incremental_limit: int = 100) -> None:
+        self.capacity = capacity
+        self.incremental_limit = max(2, incremental_limit)
+        self._buffers: Dict[Tuple[str, str], KlineRingBuffer] = {}
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._guard = threading.Lock()
+        self.stats = KlineBufferStats()
+
+    def _entry(self, symbol: str, interval: str) -> Tuple[KlineRingBuffer, threading.Lock]:
+        key = (symbol, interval)
+        with self._guard:
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                buffer = KlineRingBuffer(self.capacity)
+                self._buffers[key] = buffer
+                self._locks[key] = threading.Lock()
+            return buffer, self._locks[key]
+
+    def buffer(self, symbol: str, interval: str) -> KlineRingBuffer:
+        return self._entry(symbol, interval)[0]
+
+    def get_klines(self, symbol: str, interval: str, limit: int, fetch: KlineFetchFn) -> List[KlineRow]:
+        """Return the newest `limit` bars, downloading only what changed since the last call."""
+        if limit > self.capacity:
+            rows = list(fetch(limit, None) or [])
+            self.stats.rows_downloaded += len(rows)
+            return rows
+
+        buffer, lock = self._entry(symbol, interval)
+        with lock:
+            if len(buffer) == 0 or (len(buffer) < limit and not buffer.exhausted):
+                self._seed(buffer, fetch)
+            else:
+                self._extend(buffer, fetch)
+            return buffer.tail(limit)
+
+    def peek(self, symbol: str, interval: str, limit: int) -> Optional[List[KlineRow]]:
+        """Return buffered bars without any download, or None when the buffer cannot serve `limit`."""
+        buffer, lock = self._entry(symbol, interval)
+        with lock:
+            if len(buffer) == 0 or (len(buffer) < limit and not buffer.exhausted):
+                return None
+            return buffer.tail(limit)
+
+    def apply_update(self, symbol: str, interval: str, row: Sequence[Any]) -> bool:
+        """
+        Merge one pushed bar (e.g. from a kline stream) into a seeded buffer.
+
+        Returns False when the buffer is not seeded yet or the bar is not contiguous
+        with the buffered history; a gap clears the buffer so the next read reseeds.
+        """
+        buffer, lock = self._entry(symbol, interval)
+        with lock:
+            if len(buffer) == 0:
+                return False
+            last = buffer.tail(1)[0]
+            open_time = _open_time(row)
+            if open_time > _open_time(last) and int(last[6]) + 1 != open_time:
+                buffer.clear()
+                return False
+            buffer.merge([row])
+            return True
+
+    def _seed(self, buffer: KlineRingBuffer, fetch: KlineFetchFn) -> None:
+        rows = list(fetch(self.capacity, None) or [])
+        buffer.seed(rows, self.capacity)
+        self.stats.seeds += 1
+        self.stats.rows_downloaded += len(rows)
+
+    def _extend(self, buffer: KlineRingBuffer, fetch: KlineFetchFn) -> None:
+        rows = list(fetch(self.incremental_limit, buffer.last_open_time) or [])
+        self.stats.rows_downloaded += len(rows)
+        if len(rows) >= self.incremental_limit:
+            # 间隔过长，增量窗口可能不完整，重新整窗拉取
+            self.stats.reseeds += 1
+            self._seed(buffer, fetch)
+            return
+        if rows and _open_time(rows[0]) > (buffer.last_open_time or 0):
+            # 增量结果未覆盖缓冲区最后一根，说明中间有缺口
+            self.stats.reseeds += 1
+            self._seed(buffer, fetch)
+            return
+        buffer.merge(rows)
+        self.stats.increments += 1
+
+    def clear(self) -> None:
+        with self._guard:
+            self._buffers.clear()
+            self._locks.clear()
+            self.stats = KlineBufferStats()
@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from .interfaces import MarketDataProvider
+from .kline_buffer import KlineBufferStore, KlineRingBuffer
+
+
+StreamKey = Tuple[str, str]
+KlineListener = Callable[[str, str, List[Any], bool], None]
+
+_STOP = object()
+
+
+def _as_naive_utc(value: datetime) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts
+
+
+def parse_kline_event(message: Any) -> Optional[Tuple[str, str, List[Any], bool]]:
+    """
+    解析 Binance kline 推送（支持 combined stream 的 {"stream", "data"} 包装）。
+
+    返回 (symbol, interval, row, is_closed)，row 与 REST get_klines 的 12 列格式一致；
+    非 kline 消息返回 None。
+    """
+    if isinstance(message, (str, bytes)):
+        try:
+            message = json.loads(message)
+        except (TypeError, ValueError):
+            return None
+    if not isinstance(message, dict):
+        return None
+    if "data" in message and isinstance(message["data"], dict):
+        message = message["data"]
+    if message.get("e") != "kline" or not isinstance(message.get("k"), dict):
+        return None
+
+    k = message["k"]
+    try:
+        symbol = str(k.get("s") or message["s"]).upper()
+        interval = str(k["i"])
+        row = [
+            int(k["t"]),
+            str(k["o"]),
+            str(k["h"]),
+            str(k["l"]),
+            str(k["c"]),
+            str(k["v"]),
+            int(k["T"]),
+            str(k.get("q", "0")),
+            int(k.get("n", 0)),
+            str(k.get("V", "0")),
+            str(k.get("Q", "0")),
+            str(k.get("B", "0")),
+        ]
+    except (KeyError, TypeError, ValueError):
+        return None
+    return symbol, interval, row, bool(k.get("x", False))
+
+
+class KlineStreamState:
+    """
+    由 kline 推送维护的最新 K 线状态（线程安全）。
+
+    - 绑定 KlineBufferStore 时，推送直接并入对应环形缓冲区，REST 仅用于首次种子；
+    - 未绑定时使用自有缓冲区；
+    - 记录每个 (symbol, interval) 的最近接收时间，用于判断数据是否新鲜。
+    """
+
+    def __init__(
+        self,
+        buffers: Optional[KlineBufferStore] = None,
+        capacity: int = 200,
+        record_path: Optional[Path] = None,
+    ) -> None:
+        self.buffers = buffers
+        self.capacity = capacity
+        self._own_buffers: Dict[StreamKey, KlineRingBuffer] = {}
+        self._last_update: Dict[StreamKey, float] = {}
+        self._lock = threading.Lock()
+        self._listeners: List[KlineListener] = []
+        self._record_path = Path(record_path) if record_path else None
+        self.events_applied = 0
+
+    def add_listener(self, listener: KlineListener) -> None:
+        self._listeners.append(listener)
+
+    def apply(self, message: Any) -> bool:
+        """Apply one raw stream message; return True when it was a kline update."""
+        parsed = parse_kline_event(message)
+        if parsed is None:
+            return False
+        symbol, interval, row, is_closed = parsed
+        key = (symbol, interval)
+
+        if self._record_path is not None:
+            self._record(message)
+
+        if self.buffers is not None:
+            self.buffers.apply_update(symbol, interval, row)
+        else:
+            with self._lock:
+                buffer = self._own_buffers.get(key)
+                if buffer is None:
+                    buffer = KlineRingBuffer(self.capacity)
+                    self._own_buffers[key] = buffer
+                buffer.merge([row])
+
+        with self._lock:
+            self._last_update[key] = time.monotonic()
+            self.events_applied += 1
+
+        for listener in list(self._listeners):
+            try:
+                listener(symbol, interval, row, is_closed)
+            except Exception as exc:  # pragma: no cover - listener isolation
+                logging.warning("Kline stream listener failed: %s", exc)
+        return True
+
+    def _record(self, message: Any) -> None:
+        payload = message if isinstance(message, str) else json.dumps(message)
+        try:
+            with open(self._record_path, "a", encoding="utf-8") as fh:
+                fh.write(payload.strip() + "\n")
+        except OSError as exc:  # pragma: no cover - disk errors
+            logging.warning("Unable to record kline stream message: %s", exc)
+
+    def klines(self, symbol: str, interval: str, limit: int) -> List[List[Any]]:
+        if self.buffers is not None:
+            return self.buffers.buffer(symbol, interval).tail(limit)
+        with self._lock:
+            buffer = self._own_buffers.get((symbol, interval))
+            return buffer.tail(limit) if buffer is not None else []
+
+    def latest(self, symbol: str, interval: str) -> Optional[List[Any]]:
+        rows = self.klines(symbol, interval, 1)
+        return rows[-1] if rows else None
+
+    def age(self, symbol: str, interval: str) -> Optional[float]:
+        with self._lock:
+            updated = self._last_update.get((symbol, interval))
+        if updated is None:
+            return None
+        return time.monotonic() - updated
+
+    def is_fresh(self, symbol: str, interval: str, max_age_seconds: float) -> bool:
+        age = self.age(symbol, interval)
+        return age is not None and age <= max_age_seconds
+
+
+class BinanceKlineStream:
+    """通过 python-binance ThreadedWebsocketManager 订阅多路 kline 推送。"""
+
+    def __init__(self, state: KlineStreamState, api_key: str = "", api_secret: str = "") -> None:
+        self.state = state
+        self._api_key = api_key
+        self._api_secret = api_secret
+        self._manager: Any = None
+        self._socket_name: Optional[str] = None
+
+    @staticmethod
+    def stream_names(pairs: Iterable[StreamKey]) -> List[str]:
+        return [f"{symbol.lower()}@kline_{interval}" for symbol, interval in pairs]
+
+    def start(self, pairs: Sequence[StreamKey]) -> None:
+        from binance import ThreadedWebsocketManager  # 延迟导入，离线回放不依赖 websockets
+
+        self._manager = ThreadedWebsocketManager(api_key=self._api_key or None, api_secret=self._api_secret or None)
+        self._manager.start()
+        self._socket_name = self._manager.start_multiplex_socket(
+            callback=self._on_message,
+            streams=self.stream_names(pairs),
+        )
+
+    def _on_message(self, message: Dict[str, Any]) -> None:
+        if isinstance(message, dict) and message.get("e") == "error":
+            logging.warning("Binance kline stream error: %s", message.get("m"))
+            return
+        self.state.apply(message)
+
+    def stop(self) -> None:
+        if self._manager is not None:
+            try:
+                self._manager.stop()
+            except Exception as exc:  # pragma: no cover - shutdown guard
+                logging.debug("Error stopping Binance kline stream: %s", exc)
+            self._manager = None
+
+
+class ReplayKlineStream:
+    """
+    离线替身：从 JSONL 文件（每行一条原始 kline 推送）回放到本地队列，
+    由后台线程消费并写入 KlineStreamState，与实时推送走同一路径。
+    """
+
+    def __init__(
+        self,
+        state: KlineStreamState,
+        path: Path,
+        delay_seconds: float = 0.0,
+        loop: bool = False,
+    ) -> None:
+        self.state = state
+        self.path = Path(path)
+        self.delay_seconds = max(0.0, delay_seconds)
+        self.loop = loop
+        self.queue: "queue.Queue[Any]" = queue.Queue()
+        self._stop = threading.Event()
+        self._producer: Optional[threading.Thread] = None
+        self._consumer: Optional[threading.Thread] = None
+        self.finished = threading.Event()
+
+    def _read_messages(self) -> List[str]:
+        with open(self.path, "r", encoding="utf-8") as fh:
+            return [line.strip() for line in fh if line.strip()]
+
+    def _produce(self, pairs: Optional[Sequence[StreamKey]]) -> None:
+        wanted = {(s.upper(), i) for s, i in pairs} if pairs else None
+        try:
+            while not self._stop.is_set():
+                for line in self._read_messages():
+                    if self._stop.is_set():
+                        break
+                    if wanted is not None:
+                        parsed = parse_kline_event(line)
+                        if parsed is None or (parsed[0], parsed[1]) not in wanted:
+                            continue
+                    self.queue.put(line)
+                    if self.delay_seconds:
+                        self._stop.wait(self.delay_seconds)
+                if not self.loop:
+                    break
+        finally:
+            self.queue.put(_STOP)
+
+    def _consume(self) -> None:
+        while True:
+            message = self.queue.get()
+            if message is _STOP:
+                break
+            self.state.apply(message)
+        self.finished.set()
+
+    def start(self, pairs: Optional[Sequence[StreamKey]] = None) -> None:
+        self._stop.clear()
+        self.finished.clear()
+        self._consumer = threading.Thread(target=self._consume, name="kline-replay-consumer", daemon=True)
+        self._producer = threading.Thread(target=self._produce, args=(pairs,), name="kline-replay-producer", daemon=True)
+        self._consumer.start()
+        self._producer.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.finished.wait(timeout)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._producer is not None:
+            self._producer.join(timeout=2)
+        if self._consumer is not None:
+            self._consumer.join(timeout=2)
+
+
+class StreamingMarketDataProvider(MarketDataProvider):
+    """基于 kline 推送的行情提供者：subscribe() 启动推送，load_ohlcv() 读取内存状态。"""
+
+    def __init__(self, feed: Any, state: Optional[KlineStreamState] = None) -> None:
+        self.feed = feed
+        self.state = state or feed.state
+
+    def subscribe(self, symbols: Iterable[str], freq: str) -> None:
+        self.feed.start([(str(symbol).upper(), freq) for symbol in symbols])
+
+    def load_ohlcv(
+        self,
+        symbol: str,
+        freq: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> pd.DataFrame:
+        rows = self.state.klines(str(symbol).upper(), freq, limit or self.state.capacity)
+        if not rows:
+            return pd.DataFrame(columns=["datetime", "open", "high", "low", "close", "volume"])
+        df = pd.DataFrame(
+            {
+                "datetime": pd.to_datetime([int(r[0]) for r in rows], unit="ms"),
+                "open": pd.to_numeric([r[1] for r in rows], errors="coerce"),
+                "high": pd.to_numeric([r[2] for r in rows], errors="coerce"),
+                "low": pd.to_numeric([r[3] for r in rows], errors="coerce"),
+                "close": pd.to_numeric([r[4] for r in rows], errors="coerce"),
+                "volume": pd.to_numeric([r[5] for r in rows], errors="coerce"),
+            }
+        )
+        if start is not None:
+            df = df[df["datetime"] >= _as_naive_utc(start)]
+        if end is not None:
+            df = df[df["datetime"] <= _as_naive_utc(end)]
+        return df.reset_index(drop=True)
+
+    def close(self) -> None:
+        self.feed.stop()
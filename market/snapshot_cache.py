@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+
+FetchFn = Callable[[int], Sequence[Any]]
+
+
+@dataclass
+class _SeriesEntry:
+    rows: List[Any]
+    requested: int
+    fetched_at: float
+
+
+@dataclass
+class SnapshotStats:
+    hits: int = 0
+    misses: int = 0
+    by_kind: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+    def record(self, kind: str, hit: bool) -> None:
+        bucket = self.by_kind.setdefault(kind, {"hits": 0, "misses": 0})
+        if hit:
+            self.hits += 1
+            bucket["hits"] += 1
+        else:
+            self.misses += 1
+            bucket["misses"] += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "by_kind": {kind: dict(values) for kind, values in self.by_kind.items()},
+        }
+
+
+class MarketSnapshotCache:
+    """
+    单次迭代内的行情快照缓存。
+
+    - 同一 (kind, symbol, interval) 只向交易所请求一次，后续调用直接切片内存数据；
+    - 较小的 limit 由已缓存的较大窗口满足（取尾部），更大的 limit 触发一次补拉；
+    - 派生结果（如指标快照）可通过 get_or_compute 复用；
+    - reset() 标记新迭代开始，hits/misses 计数用于观察节省的请求量。
+    """
+
+    def __init__(self, max_age_seconds: Optional[float] = None) -> None:
+        self.max_age_seconds = max_age_seconds if max_age_seconds and max_age_seconds > 0 else None
+        self._series: Dict[Hashable, _SeriesEntry] = {}
+        self._computed: Dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+        self.stats = SnapshotStats()
+
+    def reset(self) -> None:
+        """Drop cached payloads and counters at the start of a new iteration."""
+        with self._lock:
+            self._series.clear()
+            self._computed.clear()
+            self.stats = SnapshotStats()
+
+    def _is_fresh(self, fetched_at: float) -> bool:
+        if self.max_age_seconds is None:
+            return True
+        return (time.monotonic() - fetched_at) <= self.max_age_seconds
+
+    def get_series(
+        self,
+        key: Sequence[Hashable],
+        limit: int,
+        fetch: FetchFn,
+        *,
+        min_limit: int = 0,
+    ) -> List[Any]:
+        """
+        Return the newest `limit` rows for `key`, fetching at most once per iteration.
+
+        `fetch` receives the number of rows to request; `min_limit` widens the first
+        request so that later, larger consumers of the same series are served from memory.
+        """
+        cache_key = tuple(key)
+        kind = str(cache_key[0]) if cache_key else "series"
+        with self._lock:
+            entry = self._series.get(cache_key)
+            if entry is not None and self._is_fresh(entry.fetched_at):
+                # 已有窗口足够，或上次请求已拿到全部可用历史
+                if len(entry.rows) >= limit or entry.requested >= limit:
+                    self.stats.record(kind, hit=True)
+                    return list(entry.rows[-limit:]) if limit > 0 else []
+            self.stats.record(kind, hit=False)
+
+        request_limit = max(limit, min_limit)
+        rows = list(fetch(request_limit) or [])
+        with self._lock:
+            self._series[cache_key] = _SeriesEntry(
+                rows=rows,
+                requested=request_limit,
+                fetched_at=time.monotonic(),
+            )
+        return list(rows[-limit:]) if limit > 0 else []
+
+    def get_or_compute(self, key: Sequence[Hashable], factory: Callable[[], Any]) -> Any:
+        """Memoise a derived value for this iteration; None results are not cached."""
+        cache_key = tuple(key)
+        kind = str(cache_key[0]) if cache_key else "computed"
+        with self._lock:
+            if cache_key in self._computed:
+                self.stats.record(kind, hit=True)
+                return self._computed[cache_key]
+            self.stats.record(kind, hit=False)
+
+        value = factory()
+        if value is not None:
+            with self._lock:
+                self._computed[cache_key] = value
+        return value
+
+    def invalidate(self, key: Sequence[Hashable]) -> None:
+        cache_key = tuple(key)
+        with self._lock:
+            self._series.pop(cache_key, None)
+            self._computed.pop(cache_key, None)
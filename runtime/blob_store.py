@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import zlib
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
+
+
+BLOB_REF_PREFIX = "blob:"
+# 消息 blob 目录相对于数据目录（ai_messages.csv 所在目录）的名称
+MESSAGE_BLOB_DIRNAME = "message_blobs"
+
+_DIGEST_LENGTH = 64
+
+
+def content_digest(text: str) -> str:
+    """SHA-256 digest under which `text` is (or will be) stored."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def blob_digest(value: Any) -> Optional[str]:
+    """Return the SHA-256 digest of a `blob:<digest>` reference, or None for inline text."""
+    if not isinstance(value, str) or not value.startswith(BLOB_REF_PREFIX):
+        return None
+    digest = value[len(BLOB_REF_PREFIX):]
+    if len(digest) != _DIGEST_LENGTH or any(ch not in "0123456789abcdef" for ch in digest):
+        return None
+    return digest
+
+
+@dataclass(frozen=True)
+class BlobRef:
+    digest: str
+    size: int
+    stored_size: int
+    compressed: bool
+    created: bool
+    base: Optional[str] = None
+
+    @property
+    def ref(self) -> str:
+        return f"{BLOB_REF_PREFIX}{self.digest}"
+
+
+@dataclass
+class BlobStoreStats:
+    puts: int = 0
+    created: int = 0
+    deduplicated: int = 0
+    deltas: int = 0
+    bytes_in: int = 0
+    bytes_stored: int = 0
+    errors: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def describe(self) -> str:
+        ratio = self.bytes_in / self.bytes_stored if self.bytes_stored else None
+        return (
+            f"Message blobs: {self.puts} payloads, {self.created} stored ({self.deltas} deltas),"
+            f" {self.deduplicated} deduplicated"
+            f" | {self.bytes_in / 1024:.1f} KB in -> {self.bytes_stored / 1024:.1f} KB on disk"
+            + (f" ({ratio:.1f}x)" if ratio else "")
+            + (f" | {self.errors} errors" if self.errors else "")
+        )
+
+
+class BlobStore:
+    """
+    内容寻址的消息正文存储：相同内容只保存一次，日志中只记录 `blob:<sha256>` 引用。
+
+    - 文件按摘要前两位分目录，超过 `compress_threshold` 字节的正文以 gzip 压缩保存（`.gz` 后缀）；
+    - `put(text, family=...)` 传入同类消息的分组名（如 "sent:user"）时，以该组上一条正文作为
+      zlib 预置字典做差量压缩（`.zd` 后缀，首行为基准摘要），每轮行情提示词结构几乎相同，
+      差量通常只有 gzip 的几分之一；差量链长度不超过 `max_chain`，随后重新保存完整正文；
+    - 写入为临时文件 + 原子替换，多个线程或进程同时写同一内容也只会得到一个完整文件；
+    - 已知摘要缓存在内存中，重复内容（如每轮相同的系统提示词）不再触及磁盘；
+    - `get()` / `resolve()` 按需读取完整正文，找不到时返回 None / 原引用，不抛异常。
+    """
+
+    _SUFFIXES = (".gz", ".zd", "")
+
+    def __init__(
+        self,
+        root: Path,
+        *,
+        compress_threshold: int = 1024,
+        compresslevel: int = 6,
+        max_chain: int = 16,
+    ) -> None:
+        self.root = Path(root)
+        self.compress_threshold = max(0, compress_threshold)
+        self.compresslevel = compresslevel
+        self.max_chain = max(0, max_chain)
+        self.stats = BlobStoreStats()
+        self._known: Set[str] = set()
+        # family -> (上一条正文摘要, 正文字节, 差量链深度)
+        self._families: Dict[str, Tuple[str, bytes, int]] = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, digest: str, suffix: str = "") -> Path:
+        return self.root / digest[:2] / f"{digest}{suffix}"
+
+    def _existing_path(self, digest: str) -> Optional[Path]:
+        for suffix in self._SUFFIXES:
+            path = self.path_for(digest, suffix)
+            if path.exists():
+                return path
+        return None
+
+    def _encode(self, data: bytes, family: Optional[str]) -> Tuple[str, bytes, Optional[str], int]:
+        """Pick the smallest encoding: raw, gzip, or a zlib delta against the family's previous text."""
+        if len(data) < self.compress_threshold:
+            return "", data, None, 0
+        best = (".gz", gzip.compress(data, compresslevel=self.compresslevel, mtime=0), None, 0)
+        previous = self._families.get(family) if family is not None else None
+        if previous is not None and previous[2] < self.max_chain:
+            base_digest, base_data, depth = previous
+            compressor = zlib.compressobj(self.compresslevel, zdict=base_data)
+            delta = base_digest.encode("ascii") + b"\n" + compressor.compress(data) + compressor.flush()
+            if len(delta) < len(best[1]):
+                best = (".zd", delta, base_digest, depth + 1)
+        return best
+
+    def put(self, text: str, family: Optional[str] = None) -> Optional[BlobRef]:
+        """Store `text` (once per distinct content); None when the write fails."""
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self.stats.puts += 1
+            self.stats.bytes_in += len(data)
+            known = digest in self._known
+        if known or self._existing_path(digest) is not None:
+            with self._lock:
+                self._known.add(digest)
+                self.stats.deduplicated += 1
+            return BlobRef(digest, len(data), 0, len(data) >= self.compress_threshold, created=False)
+
+        with self._lock:
+            suffix, payload, base, depth = self._encode(data, family)
+        path = self.path_for(digest, suffix)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{digest[:8]}-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as fh:
+                    fh.write(payload)
+                os.replace(tmp_name, path)
+            except BaseException:
+                if os.path.exists(tmp_name):
+                    os.unlink(tmp_name)
+                raise
+        except OSError as exc:
+            logging.warning("Unable to write message blob %s: %s", path, exc)
+            with self._lock:
+                self.stats.errors += 1
+            return None
+        with self._lock:
+            self._known.add(digest)
+            self.stats.created += 1
+            self.stats.deltas += base is not None
+            self.stats.bytes_stored += len(payload)
+            if family is not None and suffix:
+                self._families[family] = (digest, data, depth)
+        return BlobRef(digest, len(data), len(payload), bool(suffix), created=True, base=base)
+
+    def _read(self, digest: str, depth: int) -> bytes:
+        path = self._existing_path(digest)
+        if path is None:
+            raise FileNotFoundError(digest)
+        raw = path.read_bytes()
+        if path.suffix == ".gz":
+            return gzip.decompress(raw)
+        if path.suffix == ".zd":
+            if depth > self.max_chain + 1:
+                raise ValueError(f"delta chain too deep at {digest}")
+            base_ref, _, delta = raw.partition(b"\n")
+            base_digest = blob_digest(BLOB_REF_PREFIX + base_ref.decode("ascii"))
+            if base_digest is None:
+                raise ValueError(f"malformed delta header in {digest}")
+            decompressor = zlib.decompressobj(zdict=self._read(base_digest, depth + 1))
+            return decompressor.decompress(delta) + decompressor.flush()
+        return raw
+
+    def get(self, digest: str) -> Optional[str]:
+        """Return the stored text for `digest`, or None when it (or its delta base) is missing or unreadable."""
+        try:
+            return self._read(digest, 0).decode("utf-8")
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError, zlib.error) as exc:
+            logging.warning("Ignoring unreadable message blob %s: %s", digest, exc)
+            return None
+
+    def resolve(self, value: Any) -> Any:
+        """Expand a `blob:` reference to its text; inline values and missing blobs pass through unchanged."""
+        digest = blob_digest(value)
+        if digest is None:
+            return value
+        text = self.get(digest)
+        return value if text is None else text
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+@dataclass(frozen=True)
+class EndpointPolicy:
+    """Timeout budget and retry settings for one logical endpoint."""
+
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+    # 含重试与退避在内的总时长上限；None 表示不限制
+    total_budget: Optional[float] = None
+    max_retries: int = 2
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    retry_on_timeout: bool = False
+
+
+@dataclass
+class HostStats:
+    requests: int = 0
+    attempts: int = 0
+    retries: int = 0
+    failures: int = 0
+    connections_opened: int = 0
+    connections_reused: int = 0
+
+
+@dataclass
+class TransportStats:
+    requests: int = 0
+    attempts: int = 0
+    retries: int = 0
+    failures: int = 0
+    connections_opened: int = 0
+    connections_reused: int = 0
+    by_host: Dict[str, HostStats] = field(default_factory=dict)
+
+
+class HttpTransport:
+    """
+    共享的 HTTP 连接池：按主机复用 keep-alive 会话，统一超时与重试策略。
+
+    - 每个 scheme://host 一个 requests.Session，底层 urllib3 连接池保持长连接；
+    - 429 / 5xx 与连接错误按带抖动的指数退避重试，优先遵循 Retry-After；
+    - 每个端点（endpoint 名称）有独立的连接/读取超时及总时长预算，重试不会超出预算；
+    - stats() 汇总请求、重试次数以及新建 / 复用的连接数。
+
+    读取超时默认不重试：对 LLM 这类非幂等、按量计费的请求，重放可能产生重复费用。
+    """
+
+    def __init__(
+        self,
+        policies: Optional[Mapping[str, EndpointPolicy]] = None,
+        default_policy: Optional[EndpointPolicy] = None,
+        pool_maxsize: int = 10,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        self.policies: Dict[str, EndpointPolicy] = dict(policies or {})
+        self.default_policy = default_policy or EndpointPolicy()
+        self.pool_maxsize = max(1, pool_maxsize)
+        self.sleep = sleep
+        self.clock = clock
+        self._rng = rng or random.Random()
+        self._sessions: Dict[str, Tuple[requests.Session, HTTPAdapter]] = {}
+        self._counters: Dict[str, HostStats] = {}
+        self._guard = threading.Lock()
+
+    def set_policy(self, endpoint: str, policy: EndpointPolicy) -> None:
+        self.policies[endpoint] = policy
+
+    def policy(self, endpoint: Optional[str]) -> EndpointPolicy:
+        if endpoint is None:
+            return self.default_policy
+        return self.policies.get(endpoint, self.default_policy)
+
+    def session(self, url: str) -> requests.Session:
+        """Return the pooled session serving the host of `url`."""
+        return self._host_session(_host_key(url))[0]
+
+    def _host_session(self, host: str) -> Tuple[requests.Session, HTTPAdapter]:
+        with self._guard:
+            entry = self._sessions.get(host)
+            if entry is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=self.pool_maxsize,
+                    max_retries=0,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                entry = (session, adapter)
+                self._sessions[host] = entry
+                self._counters.setdefault(host, HostStats())
+            return entry
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        endpoint: Optional[str] = None,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """
+        Send a request through the host pool, retrying throttled / failed attempts.
+
+        `timeout` overrides the endpoint's read timeout.  When every retry is
+        exhausted the last response is returned (so callers still see the
+        status code); the last connection error is re-raised.
+        """
+        policy = self.policy(endpoint)
+        read_timeout = policy.read_timeout if timeout is None else timeout
+        host = _host_key(url)
+        session, _ = self._host_session(host)
+        counters = self._counters[host]
+        self._bump(counters, "requests")
+
+        started = self.clock()
+        deadline = started + policy.total_budget if policy.total_budget is not None else None
+        attempt = 0
+        while True:
+            per_attempt = (min(policy.connect_timeout, read_timeout), read_timeout)
+            if deadline is not None:
+                remaining = max(0.001, deadline - self.clock())
+                per_attempt = (min(per_attempt[0], remaining), min(per_attempt[1], remaining))
+            self._bump(counters, "attempts")
+            try:
+                response = session.request(method, url, timeout=per_attempt, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                retryable = not isinstance(exc, requests.ReadTimeout) or policy.retry_on_timeout
+                delay = self._retry_delay(policy, attempt, None, deadline) if retryable else None
+                if delay is None:
+                    self._bump(counters, "failures")
+                    raise
+                logging.debug("HTTP %s %s failed (%s); retrying in %.2fs", method, host, exc, delay)
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                delay = self._retry_delay(policy, attempt, response, deadline)
+                if delay is None:
+                    self._bump(counters, "failures")
+                    return response
+                logging.debug(
+                    "HTTP %s %s returned %s; retrying in %.2fs",
+                    method,
+                    host,
+                    response.status_code,
+                    delay,
+                )
+                response.close()
+            attempt += 1
+            self._bump(counters, "retries")
+            if delay > 0:
+                self.sleep(delay)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def _retry_delay(
+        self,
+        policy: EndpointPolicy,
+        attempt: int,
+        response: Optional[requests.Response],
+        deadline: Optional[float],
+    ) -> Optional[float]:
+        """Backoff before the next attempt, or None when no retry is allowed."""
+        if attempt >= policy.max_retries:
+            return None
+        ceiling = min(policy.backoff_max, policy.backoff_base * (2 ** attempt))
+        # 等幅抖动：保留一半退避时间，另一半随机，避免多个客户端同时重试
+        delay = ceiling / 2 + self._rng.uniform(0, ceiling / 2)
+        retry_after = _retry_after_seconds(response) if response is not None else None
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if deadline is not None and self.clock() + delay >= deadline:
+            return None
+        return delay
+
+    def _bump(self, counters: HostStats, name: str) -> None:
+        with self._guard:
+            setattr(counters, name, getattr(counters, name) + 1)
+
+    def stats(self) -> TransportStats:
+        """Aggregate request / retry counters and pooled connection usage per host."""
+        summary = TransportStats()
+        with self._guard:
+            for host, counters in self._counters.items():
+                snapshot = HostStats(**vars(counters))
+                entry = self._sessions.get(host)
+                if entry is not None:
+                    opened, served = _pool_usage(entry[1])
+                    snapshot.connections_opened = opened
+                    snapshot.connections_reused = max(0, served - opened)
+                summary.by_host[host] = snapshot
+                for name in (
+                    "requests",
+                    "attempts",
+                    "retries",
+                    "failures",
+                    "connections_opened",
+                    "connections_reused",
+                ):
+                    setattr(summary, name, getattr(summary, name) + getattr(snapshot, name))
+        return summary
+
+    def close(self) -> None:
+        with self._guard:
+            for session, _ in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+def _host_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def _pool_usage(adapter: HTTPAdapter) -> Tuple[int, int]:
+    """(connections opened, requests served) across the adapter's urllib3 pools."""
+    opened = served = 0
+    for key in list(adapter.poolmanager.pools.keys()):
+        pool = adapter.poolmanager.pools.get(key)
+        if pool is None:
+            continue
+        opened += getattr(pool, "num_connections", 0)
+        served += getattr(pool, "num_requests", 0)
+    return opened, served
+
+
+def _retry_after_seconds(response: requests.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment is None:
+        return None
+    return max(0.0, moment.timestamp() - time.time())
+
+
+_default_transport: Optional[HttpTransport] = None
+_default_guard = threading.Lock()
+
+
+def get_transport() -> HttpTransport:
+    """Process-wide transport shared by the bot, notifiers and helper scripts."""
+    global _default_transport
+    with _default_guard:
+        if _default_transport is None:
+            _default_transport = HttpTransport()
+        return _default_transport
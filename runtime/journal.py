@@ -0,0 +1,481 @@
+from __future__ import annotations
+
+import atexit
+import csv
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Protocol, Sequence, Tuple, Union
+
+import pandas as pd
+
+
+Row = Sequence[Any]
+
+JOURNAL_BACKENDS = ("csv", "parquet", "sqlite")
+# Parquet 日志在数据目录下的子目录名 / SQLite 日志的数据库文件名
+PARQUET_JOURNAL_DIRNAME = "journal"
+SQLITE_JOURNAL_FILENAME = "journal.sqlite3"
+# 机器人启动时记录当前使用的日志后端，供仪表盘、脚本等读取方判断应读取哪个存储
+JOURNAL_BACKEND_FILENAME = "journal_backend"
+
+# 日志名（与 CSV 文件名同名）-> (列名, 类型)，列顺序与 CSV 表头一致；
+# 类型为 timestamp / float / int / text，由各存储后端映射为自己的列类型
+JOURNAL_COLUMNS: Dict[str, List[Tuple[str, str]]] = {
+    "portfolio_state": [
+        ("timestamp", "timestamp"),
+        ("total_balance", "float"),
+        ("total_equity", "float"),
+        ("total_return_pct", "float"),
+        ("num_positions", "int"),
+        ("position_details", "text"),
+        ("total_margin", "float"),
+        ("net_unrealized_pnl", "float"),
+    ],
+    "trade_history": [
+        ("timestamp", "timestamp"),
+        ("coin", "text"),
+        ("action", "text"),
+        ("side", "text"),
+        ("quantity", "float"),
+        ("price", "float"),
+        ("profit_target", "float"),
+        ("stop_loss", "float"),
+        ("leverage", "float"),
+        ("confidence", "float"),
+        ("pnl", "float"),
+        ("balance_after", "float"),
+        ("reason", "text"),
+    ],
+    "ai_decisions": [
+        ("timestamp", "timestamp"),
+        ("coin", "text"),
+        ("signal", "text"),
+        ("reasoning", "text"),
+        ("confidence", "float"),
+    ],
+    "ai_messages": [
+        ("timestamp", "timestamp"),
+        ("direction", "text"),
+        ("role", "text"),
+        ("content", "text"),
+        ("metadata", "text"),
+    ],
+}
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Parse an ISO timestamp (or datetime) to an aware UTC datetime; None when unparseable."""
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str) and value.strip():
+        try:
+            parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def coerce_value(value: Any, kind: str) -> Any:
+    """Convert one CSV-style cell to the journal column type; blanks and bad numbers become None."""
+    if value is None or (isinstance(value, str) and value == ""):
+        return None
+    if kind == "timestamp":
+        return parse_timestamp(value)
+    if kind == "float":
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    if kind == "int":
+        try:
+            return int(float(value))
+        except (TypeError, ValueError, OverflowError):
+            return None
+    return str(value)
+
+
+class JournalBackend(Protocol):
+    def write(self, path: Path, rows: Sequence[Row]) -> None:
+        ...
+
+
+def append_csv_rows(path: Path, rows: Sequence[Row]) -> None:
+    """Append rows to a CSV file."""
+    with open(path, "a", newline="") as fh:
+        csv.writer(fh).writerows(rows)
+
+
+class CsvJournal:
+    """Default backend: append each journal's rows to its CSV file."""
+
+    def write(self, path: Path, rows: Sequence[Row]) -> None:
+        append_csv_rows(path, rows)
+
+
+def _nearest_rank(values: Sequence[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+@dataclass(frozen=True)
+class JournalStats:
+    queue_depth: int
+    max_queue_depth: int
+    rows_written: int
+    flushes: int
+    errors: int
+    last_flush_seconds: Optional[float]
+    flush_p50: Optional[float]
+    flush_p99: Optional[float]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "errors": self.errors,
+            "last_flush_seconds": self.last_flush_seconds,
+            "flush_p50_seconds": self.flush_p50,
+            "flush_p99_seconds": self.flush_p99,
+        }
+
+    def describe(self) -> str:
+        def ms(value: Optional[float]) -> str:
+            return "-" if value is None else f"{value * 1000:.1f}ms"
+
+        return (
+            f"Journal: {self.rows_written} rows in {self.flushes} flushes"
+            f" | queue {self.queue_depth} (max {self.max_queue_depth})"
+            f" | flush p50/p99 {ms(self.flush_p50)}/{ms(self.flush_p99)}"
+            + (f" | {self.errors} errors" if self.errors else "")
+        )
+
+
+class _FlushRequest:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+
+
+class _Stop(_FlushRequest):
+    pass
+
+
+class _Task:
+    def __init__(self, func: Callable[[], Any]) -> None:
+        self.func = func
+
+
+class JournalWriter:
+    """
+    CSV 日志的后台批量写入器：调用方只把行放入队列，由后台线程按文件分组批量追加，
+    文件 I/O 不再占用决策到下单的关键路径。
+
+    - 待写行数达到 `batch_size`，或最早一行已等待 `flush_interval` 秒时落盘；
+    - `flush()` 阻塞到此前入队的所有行都已写入（save_state() 与退出时调用）；
+    - 进程退出时通过 atexit 自动 flush 并停止线程；
+    - `defer(func)` 把其他落盘工作（如消息 blob）交给同一后台线程，保证在其后入队的行写入之前完成；
+    - `enabled=False` 时退化为调用线程内同步写入（原有行为），便于排查问题；
+    - 写入失败只记录警告并计数，不会影响交易流程；
+    - `backend` 决定落盘格式：默认 CsvJournal，也可传入 ParquetJournal 等实现 `write(path, rows)` 的对象。
+    """
+
+    def __init__(
+        self,
+        *,
+        batch_size: int = 256,
+        flush_interval: float = 1.0,
+        enabled: bool = True,
+        window: int = 200,
+        clock: Callable[[], float] = time.monotonic,
+        backend: Optional[JournalBackend] = None,
+    ) -> None:
+        self.backend: JournalBackend = backend if backend is not None else CsvJournal()
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+        self.enabled = enabled
+        self.clock = clock
+        self._queue: "queue.Queue[Union[tuple, _FlushRequest, _Task]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending_rows = 0
+        self._max_depth = 0
+        self._rows_written = 0
+        self._flushes = 0
+        self._errors = 0
+        self._last_flush: Optional[float] = None
+        self._flush_times: Deque[float] = deque(maxlen=max(1, window))
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        if enabled:
+            self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    # ── producer side ──────────────────────────────────────────
+
+    def append(self, path: Path, row: Row) -> None:
+        """Queue one CSV row for `path` (written synchronously when disabled or closed)."""
+        with self._lock:
+            queued = self.enabled and not self._closed
+            if queued:
+                self._pending_rows += 1
+                self._max_depth = max(self._max_depth, self._pending_rows)
+                self._queue.put((Path(path), list(row)))
+        if not queued:
+            self._write({Path(path): [list(row)]})
+
+    def defer(self, func: Callable[[], Any]) -> None:
+        """Run `func` on the writer thread before rows queued after it are written (inline when disabled or closed)."""
+        with self._lock:
+            queued = self.enabled and not self._closed
+            if queued:
+                self._queue.put(_Task(func))
+        if not queued:
+            self._run_task(_Task(func))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every row queued before this call is on disk; False on timeout."""
+        if not self.enabled or self._closed or self._thread is None:
+            return True
+        request = _FlushRequest()
+        self._queue.put(request)
+        return request.done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Flush outstanding rows, stop the background thread and release the backend."""
+        stop = _Stop()
+        with self._lock:
+            if self._closed or self._thread is None:
+                self._closed = True
+                self._close_backend()
+                return
+            # 关闭后新的行改为同步写入，保证不会排在停止标记之后丢失
+            self._closed = True
+            self._queue.put(stop)
+        stop.done.wait(timeout)
+        self._thread.join(timeout)
+        self._close_backend()
+
+    def _close_backend(self) -> None:
+        # 后端的连接等资源在下一次同步写入时会重新打开
+        close = getattr(self.backend, "close", None)
+        if callable(close):
+            with self._write_lock:
+                close()
+
+    @property
+    def queue_depth(self) -> int:
+        with self._lock:
+            return self._pending_rows
+
+    def stats(self) -> JournalStats:
+        with self._lock:
+            flush_times = list(self._flush_times)
+            return JournalStats(
+                queue_depth=self._pending_rows,
+                max_queue_depth=self._max_depth,
+                rows_written=self._rows_written,
+                flushes=self._flushes,
+                errors=self._errors,
+                last_flush_seconds=self._last_flush,
+                flush_p50=_nearest_rank(flush_times, 50),
+                flush_p99=_nearest_rank(flush_times, 99),
+            )
+
+    # ── writer thread ──────────────────────────────────────────
+
+    def _run(self) -> None:
+        batch: Dict[Path, List[List[Any]]] = {}
+        count = 0
+        first_at: Optional[float] = None
+        while True:
+            timeout = None
+            if first_at is not None:
+                timeout = max(self.flush_interval - (self.clock() - first_at), 0.0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if isinstance(item, _Task):
+                self._run_task(item)
+                continue
+            if isinstance(item, tuple):
+                path, row = item
+                batch.setdefault(path, []).append(row)
+                count += 1
+                if first_at is None:
+                    first_at = self.clock()
+                if count < self.batch_size and self.clock() - first_at < self.flush_interval:
+                    continue
+            if batch:
+                self._write(batch)
+                with self._lock:
+                    self._pending_rows -= count
+                batch, count, first_at = {}, 0, None
+            if isinstance(item, _FlushRequest):
+                item.done.set()
+                if isinstance(item, _Stop):
+                    return
+
+    def _run_task(self, task: _Task) -> None:
+        try:
+            task.func()
+        except Exception as exc:
+            logging.warning("Deferred journal task failed: %s", exc, exc_info=True)
+            with self._lock:
+                self._errors += 1
+
+    def _write(self, batch: Dict[Path, List[List[Any]]]) -> None:
+        started = self.clock()
+        written = 0
+        errors = 0
+        with self._write_lock:
+            for path, rows in batch.items():
+                try:
+                    self.backend.write(path, rows)
+                    written += len(rows)
+                except (OSError, ValueError, TypeError) as exc:
+                    errors += 1
+                    logging.warning("Failed to append %d journal rows to %s: %s", len(rows), path, exc)
+        elapsed = self.clock() - started
+        with self._lock:
+            self._rows_written += written
+            self._errors += errors
+            self._flushes += 1
+            self._last_flush = elapsed
+            self._flush_times.append(elapsed)
+
+
+def _as_utc(value: Union[None, str, datetime, pd.Timestamp]) -> Optional[datetime]:
+    if value is None:
+        return None
+    stamp = pd.Timestamp(value)
+    stamp = stamp.tz_localize("UTC") if stamp.tzinfo is None else stamp.tz_convert("UTC")
+    return stamp.to_pydatetime()
+
+
+def record_journal_backend(data_dir: Path, backend: str) -> None:
+    """Record which backend the bot writes `data_dir`'s journals with."""
+    if backend not in JOURNAL_BACKENDS:
+        raise ValueError(f"Unknown journal backend: {backend!r}")
+    path = Path(data_dir) / JOURNAL_BACKEND_FILENAME
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(backend + "\n", encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def active_journal_backend(data_dir: Path) -> str:
+    """The backend recorded by the bot; guessed from the files present for data written before it was recorded."""
+    data_dir = Path(data_dir)
+    try:
+        recorded = (data_dir / JOURNAL_BACKEND_FILENAME).read_text(encoding="utf-8").strip().lower()
+    except OSError:
+        recorded = ""
+    if recorded in JOURNAL_BACKENDS:
+        return recorded
+    if recorded:
+        logging.warning("Ignoring unknown journal backend %r recorded in %s.", recorded, data_dir)
+    if (data_dir / SQLITE_JOURNAL_FILENAME).exists():
+        return "sqlite"
+    if (data_dir / PARQUET_JOURNAL_DIRNAME).is_dir():
+        return "parquet"
+    return "csv"
+
+
+def read_journal(
+    data_dir: Path,
+    table: str,
+    *,
+    start: Union[None, str, datetime, pd.Timestamp] = None,
+    end: Union[None, str, datetime, pd.Timestamp] = None,
+    columns: Optional[Sequence[str]] = None,
+    coin: Optional[str] = None,
+    limit: Optional[int] = None,
+    backend: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Load one journal (e.g. "trade_history") with `start <= timestamp < end`, oldest first.
+
+    `coin` keeps one coin's rows and `limit` keeps only the newest N. Only one store is read:
+    `backend`, defaulting to the one the bot recorded (`active_journal_backend`). "sqlite" queries
+    `data_dir/journal.sqlite3` (read-only connection, indexed), "parquet" the day partitions under
+    `data_dir/journal/<table>`, "csv" `data_dir/<table>.csv`; journals outside JOURNAL_COLUMNS are
+    always CSV. Naive times are taken as UTC; `timestamp` comes back as UTC datetimes.
+    """
+    start_at, end_at = _as_utc(start), _as_utc(end)
+    data_dir = Path(data_dir)
+    backend = backend or active_journal_backend(data_dir)
+    if backend not in JOURNAL_BACKENDS:
+        raise ValueError(f"Unknown journal backend: {backend!r}")
+    if table not in JOURNAL_COLUMNS:
+        backend = "csv"
+    wanted = None if columns is None else list(columns)
+
+    if backend == "sqlite":
+        from runtime.sqlite_journal import query_journal
+
+        indexed = query_journal(
+            data_dir / SQLITE_JOURNAL_FILENAME,
+            table,
+            start=start_at,
+            end=end_at,
+            columns=columns,
+            coin=coin,
+            limit=limit,
+        )
+        if indexed is not None:
+            return indexed
+        # 数据库或表尚未创建：与空表相同
+        return pd.DataFrame(columns=wanted if wanted is not None else [name for name, _ in JOURNAL_COLUMNS[table]])
+
+    needed = None if wanted is None else set(wanted) | {"timestamp"} | ({"coin"} if coin is not None else set())
+    if backend == "parquet":
+        from runtime.parquet_journal import ParquetJournal
+
+        df = ParquetJournal(data_dir / PARQUET_JOURNAL_DIRNAME).read(
+            table,
+            start=start_at,
+            end=end_at,
+            columns=None if needed is None else [name for name, _ in JOURNAL_COLUMNS[table] if name in needed],
+            coin=coin,
+        )
+    else:
+        path = data_dir / f"{table}.csv"
+        if not path.exists():
+            return pd.DataFrame(columns=wanted)
+        usecols = None if needed is None else (lambda name: name in needed)
+        try:
+            df = pd.read_csv(path, usecols=usecols, encoding="utf-8")
+        except UnicodeDecodeError:
+            df = pd.read_csv(path, usecols=usecols, encoding="gbk")
+        if "timestamp" in df.columns:
+            df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce", utc=True, format="ISO8601")
+            if start_at is not None:
+                df = df[df["timestamp"] >= start_at]
+            if end_at is not None:
+                df = df[df["timestamp"] < end_at]
+            df = df.sort_values("timestamp", kind="stable")
+        if coin is not None and "coin" in df.columns:
+            df = df[df["coin"] == coin]
+
+    if limit is not None:
+        df = df.tail(max(0, int(limit)))
+    if wanted is not None:
+        df = df[[name for name in wanted if name in df.columns]]
+    return df.reset_index(drop=True)
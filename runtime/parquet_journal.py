@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from runtime.journal import JOURNAL_COLUMNS, append_csv_rows, coerce_value
+
+
+TIMESTAMP_TYPE = pa.timestamp("us", tz="UTC")
+
+_ARROW_TYPES = {
+    "timestamp": TIMESTAMP_TYPE,
+    "float": pa.float64(),
+    "int": pa.int64(),
+    "text": pa.string(),
+}
+
+_PARTITION_PREFIX = "date="
+_REPLACES_KEY = b"journal.replaces"
+
+
+def table_schema(table: str) -> pa.Schema:
+    return pa.schema([pa.field(name, _ARROW_TYPES[kind]) for name, kind in JOURNAL_COLUMNS[table]])
+
+
+def _partition_day(directory: Path) -> Optional[date]:
+    if not directory.name.startswith(_PARTITION_PREFIX):
+        return None
+    try:
+        return date.fromisoformat(directory.name[len(_PARTITION_PREFIX):])
+    except ValueError:
+        return None
+
+
+def _live_files(day_dir: Path) -> Tuple[List[Path], List[Path]]:
+    """Return (live data files, files already folded into a compacted file) for one day partition."""
+    files = sorted(path for path in day_dir.glob("*.parquet") if not path.name.startswith("."))
+    replaced: Set[str] = set()
+    for path in files:
+        if not path.name.startswith("compact-"):
+            continue
+        try:
+            metadata = pq.read_metadata(path).metadata or {}
+        except (OSError, pa.ArrowException) as exc:
+            logging.warning("Ignoring unreadable journal file %s: %s", path, exc)
+            replaced.add(path.name)
+            continue
+        replaced.update(json.loads(metadata.get(_REPLACES_KEY, b"[]")))
+    live = [path for path in files if path.name not in replaced]
+    stale = [path for path in files if path.name in replaced]
+    return live, stale
+
+
+def _write_atomic(table: pa.Table, path: Path, row_group_size: int, metadata: Optional[Dict[bytes, bytes]] = None) -> None:
+    if metadata:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    try:
+        pq.write_table(table, tmp_path, row_group_size=row_group_size, compression="zstd")
+        os.replace(tmp_path, path)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
+
+class ParquetJournal:
+    """
+    按天分区的 Parquet 日志后端，可替代四个 CSV 日志（JournalWriter 的写入后端）。
+
+    - 布局：`<root>/<表名>/date=YYYY-MM-DD/*.parquet`，列有明确类型（时间戳为 UTC）；
+    - 每批写入生成一个小文件（一个 row group），当天小文件超过 `max_parts` 个，
+      或开始写入新的一天时，把当天文件合并为按时间排序、`row_group_size` 行一组的单个文件；
+    - 合并文件在元数据中记录被替代的文件名，读取方据此跳过旧文件，合并过程中读取不会重复计数；
+    - 未登记的 CSV（表名不在 JOURNAL_COLUMNS 中）仍按 CSV 追加。
+    """
+
+    def __init__(self, root: Path, *, row_group_size: int = 4096, max_parts: int = 64) -> None:
+        self.root = Path(root)
+        self.row_group_size = max(1, row_group_size)
+        self.max_parts = max(2, max_parts)
+        self._last_day: Dict[str, date] = {}
+        self._seq = 0
+
+    def table_dir(self, table: str) -> Path:
+        return self.root / table
+
+    def has_data(self, table: str) -> bool:
+        directory = self.table_dir(table)
+        return directory.is_dir() and any(directory.glob(f"{_PARTITION_PREFIX}*/*.parquet"))
+
+    # ── writing ────────────────────────────────────────────────
+
+    def write(self, path: Path, rows: Sequence[Sequence[Any]]) -> None:
+        """Append `rows` for the journal named by `path`'s stem (CSV fallback for unknown tables)."""
+        table = Path(path).stem
+        if table not in JOURNAL_COLUMNS:
+            append_csv_rows(path, rows)
+            return
+        self.append_rows(table, rows)
+
+    def append_rows(self, table: str, rows: Iterable[Sequence[Any]]) -> int:
+        """Write rows (in CSV column order) into their day partitions; return rows written."""
+        columns = JOURNAL_COLUMNS[table]
+        by_day: Dict[date, List[List[Any]]] = {}
+        for row in rows:
+            values = [coerce_value(row[index] if index < len(row) else None, kind) for index, (_, kind) in enumerate(columns)]
+            if values[0] is None:
+                logging.warning("Dropping %s journal row without a valid timestamp: %r", table, list(row)[:3])
+                continue
+            by_day.setdefault(values[0].date(), []).append(values)
+
+        written = 0
+        for day in sorted(by_day):
+            records = by_day[day]
+            day_dir = self.table_dir(table) / f"{_PARTITION_PREFIX}{day.isoformat()}"
+            day_dir.mkdir(parents=True, exist_ok=True)
+            arrays = [
+                pa.array([record[index] for record in records], type=_ARROW_TYPES[kind])
+                for index, (_, kind) in enumerate(columns)
+            ]
+            self._seq += 1
+            name = f"part-{time.time_ns():020d}-{os.getpid()}-{self._seq:06d}.parquet"
+            _write_atomic(pa.Table.from_arrays(arrays, schema=table_schema(table)), day_dir / name, self.row_group_size)
+            written += len(records)
+
+            previous = self._last_day.get(table)
+            if previous is not None and previous < day:
+                self.compact(table, previous)
+            if previous is None or previous < day:
+                self._last_day[table] = day
+            live, _ = _live_files(day_dir)
+            if len(live) > self.max_parts:
+                self.compact(table, day)
+        return written
+
+    def compact(self, table: str, day: date) -> Optional[Path]:
+        """Merge one day's files into a single time-sorted file; returns it (None if nothing to do)."""
+        day_dir = self.table_dir(table) / f"{_PARTITION_PREFIX}{day.isoformat()}"
+        if not day_dir.is_dir():
+            return None
+        live, stale = _live_files(day_dir)
+        for path in stale:
+            path.unlink(missing_ok=True)
+        if len(live) <= 1:
+            return None
+        merged = pa.concat_tables(
+            [pq.read_table(path, schema=table_schema(table)) for path in live]
+        ).sort_by("timestamp")
+        target = day_dir / f"compact-{time.time_ns():020d}-{os.getpid()}.parquet"
+        _write_atomic(
+            merged,
+            target,
+            self.row_group_size,
+            metadata={_REPLACES_KEY: json.dumps([path.name for path in live]).encode("utf-8")},
+        )
+        for path in live:
+            path.unlink(missing_ok=True)
+        return target
+
+    def compact_all(self, table: str) -> int:
+        """Compact every day partition of `table`; return how many were rewritten."""
+        count = 0
+        for day_dir in sorted(self.table_dir(table).glob(f"{_PARTITION_PREFIX}*")):
+            day = _partition_day(day_dir)
+            if day is not None and self.compact(table, day) is not None:
+                count += 1
+        return count
+
+    def import_csv(self, csv_path: Path, table: Optional[str] = None) -> int:
+        """Copy an existing CSV journal into Parquet (one-time migration); the CSV is left in place."""
+        table = table or Path(csv_path).stem
+        csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+        with open(csv_path, newline="", encoding="utf-8") as fh:
+            reader = csv.DictReader(fh)
+            names = [name for name, _ in JOURNAL_COLUMNS[table]]
+            rows = [[record.get(name) for name in names] for record in reader]
+        written = self.append_rows(table, rows)
+        self.compact_all(table)
+        return written
+
+    # ── reading ────────────────────────────────────────────────
+
+    def read(
+        self,
+        table: str,
+        *,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        columns: Optional[Sequence[str]] = None,
+        coin: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """Rows with `start <= timestamp < end` (and `coin`), reading only the day partitions in range."""
+        schema = table_schema(table)
+        wanted = list(columns) if columns is not None else schema.names
+        unknown = [name for name in wanted if name not in schema.names]
+        if unknown:
+            raise ValueError(f"Unknown {table} journal columns: {', '.join(unknown)}")
+
+        first_day = start.date() if start is not None else None
+        last_day = (end - timedelta(microseconds=1)).date() if end is not None else None
+        files: List[Path] = []
+        for day_dir in sorted(self.table_dir(table).glob(f"{_PARTITION_PREFIX}*")):
+            day = _partition_day(day_dir)
+            if day is None or (first_day and day < first_day) or (last_day and day > last_day):
+                continue
+            files.extend(_live_files(day_dir)[0])
+        if not files:
+            return schema.empty_table().select(wanted).to_pandas()
+
+        predicate = None
+        if start is not None:
+            predicate = ds.field("timestamp") >= pa.scalar(start, type=TIMESTAMP_TYPE)
+        if end is not None:
+            upper = ds.field("timestamp") < pa.scalar(end, type=TIMESTAMP_TYPE)
+            predicate = upper if predicate is None else predicate & upper
+        if coin is not None and "coin" in schema.names:
+            match = ds.field("coin") == coin
+            predicate = match if predicate is None else predicate & match
+        dataset = ds.dataset([str(path) for path in files], schema=schema, format="parquet")
+        projected = wanted if "timestamp" in wanted else ["timestamp", *wanted]
+        result = dataset.to_table(columns=projected, filter=predicate)
+        result = result.sort_by("timestamp").select(wanted)
+        return result.to_pandas()
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+
+Clock = Callable[[], datetime]
+Sleeper = Callable[[float], None]
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class ManualClock:
+    """
+    可控时钟：作为 set_time_provider() 的时间源时，sleep() 只推进模拟时间而不真正等待，
+    用于回测与确定性测试。
+    """
+
+    def __init__(self, start: datetime) -> None:
+        self._now = _as_utc(start)
+
+    def __call__(self) -> datetime:
+        return self._now
+
+    def set(self, value: datetime) -> None:
+        self._now = _as_utc(value)
+
+    def advance(self, seconds: float) -> None:
+        self._now += timedelta(seconds=max(0.0, seconds))
+
+    def sleep(self, seconds: float) -> None:
+        self.advance(seconds)
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+@dataclass(frozen=True)
+class ScheduleTick:
+    """One aligned wake-up: the candle close it serves and how far off schedule it started."""
+
+    bar_close: datetime
+    scheduled_at: datetime
+    started_at: datetime
+    skipped_bars: int
+    deadline: datetime
+    late: bool = False
+
+    @property
+    def drift(self) -> float:
+        """Seconds between the scheduled wake-up and the actual start (positive = late)."""
+        return (self.started_at - self.scheduled_at).total_seconds()
+
+
+@dataclass(frozen=True)
+class CycleReport:
+    tick: ScheduleTick
+    finished_at: datetime
+
+    @property
+    def duration(self) -> float:
+        return (self.finished_at - self.tick.started_at).total_seconds()
+
+    @property
+    def overran(self) -> bool:
+        """True when the cycle ended after the next bar's scheduled wake-up."""
+        return self.finished_at > self.tick.deadline
+
+
+@dataclass
+class SchedulerStats:
+    ticks: int = 0
+    late_starts: int = 0
+    skipped_bars: int = 0
+    overruns: int = 0
+    max_drift: float = 0.0
+    total_drift: float = 0.0
+
+    @property
+    def mean_drift(self) -> float:
+        measured = self.ticks - 1
+        return self.total_drift / measured if measured > 0 else 0.0
+
+
+class BarCloseScheduler:
+    """
+    按 K 线收盘对齐的调度器：每根 `interval_seconds` K 线收盘后 `offset_seconds` 唤醒。
+
+    - 若上一轮超时，错过的收盘会被跳过（计入 skipped_bars），只处理最近一根；
+    - 最近一根收盘若已晚于计划唤醒时间但不超过 `max_lateness_seconds`，立即执行
+      （本轮可用时间相应缩短）；更晚则跳过该根，等待下一根收盘；
+    - 时间来源与等待函数均可注入，配合 ManualClock 可完全确定性地驱动。
+    """
+
+    def __init__(
+        self,
+        interval_seconds: int,
+        offset_seconds: float = 0.3,
+        max_lateness_seconds: Optional[float] = None,
+        clock: Optional[Clock] = None,
+        sleep: Optional[Sleeper] = None,
+    ) -> None:
+        if interval_seconds <= 0:
+            raise ValueError("interval_seconds must be positive")
+        self.interval = timedelta(seconds=interval_seconds)
+        self.offset = timedelta(seconds=max(0.0, offset_seconds))
+        lateness = interval_seconds / 2 if max_lateness_seconds is None else max_lateness_seconds
+        self.max_lateness = timedelta(seconds=max(0.0, lateness))
+        self.clock: Clock = clock or (lambda: datetime.now(timezone.utc))
+        self.sleep: Sleeper = sleep or time.sleep
+        self.last_bar_close: Optional[datetime] = None
+        self.stats = SchedulerStats()
+
+    def latest_close(self, now: datetime) -> datetime:
+        """Most recent candle close at or before `now` (candles are aligned to the Unix epoch)."""
+        elapsed = _as_utc(now) - _EPOCH
+        bars = elapsed // self.interval
+        return _EPOCH + bars * self.interval
+
+    def wait_for_next(self) -> ScheduleTick:
+        """Block until the next candle close to act on and return its tick."""
+        now = _as_utc(self.clock())
+        latest = self.latest_close(now)
+        skipped = 0
+
+        if self.last_bar_close is None:
+            target = latest
+        else:
+            target = self.last_bar_close + self.interval
+            if target < latest:
+                skipped = (latest - target) // self.interval
+                target = latest
+
+        if now - (target + self.offset) > self.max_lateness:
+            if self.last_bar_close is not None:
+                skipped += 1
+            target += self.interval
+
+        scheduled = target + self.offset
+        late = now > scheduled
+        if now < scheduled:
+            self.sleep((scheduled - now).total_seconds())
+            now = _as_utc(self.clock())
+
+        tick = ScheduleTick(
+            bar_close=target,
+            scheduled_at=scheduled,
+            started_at=now,
+            skipped_bars=int(skipped),
+            deadline=scheduled + self.interval,
+            late=late,
+        )
+        startup = self.last_bar_close is None
+        self.last_bar_close = target
+        self._record(tick, startup)
+        return tick
+
+    def _record(self, tick: ScheduleTick, startup: bool) -> None:
+        stats = self.stats
+        stats.ticks += 1
+        if startup:
+            # 启动时刻落在 K 线中间不属于调度漂移，不计入统计
+            return
+        stats.skipped_bars += tick.skipped_bars
+        stats.total_drift += tick.drift
+        stats.max_drift = max(stats.max_drift, tick.drift)
+        if tick.late:
+            stats.late_starts += 1
+
+    def complete(self, tick: ScheduleTick) -> CycleReport:
+        """Record the end of the cycle started by `tick`."""
+        report = CycleReport(tick=tick, finished_at=_as_utc(self.clock()))
+        if report.overran:
+            self.stats.overruns += 1
+        return report
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import csv
+import logging
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Sequence
+
+import pandas as pd
+
+from runtime.journal import JOURNAL_COLUMNS, append_csv_rows, coerce_value
+
+
+_SQL_TYPES = {"timestamp": "TEXT", "float": "REAL", "int": "INTEGER", "text": "TEXT"}
+
+
+def format_timestamp(value: datetime) -> str:
+    """Fixed-width UTC ISO text, so string order equals time order inside SQLite."""
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+
+
+def _schema_statements(table: str) -> List[str]:
+    names = [name for name, _ in JOURNAL_COLUMNS[table]]
+    columns = ", ".join(f"{name} {_SQL_TYPES[kind]}" for name, kind in JOURNAL_COLUMNS[table])
+    statements = [
+        f"CREATE TABLE IF NOT EXISTS {table} ({columns})",
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_timestamp ON {table} (timestamp)",
+    ]
+    if "coin" in names:
+        statements.append(f"CREATE INDEX IF NOT EXISTS idx_{table}_coin_timestamp ON {table} (coin, timestamp)")
+    return statements
+
+
+def connect_readonly(path: Path, timeout: float = 5.0) -> sqlite3.Connection:
+    """Open a read-only connection (never creates the database or takes the write lock)."""
+    connection = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True, timeout=timeout)
+    connection.execute(f"PRAGMA busy_timeout = {int(timeout * 1000)}")
+    return connection
+
+
+def query_journal(
+    path: Path,
+    table: str,
+    *,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    columns: Optional[Sequence[str]] = None,
+    coin: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Optional[pd.DataFrame]:
+    """
+    Rows of `table` with `start <= timestamp < end` (and `coin`), oldest first; `limit` keeps the newest N.
+
+    Uses a read-only connection and the timestamp / (coin, timestamp) indexes. Returns None when
+    the database or table does not exist yet, so callers can fall back to another backend.
+    """
+    names = [name for name, _ in JOURNAL_COLUMNS[table]]
+    wanted = list(columns) if columns is not None else names
+    unknown = [name for name in wanted if name not in names]
+    if unknown:
+        raise ValueError(f"Unknown {table} journal columns: {', '.join(unknown)}")
+    if coin is not None and "coin" not in names:
+        raise ValueError(f"The {table} journal has no coin column")
+
+    clauses: List[str] = []
+    params: List[Any] = []
+    if coin is not None:
+        clauses.append("coin = ?")
+        params.append(coin)
+    if start is not None:
+        clauses.append("timestamp >= ?")
+        params.append(format_timestamp(start))
+    if end is not None:
+        clauses.append("timestamp < ?")
+        params.append(format_timestamp(end))
+    sql = f"SELECT {', '.join(wanted) if wanted else 'rowid'} FROM {table}"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    if limit is not None:
+        sql = f"{sql} ORDER BY timestamp DESC, rowid DESC LIMIT ?"
+        params.append(max(0, int(limit)))
+    else:
+        sql += " ORDER BY timestamp, rowid"
+
+    try:
+        connection = connect_readonly(path)
+    except sqlite3.OperationalError:
+        return None
+    try:
+        rows = connection.execute(sql, params).fetchall()
+    except sqlite3.OperationalError as exc:
+        if "no such table" in str(exc):
+            return None
+        raise
+    finally:
+        connection.close()
+    if limit is not None:
+        rows.reverse()
+    df = pd.DataFrame.from_records(rows, columns=wanted)
+    if "timestamp" in df.columns:
+        df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, format="ISO8601")
+    return df
+
+
+class SqliteJournal:
+    """
+    SQLite（WAL 模式）日志后端：四个日志各一张表，带时间戳索引与 (coin, 时间戳) 索引。
+
+    - 机器人持有唯一的写连接，每批行在一个事务中写入，读方不会看到半行；
+    - WAL 模式下读连接（仪表盘、回测统计、脚本，见 `query_journal`）以只读方式打开，不阻塞写入；
+    - 时间戳以定宽 UTC ISO 文本保存，区间查询与“某币种最近 N 笔”均走索引；
+    - 未登记的 CSV（表名不在 JOURNAL_COLUMNS 中）仍按 CSV 追加。
+    """
+
+    def __init__(self, path: Path, *, timeout: float = 5.0) -> None:
+        self.path = Path(path)
+        self.timeout = timeout
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute(f"PRAGMA busy_timeout = {int(self.timeout * 1000)}")
+            with connection:
+                for table in JOURNAL_COLUMNS:
+                    for statement in _schema_statements(table):
+                        connection.execute(statement)
+            self._connection = connection
+        return self._connection
+
+    def close(self) -> None:
+        """Close the writer connection (reopened on the next write)."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def write(self, path: Path, rows: Sequence[Sequence[Any]]) -> None:
+        """Append `rows` for the journal named by `path`'s stem (CSV fallback for unknown tables)."""
+        table = Path(path).stem
+        if table not in JOURNAL_COLUMNS:
+            append_csv_rows(path, rows)
+            return
+        self.append_rows(table, rows)
+
+    def append_rows(self, table: str, rows: Iterable[Sequence[Any]]) -> int:
+        """Insert rows (in CSV column order) in one transaction; return rows written."""
+        columns = JOURNAL_COLUMNS[table]
+        records = []
+        for row in rows:
+            values = [coerce_value(row[index] if index < len(row) else None, kind) for index, (_, kind) in enumerate(columns)]
+            if values[0] is None:
+                logging.warning("Dropping %s journal row without a valid timestamp: %r", table, list(row)[:3])
+                continue
+            values[0] = format_timestamp(values[0])
+            records.append(values)
+        if not records:
+            return 0
+        placeholders = ", ".join("?" for _ in columns)
+        try:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.executemany(f"INSERT INTO {table} VALUES ({placeholders})", records)
+        except sqlite3.Error as exc:
+            raise OSError(f"SQLite journal write to {table} failed: {exc}") from exc
+        return len(records)
+
+    def has_data(self, table: str) -> bool:
+        try:
+            with self._lock:
+                return self._connect().execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is not None
+        except sqlite3.Error as exc:
+            raise OSError(f"SQLite journal {self.path} unavailable: {exc}") from exc
+
+    def import_csv(self, csv_path: Path, table: Optional[str] = None) -> int:
+        """Copy an existing CSV journal into its table (one-time migration); the CSV is left in place."""
+        table = table or Path(csv_path).stem
+        csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+        names = [name for name, _ in JOURNAL_COLUMNS[table]]
+        with open(csv_path, newline="", encoding="utf-8") as fh:
+            rows = [[record.get(name) for name in names] for record in csv.DictReader(fh)]
+        return self.append_rows(table, rows)
+
+    def read(self, table: str, **filters: Any) -> pd.DataFrame:
+        """Query through a separate read-only connection (see `query_journal`)."""
+        result = query_journal(self.path, table, **filters)
+        return result if result is not None else pd.DataFrame(columns=filters.get("columns"))
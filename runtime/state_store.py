@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, IO, List, Mapping, Optional, Tuple
+
+
+State = Dict[str, Any]
+
+STATE_OPS = ("open", "close", "update", "iteration")
+
+
+def empty_state(balance: float = 0.0) -> State:
+    return {"balance": balance, "positions": {}, "iteration": 0, "updated_at": None}
+
+
+def apply_record(state: State, record: Mapping[str, Any]) -> None:
+    """Apply one journal record to `state` in place (replay and the live mirror share this)."""
+    op = record.get("op")
+    positions = state.setdefault("positions", {})
+    if op == "open":
+        positions[record["coin"]] = copy.deepcopy(record["position"])
+    elif op == "close":
+        positions.pop(record["coin"], None)
+    elif op == "update":
+        position = positions.get(record["coin"])
+        if position is not None:
+            position.update(record.get("fields") or {})
+    elif op == "iteration":
+        state["iteration"] = record["iteration"]
+    else:
+        raise ValueError(f"Unknown state journal op: {op!r}")
+    # 记录中的余额与时间均为变更后的绝对值，重放同一记录多次结果不变
+    if "balance" in record:
+        state["balance"] = record["balance"]
+    if record.get("at"):
+        state["updated_at"] = record["at"]
+
+
+def _fsync_directory(path: Path) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class StateStore:
+    """
+    崩溃安全的组合状态存储：快照 + 预写日志（WAL）。
+
+    - 每次开仓、平仓、持仓字段更新与每轮迭代只向 `<快照>.wal` 追加一行 JSON 记录并 fsync，
+      写入量与持仓数量无关；
+    - 记录数达到 `compact_every` 时把完整状态写成临时文件、fsync 后原子替换快照，再清空 WAL；
+      快照记录已包含的最后序号 `wal_seq`，替换与清空之间崩溃也不会重复应用；
+    - 启动时读取快照并重放序号更大的记录；末尾被截断的半行会被丢弃并从文件中截掉；
+    - 快照格式与原 portfolio_state.json 相同（另加 `wal_seq`），其他工具仍可直接读取。
+    """
+
+    def __init__(
+        self,
+        snapshot_path: Path,
+        *,
+        wal_path: Optional[Path] = None,
+        compact_every: int = 100,
+        fsync: bool = True,
+    ) -> None:
+        self.snapshot_path = Path(snapshot_path)
+        self.wal_path = Path(wal_path) if wal_path is not None else self.snapshot_path.with_suffix(".wal")
+        self.compact_every = max(1, compact_every)
+        self.fsync = fsync
+        self.state: State = empty_state()
+        self.seq = 0
+        self.pending = 0
+        self.compactions = 0
+        self._wal: Optional[IO[str]] = None
+        self._synced = False
+        self._lock = threading.RLock()
+
+    # ── recovery ───────────────────────────────────────────────
+
+    def _read_wal(self) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Parse WAL records; returns (records, byte offset to truncate a torn tail at)."""
+        records: List[Dict[str, Any]] = []
+        if not self.wal_path.exists():
+            return records, None
+        offset = 0
+        with open(self.wal_path, "rb") as fh:
+            for raw in fh:
+                try:
+                    if not raw.endswith(b"\n"):
+                        raise ValueError("incomplete record")
+                    record = json.loads(raw)
+                    if not isinstance(record, dict) or record.get("op") not in STATE_OPS:
+                        raise ValueError("malformed record")
+                except ValueError as exc:
+                    logging.warning(
+                        "State journal %s: discarding records from byte %d (%s).", self.wal_path, offset, exc
+                    )
+                    return records, offset
+                records.append(record)
+                offset += len(raw)
+        return records, None
+
+    def load(self) -> Optional[State]:
+        """Recover snapshot + journal; None when neither exists. Raises ValueError on a corrupt snapshot."""
+        with self._lock:
+            self.close()
+            snapshot: Optional[State] = None
+            if self.snapshot_path.exists():
+                with open(self.snapshot_path, "r") as fh:
+                    snapshot = json.load(fh)
+                if not isinstance(snapshot, dict):
+                    raise ValueError(f"{self.snapshot_path} does not hold a state object")
+            records, torn_at = self._read_wal()
+            if torn_at is not None:
+                with open(self.wal_path, "r+b") as fh:
+                    fh.truncate(torn_at)
+            if snapshot is None and not records:
+                self.state, self.seq, self.pending = empty_state(), 0, 0
+                self._synced = True
+                return None
+
+            state: State = {**empty_state(), **(snapshot or {})}
+            base_seq = int(state.pop("wal_seq", 0) or 0)
+            replayed = 0
+            for record in records:
+                if int(record.get("seq", 0)) <= base_seq:
+                    continue
+                apply_record(state, record)
+                replayed += 1
+            self.state = state
+            self.seq = max([base_seq, *(int(record.get("seq", 0)) for record in records)])
+            self.pending = len(records)
+            self._synced = True
+            if replayed:
+                logging.info("Replayed %d state journal records over %s.", replayed, self.snapshot_path.name)
+            return copy.deepcopy(state)
+
+    # ── writing ────────────────────────────────────────────────
+
+    def _open_wal(self) -> IO[str]:
+        if self._wal is None:
+            self.wal_path.parent.mkdir(parents=True, exist_ok=True)
+            self._wal = open(self.wal_path, "a", encoding="utf-8")
+        return self._wal
+
+    def record(self, op: str, **fields: Any) -> int:
+        """Append one durable state change and apply it to the mirror; returns its sequence number."""
+        if op not in STATE_OPS:
+            raise ValueError(f"Unknown state journal op: {op!r}")
+        with self._lock:
+            if not self._synced:
+                # 未经 load/reset 就写入时先读取磁盘上的状态，序号接续已有记录
+                self.load()
+            seq = self.seq + 1
+            record = {"seq": seq, "op": op, **fields}
+            line = json.dumps(record, separators=(",", ":"), default=str) + "\n"
+            wal = self._open_wal()
+            wal.write(line)
+            wal.flush()
+            if self.fsync:
+                os.fsync(wal.fileno())
+            self.seq = seq
+            self.pending += 1
+            apply_record(self.state, json.loads(line))
+            return seq
+
+    @property
+    def should_compact(self) -> bool:
+        return self.pending >= self.compact_every
+
+    def compact(self, state: Optional[Mapping[str, Any]] = None) -> None:
+        """Write `state` (default: the replayed mirror) as the new snapshot and empty the journal."""
+        with self._lock:
+            if state is not None:
+                self.state = copy.deepcopy(dict(state))
+            elif not self._synced:
+                self.load()
+            payload = {**self.state, "wal_seq": self.seq}
+            data = json.dumps(payload, indent=2, default=str)
+            directory = self.snapshot_path.parent
+            directory.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=directory, prefix=f".{self.snapshot_path.name}-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as fh:
+                    fh.write(data)
+                    fh.flush()
+                    if self.fsync:
+                        os.fsync(fh.fileno())
+                os.replace(tmp_name, self.snapshot_path)
+            except BaseException:
+                if os.path.exists(tmp_name):
+                    os.unlink(tmp_name)
+                raise
+            if self.fsync:
+                _fsync_directory(directory)
+            # 快照已包含全部记录（wal_seq），此后清空 WAL；中途崩溃时旧记录会按序号跳过
+            self.close()
+            with open(self.wal_path, "w", encoding="utf-8") as fh:
+                if self.fsync:
+                    os.fsync(fh.fileno())
+            self.pending = 0
+            self.compactions += 1
+            self._synced = True
+
+    def quarantine(self, label: str = "unreadable") -> List[Path]:
+        """Move the snapshot and journal aside (kept for manual recovery) and start from an empty store."""
+        with self._lock:
+            self.close()
+            stamp = time.strftime("%Y%m%dT%H%M%S")
+            moved: List[Path] = []
+            for path in (self.snapshot_path, self.wal_path):
+                if path.exists():
+                    target = path.with_name(f"{path.name}.{label}-{stamp}")
+                    os.replace(path, target)
+                    moved.append(target)
+            self.state, self.seq, self.pending = empty_state(), 0, 0
+            self._synced = True
+            return moved
+
+    def reset(self, state: Mapping[str, Any]) -> None:
+        """Start over from `state` (fresh snapshot, empty journal)."""
+        with self._lock:
+            self.compact(state)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
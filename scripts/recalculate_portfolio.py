@@ -8,15 +8,25 @@ and the persisted state/json needs to be reconciled.
 from __future__ import annotations
 
 import argparse
-import csv
 import json
 import os
 import re
+import sys
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Dict, List, Optional
 
+import pandas as pd
+
+# Ensure project root is on sys.path so local modules resolve when the script is executed directly.
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from runtime.journal import read_journal
+from runtime.state_store import StateStore
+
 FEE_PATTERN = re.compile(r"Fees:\s*\$(-?\d+(?:\.\d+)?)")
 
 
@@ -212,12 +222,13 @@ def process_trades(trade_rows: List[Dict[str, str]], starting_balance: float) ->
     return state
 
 
-def load_trades(trades_path: Path) -> List[Dict[str, str]]:
-    with trades_path.open("r", newline="") as fh:
-        reader = csv.DictReader(fh)
-        rows = list(reader)
-    rows.sort(key=lambda r: r.get("timestamp") or "")
-    return rows
+def load_trades(trades_path: Path, until: Optional[datetime] = None) -> List[Dict[str, str]]:
+    """Trade rows oldest first, from the CSV or the Parquet journal next to it (before `until`)."""
+    df = read_journal(trades_path.parent, trades_path.stem, end=until)
+    if "timestamp" in df.columns:
+        df["timestamp"] = df["timestamp"].map(lambda ts: ts.isoformat() if not pd.isna(ts) else "")
+    df = df.astype(object).where(df.notna(), "")
+    return df.to_dict("records")
 
 
 def main() -> None:
@@ -229,13 +240,18 @@ def main() -> None:
     parser.add_argument("--state-json", type=Path, default=data_dir / "portfolio_state.json", help="Path to write portfolio_state.json")
     parser.add_argument("--dry-run", action="store_true", help="Do not write files, just display results.")
     parser.add_argument("--start-capital", type=float, default=None, help="Override starting capital.")
+    parser.add_argument(
+        "--until",
+        type=datetime.fromisoformat,
+        default=None,
+        help="Only replay trades before this ISO timestamp (UTC when no offset is given).",
+    )
     args = parser.parse_args()
 
-    if not args.trades.exists():
-        raise FileNotFoundError(f"Trade history not found at {args.trades}")
-
     starting_capital = args.start_capital if args.start_capital is not None else detect_starting_capital()
-    trades = load_trades(args.trades)
+    trades = load_trades(args.trades, until=args.until)
+    if not trades and not args.trades.exists():
+        raise FileNotFoundError(f"Trade history not found at {args.trades}")
     result = process_trades(trades, starting_capital)
 
     print("=== Portfolio Reconstruction ===")
@@ -255,13 +271,12 @@ def main() -> None:
 
     now_iso = datetime.now(timezone.utc).isoformat()
     iteration = 0
-    if args.state_json.exists():
-        try:
-            with args.state_json.open("r") as fh:
-                existing = json.load(fh)
-            iteration = int(existing.get("iteration", 0))
-        except Exception:
-            iteration = 0
+    state_store = StateStore(args.state_json)
+    try:
+        existing = state_store.load() or {}
+        iteration = int(existing.get("iteration", 0))
+    except Exception:
+        iteration = 0
 
     state_payload = {
         "balance": result["balance"],
@@ -275,10 +290,8 @@ def main() -> None:
         print(json.dumps(state_payload, indent=2))
         return
 
-    args.state_json.parent.mkdir(parents=True, exist_ok=True)
-    with args.state_json.open("w") as fh:
-        json.dump(state_payload, fh, indent=2)
-        fh.write("\n")
+    # 重算结果是权威状态：原子替换快照并清空机器人的状态预写日志（portfolio_state.wal）
+    state_store.reset(state_payload)
     print(f"\nState written to {args.state_json}")
 
 
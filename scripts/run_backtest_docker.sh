@@ -18,6 +18,7 @@ Environment overrides (optional):
   DOCKER_ENV_FILE        Env file passed via --env-file (default: .env in repo root)
   BACKTEST_INTERVAL      Interval override forwarded to the container
   BACKTEST_RUN_ID        Custom run identifier (default: run-<timestamp>-<random>)
+  BACKTEST_LLM_CACHE     LLM response cache mode forwarded to the container (readwrite|readonly|bypass)
 
 Examples:
   scripts/run_backtest_docker.sh 2024-01-01T00:00:00Z 2024-01-07T00:00:00Z prompts/backtest_rules.txt
@@ -103,6 +104,9 @@ ENV_VARS=(
 if [[ -n "${BACKTEST_INTERVAL:-}" ]]; then
   ENV_VARS+=("--env" "BACKTEST_INTERVAL=${BACKTEST_INTERVAL}")
 fi
+if [[ -n "${BACKTEST_LLM_CACHE:-}" ]]; then
+  ENV_VARS+=("--env" "BACKTEST_LLM_CACHE=${BACKTEST_LLM_CACHE}")
+fi
 
 # Handle optional system prompt file argument.
 if [[ -n "$PROMPT_ARG" && "$PROMPT_ARG" != "-" ]]; then
@@ -0,0 +1,42 @@
+"""Shared fixtures for tests that drive the bot module itself."""
+from __future__ import annotations
+
+import importlib
+import os
+import sys
+import types
+from unittest import mock
+
+import pytest
+
+
+def _unavailable_order_bridge() -> types.ModuleType:
+    # adapters/ 的相对导入在仓库根目录下无法解析；测试只跑纸面交易，从不下真实订单
+    module = types.ModuleType("adapters.execution_bridge")
+
+    def send_market_order(**kwargs):
+        raise RuntimeError("Live order routing is not available in tests")
+
+    module.send_market_order = send_market_order
+    return module
+
+
+@pytest.fixture(scope="session")
+def bot(tmp_path_factory):
+    """The bot module, imported once against a scratch data directory with paper trading only."""
+    data_dir = tmp_path_factory.mktemp("bot-data")
+    env = {
+        "TRADEBOT_DATA_DIR": str(data_dir),
+        "HYPERLIQUID_LIVE_TRADING": "false",
+        "OPENROUTER_API_KEY": "sk-test",
+        "TELEGRAM_BOT_TOKEN": "",
+        "TELEGRAM_CHAT_ID": "",
+        "TRADEBOT_LLM_CACHE": "bypass",
+    }
+    with mock.patch.dict(os.environ, env):
+        try:
+            importlib.import_module("adapters.execution_bridge")
+        except ImportError:
+            sys.modules["adapters.execution_bridge"] = _unavailable_order_bridge()
+        module = importlib.import_module("bot")
+    yield module
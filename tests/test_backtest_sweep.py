@@ -0,0 +1,140 @@
+"""Tests for the parallel backtest sweep runner."""
+from __future__ import annotations
+
+import json
+import os
+import runpy
+import sys
+import textwrap
+from unittest import mock
+
+import pytest
+
+from backtest.sweep import BACKTEST_SCRIPT, SweepRunner, SweepSpec, format_table, load_spec, merge_cli, summarize_results
+from llm.response_cache import chat_request_key
+
+
+FAKE_BACKTEST = textwrap.dedent(
+    """
+    import json, os, sys, time
+    from pathlib import Path
+
+    run_dir = Path(os.environ["BACKTEST_DATA_DIR"]) / os.environ["BACKTEST_RUN_ID"]
+    run_dir.mkdir(parents=True, exist_ok=True)
+    marker = Path(os.environ["BACKTEST_DATA_DIR"]) / "calls.jsonl"
+    with open(marker, "a") as fh:
+        fh.write(json.dumps({
+            "run_id": os.environ["BACKTEST_RUN_ID"],
+            "prefetch": os.environ.get("BACKTEST_PREFETCH_ONLY"),
+            "kline_cache": os.environ.get("BACKTEST_KLINE_CACHE"),
+            "pid": os.getpid(),
+        }) + "\\n")
+    if os.environ.get("BACKTEST_PREFETCH_ONLY") == "true":
+        sys.exit(0)
+    if os.environ.get("BACKTEST_LLM_MODEL") == "broken":
+        sys.exit(3)
+    time.sleep(0.2)
+    capital = float(os.environ.get("BACKTEST_START_CAPITAL", "1000"))
+    results = {
+        "timeframe": {"bars": 10},
+        "capital": {"final_equity": capital * 1.1, "total_return_pct": 10.0 if os.environ["BACKTEST_INTERVAL"] == "3m" else -5.0},
+        "trading": {"total_trades": 2, "win_rate_pct": 50.0},
+        "llm_telemetry": {"calls": 10, "latency_seconds": {"p95": 1.5}, "cost_usd": 0.01},
+    }
+    (run_dir / "backtest_results.json").write_text(json.dumps(results))
+    """
+)
+
+
+@pytest.fixture
+def fake_backtest(tmp_path):
+    script = tmp_path / "fake_backtest.py"
+    script.write_text(FAKE_BACKTEST)
+    return [sys.executable, str(script)]
+
+
+def test_load_spec_maps_aliases_and_scalars(tmp_path):
+    """YAML short names become backtest env vars and scalars become one-value axes."""
+    path = tmp_path / "sweep.yaml"
+    path.write_text(
+        "name: prompts\nworkers: 2\n"
+        "base:\n  start: 2024-01-01T00:00:00Z\n  TRADEBOT_PROMPT_DELTA: true\n"
+        "grid:\n  model: [a/x, b/y]\n  interval: 3m\n"
+    )
+    spec = load_spec(path)
+    assert spec.name == "prompts" and spec.workers == 2
+    assert spec.base == {"BACKTEST_START": "2024-01-01T00:00:00+00:00", "TRADEBOT_PROMPT_DELTA": "true"}
+    assert spec.grid == {"BACKTEST_LLM_MODEL": ["a/x", "b/y"], "BACKTEST_INTERVAL": ["3m"]}
+
+
+def test_load_spec_rejects_unknown_keys(tmp_path):
+    """Typos in the sweep file fail loudly."""
+    path = tmp_path / "sweep.yaml"
+    path.write_text("grids:\n  model: [a]\n")
+    with pytest.raises(ValueError):
+        load_spec(path)
+
+
+def test_cli_axes_expand_to_named_combinations():
+    """`--set` axes multiply out; run names carry an index and value slug."""
+    spec = merge_cli(SweepSpec(grid={}), ["model=deepseek/deepseek-chat,openai/gpt-4o", "interval=3m,15m"], ["capital=500"])
+    runs = spec.combinations()
+    assert len(runs) == 4
+    assert runs[0].name == "01-deepseek-chat_3m"
+    assert runs[3].env == {
+        "BACKTEST_START_CAPITAL": "500",
+        "BACKTEST_LLM_MODEL": "openai/gpt-4o",
+        "BACKTEST_INTERVAL": "15m",
+    }
+
+
+def test_llm_axes_reach_the_request_body_and_cache_key(bot, tmp_path):
+    """Each model/temperature sweep value changes the body sent to the model, so runs never share cached responses."""
+    script = runpy.run_path(str(BACKTEST_SCRIPT), run_name="backtest_script")
+
+    spec = merge_cli(SweepSpec(grid={}), ["model=deepseek/deepseek-chat,openai/gpt-4o-mini", "temperature=0.2"], [])
+    bodies = []
+    for run in spec.combinations():
+        with mock.patch.dict(os.environ, {**run.env, "BACKTEST_DATA_DIR": str(tmp_path), "BACKTEST_RUN_ID": run.name}):
+            script["configure_environment"](script["BacktestConfig"].from_environment())
+            bot.refresh_llm_configuration_from_env()
+            bodies.append(bot._chat_request_body("market snapshot", bot.LLM_MODEL_NAME))
+    bot.refresh_llm_configuration_from_env()
+
+    assert [body["model"] for body in bodies] == ["deepseek/deepseek-chat", "openai/gpt-4o-mini"]
+    assert {body["temperature"] for body in bodies} == {0.2}
+    assert chat_request_key(bodies[0]) != chat_request_key(bodies[1])
+
+
+def test_summarize_results_tolerates_missing_sections():
+    """Missing result blocks leave empty cells instead of failing."""
+    row = summarize_results({"capital": {"total_return_pct": 1.5}})
+    assert row["return_pct"] == 1.5
+    assert row["trades"] is None and row["llm_cost_usd"] is None
+
+
+def test_sweep_runs_in_parallel_with_isolated_dirs(tmp_path, fake_backtest):
+    """Each combination gets its own run dir; klines are prefetched once per window and read-only afterwards."""
+    spec = SweepSpec(
+        grid={"BACKTEST_INTERVAL": ["3m", "15m"], "BACKTEST_LLM_MODEL": ["good", "broken"]},
+        base={"BACKTEST_START": "2024-01-01"},
+    )
+    runner = SweepRunner(spec, data_dir=tmp_path / "data", workers=4, sweep_id="sweep-t", command=fake_backtest, env={})
+    table = runner.run()
+
+    calls = [json.loads(line) for line in (tmp_path / "data" / "calls.jsonl").read_text().splitlines()]
+    prefetches = [call for call in calls if call["prefetch"] == "true"]
+    runs = [call for call in calls if call["prefetch"] == "false"]
+    assert len(prefetches) == 2
+    assert {call["kline_cache"] for call in runs} == {"readonly"}
+    assert len({call["run_id"] for call in runs}) == 4
+
+    assert list(table["status"]) == ["ok", "exit 3", "ok", "exit 3"]
+    ok = table[table["status"] == "ok"].set_index("BACKTEST_INTERVAL")
+    assert ok.loc["3m", "return_pct"] == 10.0
+    assert ok.loc["15m", "llm_latency_p95"] == 1.5
+    assert (tmp_path / "data" / "sweep-t" / "01-3m_good" / "backtest_results.json").exists()
+    saved = json.loads((tmp_path / "data" / "sweep-t" / "sweep_results.json").read_text())
+    assert len(saved["runs"]) == 4
+    assert (tmp_path / "data" / "sweep-t" / "sweep_results.csv").exists()
+    assert format_table(table, list(spec.grid)).splitlines()[1].lstrip().startswith("01-3m_good")
@@ -0,0 +1,115 @@
+"""Tests for the content-addressed message blob store."""
+from __future__ import annotations
+
+import csv
+import random
+import threading
+
+from llm.stub_server import ReplayPolicy
+from runtime.blob_store import BlobStore, blob_digest
+
+
+def test_identical_payloads_are_stored_once(tmp_path):
+    """The same text maps to one file; later puts are deduplicated without rewriting."""
+    store = BlobStore(tmp_path / "blobs")
+    first = store.put("system prompt " * 200)
+    second = store.put("system prompt " * 200)
+
+    assert first.digest == second.digest and first.ref == f"blob:{first.digest}"
+    assert first.created and not second.created
+    assert len(list((tmp_path / "blobs").rglob("*.gz"))) == 1
+    assert store.stats.created == 1 and store.stats.deduplicated == 1
+    assert store.stats.bytes_in == 2 * first.size
+
+
+def test_large_payloads_are_compressed_and_small_ones_are_not(tmp_path):
+    """Payloads above the threshold are gzipped; both kinds round-trip exactly."""
+    store = BlobStore(tmp_path, compress_threshold=100)
+    small = store.put("short ünïcode")
+    large = store.put("BTC MARKET SNAPSHOT - Price: 65000.0\n" * 100)
+
+    assert not small.compressed and store.path_for(small.digest).exists()
+    assert large.compressed and large.stored_size < large.size / 10
+    assert store.get(small.digest) == "short ünïcode"
+    assert store.get(large.digest) == "BTC MARKET SNAPSHOT - Price: 65000.0\n" * 100
+
+
+def test_family_payloads_are_delta_compressed(tmp_path):
+    """Similar prompts in one family are stored as deltas, with the chain capped at `max_chain`."""
+    store = BlobStore(tmp_path, max_chain=2)
+    rng = random.Random(7)
+    series = "".join(f"BTC price {rng.uniform(60000, 70000):.2f}\n" for _ in range(300))
+    prompts = [f"cycle {index}\n{series}" for index in range(4)]
+    refs = [store.put(prompt, family="sent:user") for prompt in prompts]
+
+    assert [ref.base for ref in refs] == [None, refs[0].digest, refs[1].digest, None]
+    assert refs[1].stored_size < refs[0].stored_size / 5
+    assert store.stats.deltas == 2
+    assert [BlobStore(tmp_path).get(ref.digest) for ref in refs] == prompts
+
+
+def test_delta_with_missing_base_reads_as_missing(tmp_path):
+    """A delta whose base blob was deleted is reported missing instead of raising."""
+    store = BlobStore(tmp_path)
+    rng = random.Random(3)
+    body = "".join(f"{rng.random():.8f} " for _ in range(300))
+    base = store.put(body + "b", family="f")
+    delta = store.put(body + "c", family="f")
+    store.path_for(base.digest, ".gz").unlink()
+    assert delta.base == base.digest
+    assert store.get(delta.digest) is None
+
+
+def test_existing_blobs_are_found_by_a_new_store(tmp_path):
+    """A fresh process deduplicates against blobs already on disk."""
+    BlobStore(tmp_path).put("x" * 5000)
+    store = BlobStore(tmp_path)
+    assert store.put("x" * 5000).created is False
+    assert store.stats.bytes_stored == 0
+
+
+def test_resolve_passes_through_inline_and_missing(tmp_path):
+    """Inline text and unknown digests are returned unchanged; corrupt blobs read as missing."""
+    store = BlobStore(tmp_path)
+    ref = store.put("y" * 2000)
+    missing = "blob:" + "0" * 64
+
+    assert store.resolve(ref.ref) == "y" * 2000
+    assert store.resolve("plain text") == "plain text"
+    assert store.resolve(missing) == missing
+    assert blob_digest("blob:not-a-digest") is None
+
+    store.path_for(ref.digest, ".gz").write_bytes(b"not gzip")
+    assert store.get(ref.digest) is None
+
+
+def test_concurrent_puts_of_same_content(tmp_path):
+    """Racing writers leave exactly one complete blob and no temp files."""
+    store = BlobStore(tmp_path)
+    text = "z" * 50_000
+    threads = [threading.Thread(target=store.put, args=(text,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    files = [path for path in tmp_path.rglob("*") if path.is_file()]
+    assert len(files) == 1 and files[0].suffix == ".gz"
+    assert store.stats.puts == 8 and store.stats.errors == 0
+
+
+def test_replay_policy_resolves_blob_references(tmp_path):
+    """Recorded assistant responses stored as blobs replay as their full text."""
+    store = BlobStore(tmp_path / "message_blobs")
+    response = '{"BTC": {"signal": "hold"}}' + " " * 600
+    path = tmp_path / "ai_messages.csv"
+    with open(path, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["timestamp", "direction", "role", "content", "metadata"])
+        writer.writerow(["t0", "received", "assistant", store.put(response).ref, '{"content_bytes": 627}'])
+        writer.writerow(["t1", "received", "assistant", "blob:" + "f" * 64, ""])
+        writer.writerow(["t2", "received", "assistant", "inline", ""])
+
+    policy = ReplayPolicy(path, loop=False)
+
+    assert policy.responses == [response, "inline"]
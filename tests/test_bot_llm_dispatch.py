@@ -0,0 +1,59 @@
+"""Tests for how the bot executes streamed LLM decisions, with and without hedging."""
+from __future__ import annotations
+
+import json
+import threading
+from collections import Counter
+
+import pytest
+
+from llm.stub_server import StubLLMServer
+
+# BTC/ETH/SOL 在流中即可解析；XRP 带尾随逗号，只有最终解析（带修复）才能得到
+RESPONSE = (
+    "Reviewing {EMA} and {RSI} first.\n```json\n{\n"
+    + ",\n".join(
+        f'  "{coin}": ' + json.dumps({"signal": "hold", "justification": f"{coin} range"})
+        for coin in ("BTC", "ETH", "SOL")
+    )
+    + ',\n  "XRP": {"signal": "hold", "justification": "XRP range",}\n}\n```\n'
+)
+
+
+@pytest.fixture
+def stub_llm(bot, monkeypatch):
+    executed = []
+    lock = threading.Lock()
+
+    def record_execution(decisions):
+        with lock:
+            executed.append(list(decisions))
+
+    with StubLLMServer(lambda system, user: RESPONSE, latency=0.6, first_token=0.0, chunk_chars=16) as server:
+        monkeypatch.setattr(bot, "OPENROUTER_CHAT_URL", server.url)
+        monkeypatch.setattr(bot, "LLM_STREAMING", True)
+        monkeypatch.setattr(bot, "LLM_ENSEMBLE_MODELS", [])
+        monkeypatch.setattr(bot, "process_ai_decisions", record_execution)
+        yield server, executed
+
+
+@pytest.mark.parametrize("hedge", [False, True])
+def test_each_coin_is_executed_once(bot, stub_llm, monkeypatch, hedge):
+    """Streamed coins run as they arrive, the rest after the final parse, and a hedge loser never executes."""
+    server, executed = stub_llm
+    model = f"stub/dispatch-{'hedged' if hedge else 'single'}"
+    monkeypatch.setattr(bot, "LLM_MODEL_NAME", model)
+    monkeypatch.setattr(bot, "LLM_HEDGE", hedge)
+    monkeypatch.setattr(bot, "LLM_HEDGE_DELAY", 0.1)
+    monkeypatch.setattr(bot, "LLM_HEDGE_MODEL", "")
+
+    decisions = bot.request_trading_decisions("market snapshot")
+
+    assert sorted(decisions) == ["BTC", "ETH", "SOL", "XRP"]
+    assert executed[:3] == [["BTC"], ["ETH"], ["SOL"]]
+    assert executed[3:] == [["XRP"]]
+    assert Counter(coin for batch in executed for coin in batch) == Counter(list(decisions))
+
+    outcomes = sorted(record.outcome for record in bot.llm_telemetry.recent() if record.model == model)
+    assert outcomes == (["cancelled", "ok"] if hedge else ["ok"])
+    assert server.requests == (2 if hedge else 1)
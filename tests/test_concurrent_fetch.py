@@ -0,0 +1,79 @@
+"""Tests for concurrent market data fetching."""
+from __future__ import annotations
+
+import threading
+import time
+
+from market.concurrent_fetch import fetch_concurrently
+
+
+def test_results_keep_task_order_and_values():
+    """Outcomes are keyed and ordered like the submitted tasks."""
+    tasks = {
+        ("ETHUSDT", "intraday"): lambda: "eth",
+        ("BTCUSDT", "intraday"): lambda: "btc",
+        ("SOLUSDT", "funding"): lambda: [1, 2, 3],
+    }
+    outcomes = fetch_concurrently(tasks, max_workers=4, timeout=5)
+
+    assert list(outcomes) == list(tasks)
+    assert outcomes[("ETHUSDT", "intraday")].value == "eth"
+    assert outcomes[("SOLUSDT", "funding")].value == [1, 2, 3]
+    assert all(outcome.ok for outcome in outcomes.values())
+
+
+def test_requests_run_in_parallel():
+    """Total latency follows the slowest request, not the sum."""
+    tasks = {i: (lambda: time.sleep(0.2) or "done") for i in range(8)}
+    started = time.perf_counter()
+    outcomes = fetch_concurrently(tasks, max_workers=8, timeout=5)
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 1.0
+    assert all(outcome.value == "done" for outcome in outcomes.values())
+
+
+def test_partial_failure_is_captured():
+    """An exception in one request does not affect the others."""
+    def boom():
+        raise RuntimeError("exchange error")
+
+    outcomes = fetch_concurrently({"bad": boom, "good": lambda: 1}, max_workers=2, timeout=5)
+
+    assert not outcomes["bad"].ok
+    assert isinstance(outcomes["bad"].error, RuntimeError)
+    assert "exchange error" in outcomes["bad"].describe_failure()
+    assert outcomes["good"].ok
+    assert outcomes["good"].value == 1
+
+
+def test_slow_request_times_out_without_blocking():
+    """Requests exceeding the per-request timeout are abandoned."""
+    release = threading.Event()
+
+    def hang():
+        release.wait(5)
+        return "late"
+
+    started = time.perf_counter()
+    outcomes = fetch_concurrently({"slow": hang, "fast": lambda: "ok"}, max_workers=2, timeout=0.2)
+    elapsed = time.perf_counter() - started
+    release.set()
+
+    assert elapsed < 2.0
+    assert outcomes["slow"].timed_out
+    assert not outcomes["slow"].ok
+    assert outcomes["fast"].value == "ok"
+
+
+def test_bounded_pool_times_each_request_from_its_start():
+    """Queued requests are not charged for time spent waiting for a worker."""
+    tasks = {i: (lambda: time.sleep(0.15) or i) for i in range(4)}
+    outcomes = fetch_concurrently(tasks, max_workers=1, timeout=0.5)
+
+    assert all(outcome.ok for outcome in outcomes.values())
+
+
+def test_empty_tasks():
+    """No tasks produce no outcomes."""
+    assert fetch_concurrently({}, max_workers=4, timeout=1) == {}
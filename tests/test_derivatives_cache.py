@@ -0,0 +1,118 @@
+"""Tests for the funding-rate / open-interest history cache."""
+from __future__ import annotations
+
+import pytest
+
+from market.derivatives_cache import DerivativesHistoryCache
+
+STEP = 300_000
+
+
+class FakeExchange:
+    """Open-interest history on a fixed 5m grid, honouring limit/startTime like Binance."""
+
+    def __init__(self, last_time: int) -> None:
+        self.last_time = last_time
+        self.calls = []
+
+    def history(self, limit, start_time):
+        self.calls.append((limit, start_time))
+        times = [self.last_time - STEP * i for i in range(500)][::-1]
+        if start_time is not None:
+            times = [t for t in times if t >= start_time][:limit]
+        else:
+            times = times[-limit:]
+        return [{"timestamp": t, "sumOpenInterest": str(t // STEP)} for t in times]
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _cache(clock, **kwargs):
+    return DerivativesHistoryCache(
+        ttl_seconds={"open_interest": 60, "funding": 600},
+        capacity=30,
+        incremental_limit=10,
+        clock=clock,
+        **kwargs,
+    )
+
+
+def test_ttl_hit_skips_request():
+    """Within the endpoint TTL the cached series is returned without a request."""
+    clock, exchange = Clock(), FakeExchange(100 * STEP)
+    cache = _cache(clock)
+
+    first = cache.get("open_interest", "BTCUSDT", 30, exchange.history)
+    clock.now += 59
+    second = cache.get("open_interest", "BTCUSDT", 1, exchange.history)
+
+    assert len(exchange.calls) == 1
+    assert second == first[-1:]
+    assert cache.stats.hits == 1
+
+
+def test_expired_entry_is_extended_incrementally():
+    """After the TTL only records since the last cached timestamp are requested."""
+    clock, exchange = Clock(), FakeExchange(100 * STEP)
+    cache = _cache(clock)
+    cache.get("open_interest", "BTCUSDT", 30, exchange.history)
+
+    exchange.last_time += 2 * STEP
+    clock.now += 61
+    rows = cache.get("open_interest", "BTCUSDT", 30, exchange.history)
+
+    assert exchange.calls[-1] == (10, 100 * STEP)
+    assert rows == exchange.history(30, None)
+    assert cache.stats.increments == 1
+
+
+def test_long_gap_triggers_full_refetch():
+    """A truncated incremental response reseeds the whole window."""
+    clock, exchange = Clock(), FakeExchange(100 * STEP)
+    cache = _cache(clock)
+    cache.get("open_interest", "BTCUSDT", 30, exchange.history)
+
+    exchange.last_time += 50 * STEP
+    clock.now += 3600
+    rows = cache.get("open_interest", "BTCUSDT", 30, exchange.history)
+
+    assert exchange.calls[-1] == (30, None)
+    assert rows[-1]["timestamp"] == 150 * STEP
+    assert cache.stats.reseeds == 1
+
+
+def test_persisted_histories_are_warm_after_restart(tmp_path):
+    """Saved histories are reloaded with their fetch time, so the TTL still applies."""
+    clock, exchange = Clock(), FakeExchange(100 * STEP)
+    path = tmp_path / "derivatives.json"
+    cache = _cache(clock, path=path)
+    rows = cache.get("open_interest", "ETHUSDT", 30, exchange.history)
+    assert cache.save()
+    assert not cache.save()  # nothing changed since
+
+    restarted = _cache(clock, path=path)
+    assert restarted.load() == 1
+    assert restarted.get("open_interest", "ETHUSDT", 30, exchange.history) == rows
+    assert len(exchange.calls) == 1
+
+
+def test_requests_beyond_capacity_bypass_cache():
+    """Larger windows than the cache keeps are fetched directly."""
+    clock, exchange = Clock(), FakeExchange(100 * STEP)
+    cache = _cache(clock)
+
+    assert len(cache.get("open_interest", "BTCUSDT", 100, exchange.history)) == 100
+    assert cache.get("open_interest", "BTCUSDT", 100, exchange.history)
+    assert len(exchange.calls) == 2
+
+
+def test_unknown_endpoint_rejected():
+    """Only endpoints with a known time field can be cached."""
+    with pytest.raises(ValueError):
+        _cache(Clock()).get("liquidations", "BTCUSDT", 10, lambda limit, start: [])
@@ -0,0 +1,147 @@
+"""Tests for the pooled HTTP transport."""
+from __future__ import annotations
+
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from runtime.http import EndpointPolicy, HttpTransport
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):  # noqa: N802 - http.server naming
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        server.hits += 1
+        status, headers, delay = server.script.pop(0) if server.script else (200, {}, 0.0)
+        if delay:
+            time.sleep(delay)
+        body = b'{"ok": true}'
+        try:
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gave up (timeout test)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.hits = 0
+    httpd.script = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/api"
+
+
+def _transport(sleeps, **policy):
+    policy.setdefault("backoff_base", 0.5)
+    return HttpTransport(
+        policies={"api": EndpointPolicy(**policy)},
+        sleep=sleeps.append,
+        rng=random.Random(7),
+    )
+
+
+def test_keep_alive_reuses_connection(server):
+    """Sequential requests to one host share a single pooled connection."""
+    transport = _transport([])
+    for _ in range(3):
+        assert transport.post(_url(server), json={}, endpoint="api").status_code == 200
+
+    stats = transport.stats()
+    assert stats.requests == 3
+    assert stats.connections_opened == 1
+    assert stats.connections_reused == 2
+    assert transport.session(_url(server)) is transport.session(_url(server) + "/other")
+
+
+def test_retries_throttled_and_server_errors_with_jitter(server):
+    """429 and 5xx responses are retried with jittered exponential backoff."""
+    server.script = [(503, {}, 0.0), (429, {}, 0.0)]
+    sleeps = []
+    transport = _transport(sleeps, max_retries=3)
+
+    response = transport.post(_url(server), json={}, endpoint="api")
+
+    assert response.status_code == 200
+    assert server.hits == 3
+    assert len(sleeps) == 2
+    assert 0.25 <= sleeps[0] <= 0.5
+    assert 0.5 <= sleeps[1] <= 1.0
+    assert transport.stats().retries == 2
+
+
+def test_retry_after_header_is_honoured(server):
+    """A Retry-After hint longer than the backoff sets the pause."""
+    server.script = [(429, {"Retry-After": "3"}, 0.0)]
+    sleeps = []
+    transport = _transport(sleeps)
+
+    assert transport.post(_url(server), json={}, endpoint="api").status_code == 200
+    assert sleeps == [3.0]
+
+
+def test_exhausted_retries_return_last_response(server):
+    """After the last retry the failing response is handed back to the caller."""
+    server.script = [(502, {}, 0.0)] * 3
+    transport = _transport([], max_retries=1)
+
+    response = transport.post(_url(server), json={}, endpoint="api")
+
+    assert response.status_code == 502
+    assert server.hits == 2
+    assert transport.stats().failures == 1
+
+
+def test_budget_stops_retries(server):
+    """A backoff that would overrun the endpoint budget is not attempted."""
+    server.script = [(503, {"Retry-After": "30"}, 0.0)]
+    sleeps = []
+    transport = _transport(sleeps, total_budget=5.0)
+
+    assert transport.post(_url(server), json={}, endpoint="api").status_code == 503
+    assert sleeps == []
+    assert server.hits == 1
+
+
+def test_read_timeout_is_not_retried_by_default(server):
+    """Slow responses raise once instead of replaying a non-idempotent call."""
+    server.script = [(200, {}, 0.5)]
+    transport = _transport([], read_timeout=0.1)
+
+    with pytest.raises(requests.Timeout):
+        transport.post(_url(server), json={}, endpoint="api")
+    assert transport.stats().retries == 0
+
+
+def test_connection_errors_are_retried():
+    """Refused connections are retried before the error propagates."""
+    sleeps = []
+    transport = _transport(sleeps, max_retries=2, connect_timeout=0.5)
+
+    with pytest.raises(requests.ConnectionError):
+        transport.post("http://127.0.0.1:9/api", json={}, endpoint="api")
+    assert len(sleeps) == 2
+    assert transport.stats().by_host["http://127.0.0.1:9"].attempts == 3
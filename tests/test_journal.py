@@ -0,0 +1,142 @@
+"""Tests for the buffered background CSV journal writer."""
+from __future__ import annotations
+
+import csv
+import threading
+import time
+
+from runtime.journal import JournalWriter
+
+
+def _rows(path):
+    if not path.exists():
+        return []
+    with open(path, newline="") as fh:
+        return list(csv.reader(fh))
+
+
+def test_rows_are_batched_until_flush(tmp_path):
+    """Rows stay queued below the batch size and interval, then flush() writes them in order."""
+    path = tmp_path / "trades.csv"
+    journal = JournalWriter(batch_size=100, flush_interval=60.0)
+    try:
+        for index in range(5):
+            journal.append(path, [index, "multi\nline, quoted"])
+        time.sleep(0.05)
+        assert _rows(path) == []
+        assert journal.queue_depth == 5
+        assert journal.flush(timeout=2.0)
+        assert _rows(path) == [[str(index), "multi\nline, quoted"] for index in range(5)]
+        stats = journal.stats()
+        assert stats.queue_depth == 0 and stats.max_queue_depth == 5
+        assert stats.rows_written == 5 and stats.flushes == 1
+        assert stats.last_flush_seconds is not None
+    finally:
+        journal.close()
+
+
+def test_batch_size_triggers_write(tmp_path):
+    """Reaching the batch size writes without an explicit flush."""
+    path = tmp_path / "state.csv"
+    journal = JournalWriter(batch_size=3, flush_interval=60.0)
+    try:
+        for index in range(3):
+            journal.append(path, [index])
+        deadline = time.monotonic() + 2.0
+        while len(_rows(path)) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(_rows(path)) == 3
+    finally:
+        journal.close()
+
+
+def test_flush_interval_triggers_write(tmp_path):
+    """A lone row is written once it has waited the flush interval."""
+    path = tmp_path / "decisions.csv"
+    journal = JournalWriter(batch_size=1000, flush_interval=0.05)
+    try:
+        journal.append(path, ["BTC", "hold"])
+        deadline = time.monotonic() + 2.0
+        while not _rows(path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert _rows(path) == [["BTC", "hold"]]
+    finally:
+        journal.close()
+
+
+def test_close_drains_queue_and_later_rows_write_synchronously(tmp_path):
+    """Shutdown flushes everything queued; rows after close go straight to disk."""
+    path = tmp_path / "messages.csv"
+    journal = JournalWriter(batch_size=1000, flush_interval=60.0)
+    journal.append(path, ["before"])
+    journal.close()
+    assert _rows(path) == [["before"]]
+    journal.append(path, ["after"])
+    assert _rows(path) == [["before"], ["after"]]
+
+
+def test_concurrent_producers_keep_rows_whole(tmp_path):
+    """Rows from many threads are neither lost nor interleaved."""
+    path = tmp_path / "messages.csv"
+    journal = JournalWriter(batch_size=16, flush_interval=0.01)
+
+    def produce(worker):
+        for index in range(50):
+            journal.append(path, [worker, index, "x" * 500])
+
+    threads = [threading.Thread(target=produce, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    journal.close()
+    rows = _rows(path)
+    assert len(rows) == 200
+    assert all(len(row) == 3 and row[2] == "x" * 500 for row in rows)
+    for worker in range(4):
+        assert [int(row[1]) for row in rows if row[0] == str(worker)] == list(range(50))
+
+
+def test_disabled_writer_is_synchronous(tmp_path):
+    """With the background thread disabled each append writes immediately."""
+    path = tmp_path / "trades.csv"
+    journal = JournalWriter(enabled=False)
+    journal.append(path, ["a"])
+    assert _rows(path) == [["a"]]
+    assert journal.flush() is True
+    assert journal.stats().rows_written == 1
+
+
+def test_write_errors_are_counted_not_raised(tmp_path):
+    """An unwritable path is logged and counted; the writer keeps working."""
+    journal = JournalWriter(batch_size=1000, flush_interval=60.0)
+    try:
+        journal.append(tmp_path / "missing" / "x.csv", ["lost"])
+        journal.append(tmp_path / "ok.csv", ["kept"])
+        assert journal.flush(timeout=2.0)
+        stats = journal.stats()
+        assert stats.errors == 1 and stats.rows_written == 1
+        assert _rows(tmp_path / "ok.csv") == [["kept"]]
+    finally:
+        journal.close()
+
+
+def test_deferred_tasks_run_on_writer_thread_before_later_rows(tmp_path):
+    """Deferred work runs off the caller's thread and lands before rows queued after it."""
+    path = tmp_path / "rows.csv"
+    seen = []
+
+    def task():
+        seen.append((threading.current_thread().name, path.exists()))
+
+    writer = JournalWriter(batch_size=1, flush_interval=60.0)
+    try:
+        writer.defer(task)
+        writer.append(path, ["a", 1])
+        assert writer.flush(timeout=5.0)
+    finally:
+        writer.close()
+
+    assert seen == [("journal-writer", False)]
+    writer.defer(task)
+    assert seen[-1] == (threading.current_thread().name, True)
@@ -0,0 +1,55 @@
+"""Tests for decoding raw klines into column arrays."""
+from __future__ import annotations
+
+import numpy as np
+
+from market.kline_arrays import decode_klines
+
+ROWS = [
+    [1_700_000_000_000, "100.5", "101.0", "99.5", "100.75", "12.5", 1_700_000_179_999, "1260", 7, "6", "630", "0"],
+    [1_700_000_180_000, "100.75", "102.0", "100.0", "101.5", "8.0", 1_700_000_359_999, "810", 4, "3", "300", "0"],
+]
+
+
+def test_decode_string_payload():
+    """Binance string values become float64 columns with int64 open times."""
+    bars = decode_klines(ROWS)
+
+    assert len(bars) == 2
+    assert bars.open_time.dtype == np.int64
+    assert bars.open_time.tolist() == [1_700_000_000_000, 1_700_000_180_000]
+    assert bars.close.dtype == np.float64
+    assert bars.open.tolist() == [100.5, 100.75]
+    assert bars.high.tolist() == [101.0, 102.0]
+    assert bars.low.tolist() == [99.5, 100.0]
+    assert bars.close.tolist() == [100.75, 101.5]
+    assert bars.volume.tolist() == [12.5, 8.0]
+    assert bars.close.flags["C_CONTIGUOUS"]
+
+
+def test_decode_numeric_payload():
+    """Numeric rows (e.g. the backtest replay client, which yields floats) decode the same way."""
+    numeric = [[float(value) for value in row] for row in ROWS]
+    bars = decode_klines(numeric)
+
+    assert bars.open_time.tolist() == [1_700_000_000_000, 1_700_000_180_000]
+    assert bars.close.tolist() == [100.75, 101.5]
+
+
+def test_mid_price_and_tail():
+    """Derived mid prices and tail windows keep the column layout."""
+    bars = decode_klines(ROWS)
+
+    assert bars.mid_price.tolist() == [100.25, 101.0]
+    tail = bars.tail(1)
+    assert len(tail) == 1
+    assert tail.close.tolist() == [101.5]
+    assert len(bars.tail(10)) == 2
+
+
+def test_decode_empty_payload():
+    """An empty response yields empty arrays."""
+    bars = decode_klines([])
+
+    assert len(bars) == 0
+    assert bars.close.shape == (0,)
@@ -0,0 +1,126 @@
+"""Tests for incremental kline ring buffers."""
+from __future__ import annotations
+
+import pytest
+
+from market.kline_buffer import KlineBufferStore, KlineRingBuffer
+
+STEP = 180_000
+
+
+def _bar(open_time, close):
+    return [open_time, str(close), str(close + 1), str(close - 1), str(close), "1.0", open_time + STEP - 1]
+
+
+class FakeExchange:
+    """Serves bars 0..now_index; the last bar is the still-forming one."""
+
+    def __init__(self, now_index):
+        self.now_index = now_index
+        self.forming_close = 0.0
+        self.calls = []
+
+    def bars(self):
+        rows = [_bar(i * STEP, float(i)) for i in range(self.now_index + 1)]
+        rows[-1] = _bar(self.now_index * STEP, self.now_index + self.forming_close)
+        return rows
+
+    def fetch(self, limit, start_time):
+        self.calls.append((limit, start_time))
+        rows = self.bars()
+        if start_time is None:
+            return rows[-limit:]
+        return [row for row in rows if row[0] >= start_time][:limit]
+
+
+def test_ring_buffer_replaces_forming_bar_in_place():
+    """A bar with the same open time overwrites the last entry."""
+    buffer = KlineRingBuffer(capacity=3)
+    buffer.seed([_bar(0, 1.0), _bar(STEP, 2.0)], requested=3)
+    appended = buffer.merge([_bar(STEP, 2.5), _bar(2 * STEP, 3.0)])
+
+    assert appended == 1
+    assert [row[4] for row in buffer.tail(3)] == ["1.0", "2.5", "3.0"]
+
+
+def test_ring_buffer_evicts_oldest_and_ignores_stale():
+    """Capacity is enforced and older bars are ignored."""
+    buffer = KlineRingBuffer(capacity=2)
+    buffer.seed([_bar(0, 1.0), _bar(STEP, 2.0)], requested=2)
+    buffer.merge([_bar(0, 9.0), _bar(2 * STEP, 3.0)])
+
+    assert [row[0] for row in buffer.tail(5)] == [STEP, 2 * STEP]
+
+
+def test_ring_buffer_rejects_invalid_capacity():
+    """Capacity must be positive."""
+    with pytest.raises(ValueError):
+        KlineRingBuffer(capacity=0)
+
+
+def test_store_seeds_once_then_fetches_increments():
+    """After seeding, only bars since the last open time are requested."""
+    exchange = FakeExchange(now_index=500)
+    store = KlineBufferStore(capacity=200, incremental_limit=50)
+
+    first = store.get_klines("BTCUSDT", "3m", 200, exchange.fetch)
+    exchange.now_index += 2
+    exchange.forming_close = 0.25
+    second = store.get_klines("BTCUSDT", "3m", 200, exchange.fetch)
+
+    assert exchange.calls[0] == (200, None)
+    assert exchange.calls[1] == (50, 500 * STEP)
+    assert len(first) == len(second) == 200
+    assert second == exchange.bars()[-200:]
+    assert store.stats.seeds == 1
+    assert store.stats.increments == 1
+    assert store.stats.rows_downloaded == 200 + 3
+
+
+def test_store_serves_smaller_limits_from_buffer():
+    """Smaller windows are sliced from the same buffer."""
+    exchange = FakeExchange(now_index=300)
+    store = KlineBufferStore(capacity=200)
+
+    store.get_klines("ETHUSDT", "3m", 200, exchange.fetch)
+    rows = store.get_klines("ETHUSDT", "3m", 50, exchange.fetch)
+
+    assert rows == exchange.bars()[-50:]
+    assert exchange.calls[1][1] == 300 * STEP
+
+
+def test_store_reseeds_after_long_gap():
+    """A gap longer than the incremental window triggers a full reseed."""
+    exchange = FakeExchange(now_index=300)
+    store = KlineBufferStore(capacity=100, incremental_limit=10)
+
+    store.get_klines("SOLUSDT", "3m", 100, exchange.fetch)
+    exchange.now_index += 40
+    rows = store.get_klines("SOLUSDT", "3m", 100, exchange.fetch)
+
+    assert rows == exchange.bars()[-100:]
+    assert store.stats.reseeds == 1
+    assert store.stats.seeds == 2
+
+
+def test_store_with_short_history_does_not_reseed_every_call():
+    """Symbols with little history are marked exhausted after seeding."""
+    exchange = FakeExchange(now_index=20)
+    store = KlineBufferStore(capacity=200)
+
+    store.get_klines("NEWUSDT", "4h", 200, exchange.fetch)
+    store.get_klines("NEWUSDT", "4h", 200, exchange.fetch)
+
+    assert store.stats.seeds == 1
+    assert store.stats.increments == 1
+
+
+def test_store_bypasses_buffer_for_oversized_requests():
+    """Requests larger than the buffer capacity go straight to the exchange."""
+    exchange = FakeExchange(now_index=600)
+    store = KlineBufferStore(capacity=100)
+
+    rows = store.get_klines("BTCUSDT", "3m", 500, exchange.fetch)
+
+    assert len(rows) == 500
+    assert exchange.calls == [(500, None)]
@@ -0,0 +1,159 @@
+"""Tests for the kline stream state and the offline replay feed."""
+from __future__ import annotations
+
+import json
+from datetime import datetime, timezone
+
+from market.interfaces import MarketDataProvider
+from market.kline_buffer import KlineBufferStore
+from market.kline_stream import (
+    BinanceKlineStream,
+    KlineStreamState,
+    ReplayKlineStream,
+    StreamingMarketDataProvider,
+    parse_kline_event,
+)
+
+STEP = 180_000
+
+
+def _event(symbol, open_time, close, closed=False, interval="3m", wrap=True):
+    data = {
+        "e": "kline",
+        "E": open_time + 1000,
+        "s": symbol,
+        "k": {
+            "t": open_time,
+            "T": open_time + STEP - 1,
+            "s": symbol,
+            "i": interval,
+            "o": "100.0",
+            "h": str(max(close, 100.0) + 1),
+            "l": str(min(close, 100.0) - 1),
+            "c": str(close),
+            "v": "12.5",
+            "n": 7,
+            "x": closed,
+            "q": "1250.0",
+            "V": "6.0",
+            "Q": "600.0",
+            "B": "0",
+        },
+    }
+    if wrap:
+        return {"stream": f"{symbol.lower()}@kline_{interval}", "data": data}
+    return data
+
+
+def _write_recording(path, events):
+    path.write_text("\n".join(json.dumps(event) for event in events) + "\n", encoding="utf-8")
+
+
+def test_parse_kline_event_matches_rest_layout():
+    """Stream payloads are converted to the 12-column REST kline row."""
+    symbol, interval, row, closed = parse_kline_event(_event("BTCUSDT", STEP, 101.5, closed=True))
+
+    assert (symbol, interval, closed) == ("BTCUSDT", "3m", True)
+    assert row[0] == STEP
+    assert row[4] == "101.5"
+    assert row[6] == 2 * STEP - 1
+    assert len(row) == 12
+
+
+def test_parse_kline_event_ignores_other_messages():
+    """Non-kline and malformed messages are skipped."""
+    assert parse_kline_event({"e": "trade"}) is None
+    assert parse_kline_event("not json") is None
+    assert parse_kline_event({"e": "kline", "k": {"t": 1}}) is None
+
+
+def test_state_tracks_forming_and_closed_bars():
+    """Updates for the same open time replace the forming bar."""
+    state = KlineStreamState(capacity=10)
+    state.apply(_event("ETHUSDT", 0, 100.0, closed=True))
+    state.apply(_event("ETHUSDT", STEP, 101.0))
+    state.apply(json.dumps(_event("ETHUSDT", STEP, 102.0, wrap=False)))
+
+    rows = state.klines("ETHUSDT", "3m", 10)
+    assert [row[4] for row in rows] == ["100.0", "102.0"]
+    assert state.latest("ETHUSDT", "3m")[4] == "102.0"
+    assert state.is_fresh("ETHUSDT", "3m", 5.0)
+    assert not state.is_fresh("SOLUSDT", "3m", 5.0)
+    assert state.events_applied == 3
+
+
+def test_state_feeds_seeded_buffers_and_detects_gaps():
+    """Bound buffers receive contiguous updates; a gap forces a reseed."""
+    buffers = KlineBufferStore(capacity=5)
+    seed_rows = [parse_kline_event(_event("BTCUSDT", i * STEP, 100.0 + i))[2] for i in range(3)]
+    buffers.get_klines("BTCUSDT", "3m", 5, lambda limit, start: seed_rows)
+    state = KlineStreamState(buffers=buffers)
+
+    state.apply(_event("BTCUSDT", 3 * STEP, 110.0))
+    assert buffers.peek("BTCUSDT", "3m", 5)[-1][4] == "110.0"
+
+    state.apply(_event("BTCUSDT", 10 * STEP, 120.0))
+    assert buffers.peek("BTCUSDT", "3m", 5) is None
+
+
+def test_replay_stream_drives_state_offline(tmp_path):
+    """The replay stand-in pushes recorded messages through the live code path."""
+    recording = tmp_path / "klines.jsonl"
+    _write_recording(
+        recording,
+        [
+            _event("BTCUSDT", 0, 100.0, closed=True),
+            _event("ETHUSDT", 0, 50.0, closed=True),
+            _event("BTCUSDT", STEP, 105.0),
+        ],
+    )
+    state = KlineStreamState()
+    closed_bars = []
+    state.add_listener(lambda s, i, row, closed: closed and closed_bars.append((s, row[0])))
+    feed = ReplayKlineStream(state, recording)
+
+    feed.start([("BTCUSDT", "3m")])
+    assert feed.wait(5)
+    feed.stop()
+
+    assert [row[4] for row in state.klines("BTCUSDT", "3m", 5)] == ["100.0", "105.0"]
+    assert state.klines("ETHUSDT", "3m", 5) == []
+    assert closed_bars == [("BTCUSDT", 0)]
+
+
+def test_state_records_messages_for_later_replay(tmp_path):
+    """Recorded messages can be replayed into a fresh state."""
+    record_path = tmp_path / "recorded.jsonl"
+    live_state = KlineStreamState(record_path=record_path)
+    live_state.apply(_event("SOLUSDT", 0, 20.0, closed=True))
+    live_state.apply(_event("SOLUSDT", STEP, 21.0))
+
+    replay_state = KlineStreamState()
+    feed = ReplayKlineStream(replay_state, record_path)
+    feed.start()
+    assert feed.wait(5)
+
+    assert replay_state.klines("SOLUSDT", "3m", 5) == live_state.klines("SOLUSDT", "3m", 5)
+
+
+def test_streaming_provider_subscribe_and_load(tmp_path):
+    """subscribe() starts the feed and load_ohlcv() reads the streamed candles."""
+    recording = tmp_path / "klines.jsonl"
+    _write_recording(recording, [_event("BTCUSDT", i * STEP, 100.0 + i, closed=True) for i in range(4)])
+    state = KlineStreamState()
+    provider = StreamingMarketDataProvider(ReplayKlineStream(state, recording))
+    assert isinstance(provider, MarketDataProvider)
+
+    provider.subscribe(["btcusdt"], "3m")
+    assert provider.feed.wait(5)
+    df = provider.load_ohlcv("BTCUSDT", "3m", start=datetime.fromtimestamp(STEP / 1000, tz=timezone.utc))
+    provider.close()
+
+    assert list(df.columns) == ["datetime", "open", "high", "low", "close", "volume"]
+    assert df["close"].tolist() == [101.0, 102.0, 103.0]
+
+
+def test_binance_stream_names():
+    """Combined stream names follow Binance's <symbol>@kline_<interval> format."""
+    names = BinanceKlineStream.stream_names([("BTCUSDT", "3m"), ("ETHUSDT", "4h")])
+    assert names == ["btcusdt@kline_3m", "ethusdt@kline_4h"]
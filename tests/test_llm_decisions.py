@@ -0,0 +1,121 @@
+"""Tests for tolerant LLM decision parsing and validation."""
+from __future__ import annotations
+
+from llm.decisions import DecisionRecord, normalize_decision, parse_decisions, repair_json
+
+
+def test_parse_prefers_fenced_block_and_ignores_commentary():
+    """Prose and braces around a fenced JSON block do not confuse extraction."""
+    content = (
+        "Thinking about {risk} first.\n"
+        "```json\n"
+        '{"BTC": {"signal": "hold", "justification": "range", "confidence": 0.4}}\n'
+        "```\n"
+        "Let me know {if} anything changes."
+    )
+    parsed = parse_decisions(content)
+    assert parsed.ok
+    assert parsed.records["BTC"].signal == "hold"
+    assert parsed.records["BTC"].justification == "range"
+
+
+def test_parse_repairs_comments_trailing_commas_and_literals():
+    """Comments, trailing commas and Python literals are repaired, not rejected."""
+    content = """{
+        // momentum is strong
+        "ETH": {"signal": "entry", "side": "long", "stop_loss": 1900, "profit_target": 2200,
+                "wait_for_fill": True, /* maker */ "liquidity": "maker",},
+    }"""
+    parsed = parse_decisions(content)
+    assert parsed.ok and parsed.repaired
+    record = parsed.records["ETH"]
+    assert record.wait_for_fill is True
+    assert record.liquidity == "maker"
+
+
+def test_validation_coerces_strings_percentages_and_aliases():
+    """String numbers, `10x` leverage, percent confidence and field aliases are normalised."""
+    record = normalize_decision("SOL", {
+        "action": "open",
+        "direction": "sell",
+        "stop": "$105.5",
+        "take_profit": "1,090",
+        "leverage": "10x",
+        "confidence": 75,
+        "risk": "25",
+        "reason": "  breakdown  ",
+    })
+    assert record.signal == "entry"
+    assert record.side == "short"
+    assert record.stop_loss == 105.5
+    assert record.profit_target == 1090.0
+    assert record.leverage == 10.0
+    assert record.confidence == 0.75
+    assert record.risk_usd == 25.0
+    assert record.justification == "breakdown"
+    assert record.issues == ()
+
+
+def test_invalid_fields_fall_back_to_safe_defaults():
+    """Unknown signals become hold and bad values are reported as issues."""
+    record = normalize_decision("XRP", {"signal": "moon", "leverage": -3, "confidence": "high"})
+    assert record.signal == "hold"
+    assert record.leverage == 1.0
+    assert record.confidence == 0.0
+    assert len(record.issues) == 2
+    entry = normalize_decision("XRP", {"signal": "entry"})
+    assert entry.side == "long"
+    assert any("stop_loss" in issue for issue in entry.issues)
+    assert normalize_decision("XRP", entry) is entry
+
+
+def test_one_malformed_coin_does_not_discard_the_others():
+    """A broken coin member is reported while its neighbours still parse."""
+    content = (
+        '{"BTC": {"signal": "hold"}, '
+        '"ETH": {"signal": "close" "justification": "x"}, '
+        '"SOL": {"signal": "hold"}}'
+    )
+    parsed = parse_decisions(content)
+    assert not parsed.ok
+    assert sorted(parsed.records) == ["BTC", "SOL"]
+    assert [coin for coin, _ in parsed.errors] == ["ETH"]
+
+
+def test_truncated_response_salvages_complete_members():
+    """A response cut off mid-object keeps every coin that closed."""
+    content = '{"ETH": {"signal": "hold", "confidence": 0.3}, "BTC": {"signal": "entry", "side": "lo'
+    parsed = parse_decisions(content, coins=["eth", "btc"])
+    assert parsed.found and not parsed.ok
+    assert list(parsed.records) == ["ETH"]
+    assert any("truncated" in error for _, error in parsed.errors)
+
+
+def test_parse_filters_coins_and_reports_missing_json():
+    """Only requested coins are validated; text without an object is flagged."""
+    parsed = parse_decisions('{"BTC": "hold", "NOTES": {"foo": 1}}', coins=["BTC"])
+    assert list(parsed.records) == ["BTC"]
+    assert parsed.records["BTC"] == DecisionRecord(coin="BTC")
+    missing = parse_decisions("I cannot decide right now.")
+    assert not missing.found and not missing.records
+
+
+def test_repair_json_leaves_string_contents_intact():
+    """Comment markers, commas and literal names inside strings are untouched."""
+    text = '{"url": "http://x/y", "note": "True, None, ]", "n": None,}'
+    assert repair_json(text) == '{"url": "http://x/y", "note": "True, None, ]", "n": null}'
+
+
+def test_as_dict_round_trips_through_validation():
+    """Records serialise to the model's JSON shape and validate back unchanged."""
+    record = normalize_decision("BNB", {"signal": "entry", "side": "long", "stop_loss": 500, "profit_target": 560})
+    assert "coin" not in record.as_dict()
+    assert normalize_decision("BNB", record.as_dict()) == record
+
+
+def test_unfenced_response_skips_preamble_objects_without_coins():
+    """Without a fence, a `{...}` aside that names no coin is skipped when coins are given."""
+    content = 'Watching {EMA: "20/50"} closely. {"ETH": {"signal": "hold", "justification": "chop"}}'
+    parsed = parse_decisions(content, coins=["BTC", "ETH"])
+    assert parsed.ok
+    assert list(parsed.records) == ["ETH"]
@@ -0,0 +1,131 @@
+"""Tests for multi-model fan-out and decision ensembling."""
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from llm.ensemble import ModelResult, ModelSpec, combine_decisions, parse_model_specs, run_ensemble
+
+
+def _result(model, **decisions):
+    return ModelResult(model=model, decisions=decisions, latency=1.0)
+
+
+def _entry(side, confidence):
+    return {"signal": "entry", "side": side, "confidence": confidence}
+
+
+def _hold(confidence=0.5):
+    return {"signal": "hold", "confidence": confidence}
+
+
+def test_parse_model_specs():
+    """Per-model timeouts use an `@seconds` suffix and default otherwise."""
+    specs = parse_model_specs(" deepseek/deepseek-chat-v3.1:free@25, openai/gpt-4o-mini ,", default_timeout=30)
+
+    assert specs == [
+        ModelSpec("deepseek/deepseek-chat-v3.1:free", 25.0),
+        ModelSpec("openai/gpt-4o-mini", 30),
+    ]
+    with pytest.raises(ValueError):
+        parse_model_specs("m@soon")
+
+
+def test_majority_vote_picks_most_confident_winner():
+    """The plurality proposal wins and its most confident decision is kept."""
+    results = [
+        _result("a", BTC=_entry("long", 0.6), ETH=_hold()),
+        _result("b", BTC=_entry("long", 0.8), ETH=_entry("short", 0.9)),
+        _result("c", BTC=_entry("short", 0.95), ETH=_hold(0.3)),
+    ]
+    decisions, votes = combine_decisions(results, "majority")
+
+    assert decisions["BTC"] == _entry("long", 0.8)
+    assert votes["BTC"] == {"entry:long": 2.0, "entry:short": 1.0}
+    assert decisions["ETH"] == _hold()
+
+
+def test_confidence_weighting_can_overturn_headcount():
+    """Two lukewarm votes lose to one confident one when weighting by confidence."""
+    results = [
+        _result("a", SOL={"signal": "close", "confidence": 0.9}),
+        _result("b", SOL=_hold(0.3)),
+        _result("c", SOL=_hold(0.4)),
+    ]
+
+    assert combine_decisions(results, "majority")[0]["SOL"]["signal"] == "hold"
+    assert combine_decisions(results, "confidence")[0]["SOL"]["signal"] == "close"
+
+
+def test_ties_fall_back_to_hold():
+    """Opposite entries with equal weight produce a hold instead of a coin flip."""
+    results = [_result("a", BTC=_entry("long", 0.7)), _result("b", BTC=_entry("short", 0.7))]
+    decisions, _ = combine_decisions(results, "confidence")
+
+    assert decisions["BTC"]["signal"] == "hold"
+    assert "tie" in decisions["BTC"]["justification"]
+
+
+def test_failed_models_are_ignored():
+    """Models without valid decisions do not vote."""
+    results = [
+        ModelResult(model="slow", timed_out=True, latency=20.0),
+        ModelResult(model="broken", error="HTTPError: 500"),
+        _result("ok", BTC=_hold()),
+    ]
+
+    assert combine_decisions(results, "majority")[0] == {"BTC": _hold()}
+
+
+def _sleepy(delays, answers):
+    def query(spec):
+        time.sleep(delays[spec.name])
+        answer = answers[spec.name]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+    return query
+
+
+def test_fan_out_runs_models_concurrently_and_respects_timeouts():
+    """Total time tracks the slowest model in budget, not the sum; late models are dropped."""
+    specs = [ModelSpec("a", 1.0), ModelSpec("b", 1.0), ModelSpec("late", 0.15)]
+    delays = {"a": 0.1, "b": 0.1, "late": 0.6}
+    answers = {"a": {"BTC": _hold()}, "b": {"BTC": _hold()}, "late": {"BTC": _entry("long", 1.0)}}
+
+    outcome = run_ensemble(specs, _sleepy(delays, answers), policy="majority")
+
+    assert outcome.elapsed < 0.45
+    assert outcome.responders == ["a", "b"]
+    assert outcome.results[2].timed_out
+    assert outcome.decisions == {"BTC": _hold()}
+    assert all(0.05 < result.latency < 0.45 for result in outcome.results)
+
+
+def test_first_valid_returns_without_waiting_for_slower_models():
+    """The first policy skips errors and returns as soon as one model answers."""
+    specs = [ModelSpec("error"), ModelSpec("fast"), ModelSpec("slow")]
+    delays = {"error": 0.0, "fast": 0.1, "slow": 0.8}
+    answers = {"error": RuntimeError("boom"), "fast": {"ETH": _hold()}, "slow": {"ETH": _entry("long", 1)}}
+
+    outcome = run_ensemble(specs, _sleepy(delays, answers), policy="first")
+
+    assert outcome.decisions == {"ETH": _hold()}
+    assert outcome.elapsed < 0.5
+    assert outcome.results[0].error.startswith("RuntimeError")
+    assert outcome.results[2].superseded and not outcome.results[2].failed
+
+
+def test_deadline_bounds_the_whole_fan_out():
+    """Nothing is waited for past the ensemble deadline."""
+    specs = [ModelSpec("a"), ModelSpec("b")]
+    outcome = run_ensemble(
+        specs,
+        _sleepy({"a": 0.6, "b": 0.6}, {"a": {"BTC": _hold()}, "b": {"BTC": _hold()}}),
+        deadline=0.1,
+    )
+
+    assert outcome.decisions == {}
+    assert outcome.elapsed < 0.4
+    assert all(result.timed_out for result in outcome.results)
@@ -0,0 +1,115 @@
+"""Tests for hedged LLM requests."""
+from __future__ import annotations
+
+import threading
+import time
+
+from llm.hedging import HedgeCancelled, HedgeStats, hedge_delay, run_hedged
+from llm.telemetry import LLMCallRecord, LLMTelemetry
+
+
+def test_fast_primary_is_not_hedged():
+    """A response inside the threshold never triggers the second request."""
+    models = []
+
+    def request(attempt):
+        models.append(attempt.model)
+        return {"BTC": attempt.label}
+
+    outcome = run_hedged(request, "main", delay=1.0, hedge_model="backup")
+    assert outcome.value == {"BTC": "primary"}
+    assert outcome.winner == "primary" and not outcome.hedged
+    assert models == ["main"]
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    """The hedge goes to the fallback model, wins, and cancels the slow primary."""
+    primary_cancelled = threading.Event()
+
+    def request(attempt):
+        if attempt.label == "primary":
+            if attempt.cancel_event.wait(2.0):
+                primary_cancelled.set()
+                raise HedgeCancelled("lost")
+            return {"BTC": "late"}
+        return {"BTC": attempt.model}
+
+    started = time.monotonic()
+    outcome = run_hedged(request, "main", delay=0.05, hedge_model="backup")
+    assert time.monotonic() - started < 1.0
+    assert outcome.value == {"BTC": "backup"}
+    assert outcome.winner == "hedge" and outcome.hedged
+    assert primary_cancelled.wait(1.0)
+
+
+def test_invalid_response_does_not_win():
+    """An empty primary answer leaves the race open for the hedge."""
+    def request(attempt):
+        if attempt.label == "primary":
+            time.sleep(0.1)
+            return None
+        time.sleep(0.2)
+        return {"ETH": "hedge"}
+
+    outcome = run_hedged(request, "main", delay=0.02)
+    assert outcome.winner == "hedge"
+    assert outcome.value == {"ETH": "hedge"}
+
+
+def test_claim_inside_request_wins_immediately():
+    """An attempt that claims before acting on streamed output wins even if the other finishes first."""
+    def request(attempt):
+        if attempt.label == "primary":
+            time.sleep(0.05)
+            assert attempt.claim()
+            time.sleep(0.1)
+            return {"SOL": "primary"}
+        time.sleep(0.01)
+        return {"SOL": "hedge"}
+
+    outcome = run_hedged(request, "main", delay=0.04)
+    assert outcome.winner == "primary"
+    assert outcome.value == {"SOL": "primary"}
+
+
+def test_errors_are_reported_without_winner():
+    """Failures on both sides surface as errors and no winner."""
+    def request(attempt):
+        time.sleep(0.05)
+        raise RuntimeError(f"{attempt.label} down")
+
+    outcome = run_hedged(request, "main", delay=0.01)
+    assert outcome.winner is None and outcome.value is None
+    assert outcome.errors == {"primary": "RuntimeError: primary down", "hedge": "RuntimeError: hedge down"}
+
+
+def test_hedge_delay_uses_percentile_after_warmup():
+    """The threshold falls back to the configured delay until enough latencies are known."""
+    assert hedge_delay([1.0, 2.0], 95, fallback=7.0) == 7.0
+    assert hedge_delay([1.0, 2.0, 3.0, 4.0, 5.0], 50, fallback=7.0) == 3.0
+
+
+def test_hedge_stats_count_rate_and_wins():
+    """Hedge rate and win counters follow the recorded outcomes."""
+    stats = HedgeStats()
+    stats.record(run_hedged(lambda attempt: {"BTC": 1}, "m", delay=1.0))
+    stats.record(run_hedged(lambda attempt: None, "m", delay=1.0))
+    assert stats.as_dict() == {
+        "calls": 2,
+        "hedged": 0,
+        "hedge_rate": 0.0,
+        "primary_wins": 1,
+        "hedge_wins": 0,
+        "failures": 1,
+    }
+    assert "0/2 calls hedged" in stats.describe()
+
+
+def test_cancelled_calls_are_excluded_from_latency(tmp_path):
+    """Telemetry keeps cancelled losers out of the latency percentiles."""
+    telemetry = LLMTelemetry(tmp_path / "llm_calls.csv")
+    telemetry.record(LLMCallRecord(model="m", latency=1.0))
+    telemetry.record(LLMCallRecord(model="m", latency=9.0, outcome="cancelled"))
+    summary = telemetry.summary()
+    assert summary.outcomes["cancelled"] == 1
+    assert summary.latency[99] == 1.0
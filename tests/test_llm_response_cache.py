@@ -0,0 +1,92 @@
+"""Tests for the content-addressed LLM response cache."""
+from __future__ import annotations
+
+import pytest
+
+from llm.response_cache import CachedResponse, LLMResponseCache, cache_key, chat_request_key
+
+
+def _body(**overrides):
+    body = {
+        "model": "deepseek/deepseek-chat",
+        "messages": [
+            {"role": "system", "content": "rules"},
+            {"role": "user", "content": "market snapshot"},
+        ],
+        "temperature": 0.7,
+        "max_tokens": 4000,
+    }
+    body.update(overrides)
+    return body
+
+
+def test_key_depends_on_every_input():
+    """Model, parameters and both prompts all change the key."""
+    base = cache_key("m", {"temperature": 0.7}, "sys", "user")
+
+    assert base == cache_key("m", {"temperature": 0.7}, "sys", "user")
+    assert base != cache_key("m2", {"temperature": 0.7}, "sys", "user")
+    assert base != cache_key("m", {"temperature": 0.2}, "sys", "user")
+    assert base != cache_key("m", {"temperature": 0.7}, "sys2", "user")
+    assert base != cache_key("m", {"temperature": 0.7}, "sys", "user2")
+
+
+def test_chat_request_key_ignores_streaming_and_key_order():
+    """Streaming the same request (or reordering its fields) hits the same entry."""
+    body = _body()
+    reordered = dict(reversed(list(body.items())))
+
+    assert chat_request_key(body) == chat_request_key(_body(stream=True))
+    assert chat_request_key(body) == chat_request_key(reordered)
+    assert chat_request_key(body) != chat_request_key(_body(max_tokens=100))
+    assert chat_request_key(body) != chat_request_key(body, namespace="http://127.0.0.1:8765/v1/chat/completions")
+
+
+def test_round_trip_shared_between_instances(tmp_path):
+    """Entries written by one run are served to another run using the same directory."""
+    key = chat_request_key(_body())
+    writer = LLMResponseCache(tmp_path, mode="readwrite", clock=lambda: 123.0)
+    assert writer.get(key) is None
+    assert writer.put(key, CachedResponse(content='{"BTC": {"signal": "hold"}}', response_id="gen-1", usage={"total_tokens": 9}))
+
+    reader = LLMResponseCache(tmp_path, mode="readonly")
+    cached = reader.get(key)
+
+    assert cached.content == '{"BTC": {"signal": "hold"}}'
+    assert cached.response_id == "gen-1"
+    assert cached.usage == {"total_tokens": 9}
+    assert cached.stored_at == 123.0
+    assert writer.stats.misses == 1 and writer.stats.writes == 1
+    assert reader.stats.hits == 1
+    assert writer.path_for(key).parent.name == key[:2]
+
+
+def test_readonly_and_bypass_modes(tmp_path):
+    """Read-only never writes; bypass neither reads nor writes."""
+    key = cache_key("m", {}, "s", "u")
+    LLMResponseCache(tmp_path).put(key, CachedResponse(content="x"))
+
+    readonly = LLMResponseCache(tmp_path, mode="readonly")
+    assert not readonly.put(cache_key("m", {}, "s", "other"), CachedResponse(content="y"))
+    bypass = LLMResponseCache(tmp_path, mode="bypass")
+    assert bypass.get(key) is None
+    assert not bypass.put(key, CachedResponse(content="z"))
+    assert LLMResponseCache(tmp_path).get(key).content == "x"
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    """A truncated file is ignored instead of raising."""
+    cache = LLMResponseCache(tmp_path)
+    key = cache_key("m", {}, "s", "u")
+    path = cache.path_for(key)
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"\x1f\x8b\x08garbage")
+
+    assert cache.get(key) is None
+    assert cache.stats.errors == 1
+
+
+def test_unknown_mode_rejected(tmp_path):
+    """Modes are validated up front."""
+    with pytest.raises(ValueError):
+        LLMResponseCache(tmp_path, mode="write-only")
@@ -0,0 +1,137 @@
+"""Tests for the SSE completion reader and the incremental decision parser."""
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from llm.decisions import normalize_decision, parse_decisions
+from llm.streaming import DecisionStreamParser, StreamError, iter_sse_data, read_chat_stream
+
+DECISIONS = {
+    "BTC": {"signal": "entry", "side": "long", "justification": "Breakout {above} \"range\"", "confidence": 0.7},
+    "ETH": {"signal": "hold", "tags": ["a", "]"], "confidence": 0.4},
+    "SOL": {"signal": "close", "justification": "Target hit"},
+}
+
+
+def _sse(texts, usage=None):
+    events = [": OPENROUTER PROCESSING\n\n"]
+    for text in texts:
+        chunk = {"id": "gen-1", "model": "m", "choices": [{"delta": {"content": text}}]}
+        events.append(f"data: {json.dumps(chunk)}\n\n")
+    final = {"id": "gen-1", "choices": [{"delta": {}, "finish_reason": "stop"}], "usage": usage}
+    events.append(f"data: {json.dumps(final)}\n\n")
+    events.append("data: [DONE]\n\n")
+    return "".join(events).encode("utf-8")
+
+
+def _split(payload, size):
+    return [payload[i:i + size] for i in range(0, len(payload), size)]
+
+
+def test_members_complete_as_soon_as_closed():
+    """Each coin is emitted when its closing brace arrives, before later coins."""
+    text = "Reasoning first...\n```json\n" + json.dumps(DECISIONS, indent=2) + "\n```\nDone."
+    parser = DecisionStreamParser()
+    emitted = []
+    for index, char in enumerate(text):
+        for key, value in parser.feed(char):
+            emitted.append((key, value, index))
+
+    assert [key for key, _, _ in emitted] == ["BTC", "ETH", "SOL"]
+    assert {key: value for key, value, _ in emitted} == DECISIONS
+    btc_end = text.index('"ETH"')
+    assert emitted[0][2] < btc_end
+    assert parser.complete
+    assert parser.members == DECISIONS
+
+
+def test_scalar_members_and_bad_member_isolated():
+    """Scalars finish at the next separator; a malformed member does not drop others."""
+    parser = DecisionStreamParser()
+    emitted = parser.feed('{"note": 1.5, "BTC": {"signal": hold}, "ETH": {"signal": "hold"}}')
+
+    assert emitted == [("note", 1.5), ("ETH", {"signal": "hold"})]
+    assert len(parser.errors) == 1
+    assert parser.complete
+
+
+def test_truncated_stream_is_not_complete():
+    """A cut-off response keeps the finished members but is flagged incomplete."""
+    parser = DecisionStreamParser()
+    parser.feed('{"BTC": {"signal": "hold"}, "ETH": {"sig')
+
+    assert parser.members == {"BTC": {"signal": "hold"}}
+    assert not parser.complete
+
+
+def test_preamble_braces_do_not_capture_the_stream():
+    """With fence following on, a `{EMA}` aside is skipped and the fenced block is emitted, as parse_decisions does."""
+    text = "Looking at {EMA} and {RSI: 55} trends...\n```json\n" + json.dumps(DECISIONS) + "\n```\nDone {ok}."
+    parser = DecisionStreamParser(follow_fences=True, coins=["BTC", "ETH", "SOL"])
+    emitted = [key for char in text for key, _ in parser.feed(char)]
+
+    assert emitted == ["BTC", "ETH", "SOL"]
+    assert parser.members == DECISIONS
+    assert sorted(parse_decisions(text, coins=["BTC", "ETH", "SOL"]).records) == emitted
+    assert parser.complete and not parser.superseded
+
+
+def test_unfenced_example_is_superseded_by_fenced_block():
+    """An unfenced object is provisional: a later fenced block replaces it and the switch is flagged."""
+    example = {"BTC": {"signal": "entry", "side": "short"}}
+    text = "For example " + json.dumps(example) + " would be bearish.\n```json\n" + json.dumps(DECISIONS) + "\n```"
+    parser = DecisionStreamParser(follow_fences=True, coins=["BTC", "ETH", "SOL"])
+    for chunk in _split(text, 7):
+        parser.feed(chunk)
+
+    assert parser.superseded
+    assert parser.members == DECISIONS
+    assert parse_decisions(text).records["BTC"] == normalize_decision("BTC", DECISIONS["BTC"])
+
+
+def test_sse_events_reassembled_across_chunk_boundaries():
+    """Events split mid-line (and multi-byte characters) are decoded intact."""
+    payload = "data: {\"a\": \"é\"}\r\n\r\n: ping\n\ndata: x\ndata: y\n\n".encode("utf-8")
+
+    assert list(iter_sse_data(_split(payload, 3))) == ['{"a": "é"}', "x\ny"]
+
+
+def test_read_chat_stream_collects_text_usage_and_timing():
+    """Deltas are forwarded in order and usage comes from the final chunk."""
+    texts = ['{"BTC": ', '{"signal": "hold"}', "}"]
+    ticks = iter([10.0, 10.4, 11.0])
+    seen = []
+
+    result = read_chat_stream(
+        _split(_sse(texts, usage={"total_tokens": 42}), 17),
+        on_text=seen.append,
+        clock=lambda: next(ticks),
+        started=9.5,
+    )
+
+    assert seen == texts
+    assert result.content == "".join(texts)
+    assert result.response_id == "gen-1"
+    assert result.usage == {"total_tokens": 42}
+    assert result.finish_reason == "stop"
+    assert result.first_token_seconds == pytest.approx(0.5)
+    assert result.elapsed_seconds == pytest.approx(0.9)
+
+
+def test_stream_error_event_raises():
+    """Errors reported mid-stream surface as StreamError."""
+    payload = b'data: {"error": {"message": "overloaded"}}\n\n'
+
+    with pytest.raises(StreamError, match="overloaded"):
+        read_chat_stream([payload])
+
+
+def test_keep_alive_comments_do_not_extend_the_deadline():
+    """Comment-only chunks still count against the deadline."""
+    ticks = iter([0.0, 1.0, 2.0, 3.0, 4.0])
+    chunks = [b": OPENROUTER PROCESSING\n\n"] * 4
+
+    with pytest.raises(StreamError, match="deadline"):
+        read_chat_stream(chunks, clock=lambda: next(ticks), deadline=2.5)
@@ -0,0 +1,133 @@
+"""Tests for the offline OpenAI-compatible LLM stub."""
+from __future__ import annotations
+
+import csv
+import json
+import time
+
+import pytest
+import requests
+
+from llm.streaming import StreamError, read_chat_stream
+from llm.stub_server import HoldPolicy, ReplayPolicy, RuleBasedPolicy, StubLLMServer, parse_prompt_market
+
+
+VERBOSE_PROMPT = """CURRENT MARKET STATE FOR ALL COINS
+ETH MARKET SNAPSHOT
+- Price: 2010.5, EMA20: 2000.0, MACD: 3.2, RSI(7): 55.1
+- Open Interest (latest/avg): 1029.00 / 1014.50
+--------------------------------------------------------------------------------
+BTC MARKET SNAPSHOT
+- Price: 60000, EMA20: 60500, MACD: -12.5, RSI(7): 41
+Open positions and performance details:
+BTC position data: {"symbol": "BTC", "side": "long", "quantity": 0.1}
+"""
+
+COMPACT_PROMPT = """t=2024-01-01T12:00:00+00:00 running=5m call=2.
+MARKET coin price ema20 macd rsi7 rsi14 | oi_last oi_avg | funding_last funding_avg
+ETH 2010.5 2000 3.2 55.1 50 | 1029 1014.5 | 0.0001 0.0001
+SOL 99 100 -0.5 80 60 | 1 1 | 0 0
+4H coin ema20 ema50 atr3 atr14 volume volume_avg
+POSITION {"symbol":"SOL","side":"short","quantity":3}
+"""
+
+
+def _chat_body(prompt, **extra):
+    return {"model": "stub/model", "messages": [{"role": "system", "content": "rules"}, {"role": "user", "content": prompt}], **extra}
+
+
+def test_parse_prompt_market_handles_both_formats():
+    """Indicators and held sides are read from verbose and compact prompts alike."""
+    verbose, verbose_positions = parse_prompt_market(VERBOSE_PROMPT)
+    compact, compact_positions = parse_prompt_market(COMPACT_PROMPT)
+
+    assert verbose["ETH"] == {"price": 2010.5, "ema20": 2000.0, "macd": 3.2, "rsi7": 55.1}
+    assert verbose_positions == {"BTC": "long"}
+    assert compact["SOL"] == {"price": 99.0, "ema20": 100.0, "macd": -0.5, "rsi7": 80.0}
+    assert compact_positions == {"SOL": "short"}
+
+
+def test_rule_policy_is_deterministic_and_executable():
+    """Entries carry valid stops/targets; positions are closed when the trend turns."""
+    policy = RuleBasedPolicy(risk_usd=20, stop_pct=0.01)
+    decisions = policy("", VERBOSE_PROMPT)
+
+    eth = decisions["ETH"]
+    assert eth["signal"] == "entry" and eth["side"] == "long"
+    assert eth["stop_loss"] < 2010.5 < eth["profit_target"]
+    assert eth["quantity"] == pytest.approx(20 / (2010.5 * 0.01), rel=1e-6)
+    assert decisions["BTC"]["signal"] == "close"
+    assert policy("", VERBOSE_PROMPT) == decisions
+    assert HoldPolicy()("", COMPACT_PROMPT) == {
+        coin: {"signal": "hold", "justification": "stub: hold", "confidence": 0.5} for coin in ("ETH", "SOL")
+    }
+
+
+def test_replay_policy_returns_recorded_responses_in_order(tmp_path):
+    """Recorded assistant messages are replayed verbatim and cycle when exhausted."""
+    path = tmp_path / "ai_messages.csv"
+    with open(path, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["timestamp", "direction", "role", "content", "metadata"])
+        writer.writerow(["t0", "sent", "user", "prompt", ""])
+        writer.writerow(["t0", "received", "assistant", 'first {"BTC": {"signal": "hold"}}', ""])
+        writer.writerow(["t1", "received", "assistant", '{"BTC": {"signal": "close"}}', ""])
+
+    policy = ReplayPolicy(path)
+
+    assert [policy("", "") for _ in range(3)] == [
+        'first {"BTC": {"signal": "hold"}}',
+        '{"BTC": {"signal": "close"}}',
+        'first {"BTC": {"signal": "hold"}}',
+    ]
+
+
+def test_buffered_completion_round_trip():
+    """The server answers in the chat-completions schema with estimated usage."""
+    with StubLLMServer(RuleBasedPolicy()) as server:
+        response = requests.post(server.url, json=_chat_body(VERBOSE_PROMPT), timeout=5)
+
+    payload = response.json()
+    assert response.status_code == 200
+    assert payload["model"] == "stub/model"
+    decisions = json.loads(payload["choices"][0]["message"]["content"])
+    assert set(decisions) == {"ETH", "BTC"}
+    assert payload["usage"]["prompt_tokens"] > 0 and payload["usage"]["completion_tokens"] > 0
+
+
+def test_streaming_respects_latency_and_first_token():
+    """Streamed responses deliver the first chunk early and the rest after the configured latency."""
+    with StubLLMServer(HoldPolicy(), latency=0.3, first_token=0.05, chunk_chars=8) as server:
+        started = time.monotonic()
+        response = requests.post(server.url, json=_chat_body(COMPACT_PROMPT, stream=True), stream=True, timeout=5)
+        completion = read_chat_stream(response.iter_content(chunk_size=None), started=started)
+
+    assert completion.finish_reason == "stop"
+    assert completion.first_token_seconds < 0.2
+    assert 0.3 <= completion.elapsed_seconds < 1.0
+    assert set(json.loads(completion.content)) == {"ETH", "SOL"}
+    assert completion.usage["total_tokens"] > 0
+
+
+def test_unknown_path_and_policy_failure():
+    """Wrong paths return 404 and policy errors surface as HTTP 500."""
+    def broken(system, user):
+        raise RuntimeError("boom")
+
+    with StubLLMServer(broken) as server:
+        base = server.url.rsplit("/v1/", 1)[0]
+        assert requests.post(base + "/v1/embeddings", json={}, timeout=5).status_code == 404
+        failed = requests.post(server.url, json=_chat_body("x"), timeout=5)
+
+    assert failed.status_code == 500
+    assert "boom" in failed.json()["error"]["message"]
+
+
+def test_stalled_stream_stops_at_its_deadline():
+    """A stream that keeps trickling chunks is cut off at the overall deadline, not the read timeout."""
+    with StubLLMServer(HoldPolicy(), latency=5.0, first_token=0.05, chunk_chars=2) as server:
+        sent_at = time.monotonic()
+        with requests.post(server.url, json=_chat_body(VERBOSE_PROMPT, stream=True), stream=True, timeout=2) as response:
+            with pytest.raises(StreamError, match="deadline"):
+                read_chat_stream(response.iter_content(chunk_size=None), started=sent_at, deadline=sent_at + 0.5)
+        assert time.monotonic() - sent_at < 2.0
@@ -0,0 +1,144 @@
+"""Tests for per-call LLM telemetry."""
+from __future__ import annotations
+
+import csv
+from datetime import datetime, timezone
+
+import pytest
+
+from llm.telemetry import (
+    LLMCallRecord,
+    LLMTelemetry,
+    ModelPrice,
+    TELEMETRY_COLUMNS,
+    estimate_cost,
+    parse_price_table,
+    percentile,
+)
+from runtime.journal import JournalWriter
+
+
+class StepClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _telemetry(tmp_path, **kwargs):
+    clock = StepClock()
+    telemetry = LLMTelemetry(
+        tmp_path / "llm_calls.csv",
+        clock=clock,
+        now=lambda: datetime(2024, 1, 1, tzinfo=timezone.utc),
+        **kwargs,
+    )
+    return telemetry, clock
+
+
+def test_percentile_interpolates():
+    """Percentiles interpolate linearly between ranks."""
+    values = [1.0, 2.0, 3.0, 4.0, 5.0]
+
+    assert percentile(values, 50) == 3.0
+    assert percentile(values, 95) == pytest.approx(4.8)
+    assert percentile([7.0], 99) == 7.0
+    assert percentile([], 50) is None
+
+
+def test_price_table_and_cost_estimate():
+    """Token prices are per million; cached prompt tokens use the discounted rate."""
+    prices = parse_price_table("deepseek/deepseek-chat=0.27/1.10/0.07, *=1/2")
+    usage = {"prompt_tokens": 1000, "completion_tokens": 200, "prompt_tokens_details": {"cached_tokens": 600}}
+
+    assert prices["*"] == ModelPrice(1.0, 2.0)
+    assert estimate_cost(usage, prices["deepseek/deepseek-chat"]) == pytest.approx((400 * 0.27 + 600 * 0.07 + 200 * 1.10) / 1e6)
+    assert estimate_cost({**usage, "cost": 0.0042}, None) == 0.0042
+    assert estimate_cost(usage, None) is None
+    with pytest.raises(ValueError):
+        parse_price_table("model=1")
+
+
+def test_track_writes_one_row_per_call(tmp_path):
+    """Each tracked call becomes one CSV row with latency, tokens, cost and outcome."""
+    telemetry, clock = _telemetry(tmp_path, prices={"*": ModelPrice(1.0, 2.0)})
+
+    with telemetry.track("m", streamed=True) as call:
+        clock.now += 1.5
+        call.first_token = 0.4
+        call.status_code = 200
+        call.usage = {"prompt_tokens": 100, "completion_tokens": 10}
+    with telemetry.track("m") as call:
+        clock.now += 0.5
+        call.status_code = 429
+        call.outcome = "http-error"
+
+    with open(telemetry.path, newline="") as fh:
+        rows = list(csv.DictReader(fh))
+    assert list(rows[0].keys()) == TELEMETRY_COLUMNS
+    assert rows[0]["latency_seconds"] == "1.500"
+    assert rows[0]["first_token_seconds"] == "0.400"
+    assert rows[0]["cost_usd"] == "0.000120"
+    assert rows[0]["streamed"] == "true"
+    assert rows[1]["outcome"] == "http-error"
+    assert rows[1]["prompt_tokens"] == ""
+
+
+def test_rows_are_queued_through_the_journal(tmp_path):
+    """With a journal writer, the caller only queues rows; the header is written once up front."""
+    journal = JournalWriter(flush_interval=60.0)
+    telemetry, clock = _telemetry(tmp_path, append=journal.append)
+    try:
+        for _ in range(2):
+            with telemetry.track("m") as call:
+                clock.now += 0.2
+
+        with open(telemetry.path, newline="") as fh:
+            assert list(csv.reader(fh)) == [TELEMETRY_COLUMNS]
+        assert journal.queue_depth == 2
+        journal.flush()
+        with open(telemetry.path, newline="") as fh:
+            rows = list(csv.DictReader(fh))
+        assert [row["latency_seconds"] for row in rows] == ["0.200", "0.200"]
+    finally:
+        journal.close()
+
+
+def test_exceptions_are_recorded_as_errors(tmp_path):
+    """A call that raises (e.g. a timeout) is still recorded, then re-raised."""
+    telemetry, clock = _telemetry(tmp_path)
+
+    with pytest.raises(TimeoutError):
+        with telemetry.track("m"):
+            clock.now += 30
+            raise TimeoutError("read timed out")
+
+    (record,) = telemetry.recent()
+    assert record.outcome == "error"
+    assert record.latency == 30
+
+
+def test_summary_uses_rolling_window_and_skips_cache_hits(tmp_path):
+    """Percentiles cover the last `window` live calls; local cache hits are counted but not timed."""
+    telemetry, _ = _telemetry(tmp_path, window=4)
+    for latency in (100.0, 1.0, 2.0, 3.0):
+        telemetry.record(LLMCallRecord(model="m", latency=latency))
+    telemetry.record(LLMCallRecord(model="m", latency=0.0, outcome="cached"))
+
+    summary = telemetry.summary()
+
+    assert summary.calls == 4
+    assert summary.outcomes["cached"] == 1
+    assert summary.latency[50] == 2.0
+    assert summary.latency[99] == pytest.approx(2.98)
+    assert "p50/p95/p99" in summary.describe()
+    assert summary.as_dict()["latency_seconds"]["p50"] == 2.0
+
+
+def test_unknown_outcome_rejected(tmp_path):
+    """Outcomes are limited to the documented set."""
+    telemetry, _ = _telemetry(tmp_path)
+
+    with pytest.raises(ValueError):
+        telemetry.record(LLMCallRecord(model="m", outcome="meh"))
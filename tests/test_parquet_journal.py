@@ -0,0 +1,130 @@
+"""Tests for the day-partitioned Parquet journal and the backend-agnostic reader."""
+from __future__ import annotations
+
+import csv
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from runtime.journal import JournalWriter, read_journal
+from runtime.parquet_journal import ParquetJournal
+
+
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def _state_rows(count, step=timedelta(hours=6)):
+    return [
+        [(START + step * index).isoformat(), f"{1000 + index:.2f}", 1000.0 + index, "0.00", "1", "BTC:long", "", "n/a"]
+        for index in range(count)
+    ]
+
+
+def test_rows_are_typed_and_partitioned_by_day(tmp_path):
+    """Each UTC day gets its own partition and values come back typed."""
+    journal = ParquetJournal(tmp_path / "journal")
+    assert journal.append_rows("portfolio_state", _state_rows(8)) == 8
+
+    days = sorted(path.name for path in (tmp_path / "journal" / "portfolio_state").iterdir())
+    assert days == ["date=2024-03-01", "date=2024-03-02"]
+    df = read_journal(tmp_path, "portfolio_state")
+    assert len(df) == 8
+    assert str(df["timestamp"].dt.tz) == "UTC"
+    assert df["total_balance"].iloc[3] == 1003.0 and df["num_positions"].iloc[0] == 1
+    assert pd.isna(df["total_margin"].iloc[0]) and pd.isna(df["net_unrealized_pnl"].iloc[0])
+
+
+def test_time_range_reads_only_matching_partitions(tmp_path):
+    """Out-of-range day partitions are never opened, even when unreadable."""
+    journal = ParquetJournal(tmp_path / "journal")
+    journal.append_rows("portfolio_state", _state_rows(12))
+    (tmp_path / "journal" / "portfolio_state" / "date=2024-03-01" / "part-0-corrupt.parquet").write_bytes(b"junk")
+
+    df = read_journal(
+        tmp_path,
+        "portfolio_state",
+        start="2024-03-02T06:00:00",
+        end=START + timedelta(days=3),
+        columns=["total_equity"],
+    )
+    assert list(df.columns) == ["total_equity"]
+    assert df["total_equity"].tolist() == [1005.0, 1006.0, 1007.0, 1008.0, 1009.0, 1010.0, 1011.0]
+
+
+def test_compaction_merges_parts_without_duplicates(tmp_path):
+    """Small batches are merged into one sorted file; replaced parts are ignored even if left behind."""
+    journal = ParquetJournal(tmp_path / "journal", max_parts=3, row_group_size=2)
+    for row in _state_rows(3, step=timedelta(minutes=3)):
+        journal.append_rows("portfolio_state", [row])
+    day_dir = tmp_path / "journal" / "portfolio_state" / "date=2024-03-01"
+    leftover = next(day_dir.glob("part-*.parquet"))
+    leftover_bytes = leftover.read_bytes()
+    journal.append_rows("portfolio_state", _state_rows(4, step=timedelta(minutes=3))[3:])
+
+    files = sorted(path.name for path in day_dir.glob("*.parquet"))
+    assert len(files) == 1 and files[0].startswith("compact-")
+    assert pq.ParquetFile(day_dir / files[0]).num_row_groups == 2
+
+    # 模拟合并后删除旧文件前崩溃：旧文件仍在，但已被合并文件登记为替代
+    leftover.write_bytes(leftover_bytes)
+    replaced = pq.read_metadata(day_dir / files[0]).metadata[b"journal.replaces"]
+    assert b"part-" in replaced
+    assert len(read_journal(tmp_path, "portfolio_state")) == 4
+
+
+def test_new_day_compacts_previous_day(tmp_path):
+    """Writing into a new day closes out the previous day's partition."""
+    journal = ParquetJournal(tmp_path / "journal")
+    for row in _state_rows(5):
+        journal.append_rows("portfolio_state", [row])
+    first_day = list((tmp_path / "journal" / "portfolio_state" / "date=2024-03-01").glob("*.parquet"))
+    assert len(first_day) == 1 and first_day[0].name.startswith("compact-")
+
+
+def test_journal_writer_uses_parquet_backend(tmp_path):
+    """JournalWriter batches land in Parquet; unknown journals still append to CSV."""
+    writer = JournalWriter(batch_size=100, flush_interval=60.0, backend=ParquetJournal(tmp_path / "journal"))
+    try:
+        writer.append(tmp_path / "ai_decisions.csv", [START.isoformat(), "BTC", "hold", "flat", 0.5])
+        writer.append(tmp_path / "ai_decisions.csv", ["not a time", "ETH", "hold", "", ""])
+        writer.append(tmp_path / "other.csv", ["x", 1])
+        assert writer.flush(timeout=5.0)
+    finally:
+        writer.close()
+
+    df = read_journal(tmp_path, "ai_decisions", columns=["coin", "confidence"])
+    assert df.to_dict("records") == [{"coin": "BTC", "confidence": 0.5}]
+    assert (tmp_path / "other.csv").read_text().strip() == "x,1"
+    assert not (tmp_path / "ai_decisions.csv").exists()
+
+
+def test_csv_fallback_applies_the_same_filters(tmp_path):
+    """Without Parquet data the CSV is read and filtered to the same shape."""
+    with open(tmp_path / "portfolio_state.csv", "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["timestamp", "total_balance", "total_equity"])
+        writer.writerow(["2024-03-02T00:00:00+00:00", "2", "20"])
+        writer.writerow(["2024-03-01T00:00:00+00:00", "1", "10"])
+
+    df = read_journal(tmp_path, "portfolio_state", start=START, columns=["timestamp", "total_equity"])
+    assert df["total_equity"].tolist() == [10, 20]
+    assert read_journal(tmp_path, "portfolio_state", start="2024-03-02").shape == (1, 3)
+    assert read_journal(tmp_path, "trade_history", columns=["pnl"]).empty
+
+
+def test_import_csv_migrates_existing_history(tmp_path):
+    """A one-time import copies CSV rows into compacted day partitions."""
+    csv_path = tmp_path / "trade_history.csv"
+    with open(csv_path, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["timestamp", "coin", "action", "side", "quantity", "price", "profit_target",
+                         "stop_loss", "leverage", "confidence", "pnl", "balance_after", "reason"])
+        writer.writerow([START.isoformat(), "BTC", "ENTRY", "long", "0.1", "60000", "", "", "5", "0.7", "0", "900", "x"])
+        writer.writerow([(START + timedelta(days=1)).isoformat(), "BTC", "CLOSE", "long", "0.1", "61000", "",
+                         "", "5", "0.7", "100", "1100", "y"])
+
+    journal = ParquetJournal(tmp_path / "journal")
+    assert journal.import_csv(csv_path) == 2
+    df = read_journal(tmp_path, "trade_history", columns=["action", "pnl"])
+    assert df.to_dict("records") == [{"action": "ENTRY", "pnl": 0.0}, {"action": "CLOSE", "pnl": 100.0}]
@@ -0,0 +1,112 @@
+"""Tests for compact prompt encoding and token budgeting."""
+from __future__ import annotations
+
+import pytest
+
+from llm.prompt_budget import (
+    PromptSection,
+    TokenCounter,
+    assemble_prompt,
+    decode_series,
+    encode_series,
+    format_value,
+    significant_decimals,
+)
+
+
+class CharCounter:
+    """Deterministic counter: one token per character."""
+
+    def count(self, text):
+        return len(text)
+
+
+def test_precision_follows_magnitude():
+    """Large prices lose decimals, small ones keep them, trailing zeros vanish."""
+    assert format_value(67234.5678) == "67235"
+    assert format_value(3.14159265) == "3.1416"
+    assert format_value(0.000123456) == "0.00012346"
+    assert format_value(2.50) == "2.5"
+    assert format_value(None) == "NA"
+    assert format_value(float("nan")) == "NA"
+    assert format_value(-0.00001, 3) == "-0.00001"
+    assert significant_decimals([0.0, 0.0]) == 0
+
+
+def test_series_share_precision_of_largest_value():
+    """A series is quantised once, using the decimals its largest value needs."""
+    assert encode_series([101.26, 99.5, 100.0], significant=4) == "101.3,99.5,100"
+
+
+@pytest.mark.parametrize("values", [[67000.5, 67012.25, 66990.0, 67001.75], [-1.25, -0.5, 0.75, 0.0]])
+def test_delta_encoding_round_trips(values):
+    """Delta-encoded series decode back to the quantised values."""
+    plain = encode_series(values, significant=6)
+    delta = encode_series(values, significant=6, delta=True)
+
+    assert delta.startswith("d:")
+    assert decode_series(delta) == pytest.approx(decode_series(plain))
+
+
+def test_delta_encoding_shrinks_large_slowly_moving_series():
+    """BTC-sized prices with small moves encode shorter as deltas."""
+    prices = [67234.1, 67236.4, 67231.9, 67240.2, 67245.7, 67243.0]
+
+    assert len(encode_series(prices, 6, delta=True)) < len(encode_series(prices, 6))
+
+
+def test_token_counter_counts_something_sensible():
+    """Estimated counts grow with text and treat numbers in 3-digit groups."""
+    counter = TokenCounter()
+
+    assert counter.count("") == 0
+    assert counter.count("price 67234.5") < counter.count("price 67234.5, ema20 67100.25, macd -12.5")
+    if not counter.exact:
+        assert counter.count("123456") == 2
+
+
+def test_budget_drops_lowest_priority_sections_first():
+    """Optional sections are removed by ascending priority, later ones first on ties."""
+    sections = [
+        PromptSection("header", "H" * 10, priority=100, required=True),
+        PromptSection("context", "C" * 20, priority=70),
+        PromptSection("series:BTC", "B" * 30, priority=40),
+        PromptSection("series:ETH", "E" * 30, priority=40),
+        PromptSection("rules", "R" * 10, priority=100, required=True),
+    ]
+
+    text, report = assemble_prompt(sections, budget=80, counter=CharCounter())
+
+    assert report.dropped == ["series:ETH"]
+    assert "E" not in text and "B" * 30 in text
+    assert report.total_tokens <= 80
+    assert [s.tokens for s in report.sections] == [10, 20, 30, 30, 10]
+
+
+def test_required_sections_survive_an_impossible_budget():
+    """Required sections stay even if the budget cannot be met."""
+    sections = [
+        PromptSection("rules", "R" * 50, required=True),
+        PromptSection("extra", "X" * 10),
+    ]
+
+    text, report = assemble_prompt(sections, budget=20, counter=CharCounter())
+
+    assert text == "R" * 50
+    assert report.over_budget
+
+
+def test_group_header_disappears_with_its_group():
+    """A shared header is only emitted while at least one member remains."""
+    sections = [
+        PromptSection("rules", "rules", required=True),
+        PromptSection("series_header", "SERIES keys: mid ema20", group="series", group_header=True),
+        PromptSection("series:BTC", "BTC 1,2,3", priority=40, group="series"),
+    ]
+
+    full, _ = assemble_prompt(sections, counter=CharCounter())
+    trimmed, report = assemble_prompt(sections, budget=10, counter=CharCounter())
+
+    assert "SERIES keys" in full
+    assert trimmed == "rules"
+    assert report.dropped == ["series_header", "series:BTC"]
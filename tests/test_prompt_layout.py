@@ -0,0 +1,73 @@
+"""Tests for the static prompt prefix and cached-token accounting."""
+from __future__ import annotations
+
+import pytest
+
+from llm.prompt_layout import PrefixCacheStats, StaticPrompt, cached_prompt_tokens
+
+
+def test_prefix_layout_moves_instructions_into_the_system_message():
+    """All invariant text sits in one system message; the user message is purely dynamic."""
+    static = StaticPrompt("You are a trader.", "Return JSON.")
+
+    first = static.messages("prices at t0")
+    second = static.messages("prices at t1")
+
+    assert first[0] is second[0]
+    assert first[0]["content"] == "You are a trader.\n\nReturn JSON."
+    assert first[1] == {"role": "user", "content": "prices at t0"}
+    assert static.inline_instructions is None
+
+
+def test_legacy_layout_keeps_instructions_in_the_user_prompt():
+    """The legacy layout leaves the system prompt untouched."""
+    static = StaticPrompt("You are a trader.", "Return JSON.", layout="legacy")
+
+    assert static.messages("x")[0]["content"] == "You are a trader."
+    assert static.inline_instructions == "Return JSON."
+    with pytest.raises(ValueError):
+        StaticPrompt("s", layout="suffix")
+
+
+def test_fingerprint_tracks_prefix_content():
+    """The fingerprint changes exactly when the cached prefix would change."""
+    base = StaticPrompt("rules", "json")
+
+    assert base.fingerprint == StaticPrompt("rules", "json", cache_control=True).fingerprint
+    assert base.fingerprint != StaticPrompt("rules v2", "json").fingerprint
+
+
+def test_cache_control_breakpoint():
+    """Explicit cache breakpoints wrap the system text in a content part."""
+    message = StaticPrompt("rules", "json", cache_control=True).system_message
+
+    assert message["content"] == [
+        {"type": "text", "text": "rules\n\njson", "cache_control": {"type": "ephemeral"}}
+    ]
+
+
+@pytest.mark.parametrize(
+    "usage, expected",
+    [
+        ({"prompt_tokens": 900, "prompt_tokens_details": {"cached_tokens": 640}}, 640),
+        ({"prompt_tokens": 900, "prompt_cache_hit_tokens": 512, "prompt_cache_miss_tokens": 388}, 512),
+        ({"input_tokens": 900, "cache_read_input_tokens": 256}, 256),
+        ({"prompt_tokens": 900}, None),
+        (None, None),
+    ],
+)
+def test_cached_tokens_from_provider_usage(usage, expected):
+    """Cached-token counts are read from the usual provider usage shapes."""
+    assert cached_prompt_tokens(usage) == expected
+
+
+def test_prefix_cache_stats_hit_rate():
+    """The hit rate only counts calls whose provider reported cached tokens."""
+    stats = PrefixCacheStats()
+    assert stats.record({"prompt_tokens": 1000, "prompt_tokens_details": {"cached_tokens": 0}}) == 0
+    assert stats.record({"prompt_tokens": 1000, "prompt_tokens_details": {"cached_tokens": 800}}) == 800
+    stats.record(None)
+
+    assert stats.calls == 3
+    assert stats.hit_rate == pytest.approx(0.4)
+    assert PrefixCacheStats().hit_rate is None
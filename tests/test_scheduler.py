@@ -0,0 +1,119 @@
+"""Tests for the bar-close-aligned scheduler."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from runtime.scheduler import BarCloseScheduler, ManualClock
+
+
+def _at(hour, minute, second=0.0):
+    return datetime(2024, 1, 1, hour, minute, tzinfo=timezone.utc) + timedelta(seconds=second)
+
+
+def _scheduler(clock, **kwargs):
+    kwargs.setdefault("offset_seconds", 0.3)
+    return BarCloseScheduler(180, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_wakes_offset_after_each_close():
+    """Consecutive ticks land exactly `offset` after each 3m close."""
+    clock = ManualClock(_at(12, 2, 59))
+    scheduler = _scheduler(clock, max_lateness_seconds=30)
+
+    first = scheduler.wait_for_next()
+    clock.advance(12.5)  # iteration work
+    second = scheduler.wait_for_next()
+
+    assert first.bar_close == _at(12, 3)
+    assert first.started_at == _at(12, 3, 0.3)
+    assert first.drift == 0
+    assert second.bar_close == _at(12, 6)
+    assert second.started_at == _at(12, 6, 0.3)
+    assert not second.late and second.skipped_bars == 0
+
+
+def test_startup_mid_bar_runs_immediately_within_lateness():
+    """Starting shortly after a close acts on that close right away."""
+    clock = ManualClock(_at(12, 1, 10))
+    scheduler = _scheduler(clock)
+    tick = scheduler.wait_for_next()
+
+    assert tick.bar_close == _at(12, 0)
+    assert tick.started_at == _at(12, 1, 10)
+    assert tick.late
+    assert tick.drift == pytest.approx(69.7)
+    assert tick.skipped_bars == 0
+    assert scheduler.stats.late_starts == 0  # startup offset is not drift
+
+
+def test_overrun_shortens_next_cycle():
+    """A cycle that spills into the next bar starts the next one immediately."""
+    clock = ManualClock(_at(12, 2, 59))
+    scheduler = _scheduler(clock)
+    tick = scheduler.wait_for_next()
+
+    clock.advance(200)
+    report = scheduler.complete(tick)
+    following = scheduler.wait_for_next()
+
+    assert report.overran
+    assert report.duration == pytest.approx(200)
+    assert following.bar_close == _at(12, 6)
+    assert following.late
+    assert following.skipped_bars == 0
+    assert following.deadline == _at(12, 9, 0.3)
+    assert scheduler.stats.overruns == 1
+
+
+def test_missed_closes_are_skipped():
+    """Closes that passed entirely during a long cycle are counted and skipped."""
+    clock = ManualClock(_at(12, 2, 59))
+    scheduler = _scheduler(clock)
+    scheduler.wait_for_next()
+
+    clock.set(_at(12, 13))
+    tick = scheduler.wait_for_next()
+
+    assert tick.bar_close == _at(12, 12)
+    assert tick.skipped_bars == 2  # 12:06 and 12:09
+    assert scheduler.stats.skipped_bars == 2
+
+
+def test_too_late_waits_for_following_close():
+    """Beyond the lateness budget the current bar is skipped as well."""
+    clock = ManualClock(_at(12, 2, 59))
+    scheduler = _scheduler(clock, max_lateness_seconds=60)
+    scheduler.wait_for_next()
+
+    clock.set(_at(12, 7, 40))
+    tick = scheduler.wait_for_next()
+
+    assert tick.bar_close == _at(12, 9)
+    assert tick.started_at == _at(12, 9, 0.3)
+    assert tick.skipped_bars == 1
+    assert not tick.late
+
+
+def test_drift_statistics_follow_real_clock_jitter():
+    """Drift is measured from the clock after waking, so oversleeping shows up."""
+    clock = ManualClock(_at(12, 2, 59))
+    scheduler = BarCloseScheduler(
+        180,
+        offset_seconds=0.3,
+        clock=clock,
+        sleep=lambda seconds: clock.advance(seconds + 0.05),
+    )
+    for _ in range(4):
+        scheduler.wait_for_next()
+
+    assert scheduler.stats.ticks == 4
+    assert scheduler.stats.mean_drift == pytest.approx(0.05)
+    assert scheduler.stats.max_drift == pytest.approx(0.05)
+
+
+def test_invalid_interval():
+    """A zero interval cannot be scheduled."""
+    with pytest.raises(ValueError):
+        BarCloseScheduler(0)
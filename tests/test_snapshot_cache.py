@@ -0,0 +1,112 @@
+"""Tests for the per-iteration market snapshot cache."""
+from __future__ import annotations
+
+from market.snapshot_cache import MarketSnapshotCache
+
+
+def _counting_fetch(calls, total_rows=500):
+    def fetch(limit):
+        calls.append(limit)
+        return list(range(total_rows))[-limit:]
+    return fetch
+
+
+def test_series_fetched_once_per_iteration():
+    """Repeated requests for the same key hit memory after the first fetch."""
+    cache = MarketSnapshotCache()
+    calls = []
+    fetch = _counting_fetch(calls)
+
+    first = cache.get_series(("klines", "BTCUSDT", "3m"), 50, fetch)
+    second = cache.get_series(("klines", "BTCUSDT", "3m"), 50, fetch)
+
+    assert first == second
+    assert calls == [50]
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+
+
+def test_min_limit_serves_smaller_and_larger_consumers():
+    """A widened first fetch satisfies later, larger requests without refetching."""
+    cache = MarketSnapshotCache()
+    calls = []
+    fetch = _counting_fetch(calls)
+
+    small = cache.get_series(("klines", "ETHUSDT", "3m"), 50, fetch, min_limit=200)
+    large = cache.get_series(("klines", "ETHUSDT", "3m"), 200, fetch, min_limit=200)
+
+    assert calls == [200]
+    assert len(small) == 50
+    assert len(large) == 200
+    assert small == large[-50:]
+
+
+def test_larger_limit_triggers_refetch():
+    """Requesting more rows than cached causes one additional fetch."""
+    cache = MarketSnapshotCache()
+    calls = []
+    fetch = _counting_fetch(calls)
+
+    cache.get_series(("funding", "ETHUSDT"), 1, fetch)
+    rows = cache.get_series(("funding", "ETHUSDT"), 30, fetch)
+
+    assert calls == [1, 30]
+    assert len(rows) == 30
+
+
+def test_short_history_is_not_refetched():
+    """When the exchange has fewer rows than requested, the short answer is reused."""
+    cache = MarketSnapshotCache()
+    calls = []
+    fetch = _counting_fetch(calls, total_rows=10)
+
+    cache.get_series(("klines", "NEWUSDT", "4h"), 200, fetch)
+    rows = cache.get_series(("klines", "NEWUSDT", "4h"), 200, fetch)
+
+    assert calls == [200]
+    assert len(rows) == 10
+
+
+def test_reset_clears_payloads_and_counters():
+    """reset() starts a fresh iteration."""
+    cache = MarketSnapshotCache()
+    calls = []
+    fetch = _counting_fetch(calls)
+
+    cache.get_series(("klines", "BTCUSDT", "3m"), 10, fetch)
+    cache.reset()
+    assert cache.stats.hits == 0
+    assert cache.stats.misses == 0
+
+    cache.get_series(("klines", "BTCUSDT", "3m"), 10, fetch)
+    assert calls == [10, 10]
+
+
+def test_get_or_compute_skips_none():
+    """Derived values are memoised, failures are retried."""
+    cache = MarketSnapshotCache()
+    results = iter([None, {"price": 1.0}, {"price": 2.0}])
+
+    assert cache.get_or_compute(("market_data", "BTCUSDT"), lambda: next(results)) is None
+    assert cache.get_or_compute(("market_data", "BTCUSDT"), lambda: next(results)) == {"price": 1.0}
+    assert cache.get_or_compute(("market_data", "BTCUSDT"), lambda: next(results)) == {"price": 1.0}
+    assert cache.stats.by_kind["market_data"] == {"hits": 1, "misses": 2}
+
+
+def test_max_age_expires_entries(monkeypatch):
+    """Entries older than max_age_seconds are refetched."""
+    import market.snapshot_cache as module
+
+    clock = {"now": 100.0}
+    monkeypatch.setattr(module.time, "monotonic", lambda: clock["now"])
+    cache = MarketSnapshotCache(max_age_seconds=5)
+    calls = []
+    fetch = _counting_fetch(calls)
+
+    cache.get_series(("klines", "BTCUSDT", "3m"), 10, fetch)
+    clock["now"] += 3
+    cache.get_series(("klines", "BTCUSDT", "3m"), 10, fetch)
+    clock["now"] += 10
+    cache.get_series(("klines", "BTCUSDT", "3m"), 10, fetch)
+
+    assert calls == [10, 10]
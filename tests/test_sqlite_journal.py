@@ -0,0 +1,132 @@
+"""Tests for the SQLite (WAL) journal backend."""
+from __future__ import annotations
+
+import csv
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from runtime.journal import (
+    SQLITE_JOURNAL_FILENAME,
+    JournalWriter,
+    active_journal_backend,
+    read_journal,
+    record_journal_backend,
+)
+from runtime.sqlite_journal import SqliteJournal, connect_readonly
+
+
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def _trade(index, coin):
+    return [(START + timedelta(minutes=3 * index)).isoformat(), coin, "ENTRY", "long", 0.1, 60000 + index,
+            "", "", 5, 0.7, "", 1000 - index, f"trade {index}"]
+
+
+@pytest.fixture
+def journal(tmp_path):
+    backend = SqliteJournal(tmp_path / SQLITE_JOURNAL_FILENAME)
+    yield backend
+    backend.close()
+
+
+def test_database_uses_wal_and_indexes(journal, tmp_path):
+    """The writer enables WAL; coin and time-range queries are index lookups."""
+    journal.append_rows("trade_history", [_trade(0, "BTC")])
+    reader = connect_readonly(tmp_path / SQLITE_JOURNAL_FILENAME)
+    try:
+        assert reader.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        plan = " ".join(row[-1] for row in reader.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM trade_history WHERE coin = ? ORDER BY timestamp DESC LIMIT 5", ("BTC",)
+        ))
+        assert "idx_trade_history_coin_timestamp" in plan
+        plan = " ".join(row[-1] for row in reader.execute(
+            "EXPLAIN QUERY PLAN SELECT total_equity FROM portfolio_state WHERE timestamp >= ? AND timestamp < ?", ("a", "b")
+        ))
+        assert "idx_portfolio_state_timestamp" in plan
+        with pytest.raises(sqlite3.OperationalError):
+            reader.execute("DELETE FROM trade_history")
+    finally:
+        reader.close()
+
+
+def test_last_trades_for_coin_and_time_range(journal, tmp_path):
+    """`coin` + `limit` return the newest N rows oldest first; ranges compare as UTC times."""
+    journal.append_rows("trade_history", [_trade(index, "BTC" if index % 2 else "ETH") for index in range(10)])
+
+    last = read_journal(tmp_path, "trade_history", coin="BTC", limit=3, columns=["timestamp", "price"])
+    assert last["price"].tolist() == [60005.0, 60007.0, 60009.0]
+    assert str(last["timestamp"].dt.tz) == "UTC"
+
+    window = read_journal(
+        tmp_path,
+        "trade_history",
+        start="2024-03-01T01:00:00+01:00",
+        end=START + timedelta(minutes=12),
+        columns=["coin"],
+    )
+    assert window["coin"].tolist() == ["ETH", "BTC", "ETH", "BTC"]
+    assert window.columns.tolist() == ["coin"]
+
+
+def test_journal_writer_batches_into_sqlite(tmp_path):
+    """Queued rows commit per batch; bad timestamps are dropped and unknown journals stay CSV."""
+    backend = SqliteJournal(tmp_path / SQLITE_JOURNAL_FILENAME)
+    writer = JournalWriter(batch_size=100, flush_interval=60.0, backend=backend)
+    writer.append(tmp_path / "ai_decisions.csv", [START.isoformat(), "BTC", "hold", "flat", "0.5"])
+    writer.append(tmp_path / "ai_decisions.csv", ["yesterday", "ETH", "hold", "", ""])
+    writer.append(tmp_path / "other.csv", ["x"])
+    writer.close()
+    writer.append(tmp_path / "ai_decisions.csv", [(START + timedelta(seconds=1)).isoformat(), "SOL", "buy", "", ""])
+    backend.close()
+
+    df = read_journal(tmp_path, "ai_decisions", columns=["coin", "confidence"])
+    assert df["coin"].tolist() == ["BTC", "SOL"]
+    assert df["confidence"].iloc[0] == 0.5
+    assert (tmp_path / "other.csv").read_text().strip() == "x"
+
+
+def test_readers_never_see_partial_batches(journal, tmp_path):
+    """A reader polling during writes only ever sees whole committed batches."""
+    seen = []
+    done = threading.Event()
+
+    def poll():
+        while not done.is_set():
+            seen.append(len(read_journal(tmp_path, "portfolio_state", columns=["total_equity"])))
+
+    thread = threading.Thread(target=poll)
+    thread.start()
+    for batch in range(20):
+        rows = [[(START + timedelta(minutes=batch * 10 + index)).isoformat(), 1, 2, 0, 0, "", 0, 0] for index in range(10)]
+        journal.append_rows("portfolio_state", rows)
+    done.set()
+    thread.join()
+    assert all(count % 10 == 0 for count in seen)
+    assert len(read_journal(tmp_path, "portfolio_state")) == 200
+
+
+def test_recorded_backend_decides_which_store_is_read(journal, tmp_path):
+    """An empty SQLite table reads as empty, and switching back to CSV stops reading the database."""
+    csv_path = tmp_path / "portfolio_state.csv"
+    with open(csv_path, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["timestamp", "total_balance", "total_equity", "total_return_pct", "num_positions",
+                         "position_details", "total_margin", "net_unrealized_pnl"])
+        writer.writerow([START.isoformat(), "900", "1000", "0", "1", "BTC", "100", "0"])
+
+    assert not journal.has_data("portfolio_state")
+    record_journal_backend(tmp_path, "sqlite")
+    assert read_journal(tmp_path, "portfolio_state", columns=["total_equity"]).empty
+    assert journal.import_csv(csv_path) == 1
+    assert read_journal(tmp_path, "portfolio_state", columns=["num_positions"])["num_positions"].tolist() == [1]
+
+    with open(csv_path, "a", newline="") as fh:
+        csv.writer(fh).writerow([(START + timedelta(hours=1)).isoformat(), "950", "1050", "5", "0", "", "0", "0"])
+    record_journal_backend(tmp_path, "csv")
+    assert active_journal_backend(tmp_path) == "csv"
+    assert read_journal(tmp_path, "portfolio_state", columns=["total_equity"])["total_equity"].tolist() == [1000, 1050]
+    assert read_journal(tmp_path, "portfolio_state", columns=["total_equity"], backend="sqlite").shape == (1, 1)
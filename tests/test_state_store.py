@@ -0,0 +1,133 @@
+"""Tests for the write-ahead journaled portfolio state store."""
+from __future__ import annotations
+
+import json
+import threading
+
+from runtime.state_store import StateStore, apply_record, empty_state
+
+
+def _position(quantity=0.1, price=60000.0):
+    return {"side": "long", "quantity": quantity, "entry_price": price, "margin": 600.0, "last_justification": "x"}
+
+
+def test_crash_before_compaction_is_recovered_from_the_journal(tmp_path):
+    """A store that never compacted recovers every journaled change on restart."""
+    store = StateStore(tmp_path / "state.json", compact_every=100)
+    store.compact({**empty_state(1000.0), "iteration": 4})
+    store.record("open", coin="BTC", position=_position(), balance=400.0)
+    store.record("open", coin="ETH", position=_position(1.0, 3000.0), balance=100.0)
+    store.record("update", coin="BTC", fields={"last_justification": "trend intact"})
+    store.record("close", coin="ETH", balance=720.0)
+    store.record("iteration", iteration=5, balance=720.0, at="2024-03-01T00:05:00+00:00")
+    # 模拟进程被杀：不 close、不 compact
+
+    state = StateStore(tmp_path / "state.json").load()
+    assert state["balance"] == 720.0 and state["iteration"] == 5
+    assert list(state["positions"]) == ["BTC"]
+    assert state["positions"]["BTC"]["last_justification"] == "trend intact"
+    assert state["updated_at"] == "2024-03-01T00:05:00+00:00"
+
+
+def test_torn_tail_is_discarded_and_truncated(tmp_path):
+    """A half-written last record is dropped and cut off so new appends stay parseable."""
+    store = StateStore(tmp_path / "state.json")
+    store.compact(empty_state(1000.0))
+    store.record("open", coin="BTC", position=_position(), balance=400.0)
+    with open(store.wal_path, "a") as fh:
+        fh.write('{"seq": 2, "op": "close", "coin": "BT')
+
+    recovered = StateStore(tmp_path / "state.json")
+    assert recovered.load()["balance"] == 400.0
+    assert store.wal_path.read_text().count("\n") == 1
+    recovered.record("close", coin="BTC", balance=1010.0)
+    assert StateStore(tmp_path / "state.json").load() == {**empty_state(1010.0)}
+
+
+def test_compaction_writes_snapshot_and_skips_already_applied_records(tmp_path):
+    """Records already folded into the snapshot are not re-applied if the journal survives a crash."""
+    store = StateStore(tmp_path / "state.json", compact_every=3)
+    store.compact(empty_state(1000.0))
+    for index in range(3):
+        store.record("iteration", iteration=index + 1, balance=1000.0 + index)
+    assert store.should_compact
+    stale_journal = store.wal_path.read_text()
+    store.compact()
+
+    snapshot = json.loads((tmp_path / "state.json").read_text())
+    assert snapshot["iteration"] == 3 and snapshot["wal_seq"] == 3
+    assert store.wal_path.read_text() == "" and not store.should_compact
+    assert not list(tmp_path.glob("*.tmp"))
+
+    # 替换快照后、清空 WAL 前崩溃：旧记录仍在，但序号不大于 wal_seq，会被跳过
+    store.wal_path.write_text(stale_journal)
+    store.record("iteration", iteration=4, balance=1003.0)
+    state = StateStore(tmp_path / "state.json").load()
+    assert state["iteration"] == 4 and state["balance"] == 1003.0
+
+
+def test_replaying_a_record_twice_is_idempotent():
+    """Records carry absolute values, so applying one twice leaves the same state."""
+    once, twice = empty_state(1000.0), empty_state(1000.0)
+    records = [
+        {"seq": 1, "op": "open", "coin": "SOL", "position": _position(5.0, 150.0), "balance": 250.0},
+        {"seq": 2, "op": "update", "coin": "SOL", "fields": {"stop_loss": 140.0}},
+        {"seq": 3, "op": "close", "coin": "SOL", "balance": 990.0},
+    ]
+    for record in records:
+        apply_record(once, record)
+        apply_record(twice, record)
+        apply_record(twice, record)
+    assert once == twice == empty_state(990.0)
+
+
+def test_legacy_snapshot_without_journal_loads_unchanged(tmp_path):
+    """A state file written before the journal existed loads as-is; no file means no state."""
+    assert StateStore(tmp_path / "missing.json").load() is None
+    legacy = {"balance": 812.5, "positions": {"BTC": _position()}, "iteration": 42, "updated_at": "t"}
+    (tmp_path / "state.json").write_text(json.dumps(legacy, indent=2))
+
+    store = StateStore(tmp_path / "state.json")
+    assert store.load() == legacy
+    store.record("iteration", iteration=43, balance=812.5)
+    assert StateStore(tmp_path / "state.json").load()["iteration"] == 43
+
+
+def test_concurrent_records_keep_unique_sequence_numbers(tmp_path):
+    """Appends from several threads produce one intact line per record, in sequence order."""
+    store = StateStore(tmp_path / "state.json", fsync=False)
+    store.compact(empty_state(1000.0))
+
+    def worker(coin):
+        for index in range(50):
+            store.record("update", coin=coin, fields={"n": index})
+
+    threads = [threading.Thread(target=worker, args=(coin,)) for coin in ("BTC", "ETH", "SOL", "XRP")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    seqs = [json.loads(line)["seq"] for line in store.wal_path.read_text().splitlines()]
+    assert seqs == list(range(1, 201))
+
+
+def test_quarantine_keeps_unreadable_files_for_recovery(tmp_path):
+    """A corrupt snapshot and its journal are moved aside intact, never truncated or overwritten."""
+    store = StateStore(tmp_path / "state.json")
+    store.compact(empty_state(1000.0))
+    store.record("open", coin="BTC", position=_position(), balance=400.0)
+    journal = store.wal_path.read_text()
+    (tmp_path / "state.json").write_text('{"balance": 40')
+
+    recovering = StateStore(tmp_path / "state.json")
+    try:
+        recovering.load()
+    except ValueError:
+        moved = recovering.quarantine()
+    assert sorted(path.name.split(".")[1] for path in moved) == ["json", "wal"]
+    assert [path.read_text() for path in moved if path.name.startswith("state.wal")] == [journal]
+    assert not (tmp_path / "state.json").exists() and not recovering.wal_path.exists()
+
+    recovering.compact(empty_state(1000.0))
+    assert StateStore(tmp_path / "state.json").load() == empty_state(1000.0)
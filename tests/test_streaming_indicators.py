@@ -0,0 +1,172 @@
+"""Tests proving the streaming indicator engine matches the pandas implementation."""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators.streaming import (
+    AtrState,
+    EmaState,
+    IndicatorEngine,
+    IndicatorEngineStore,
+    IndicatorSpec,
+    RsiState,
+)
+
+TOLERANCE = 1e-9
+
+
+def _pandas_reference(df: pd.DataFrame, spec: IndicatorSpec) -> pd.DataFrame:
+    """Same formulas as bot.add_indicator_columns / calculate_rsi_series / calculate_atr_series."""
+    close = df["close"]
+    out = pd.DataFrame(index=df.index)
+    for span in spec.ema_lengths:
+        out[f"ema{span}"] = close.ewm(span=span, adjust=False).mean()
+    for period in spec.rsi_periods:
+        delta = close.diff()
+        gain = delta.where(delta > 0, 0.0)
+        loss = -delta.where(delta < 0, 0.0)
+        avg_gain = gain.ewm(alpha=1 / period, adjust=False).mean()
+        avg_loss = loss.ewm(alpha=1 / period, adjust=False).mean()
+        rs = avg_gain / avg_loss.replace(0, np.nan)
+        out[f"rsi{period}"] = 100 - 100 / (1 + rs)
+    fast, slow, signal = spec.macd_params
+    macd = close.ewm(span=fast, adjust=False).mean() - close.ewm(span=slow, adjust=False).mean()
+    out["macd"] = macd
+    out["macd_signal"] = macd.ewm(span=signal, adjust=False).mean()
+    prev_close = close.shift(1)
+    true_range = pd.concat(
+        [df["high"] - df["low"], (df["high"] - prev_close).abs(), (df["low"] - prev_close).abs()],
+        axis=1,
+    ).max(axis=1)
+    for period in spec.atr_periods:
+        out[f"atr{period}"] = true_range.ewm(alpha=1 / period, adjust=False).mean()
+    return out
+
+
+def _random_bars(n: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    high = close + rng.uniform(0, 1.5, n)
+    low = close - rng.uniform(0, 1.5, n)
+    open_time = np.arange(n, dtype=np.int64) * 180_000
+    return pd.DataFrame({"timestamp": open_time, "high": high, "low": low, "close": close})
+
+
+def _assert_close(actual, expected):
+    actual = np.asarray(actual, dtype=float)
+    expected = np.asarray(expected, dtype=float)
+    assert np.array_equal(np.isnan(actual), np.isnan(expected))
+    mask = ~np.isnan(expected)
+    assert np.allclose(actual[mask], expected[mask], rtol=TOLERANCE, atol=TOLERANCE)
+
+
+SPECS = [
+    IndicatorSpec(ema_lengths=(20,), rsi_periods=(7, 14), macd_params=(12, 26, 9)),
+    IndicatorSpec(ema_lengths=(20, 50), rsi_periods=(14,), macd_params=(12, 26, 9), atr_periods=(3, 14)),
+]
+
+
+@pytest.mark.parametrize("spec", SPECS)
+def test_bar_by_bar_updates_match_pandas(spec):
+    """Committing every bar reproduces the full pandas series."""
+    df = _random_bars(300)
+    expected = _pandas_reference(df, spec)
+    engine = IndicatorEngine(spec)
+
+    rows = [engine.update(h, l, c) for h, l, c in zip(df["high"], df["low"], df["close"])]
+
+    for column in spec.columns():
+        _assert_close([row[column] for row in rows], expected[column])
+
+
+@pytest.mark.parametrize("spec", SPECS)
+def test_sync_on_rolling_window_matches_pandas(spec):
+    """Syncing a growing window matches pandas run over the same history, including the forming bar."""
+    df = _random_bars(260, seed=11)
+    engine = IndicatorEngine(spec, history=10)
+
+    for end in (200, 201, 203, 260):
+        window = df.iloc[:end]
+        result = engine.sync(
+            window["timestamp"].to_numpy(),
+            window["high"].to_numpy(),
+            window["low"].to_numpy(),
+            window["close"].to_numpy(),
+            tail=10,
+        )
+        expected = _pandas_reference(window, spec).tail(10)
+        for column in spec.columns():
+            _assert_close(result[column], expected[column])
+
+    # Each closed bar was committed exactly once.
+    assert engine.bars_processed == 259
+
+
+def test_forming_bar_is_previewed_not_committed():
+    """Revisions to the last bar do not leak into the recursive state."""
+    spec = SPECS[0]
+    df = _random_bars(50, seed=3)
+    engine = IndicatorEngine(spec)
+    times, highs, lows, closes = (df[c].to_numpy().copy() for c in ("timestamp", "high", "low", "close"))
+
+    engine.sync(times, highs, lows, closes)
+    closes[-1] += 5.0
+    highs[-1] += 5.0
+    revised = engine.sync(times, highs, lows, closes)
+
+    expected = _pandas_reference(pd.DataFrame({"high": highs, "low": lows, "close": closes}), spec)
+    for column in spec.columns():
+        _assert_close(revised[column], expected[column].tail(1))
+    assert engine.bars_processed == 49
+
+
+def test_gap_beyond_window_replays_from_window_start():
+    """When the last processed bar falls outside the window, the engine resets."""
+    spec = SPECS[1]
+    df = _random_bars(400, seed=5)
+    engine = IndicatorEngine(spec)
+    first = df.iloc[:200]
+    engine.sync(first["timestamp"].to_numpy(), first["high"].to_numpy(), first["low"].to_numpy(), first["close"].to_numpy())
+
+    later = df.iloc[200:400]
+    result = engine.sync(
+        later["timestamp"].to_numpy(),
+        later["high"].to_numpy(),
+        later["low"].to_numpy(),
+        later["close"].to_numpy(),
+        tail=5,
+    )
+    expected = _pandas_reference(later.reset_index(drop=True), spec).tail(5)
+    for column in spec.columns():
+        _assert_close(result[column], expected[column])
+
+
+def test_store_keeps_one_engine_per_key_and_spec():
+    """The store reuses engines across calls."""
+    store = IndicatorEngineStore(history=10)
+    df = _random_bars(100)
+    args = (df["timestamp"].to_numpy(), df["high"].to_numpy(), df["low"].to_numpy(), df["close"].to_numpy())
+
+    store.sync(("BTCUSDT", "3m"), SPECS[0], *args)
+    store.sync(("BTCUSDT", "3m"), SPECS[0], *args)
+    store.sync(("BTCUSDT", "3m"), SPECS[1], *args)
+
+    assert len(store._engines) == 2
+
+
+def test_state_validation():
+    """Invalid periods are rejected."""
+    with pytest.raises(ValueError):
+        EmaState()
+    with pytest.raises(ValueError):
+        RsiState(0)
+    with pytest.raises(ValueError):
+        AtrState(0)
+
+
+def test_empty_window():
+    """An empty window yields empty series."""
+    result = IndicatorEngine(SPECS[0]).sync([], [], [], [])
+    assert all(len(values) == 0 for values in result.values())
@@ -0,0 +1,62 @@
+"""Tests for the batched (symbols × bars) indicator kernel."""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from indicators import vectorized
+from indicators.vectorized import compute_indicator_matrix, ema_matrix, stack_right_aligned
+from tests.test_streaming_indicators import SPECS, _assert_close, _pandas_reference, _random_bars
+
+
+@pytest.mark.parametrize("spec", SPECS)
+def test_matrix_matches_pandas_per_symbol(spec):
+    """Every row of the batch equals the single-symbol pandas computation."""
+    frames = [_random_bars(200, seed=seed) for seed in range(6)]
+    highs = np.vstack([df["high"].to_numpy() for df in frames])
+    lows = np.vstack([df["low"].to_numpy() for df in frames])
+    closes = np.vstack([df["close"].to_numpy() for df in frames])
+
+    result = compute_indicator_matrix(spec, highs, lows, closes)
+
+    for row, df in enumerate(frames):
+        expected = _pandas_reference(df, spec)
+        for column in spec.columns():
+            assert result[column].shape == (6, 200)
+            _assert_close(result[column][row], expected[column])
+
+
+def test_ragged_rows_are_padded_without_changing_results():
+    """Shorter histories are right-aligned; padding only yields NaN in the prefix."""
+    spec = SPECS[1]
+    frames = [_random_bars(200, seed=1), _random_bars(37, seed=2), _random_bars(120, seed=3)]
+    highs, lengths = stack_right_aligned([df["high"].to_numpy() for df in frames])
+    lows, _ = stack_right_aligned([df["low"].to_numpy() for df in frames])
+    closes, _ = stack_right_aligned([df["close"].to_numpy() for df in frames])
+
+    result = compute_indicator_matrix(spec, highs, lows, closes, lengths)
+
+    assert lengths.tolist() == [200, 37, 120]
+    for row, df in enumerate(frames):
+        expected = _pandas_reference(df, spec)
+        pad = 200 - len(df)
+        for column in spec.columns():
+            assert np.isnan(result[column][row, :pad]).all()
+            _assert_close(result[column][row, pad:], expected[column])
+
+
+def test_long_windows_use_recurrence(monkeypatch):
+    """Windows beyond the matmul limit fall back to the bar recurrence with the same values."""
+    values = np.vstack([_random_bars(300, seed=9)["close"].to_numpy()] * 2)
+    via_matmul = ema_matrix(values, 2 / 21)
+    monkeypatch.setattr(vectorized, "MATMUL_MAX_BARS", 100)
+    via_recurrence = ema_matrix(values, 2 / 21)
+
+    _assert_close(via_recurrence, via_matmul)
+
+
+def test_single_symbol_vector_input():
+    """1-D inputs are treated as a single symbol."""
+    df = _random_bars(50)
+    result = compute_indicator_matrix(SPECS[0], df["high"], df["low"], df["close"])
+    _assert_close(result["ema20"][0], _pandas_reference(df, SPECS[0])["ema20"])
@@ -18,6 +18,11 @@ from urllib.parse import quote_plus
 
 import requests
 
+try:
+    from runtime.http import get_transport
+except ImportError:  # pragma: no cover - running the module from inside utils/
+    get_transport = None
+
 
 _CONFIG_SECTION = "dingbot"
 
@@ -87,7 +92,10 @@ class DingTalkBot:
         }
 
         url = self._signed_webhook()
-        response = requests.post(url, json=payload, timeout=timeout)
+        if get_transport is not None:
+            response = get_transport().post(url, json=payload, timeout=timeout, endpoint="dingtalk")
+        else:
+            response = requests.post(url, json=payload, timeout=timeout)
         response.raise_for_status()
 
         data = response.json()